@@ -1,18 +1,31 @@
-from django.contrib import admin
-from django.utils.html import format_html
-from django.http import HttpResponse
-from django.urls import path
-from django.shortcuts import render
+from django.contrib import admin, messages
+from django.contrib.admin.views.main import ORDER_VAR
+from django.contrib.auth import get_permission_codename
+from django.core.exceptions import PermissionDenied
+from django.utils.html import format_html, format_html_join
+from django.utils.safestring import mark_safe
+from django.http import FileResponse, Http404, HttpResponse
+from django.urls import path, reverse
+from django.shortcuts import redirect, render
+from django.core.files.storage import default_storage
 from django.db.models import Count, Sum, Q
 from django.utils import timezone
 from datetime import timedelta, date
 import pandas as pd
 
 from .models import (
-    Cliente, Empresa, Plato, DisponibilidadPlato, CarritoItem, 
-    Recibo, ReciboItem, PedidoHistorico, Produccion, Inventario, MovimientoInventario
+    Cliente, Empresa, Plato, DisponibilidadPlato, DisponibilidadFecha, CarritoItem, 
+    Recibo, ReciboItem, PedidoHistorico, Produccion, Inventario, MovimientoInventario,
+    PedidoHistoricoArchivado, MovimientoInventarioArchivado, CarritoItemArchivado, FacturaEmpresa, LineaFacturaEmpresa,
+    PlantillaMenu, PlantillaMenuPlato, RotacionMenu, RotacionMenuPaso, SegmentoRFM, SemanaMenu
 )
 from .forms import DisponibilidadPlatoForm, CarritoItemForm
+from .search import buscar_platos
+from .alergenos import etiquetas_de_mascara
+from .facturacion import marcar_pagadas
+from . import cohortes, documentos, reparto, servicio
+from .planificacion import (DIAS, aplicar_cambios_menu, aplicar_plantilla, calendario, comparar_plantilla,
+                            diferencia, guardar_plantilla, matriz, plantilla_de_semana)
 
 # ==================== VISTAS PERSONALIZADAS ====================
 
@@ -48,7 +61,7 @@ class ClienteAdmin(admin.ModelAdmin):
             'fields': ('Nombre_Completo', 'usuario', 'celular', 'dni', 'correo')
         }),
         ('Tipo de Cliente', {
-            'fields': ('es_particular', 'empresa', 'direccion_particular')
+            'fields': ('es_particular', 'empresa', 'direccion_particular', 'latitud', 'longitud')
         }),
         ('Configuración', {
             'fields': ('importante', 'Creacion_cuenta'),
@@ -56,16 +69,70 @@ class ClienteAdmin(admin.ModelAdmin):
         }),
     )
 
+    def get_urls(self):
+        return [
+            path('cohortes/', self.admin_site.admin_view(self.cohortes), name='myapp_cliente_cohortes'),
+        ] + super().get_urls()
+
+    def cohortes(self, request):
+        """Retención mensual por cohorte de alta (``?desde=AAAA-MM&hasta=AAAA-MM``)"""
+        limites = {}
+        for clave in ('desde', 'hasta'):
+            if request.GET.get(clave):
+                try:
+                    limites[clave] = cohortes.mes_desde_parametro(request.GET[clave])
+                except ValueError as e:
+                    self.message_user(request, str(e), messages.ERROR)
+        filas = cohortes.informe(**limites)['cohortes']
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'Retención por cohorte de alta',
+            'opts': self.model._meta,
+            'desde': request.GET.get('desde', ''),
+            'hasta': request.GET.get('hasta', ''),
+            'meses': range(max((len(fila['retencion']) for fila in filas), default=0)),
+            'filas': [
+                {**fila, 'celdas': list(zip(fila['retencion'], fila['activos']))} for fila in filas
+            ],
+        }
+        return render(request, 'admin/cohortes.html', context)
+
 class EmpresaAdmin(admin.ModelAdmin):
-    list_display = ('codigo', 'nombre', 'cif', 'direccion')
+    list_display = ('codigo', 'nombre', 'cif', 'direccion', 'facturacion_consolidada', 'geolocalizada')
+    list_filter = ('facturacion_consolidada',)
     search_fields = ('codigo', 'nombre', 'cif')
     ordering = ('codigo',)
 
+    def geolocalizada(self, obj):
+        return obj.latitud is not None
+    geolocalizada.boolean = True
+    geolocalizada.short_description = 'Geolocalizada'
+
+    def get_urls(self):
+        return [
+            path('reparto/', self.admin_site.admin_view(self.rutas_reparto), name='myapp_empresa_reparto'),
+        ] + super().get_urls()
+
+    def rutas_reparto(self, request):
+        """Rutas de reparto del día (``?fecha=``, mañana por defecto)"""
+        try:
+            fecha = date.fromisoformat(request.GET.get('fecha', ''))
+        except ValueError:
+            fecha = date.today() + timedelta(days=1)
+        context = {
+            **self.admin_site.each_context(request),
+            'title': f'Rutas de reparto del {fecha:%d/%m/%Y}',
+            'opts': self.model._meta,
+            'fecha': fecha,
+            'plan': reparto.planificar_rutas(fecha),
+        }
+        return render(request, 'admin/reparto_rutas.html', context)
+
 class PlatoAdmin(admin.ModelAdmin):
     list_display = ('codigo', 'nombre', 'grupo', 'precio', 'precio_sin_iva', 'estado', 'imagen_preview')
     list_filter = ('grupo', 'estado')
     search_fields = ('codigo', 'nombre', 'ingredientes', 'alergenos')
-    readonly_fields = ('precio_sin_iva', 'imagen_preview')
+    readonly_fields = ('precio_sin_iva', 'imagen_preview', 'alergenos_detectados')
     list_per_page = 20
     
     fieldsets = (
@@ -77,10 +144,10 @@ class PlatoAdmin(admin.ModelAdmin):
             'description': 'Sube una imagen para el plato. Se mostrará en el sitio web.'
         }),
         ('Precios', {
-            'fields': ('precio', 'precio_sin_iva')
+            'fields': ('precio', 'precio_sin_iva', 'capacidad_diaria')
         }),
         ('Detalles del Producto', {
-            'fields': ('kilogramos', 'ingredientes', 'alergenos', 'vida_util'),
+            'fields': ('kilogramos', 'ingredientes', 'alergenos', 'alergenos_detectados', 'vida_util'),
             'classes': ('collapse',)
         }),
         ('Información Nutricional', {
@@ -97,6 +164,23 @@ class PlatoAdmin(admin.ModelAdmin):
             )
         return "Sin imagen"
     imagen_preview.short_description = "Vista previa"
+    
+    def alergenos_detectados(self, obj):
+        return ", ".join(etiquetas_de_mascara(obj.alergenos_mascara)) or "Ninguno"
+    alergenos_detectados.short_description = "Alérgenos UE detectados"
+    
+    def get_search_results(self, request, queryset, search_term):
+        """Búsqueda con el índice de platos en lugar de icontains, por relevancia
+
+        Si se ha elegido una columna para ordenar, manda la columna.
+        """
+        if not search_term:
+            return queryset, False
+        resultados = buscar_platos(search_term, queryset)
+        if request.GET.get(ORDER_VAR):
+            # El listado ya viene ordenado por la columna (ChangeList ordena antes de buscar)
+            resultados = resultados.order_by(*queryset.query.order_by)
+        return resultados, False
 
 class DisponibilidadPlatoAdmin(admin.ModelAdmin):
     form = DisponibilidadPlatoForm
@@ -146,6 +230,85 @@ class DisponibilidadPlatoAdmin(admin.ModelAdmin):
         }),
     )
     
+    def get_urls(self):
+        return [
+            path('semana/', self.admin_site.admin_view(self.planificar_semana), name='myapp_disponibilidadplato_semana'),
+        ] + super().get_urls()
+
+    def planificar_semana(self, request):
+        """Editor plato × día: guarda toda la semana de una vez"""
+        platos = Plato.objects.order_by('nombre')
+        grupo = request.GET.get('grupo')
+        if grupo:
+            platos = platos.filter(grupo=grupo)
+        platos = list(platos.only('id', 'nombre', 'grupo'))
+
+        if request.method == 'POST' and not self.has_change_permission(request):
+            raise PermissionDenied
+
+        # El formulario de plantilla va aparte: con el nombre vacío no debe caer en el guardado del menú
+        if request.method == 'POST' and 'nombre_plantilla' in request.POST:
+            # Crea o sobrescribe una plantilla: hacen falta los permisos sobre PlantillaMenu
+            opts = PlantillaMenu._meta
+            if not all(request.user.has_perm(f'{opts.app_label}.{get_permission_codename(accion, opts)}')
+                       for accion in ('add', 'change')):
+                raise PermissionDenied
+            try:
+                plantilla = guardar_plantilla(request.POST['nombre_plantilla'])
+            except ValueError as e:
+                self.message_user(request, str(e), level=messages.ERROR)
+            else:
+                self.message_user(request, f"Menú actual guardado como plantilla «{plantilla.nombre}».")
+            return redirect(request.get_full_path())
+
+        if request.method == 'POST':
+            ids = {plato.id for plato in platos}
+            marcadas = []
+            for valor in request.POST.getlist('casilla'):
+                plato_id, _, dia = valor.partition('-')
+                if plato_id.isdigit() and int(plato_id) in ids:
+                    marcadas.append((int(plato_id), dia))
+            altas, bajas = diferencia(ids, marcadas)
+            try:
+                creadas, eliminadas = aplicar_cambios_menu(altas, bajas)
+            except ValueError as e:
+                self.message_user(request, str(e), level=messages.ERROR)
+            else:
+                self.message_user(request, f"Menú guardado: {creadas} altas y {eliminadas} bajas.")
+            return redirect(request.get_full_path())
+
+        dias_por_plato = matriz([plato.id for plato in platos])
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'Planificación semanal del menú',
+            'opts': self.model._meta,
+            'dias': DisponibilidadPlato.DIAS_SEMANA,
+            'grupos': Plato.GRUPOS_CHOICES,
+            'grupo': grupo or '',
+            'filas': [
+                (plato, [(dia, dia in dias_por_plato.get(plato.id, ())) for dia in DIAS])
+                for plato in platos
+            ],
+        }
+        return render(request, 'admin/menu_semanal.html', context)
+
+    # Los cambios del patrón semanal se llevan a las fechas publicadas
+    def save_model(self, request, obj, form, change):
+        anterior = DisponibilidadPlato.objects.filter(pk=obj.pk).values_list('plato_id', 'dia').first() if change else None
+        super().save_model(request, obj, form, change)
+        if anterior and anterior != (obj.plato_id, obj.dia):
+            servicio.retirar([anterior])
+        servicio.publicar_menu(platos=[obj.plato_id])
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        servicio.retirar([(obj.plato_id, obj.dia)])
+
+    def delete_queryset(self, request, queryset):
+        casillas = list(queryset.values_list('plato_id', 'dia'))
+        super().delete_queryset(request, queryset)
+        servicio.retirar(casillas)
+
     # Asegurar que se pueden editar los registros
     def get_readonly_fields(self, request, obj=None):
         return []
@@ -159,17 +322,215 @@ class DisponibilidadPlatoAdmin(admin.ModelAdmin):
     def has_add_permission(self, request):
         return True
 
+class DisponibilidadFechaAdmin(admin.ModelAdmin):
+    list_display = ('fecha', 'plato', 'capacidad', 'reservadas', 'vendidas', 'restantes')
+    list_editable = ('capacidad',)
+    list_filter = ('plato__grupo',)
+    search_fields = ('plato__nombre', 'plato__codigo')
+    date_hierarchy = 'fecha'
+    readonly_fields = ('reservadas', 'vendidas')
+    list_select_related = ('plato',)
+    ordering = ('fecha', 'plato__nombre')
+
+    def restantes(self, obj):
+        return '∞' if obj.restantes is None else obj.restantes
+    restantes.short_description = 'Quedan'
+
+# ==================== PLANTILLAS Y ROTACIONES DE MENÚ ====================
+
+class PlantillaMenuPlatoInline(admin.TabularInline):
+    model = PlantillaMenuPlato
+    extra = 0
+    raw_id_fields = ('plato',)
+
+class PlantillaMenuAdmin(admin.ModelAdmin):
+    list_display = ('nombre', 'num_casillas', 'creada', 'comparar_link')
+    search_fields = ('nombre',)
+    inlines = [PlantillaMenuPlatoInline]
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(num_casillas=Count('casillas'))
+
+    def num_casillas(self, obj):
+        return obj.num_casillas
+    num_casillas.short_description = 'Casillas'
+    num_casillas.admin_order_field = 'num_casillas'
+
+    def comparar_link(self, obj):
+        url = reverse('admin:myapp_plantillamenu_comparar', args=[obj.pk])
+        return format_html('<a href="{}" class="button">Comparar / aplicar</a>', url)
+    comparar_link.short_description = 'Semana'
+
+    def get_urls(self):
+        return [
+            path('<int:pk>/comparar/', self.admin_site.admin_view(self.comparar),
+                 name='myapp_plantillamenu_comparar'),
+        ] + super().get_urls()
+
+    def comparar(self, request, pk):
+        """Diferencia entre una semana publicada (?semana=, la próxima por defecto) y la plantilla; POST la aplica"""
+        plantilla = self.get_object(request, pk)
+        if plantilla is None:
+            raise Http404
+        hoy = date.today()
+        try:
+            fecha = date.fromisoformat(request.POST.get('semana') or request.GET.get('semana') or '')
+        except ValueError:
+            fecha = hoy + timedelta(days=7 - hoy.weekday())
+        lunes = fecha - timedelta(days=fecha.weekday())
+        if request.method == 'POST':
+            if not self.has_change_permission(request, plantilla):
+                raise PermissionDenied
+            creadas, eliminadas = aplicar_plantilla(plantilla, lunes)
+            self.message_user(
+                request,
+                f"Plantilla «{plantilla}» aplicada a la semana del {lunes:%d/%m/%Y}: "
+                f"{creadas} altas y {eliminadas} bajas."
+            )
+            return redirect('admin:myapp_disponibilidadfecha_changelist')
+
+        cambios = comparar_plantilla(plantilla, lunes)
+        nombres = dict(Plato.objects.filter(
+            id__in={plato_id for casillas in cambios.values() for plato_id, _ in casillas}
+        ).values_list('id', 'nombre'))
+        dias = dict(DisponibilidadPlato.DIAS_SEMANA)
+
+        def legibles(casillas):
+            return sorted((nombres[plato_id], dias[dia]) for plato_id, dia in casillas)
+
+        context = {
+            **self.admin_site.each_context(request),
+            'title': f'Comparar «{plantilla}» con la semana del {lunes:%d/%m/%Y}',
+            'semana': lunes.isoformat(),
+            'opts': self.model._meta,
+            'original': plantilla,
+            'altas': legibles(cambios['altas']),
+            'bajas': legibles(cambios['bajas']),
+            'iguales': len(cambios['iguales']),
+        }
+        return render(request, 'admin/menu_comparar.html', context)
+
+class SemanaMenuAdmin(admin.ModelAdmin):
+    list_display = ('lunes', 'plantilla', 'aplicada')
+    list_select_related = ('plantilla',)
+    date_hierarchy = 'lunes'
+
+class RotacionMenuPasoInline(admin.TabularInline):
+    model = RotacionMenuPaso
+    extra = 1
+
+def aplicar_semana_actual(modeladmin, request, queryset):
+    """Aplicar a las fechas de esta semana la plantilla que les toca"""
+    hoy = date.today()
+    for rotacion in queryset:
+        plantilla = plantilla_de_semana(rotacion, hoy)
+        if plantilla is None:
+            modeladmin.message_user(request, f"«{rotacion}» no tiene plantilla para esta semana.", level=messages.WARNING)
+            continue
+        creadas, eliminadas = aplicar_plantilla(plantilla, hoy)
+        modeladmin.message_user(request, f"«{rotacion}»: aplicada «{plantilla}» ({creadas} altas, {eliminadas} bajas).")
+
+aplicar_semana_actual.short_description = "Aplicar la plantilla de esta semana"
+
+class RotacionMenuAdmin(admin.ModelAdmin):
+    list_display = ('nombre', 'fecha_inicio', 'activa', 'plantilla_esta_semana')
+    list_filter = ('activa',)
+    readonly_fields = ('proximas_semanas',)
+    inlines = [RotacionMenuPasoInline]
+    actions = [aplicar_semana_actual]
+
+    def plantilla_esta_semana(self, obj):
+        return plantilla_de_semana(obj, date.today()) or '-'
+    plantilla_esta_semana.short_description = 'Esta semana'
+
+    def proximas_semanas(self, obj):
+        if not obj.pk:
+            return '-'
+        return format_html_join(mark_safe('<br>'), '{}: {}', (
+            (f'{lunes:%d/%m/%Y}', plantilla or '-') for lunes, plantilla in calendario(obj, date.today())
+        ))
+    proximas_semanas.short_description = 'Próximas semanas'
+
 class CarritoItemAdmin(admin.ModelAdmin):
     form = CarritoItemForm
-    list_display = ('usuario', 'plato', 'cantidad', 'dia_semana', 'fecha_agregado')
-    list_filter = ('dia_semana', 'fecha_agregado')
+    list_display = ('usuario', 'plato', 'cantidad', 'reservada', 'fecha_servicio', 'dia_semana', 'fecha_agregado')
+    list_filter = ('fecha_servicio', 'dia_semana', 'fecha_agregado')
     search_fields = ('usuario__username', 'plato__nombre')
 
-class ReciboAdmin(admin.ModelAdmin):
+# ==================== DOCUMENTOS PDF ====================
+
+def generar_pdfs(modeladmin, request, queryset):
+    """Encolar los PDF seleccionados (comando generar_documentos) y descargarlos en un ZIP"""
+    tarea = documentos.lanzar_lote(modeladmin.tipo_documento, queryset.values_list('pk', flat=True))
+    opts = modeladmin.model._meta
+    return redirect(reverse(f'admin:{opts.app_label}_{opts.model_name}_documentos', args=[tarea]))
+
+generar_pdfs.short_description = "Generar PDF (ZIP)"
+
+class DocumentosPDFMixin:
+    """Descarga del PDF de cada objeto y generación masiva con progreso"""
+    tipo_documento = None
+
+    def get_urls(self):
+        opts = self.model._meta
+        nombre = f'{opts.app_label}_{opts.model_name}'
+        return [
+            path('<int:pk>/pdf/', self.admin_site.admin_view(self.descargar_pdf), name=f'{nombre}_pdf'),
+            path('documentos/<int:tarea>/', self.admin_site.admin_view(self.progreso_documentos),
+                 name=f'{nombre}_documentos'),
+        ] + super().get_urls()
+
+    def pdf_link(self, obj):
+        if not obj.pk:
+            return '-'
+        opts = self.model._meta
+        url = reverse(f'admin:{opts.app_label}_{opts.model_name}_pdf', args=[obj.pk])
+        return format_html('<a href="{}">📄 Descargar PDF</a>', url)
+    pdf_link.short_description = 'PDF'
+
+    def descargar_pdf(self, request, pk):
+        if not self.has_view_permission(request):
+            raise Http404
+        try:
+            nombre, destino, listo = documentos.solicitar(self.tipo_documento, pk)
+        except self.model.DoesNotExist:
+            raise Http404
+        if not listo:
+            # Se está maquetando en el pool: la página se recarga hasta que esté
+            context = {
+                **self.admin_site.each_context(request),
+                'title': f'Generando {nombre}',
+                'opts': self.model._meta,
+                'estado': {'estado': 'en_curso', 'hechos': 0, 'total': 1},
+                'porcentaje': 0,
+            }
+            return render(request, 'admin/documentos_progreso.html', context, status=202)
+        return FileResponse(default_storage.open(destino), as_attachment=True, filename=nombre,
+                            content_type='application/pdf')
+
+    def progreso_documentos(self, request, tarea):
+        estado = documentos.estado_lote(tarea)
+        if estado is None:
+            raise Http404
+        if estado.estado == 'terminada' and request.GET.get('descargar'):
+            return FileResponse(default_storage.open(estado.zip), as_attachment=True,
+                                filename=estado.zip.rsplit('/', 1)[-1])
+        context = {
+            **self.admin_site.each_context(request),
+            'title': f'Generación de PDF ({self.model._meta.verbose_name_plural})',
+            'opts': self.model._meta,
+            'estado': estado,
+            'porcentaje': int(100 * estado.hechos / estado.total) if estado.total else 100,
+        }
+        return render(request, 'admin/documentos_progreso.html', context)
+
+class ReciboAdmin(DocumentosPDFMixin, admin.ModelAdmin):
     list_display = ('id', 'usuario', 'empresa', 'total', 'pagado', 'estado_pago', 'fecha_compra')
-    list_filter = ('pagado', 'estado_pago', 'fecha_compra')
+    list_filter = ('pagado', 'estado_pago', 'metodo_pago', 'fecha_compra')
     search_fields = ('usuario__username', 'empresa__nombre')
-    readonly_fields = ('fecha_compra',)
+    readonly_fields = ('fecha_compra', 'pdf_link')
+    actions = [generar_pdfs]
+    tipo_documento = 'recibo'
 
 class ReciboItemAdmin(admin.ModelAdmin):
     list_display = ('recibo', 'plato', 'cantidad', 'precio_unitario', 'subtotal_display')
@@ -179,6 +540,31 @@ class ReciboItemAdmin(admin.ModelAdmin):
         return f"€{obj.subtotal():.2f}"
     subtotal_display.short_description = 'Subtotal'
 
+# ==================== FACTURAS DE EMPRESA ====================
+
+class LineaFacturaEmpresaInline(admin.TabularInline):
+    model = LineaFacturaEmpresa
+    extra = 0
+    readonly_fields = ('plato', 'cantidad', 'precio_unitario')
+    can_delete = False
+
+def marcar_facturas_pagadas(modeladmin, request, queryset):
+    """Marcar facturas y sus recibos como pagados"""
+    recibos = marcar_pagadas(queryset)
+    modeladmin.message_user(request, f"{queryset.count()} facturas pagadas ({recibos} recibos).")
+
+marcar_facturas_pagadas.short_description = "Marcar como pagadas (con sus recibos)"
+
+class FacturaEmpresaAdmin(DocumentosPDFMixin, admin.ModelAdmin):
+    list_display = ('numero', 'empresa', 'semana_inicio', 'total', 'pagada', 'fecha_emision')
+    list_filter = ('pagada', 'semana_inicio')
+    search_fields = ('numero', 'empresa__nombre', 'empresa__cif')
+    readonly_fields = ('numero', 'empresa', 'semana_inicio', 'semana_fin', 'total', 'fecha_emision', 'fecha_pago',
+                       'pdf_link')
+    inlines = [LineaFacturaEmpresaInline]
+    actions = [marcar_facturas_pagadas, generar_pdfs]
+    tipo_documento = 'factura'
+
 # ==================== ADMINISTRACIÓN DE PRODUCCIÓN ====================
 
 class ProduccionAdmin(admin.ModelAdmin):
@@ -240,6 +626,7 @@ def exportar_pedidos_excel(modeladmin, request, queryset):
             'Plato': pedido.plato.nombre,
             'Cantidad': pedido.cantidad,
             'Día': pedido.get_dia_semana_display(),
+            'Fecha de servicio': pedido.fecha_servicio,
             'Fecha': pedido.fecha_emision,
         })
 
@@ -255,31 +642,73 @@ def exportar_pedidos_excel(modeladmin, request, queryset):
 exportar_pedidos_excel.short_description = "Exportar pedidos seleccionados a Excel"
 
 class PedidoHistoricoAdmin(admin.ModelAdmin):
-    list_display = ('usuario', 'plato', 'cantidad', 'dia_semana', 'fecha_emision')
-    list_filter = ('dia_semana', 'fecha_emision', 'plato__grupo')
+    list_display = ('usuario', 'plato', 'cantidad', 'fecha_servicio', 'dia_semana', 'fecha_emision')
+    list_filter = ('fecha_servicio', 'dia_semana', 'fecha_emision', 'plato__grupo')
     search_fields = ('usuario__username', 'plato__nombre')
     actions = [exportar_pedidos_excel]
 
+    # Los borrados no tienen señal (ver myapp.signals): se invalida cada mes una vez
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        cohortes.invalidar_meses([obj.fecha_emision])
+
+    def delete_queryset(self, request, queryset):
+        fechas = list(queryset.values_list('fecha_emision', flat=True).distinct())
+        super().delete_queryset(request, queryset)
+        cohortes.invalidar_meses(fechas)
+
+# ==================== ARCHIVO HISTÓRICO ====================
+
+class ArchivoAdmin(admin.ModelAdmin):
+    """Consulta del archivo: solo lectura, lo rellena archivar_historico"""
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+class PedidoHistoricoArchivadoAdmin(ArchivoAdmin):
+    list_display = ('id', 'usuario_id', 'plato_id', 'cantidad', 'fecha_servicio', 'dia_semana', 'fecha_emision')
+    list_filter = ('dia_semana',)
+    date_hierarchy = 'fecha_emision'
+
+class CarritoItemArchivadoAdmin(ArchivoAdmin):
+    list_display = ('id', 'usuario_id', 'plato_id', 'cantidad', 'fecha_servicio', 'fecha_agregado')
+    date_hierarchy = 'fecha_agregado'
+
+class MovimientoInventarioArchivadoAdmin(ArchivoAdmin):
+    list_display = ('id', 'inventario_id', 'tipo_movimiento', 'cantidad', 'motivo', 'fecha_movimiento')
+    list_filter = ('tipo_movimiento',)
+    date_hierarchy = 'fecha_movimiento'
+
+# ==================== ANALÍTICA DE CLIENTES ====================
+
+class SegmentoRFMAdmin(admin.ModelAdmin):
+    """Segmentación RFM: solo lectura, la rellena calcular_rfm"""
+    list_display = ('titular', 'segmento', 'r', 'f', 'm', 'recibos', 'importe', 'ultima_compra', 'actualizado')
+    list_filter = ('segmento', 'r', 'f', 'm', ('empresa', admin.EmptyFieldListFilter))
+    search_fields = ('cliente__Nombre_Completo', 'empresa__nombre')
+    list_select_related = ('cliente', 'empresa')
+    date_hierarchy = 'ultima_compra'
+    ordering = ('-importe',)
+
+    def titular(self, obj):
+        return obj.cliente.Nombre_Completo if obj.cliente_id else f"🏢 {obj.empresa.nombre}"
+    titular.short_description = 'Cliente / empresa'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
 # ==================== ACTIONS PERSONALIZADAS ====================
 
 def duplicar_disponibilidad_semana(modeladmin, request, queryset):
     """Duplicar disponibilidades para todos los días de la semana"""
-    platos_seleccionados = set()
-    for disp in queryset:
-        platos_seleccionados.add(disp.plato)
-    
-    dias_semana = ['LUN', 'MAR', 'MIE', 'JUE', 'VIE', 'SAB', 'DOM']
-    creados = 0
-    
-    for plato in platos_seleccionados:
-        for dia in dias_semana:
-            _, created = DisponibilidadPlato.objects.get_or_create(
-                plato=plato,
-                dia=dia
-            )
-            if created:
-                creados += 1
-    
+    platos = set(queryset.values_list('plato_id', flat=True))
+    creados, _ = aplicar_cambios_menu(altas=[(plato_id, dia) for plato_id in platos for dia in DIAS])
     modeladmin.message_user(request, f"Se crearon {creados} nuevas disponibilidades.")
 
 duplicar_disponibilidad_semana.short_description = "Hacer disponible toda la semana"
@@ -308,10 +737,19 @@ admin.site.register(Cliente, ClienteAdmin)
 admin.site.register(Empresa, EmpresaAdmin)
 admin.site.register(Plato, PlatoAdmin)
 admin.site.register(DisponibilidadPlato, DisponibilidadPlatoAdmin)
+admin.site.register(DisponibilidadFecha, DisponibilidadFechaAdmin)
+admin.site.register(PlantillaMenu, PlantillaMenuAdmin)
+admin.site.register(RotacionMenu, RotacionMenuAdmin)
+admin.site.register(SemanaMenu, SemanaMenuAdmin)
 admin.site.register(CarritoItem, CarritoItemAdmin)
 admin.site.register(Recibo, ReciboAdmin)
 admin.site.register(ReciboItem, ReciboItemAdmin)
+admin.site.register(FacturaEmpresa, FacturaEmpresaAdmin)
 admin.site.register(PedidoHistorico, PedidoHistoricoAdmin)
 admin.site.register(Produccion, ProduccionAdmin)
 admin.site.register(Inventario, InventarioAdmin)
-admin.site.register(MovimientoInventario, MovimientoInventarioAdmin)
\ No newline at end of file
+admin.site.register(MovimientoInventario, MovimientoInventarioAdmin)
+admin.site.register(PedidoHistoricoArchivado, PedidoHistoricoArchivadoAdmin)
+admin.site.register(MovimientoInventarioArchivado, MovimientoInventarioArchivadoAdmin)
+admin.site.register(CarritoItemArchivado, CarritoItemArchivadoAdmin)
+admin.site.register(SegmentoRFM, SegmentoRFMAdmin)
@@ -0,0 +1,100 @@
+"""
+Los 14 alérgenos de declaración obligatoria en la UE (Reglamento 1169/2011)
+codificados como máscara de bits.
+
+``Plato.alergenos`` sigue siendo el texto libre que se muestra al cliente;
+``Plato.alergenos_mascara`` se deriva de él al guardar y permite filtrar con
+un único predicado a nivel de bits.
+"""
+import re
+import unicodedata
+
+from django.db.models import F
+
+# (código, etiqueta, palabras clave en minúsculas y sin tildes)
+ALERGENOS_UE = [
+    ('GLUTEN', 'Gluten', ('gluten', 'trigo', 'cebada', 'centeno', 'avena', 'espelta', 'kamut')),
+    ('CRUSTACEOS', 'Crustáceos', ('crustaceo', 'gamba', 'langostino', 'cigala', 'cangrejo', 'bogavante')),
+    ('HUEVOS', 'Huevos', ('huevo',)),
+    ('PESCADO', 'Pescado', ('pescado', 'merluza', 'bacalao', 'atun', 'salmon', 'anchoa')),
+    ('CACAHUETES', 'Cacahuetes', ('cacahuete', 'mani')),
+    ('SOJA', 'Soja', ('soja',)),
+    ('LACTEOS', 'Leche y derivados', ('leche', 'lacteo', 'lactosa', 'queso', 'nata', 'mantequilla', 'yogur')),
+    ('FRUTOS_CASCARA', 'Frutos de cáscara', (
+        'frutos de cascara', 'frutos secos', 'almendra', 'avellana', 'nuez', 'nueces',
+        'anacardo', 'pistacho', 'macadamia', 'pacana',
+    )),
+    ('APIO', 'Apio', ('apio',)),
+    ('MOSTAZA', 'Mostaza', ('mostaza',)),
+    ('SESAMO', 'Sésamo', ('sesamo',)),
+    ('SULFITOS', 'Dióxido de azufre y sulfitos', ('sulfito', 'azufre')),
+    ('ALTRAMUCES', 'Altramuces', ('altramuz', 'altramuces')),
+    ('MOLUSCOS', 'Moluscos', ('molusco', 'mejillon', 'almeja', 'calamar', 'sepia', 'pulpo', 'berberecho')),
+]
+
+BITS = {codigo: 1 << posicion for posicion, (codigo, _, _) in enumerate(ALERGENOS_UE)}
+ETIQUETAS = {codigo: etiqueta for codigo, etiqueta, _ in ALERGENOS_UE}
+CHOICES = [(codigo, etiqueta) for codigo, etiqueta, _ in ALERGENOS_UE]
+
+
+def _alternativas(palabras):
+    # Palabra completa con su plural (huevo/huevos, mejillon/mejillones): "mani" no casa con "manipulado"
+    return r'\b(?:' + '|'.join(re.escape(p) for p in palabras) + r')(?:s|es)?\b'
+
+
+_PATRONES = [(BITS[codigo], re.compile(_alternativas(palabras))) for codigo, _, palabras in ALERGENOS_UE]
+
+# "sin gluten", "libre de lactosa", "sin gluten ni huevo": menciones que no cuentan. Tras una
+# coma no se sigue ("sin gluten, huevo"): ante la duda, el alérgeno se declara
+_CUALQUIERA = _alternativas(p for _, _, palabras in ALERGENOS_UE for p in palabras)
+_NEGACION = re.compile(
+    r'\b(?:sin|libres? de)\s+' + _CUALQUIERA + r'(?:\s+(?:ni|o)\s+' + _CUALQUIERA + r')*'
+)
+
+
+def _normalizar(texto):
+    texto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in texto if not unicodedata.combining(c)).lower()
+
+
+def mascara_desde_texto(texto):
+    """Detecta los alérgenos mencionados en un texto libre (salvo "sin X" y "libre de X")"""
+    texto = _NEGACION.sub(' ', _normalizar(texto))
+    mascara = 0
+    for bit, patron in _PATRONES:
+        if patron.search(texto):
+            mascara |= bit
+    return mascara
+
+
+def mascara_desde_codigos(codigos):
+    """Convierte una lista de códigos (``GLUTEN``, ``lacteos``...) en máscara"""
+    mascara = 0
+    for codigo in codigos:
+        codigo = codigo.strip().upper()
+        if not codigo:
+            continue
+        if codigo not in BITS:
+            raise ValueError(f"Alérgeno desconocido: {codigo}")
+        mascara |= BITS[codigo]
+    return mascara
+
+
+def mascara_desde_parametro(valor):
+    """Interpreta ``?sin_alergenos=GLUTEN,LACTEOS``"""
+    return mascara_desde_codigos((valor or '').split(','))
+
+
+def codigos_de_mascara(mascara):
+    return [codigo for codigo, _, _ in ALERGENOS_UE if mascara & BITS[codigo]]
+
+
+def etiquetas_de_mascara(mascara):
+    return [ETIQUETAS[codigo] for codigo in codigos_de_mascara(mascara)]
+
+
+def excluir_alergenos(queryset, mascara, campo='alergenos_mascara'):
+    """Excluye las filas que contienen alguno de los alérgenos de ``mascara``"""
+    if not mascara:
+        return queryset
+    return queryset.alias(_alergenos_comunes=F(campo).bitand(mascara)).filter(_alergenos_comunes=0)
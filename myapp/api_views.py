@@ -3,22 +3,38 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from django.db.models import Count, Sum, Q, Avg
+from django.db.models.functions import TruncDate
 from django.utils import timezone
 from datetime import timedelta, date
 from .models import (Cliente, Empresa, Plato, CarritoItem, Recibo, ReciboItem, 
-                     PedidoHistorico, Produccion, Inventario, MovimientoInventario)
+                     PedidoHistorico, Produccion, Inventario, MovimientoInventario, SegmentoRFM)
 from .serializers import (
     PlatoSerializer, ClienteSerializer, EmpresaSerializer, 
     CarritoItemSerializer, ReciboSerializer, PedidoHistoricoSerializer,
-    DashboardStatsSerializer
+    DashboardStatsSerializer, SegmentoRFMSerializer
 )
-from rest_framework.decorators import api_view
+from .fast_serializers import FastListMixin, PlatoValuesSerializer, ReciboValuesSerializer
+from .search import PlatoSearchFilter
+from .alergenos import excluir_alergenos, mascara_desde_parametro
+from rest_framework.exceptions import ValidationError
+from .db_routers import lectura_en_replica
+from .carritos import repetir_semana_anterior
+from .dashboard import PlanDashboard
+from . import archivo, cohortes, hoja_produccion, planificacion, ranking, recomendaciones, reparto, rfm
+from .menu import menu_del_dia
+from .servicio import anadir_al_carrito, cambiar_cantidad, fecha_desde_parametros
+from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework.filters import OrderingFilter
+from rest_framework.decorators import api_view, permission_classes
+from django.http import HttpResponse
 
 
-class PlatoViewSet(viewsets.ModelViewSet):
+class PlatoViewSet(FastListMixin, viewsets.ModelViewSet):
     queryset = Plato.objects.all()
     serializer_class = PlatoSerializer
+    values_serializer_class = PlatoValuesSerializer
     permission_classes = [IsAuthenticated]
+    filter_backends = [DjangoFilterBackend, PlatoSearchFilter, OrderingFilter]
     
     def get_queryset(self):
         queryset = Plato.objects.all()
@@ -29,17 +45,27 @@ class PlatoViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(grupo=grupo)
         if estado:
             queryset = queryset.filter(estado=estado)
+        
+        try:
+            sin_alergenos = mascara_desde_parametro(self.request.query_params.get('sin_alergenos', ''))
+        except ValueError as e:
+            raise ValidationError({'sin_alergenos': str(e)})
+        queryset = excluir_alergenos(queryset, sin_alergenos)
             
         return queryset.order_by('nombre')
     
     @action(detail=False, methods=['get'])
+    @lectura_en_replica
     def mas_vendidos(self, request):
-        """Obtiene los platos más vendidos"""
-        platos_vendidos = PedidoHistorico.objects.values('plato__nombre').annotate(
-            total_vendido=Sum('cantidad')
-        ).order_by('-total_vendido')[:10]
+        """Obtiene los platos más vendidos (?ventana=7d|30d|total)"""
+        try:
+            top = ranking.mas_vendidos(request.query_params.get('ventana', 'total'), limite=10)
+        except ValueError as e:
+            raise ValidationError({'ventana': str(e)})
         
-        return Response(platos_vendidos)
+        return Response([
+            {'plato__nombre': fila['nombre'], 'total_vendido': fila['cantidad']} for fila in top
+        ])
 
 
 class ClienteViewSet(viewsets.ModelViewSet):
@@ -49,14 +75,71 @@ class ClienteViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def activos(self, request):
-        """Obtiene clientes activos (con pedidos en los últimos 30 días)"""
-        fecha_limite = timezone.now() - timedelta(days=30)
-        clientes_activos = Cliente.objects.filter(
-            usuario__pedidohistorico__fecha_emision__gte=fecha_limite
-        ).distinct()
+        """Clientes con algún recibo no fallido en los últimos 30 días
+
+        Se lee de la tabla resumen RFM, que ``calcular_rfm`` actualiza cada
+        noche: los recibos de hoy pueden no aparecer hasta la siguiente
+        ejecución. Cuenta recibos (``Recibo``), no pedidos históricos.
+        """
+        # Tabla resumen RFM: sin recorrer el histórico de pedidos
+        clientes_activos = rfm.activos(dias=30)
         
         serializer = self.get_serializer(clientes_activos, many=True)
         return Response(serializer.data)
+    
+    @action(detail=False, methods=['get'])
+    def cohortes(self, request):
+        """Retención mensual por cohorte de alta (``?desde=AAAA-MM&hasta=AAAA-MM``)"""
+        try:
+            limites = {
+                clave: cohortes.mes_desde_parametro(request.query_params[clave])
+                for clave in ('desde', 'hasta') if request.query_params.get(clave)
+            }
+        except ValueError as e:
+            raise ValidationError({'detail': str(e)})
+        return Response(cohortes.informe(**limites))
+
+
+class SegmentoRFMViewSet(viewsets.ReadOnlyModelViewSet):
+    """Segmentación RFM de clientes y empresas (``?tipo=cliente|empresa``)"""
+    serializer_class = SegmentoRFMSerializer
+    permission_classes = [IsAdminUser]
+    filter_backends = [DjangoFilterBackend, OrderingFilter]
+    filterset_fields = {
+        'segmento': ['exact', 'in'],
+        'r': ['exact', 'gte', 'lte'],
+        'f': ['exact', 'gte', 'lte'],
+        'm': ['exact', 'gte', 'lte'],
+        'cliente__empresa': ['exact'],
+        'ultima_compra': ['gte', 'lte'],
+        'importe': ['gte', 'lte'],
+    }
+    ordering_fields = ['importe', 'recibos', 'ultima_compra', 'r', 'f', 'm']
+    ordering = ['-importe']
+    
+    def get_queryset(self):
+        queryset = SegmentoRFM.objects.select_related('cliente', 'empresa')
+        tipo = self.request.query_params.get('tipo')
+        if tipo == 'cliente':
+            queryset = queryset.filter(empresa=None)
+        elif tipo == 'empresa':
+            queryset = queryset.filter(cliente=None)
+        elif tipo:
+            raise ValidationError({'tipo': 'Usa cliente o empresa'})
+        return queryset
+    
+    @action(detail=False, methods=['get'])
+    def resumen(self, request):
+        """Número de clientes o empresas e importe por segmento"""
+        filas = self.filter_queryset(self.get_queryset()).order_by().values('segmento').annotate(
+            total=Count('id'), importe=Sum('importe')
+        )
+        nombres = dict(SegmentoRFM.SEGMENTOS)
+        return Response([
+            {'segmento': fila['segmento'], 'nombre': nombres.get(fila['segmento'], 'Sin puntuar'),
+             'total': fila['total'], 'importe': fila['importe']}
+            for fila in sorted(filas, key=lambda fila: -fila['importe'])
+        ])
 
 
 class CarritoViewSet(viewsets.ModelViewSet):
@@ -66,6 +149,26 @@ class CarritoViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         return CarritoItem.objects.filter(usuario=self.request.user)
     
+    def perform_create(self, serializer):
+        """Añade con reserva, igual que la vista del menú"""
+        datos = serializer.validated_data
+        try:
+            serializer.instance = anadir_al_carrito(
+                self.request.user, datos['plato'], datos['fecha_servicio'], datos.get('cantidad', 1)
+            )
+        except ValueError as e:
+            raise ValidationError({'detail': str(e)})
+        serializer.instance.refresh_from_db()
+    
+    def perform_update(self, serializer):
+        """Solo cambia la cantidad, ajustando la reserva"""
+        try:
+            serializer.instance = cambiar_cantidad(
+                serializer.instance, serializer.validated_data.get('cantidad', serializer.instance.cantidad)
+            )
+        except ValueError as e:
+            raise ValidationError({'detail': str(e)})
+    
     @action(detail=False, methods=['get'])
     def resumen(self, request):
         """Obtiene resumen del carrito"""
@@ -84,9 +187,16 @@ class CarritoViewSet(viewsets.ModelViewSet):
         self.get_queryset().delete()
         return Response({'message': 'Carrito limpiado exitosamente'})
 
+    @action(detail=False, methods=['post'])
+    def repetir(self, request):
+        """Añade al carrito el pedido de la semana pasada"""
+        resultado = repetir_semana_anterior(request.user)
+        return Response(resultado, status=status.HTTP_201_CREATED if resultado['anadidas'] else status.HTTP_200_OK)
 
-class ReciboViewSet(viewsets.ReadOnlyModelViewSet):
+
+class ReciboViewSet(FastListMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = ReciboSerializer
+    values_serializer_class = ReciboValuesSerializer
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
@@ -95,6 +205,7 @@ class ReciboViewSet(viewsets.ReadOnlyModelViewSet):
         return Recibo.objects.filter(usuario=self.request.user)
     
     @action(detail=False, methods=['get'])
+    @lectura_en_replica
     def estadisticas(self, request):
         """Obtiene estadísticas de recibos"""
         queryset = self.get_queryset()
@@ -103,7 +214,7 @@ class ReciboViewSet(viewsets.ReadOnlyModelViewSet):
             'total_recibos': queryset.count(),
             'total_ventas': queryset.aggregate(Sum('total'))['total__sum'] or 0,
             'recibos_pagados': queryset.filter(pagado=True).count(),
-            'recibos_pendientes': queryset.filter(pagado=False).count(),
+            'recibos_pendientes': queryset.filter(pagado=False).exclude(estado_pago='facturado').count(),
         }
         
         return Response(stats)
@@ -113,57 +224,51 @@ class DashboardViewSet(viewsets.ViewSet):
     permission_classes = [IsAdminUser]
     
     @action(detail=False, methods=['get'])
+    @lectura_en_replica
     def estadisticas(self, request):
         """Obtiene estadísticas generales del dashboard"""
         # Fechas para filtros
         hoy = timezone.now().date()
         hace_30_dias = hoy - timedelta(days=30)
-        hace_7_dias = hoy - timedelta(days=7)
-        
-        # Estadísticas generales
-        total_pedidos = PedidoHistorico.objects.count()
-        total_ventas = Recibo.objects.filter(pagado=True).aggregate(Sum('total'))['total__sum'] or 0
-        pedidos_pendientes = Recibo.objects.filter(pagado=False).count()
-        pedidos_completados = Recibo.objects.filter(pagado=True).count()
         
-        # Platos más vendidos
-        platos_mas_vendidos = list(PedidoHistorico.objects.values('plato__nombre').annotate(
-            total=Sum('cantidad')
-        ).order_by('-total')[:5])
-        
-        # Ventas por día (últimos 7 días)
-        ventas_por_dia = []
-        for i in range(7):
-            fecha = hoy - timedelta(days=i)
-            ventas_dia = Recibo.objects.filter(
-                fecha_compra__date=fecha,
+        def ventas_por_dia():
+            # Ventas por día (últimos 7 días) en una sola consulta agrupada
+            ventas = dict(Recibo.objects.filter(
+                fecha_compra__date__gte=hoy - timedelta(days=6),
                 pagado=True
-            ).aggregate(Sum('total'))['total__sum'] or 0
-            
-            ventas_por_dia.append({
+            ).annotate(dia=TruncDate('fecha_compra')).values('dia').annotate(
+                ventas=Sum('total')
+            ).values_list('dia', 'ventas'))
+            return [{
                 'fecha': fecha.strftime('%Y-%m-%d'),
-                'ventas': float(ventas_dia)
-            })
+                'ventas': float(ventas.get(fecha) or 0)
+            } for fecha in (hoy - timedelta(days=i) for i in range(7))]
         
-        # Clientes activos
-        clientes_activos = Cliente.objects.filter(
+        # Consultas independientes, ejecutadas a la vez
+        plan = PlanDashboard()
+        plan.widget('total_pedidos', lambda: archivo.contar(PedidoHistorico), 0)
+        plan.widget('total_ventas', lambda: Recibo.objects.filter(pagado=True).aggregate(Sum('total'))['total__sum'] or 0, 0)
+        plan.widget('pedidos_pendientes', Recibo.objects.filter(pagado=False).exclude(estado_pago='facturado').count, 0)
+        plan.widget('pedidos_completados', Recibo.objects.filter(pagado=True).count, 0)
+        plan.widget('platos_mas_vendidos', lambda: [
+            {'plato__nombre': fila['nombre'], 'total': fila['cantidad']}
+            for fila in ranking.mas_vendidos(limite=5)
+        ], [])
+        plan.widget('ventas_por_dia', ventas_por_dia, [])
+        plan.widget('clientes_activos', Cliente.objects.filter(
             usuario__pedidohistorico__fecha_emision__gte=hace_30_dias
-        ).distinct().count()
+        ).distinct().count, 0)
         
-        data = {
-            'total_pedidos': total_pedidos,
-            'total_ventas': float(total_ventas),
-            'pedidos_pendientes': pedidos_pendientes,
-            'pedidos_completados': pedidos_completados,
-            'platos_mas_vendidos': platos_mas_vendidos,
-            'ventas_por_dia': ventas_por_dia,
-            'clientes_activos': clientes_activos,
-        }
+        data = plan.ejecutar()
+        data['total_ventas'] = float(data['total_ventas'])
         
         serializer = DashboardStatsSerializer(data)
+        if plan.parciales:
+            return Response({**serializer.data, 'parciales': plan.parciales})
         return Response(serializer.data)
     
     @action(detail=False, methods=['get'])
+    @lectura_en_replica
     def ventas_mensuales(self, request):
         """Obtiene ventas de los últimos 12 meses"""
         ventas_mensuales = []
@@ -194,12 +299,14 @@ class DashboardViewSet(viewsets.ViewSet):
 
 
 @api_view(['GET'])
+@lectura_en_replica
 def dashboard_estadisticas(request):
     """API endpoint para estadísticas del dashboard principal"""
     # Calcular estadísticas básicas
-    total_pedidos = PedidoHistorico.objects.count()
+    total_pedidos = archivo.contar(PedidoHistorico)
     total_ventas = Recibo.objects.filter(pagado=True).aggregate(Sum('total'))['total__sum'] or 0
-    pedidos_pendientes = Recibo.objects.filter(pagado=False).count()
+    # Los recibos de empresas se cobran con la factura semanal: no están pendientes de pago
+    pedidos_pendientes = Recibo.objects.filter(pagado=False).exclude(estado_pago='facturado').count()
     clientes_activos = Cliente.objects.filter(
         usuario__pedidohistorico__fecha_emision__gte=timezone.now() - timedelta(days=30)
     ).distinct().count()
@@ -218,9 +325,10 @@ def dashboard_estadisticas(request):
         })
     
     # Platos más vendidos
-    platos_mas_vendidos = PedidoHistorico.objects.values('plato__nombre').annotate(
-        total=Sum('cantidad')
-    ).order_by('-total')[:5]
+    platos_mas_vendidos = [
+        {'plato__nombre': fila['nombre'], 'total': fila['cantidad']}
+        for fila in ranking.mas_vendidos(limite=5)
+    ]
     
     return Response({
         'total_pedidos': total_pedidos,
@@ -228,10 +336,11 @@ def dashboard_estadisticas(request):
         'pedidos_pendientes': pedidos_pendientes,
         'clientes_activos': clientes_activos,
         'ventas_por_dia': list(reversed(ventas_por_dia)),
-        'platos_mas_vendidos': list(platos_mas_vendidos)
+        'platos_mas_vendidos': platos_mas_vendidos
     })
 
 @api_view(['GET'])
+@lectura_en_replica
 def dashboard_ventas_mensuales(request):
     """API endpoint para ventas mensuales"""
     from django.db.models import Extract
@@ -252,74 +361,70 @@ def dashboard_ventas_mensuales(request):
 
 # ==================== NUEVAS APIs DE PRODUCCIÓN ====================
 
+def eficiencia_media(producciones):
+    """Media de ``Produccion.eficiencia`` sobre las producciones dadas"""
+    eficiencias = [produccion.eficiencia for produccion in producciones]
+    return float(sum(eficiencias) / len(eficiencias)) if eficiencias else 0.0
+
 @api_view(['GET'])
+@lectura_en_replica
 def production_dashboard_stats(request):
     """API endpoint para estadísticas del dashboard de producción"""
     today = date.today()
+    completadas_30_dias = Produccion.objects.filter(
+        estado='COMPLETADA',
+        fecha_completada__gte=timezone.now() - timedelta(days=30)
+    )
     
-    # Estadísticas básicas de producción
-    producciones_activas = Produccion.objects.filter(
-        estado__in=['PLANIFICADA', 'EN_PROCESO']
-    ).count()
+    def costos_por_dia():
+        # Costos de producción por día (últimos 7 días) en una sola consulta agrupada
+        costos = dict(Produccion.objects.filter(
+            fecha_completada__date__gte=today - timedelta(days=6),
+            estado='COMPLETADA'
+        ).annotate(dia=TruncDate('fecha_completada')).values('dia').annotate(
+            total_costos=Sum('costo_ingredientes') + Sum('costo_mano_obra') + Sum('otros_costos')
+        ).values_list('dia', 'total_costos'))
+        return [{
+            'fecha': fecha.isoformat(),
+            'costos': float(costos.get(fecha) or 0)
+        } for fecha in (today - timedelta(days=i) for i in range(6, -1, -1))]
     
-    producciones_completadas_hoy = Produccion.objects.filter(
+    # Consultas independientes, ejecutadas a la vez
+    plan = PlanDashboard()
+    plan.widget('producciones_activas', Produccion.objects.filter(
+        estado__in=['PLANIFICADA', 'EN_PROCESO']
+    ).count, 0)
+    plan.widget('producciones_completadas_hoy', Produccion.objects.filter(
         estado='COMPLETADA',
         fecha_completada__date=today
-    ).count()
-    
-    inventario_critico = Inventario.objects.filter(
+    ).count, 0)
+    plan.widget('inventario_critico', Inventario.objects.filter(
         Q(cantidad_disponible__lte=10) | 
         Q(fecha_vencimiento__lte=today + timedelta(days=2))
-    ).count()
-    
-    eficiencia_promedio = Produccion.objects.filter(
-        estado='COMPLETADA',
-        fecha_completada__gte=timezone.now() - timedelta(days=30)
-    ).aggregate(
-        promedio=Avg('eficiencia')
-    )['promedio'] or 0
-    
+    ).count, 0)
+    # eficiencia es una propiedad del modelo, no una columna: se calcula en Python
+    plan.widget('eficiencia_promedio', lambda: eficiencia_media(
+        completadas_30_dias.only('estado', 'fecha_inicio', 'fecha_completada')
+    ), 0.0)
     # Producción por estado (últimos 30 días)
-    produccion_por_estado = Produccion.objects.filter(
+    plan.widget('produccion_por_estado', lambda: list(Produccion.objects.filter(
         fecha_planificada__gte=today - timedelta(days=30)
     ).values('estado').annotate(
         cantidad=Count('id')
-    ).order_by('estado')
-    
-    # Costos de producción por día (últimos 7 días)
-    costos_por_dia = []
-    for i in range(7):
-        fecha = today - timedelta(days=i)
-        costo_dia = Produccion.objects.filter(
-            fecha_completada__date=fecha,
-            estado='COMPLETADA'
-        ).aggregate(
-            total_costos=Sum('costo_ingredientes') + Sum('costo_mano_obra') + Sum('otros_costos')
-        )['total_costos'] or 0
-        costos_por_dia.append({
-            'fecha': fecha.isoformat(),
-            'costos': float(costo_dia)
-        })
-    
+    ).order_by('estado')), [])
+    plan.widget('costos_por_dia', costos_por_dia, [])
     # Top 5 platos por volumen de producción
-    top_platos_produccion = Produccion.objects.filter(
-        estado='COMPLETADA',
-        fecha_completada__gte=timezone.now() - timedelta(days=30)
-    ).values('plato__nombre').annotate(
+    plan.widget('top_platos_produccion', lambda: list(completadas_30_dias.values('plato__nombre').annotate(
         total_producido=Sum('cantidad_producida')
-    ).order_by('-total_producido')[:5]
+    ).order_by('-total_producido')[:5]), [])
     
-    return Response({
-        'producciones_activas': producciones_activas,
-        'producciones_completadas_hoy': producciones_completadas_hoy,
-        'inventario_critico': inventario_critico,
-        'eficiencia_promedio': float(eficiencia_promedio),
-        'produccion_por_estado': list(produccion_por_estado),
-        'costos_por_dia': list(reversed(costos_por_dia)),
-        'top_platos_produccion': list(top_platos_produccion)
-    })
+    data = plan.ejecutar()
+    if plan.parciales:
+        data['parciales'] = plan.parciales
+    return Response(data)
 
 @api_view(['GET'])
+@lectura_en_replica
 def inventory_alerts(request):
     """API endpoint para alertas de inventario"""
     today = date.today()
@@ -363,6 +468,7 @@ def inventory_alerts(request):
     })
 
 @api_view(['GET'])
+@lectura_en_replica
 def production_efficiency_chart(request):
     """API endpoint para gráfico de eficiencia de producción"""
     # Eficiencia por plato (últimos 30 días)
@@ -405,6 +511,7 @@ def production_efficiency_chart(request):
     })
 
 @api_view(['GET'])
+@lectura_en_replica
 def inventory_rotation_chart(request):
     """API endpoint para gráfico de rotación de inventario"""
     # Movimientos de inventario por tipo (últimos 30 días)
@@ -436,4 +543,105 @@ def inventory_rotation_chart(request):
                 'stock': item['total_stock']
             } for item in stock_por_grupo
         ]
-    })
\ No newline at end of file
+    })
+
+
+def _fecha_entrega(request):
+    """``?fecha=AAAA-MM-DD`` (mañana por defecto)"""
+    valor = request.query_params.get('fecha')
+    if not valor:
+        return date.today() + timedelta(days=1)
+    try:
+        return date.fromisoformat(valor)
+    except ValueError:
+        raise ValidationError({'fecha': 'Fecha no válida, usa AAAA-MM-DD'})
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+@lectura_en_replica
+def production_sheet(request):
+    """Hoja de producción y reparto de un día: ``?fecha=`` y ``?formato=json|csv|pdf``"""
+    fecha = _fecha_entrega(request)
+    datos = hoja_produccion.hoja(fecha)
+    formato = request.query_params.get('formato', 'json')
+    if formato == 'csv':
+        response = HttpResponse(hoja_produccion.a_csv(datos), content_type='text/csv; charset=utf-8')
+    elif formato == 'pdf':
+        response = HttpResponse(hoja_produccion.a_pdf(datos), content_type='application/pdf')
+    elif formato == 'json':
+        return Response(datos)
+    else:
+        raise ValidationError({'formato': 'Usa json, csv o pdf'})
+    response['Content-Disposition'] = f'attachment; filename=produccion_{fecha.isoformat()}.{formato}'
+    return response
+
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def production_sheet_plan(request):
+    """Rellena ``Produccion.cantidad_planificada`` con la hoja del día"""
+    creadas, actualizadas = hoja_produccion.planificar(_fecha_entrega(request))
+    return Response({'creadas': creadas, 'actualizadas': actualizadas})
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def delivery_routes(request):
+    """Rutas de reparto del día de entrega ``?fecha=`` (mañana por defecto)"""
+    return Response(reparto.planificar_rutas(_fecha_entrega(request)))
+
+# ==================== PLANIFICACIÓN DEL MENÚ ====================
+
+def _casillas_peticion(datos, clave):
+    try:
+        return [(casilla['plato'], casilla['dia']) for casilla in datos.get(clave, [])]
+    except (TypeError, KeyError):
+        raise ValidationError({clave: 'Lista de {"plato": id, "dia": "LUN"}'})
+
+@api_view(['GET', 'PATCH'])
+@permission_classes([IsAdminUser])
+def menu_semanal(request):
+    """Matriz plato × día del menú (GET) y aplicación de cambios en bloque (PATCH)
+
+    PATCH: ``{"altas": [{"plato": 1, "dia": "LUN"}, ...], "bajas": [...]}``
+    """
+    if request.method == 'PATCH':
+        altas = _casillas_peticion(request.data, 'altas')
+        bajas = _casillas_peticion(request.data, 'bajas')
+        try:
+            creadas, eliminadas = planificacion.aplicar_cambios_menu(altas, bajas)
+        except ValueError as e:
+            raise ValidationError({'detail': str(e)})
+        return Response({'creadas': creadas, 'eliminadas': eliminadas})
+
+    platos = Plato.objects.order_by('nombre')
+    if request.query_params.get('grupo'):
+        platos = platos.filter(grupo=request.query_params['grupo'])
+    platos = list(platos.values('id', 'codigo', 'nombre', 'grupo'))
+    dias_por_plato = planificacion.matriz([plato['id'] for plato in platos])
+    return Response({
+        'dias': planificacion.DIAS,
+        'platos': [
+            {**plato, 'dias': [dia for dia in planificacion.DIAS if dia in dias_por_plato.get(plato['id'], ())]}
+            for plato in platos
+        ],
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def menu_recomendado(request):
+    """Menú de una fecha (``?fecha=``, ``?dia=``) ordenado para el usuario"""
+    try:
+        fecha = fecha_desde_parametros(request.query_params.get('fecha'), request.query_params.get('dia'))
+    except ValueError as e:
+        raise ValidationError({'fecha': str(e)})
+    menu = menu_del_dia(fecha)
+    valores = recomendaciones.puntuaciones(request.user.id, [d.plato_id for d in menu])
+    orden = sorted(range(len(menu)), key=lambda i: -valores[i])
+    return Response({
+        'fecha': fecha,
+        'platos': [
+            {'plato': menu[i].plato_id, 'nombre': menu[i].plato.nombre, 'precio': menu[i].plato.precio,
+             'puntuacion': round(float(valores[i]), 4)}
+            for i in orden
+        ],
+    })
@@ -0,0 +1,143 @@
+"""
+Archivo de las tablas históricas que solo crecen.
+
+``archivar`` mueve las filas de ``PedidoHistorico`` y ``MovimientoInventario``
+anteriores al horizonte de retención (``ARCHIVO_MESES_RETENCION``) a sus tablas
+de archivo, en lotes de una transacción cada uno. Las filas conservan su id,
+así que un lote interrumpido se puede repetir sin duplicados: basta con volver
+a ejecutar el comando ``archivar_historico``.
+
+Las consultas que necesitan un rango de fechas que puede llegar al archivo usan
+``querysets``/``agregar``/``contar``, que solo consultan la tabla de archivo
+cuando el rango empieza antes de la última fecha archivada. Esa fecha (un
+``MAX`` sobre una columna indexada) solo se cachea si la caché es compartida
+(``CACHE_COMPARTIDA``): ``archivar`` la invalida tras cada lote y el borrado
+tiene que llegar a todos los workers.
+"""
+from datetime import date, datetime, time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import (MovimientoInventario, MovimientoInventarioArchivado,
+                     PedidoHistorico, PedidoHistoricoArchivado)
+
+# modelo caliente: (modelo de archivo, campo de fecha, campos copiados)
+TABLAS = {
+    PedidoHistorico: (
+        PedidoHistoricoArchivado, 'fecha_emision',
+        ('id', 'usuario_id', 'plato_id', 'cantidad', 'dia_semana', 'fecha_servicio', 'fecha_emision'),
+    ),
+    MovimientoInventario: (
+        MovimientoInventarioArchivado, 'fecha_movimiento',
+        ('id', 'inventario_id', 'tipo_movimiento', 'cantidad', 'motivo',
+         'recibo_id', 'usuario_responsable_id', 'fecha_movimiento'),
+    ),
+}
+
+TIMEOUT_ULTIMA_FECHA = 3600
+
+
+def horizonte(meses=None):
+    """Primer día del mes que queda dentro del periodo de retención"""
+    meses = meses if meses is not None else settings.ARCHIVO_MESES_RETENCION
+    hoy = date.today()
+    total = hoy.year * 12 + hoy.month - 1 - meses
+    return date(total // 12, total % 12 + 1, 1)
+
+
+def _limite(modelo, fecha):
+    """``fecha`` en el tipo del campo de fecha de ``modelo``"""
+    campo = modelo._meta.get_field(TABLAS[modelo][1])
+    if campo.get_internal_type() == 'DateTimeField':
+        return timezone.make_aware(datetime.combine(fecha, time.min))
+    return fecha
+
+
+def _clave_ultima_fecha(modelo):
+    return f'archivo:ultima_fecha:{modelo._meta.model_name}'
+
+
+def ultima_fecha_archivada(modelo):
+    """Fecha más reciente presente en el archivo de ``modelo`` (o ``None``)"""
+    clave = _clave_ultima_fecha(modelo)
+    ultima = cache.get(clave) if settings.CACHE_COMPARTIDA else None
+    if ultima is None:
+        archivo, campo, _ = TABLAS[modelo]
+        ultima = archivo.objects.aggregate(ultima=Max(campo))['ultima'] or False
+        if settings.CACHE_COMPARTIDA:
+            cache.set(clave, ultima, TIMEOUT_ULTIMA_FECHA)
+    if isinstance(ultima, datetime):
+        ultima = timezone.localdate(ultima)
+    return ultima or None
+
+
+# ==================== ARCHIVADO ====================
+
+def archivar(modelo, antes_de, lote=5000, max_lotes=None):
+    """Mueve al archivo las filas de ``modelo`` anteriores a ``antes_de``
+
+    Devuelve las filas movidas. Cada lote es una transacción: si el proceso se
+    corta, lo ya movido se queda en el archivo y lo demás en la tabla caliente.
+    """
+    archivo, campo, campos = TABLAS[modelo]
+    pendientes = modelo.objects.filter(**{f'{campo}__lt': _limite(modelo, antes_de)})
+    movidas = lotes = 0
+
+    while max_lotes is None or lotes < max_lotes:
+        with transaction.atomic():
+            filas = list(pendientes.order_by('id').values(*campos)[:lote])
+            if not filas:
+                break
+            # ignore_conflicts: un lote repetido tras un corte no duplica filas
+            archivo.objects.bulk_create([archivo(**fila) for fila in filas], ignore_conflicts=True)
+            modelo.objects.filter(id__in=[fila['id'] for fila in filas]).delete()
+        # Cada lote ya falta en la tabla caliente: las consultas tienen que ver el archivo desde ahora
+        cache.delete(_clave_ultima_fecha(modelo))
+        movidas += len(filas)
+        lotes += 1
+    return movidas
+
+
+# ==================== CONSULTAS ====================
+
+def querysets(modelo, desde=None, hasta=None):
+    """Querysets que cubren ``[desde, hasta)`` en la tabla caliente y, si hace
+    falta, en la de archivo"""
+    archivo, campo, _ = TABLAS[modelo]
+    filtros = {}
+    if desde is not None:
+        filtros[f'{campo}__gte'] = _limite(modelo, desde)
+    if hasta is not None:
+        filtros[f'{campo}__lt'] = _limite(modelo, hasta)
+
+    resultado = [modelo.objects.filter(**filtros)]
+    ultima = ultima_fecha_archivada(modelo)
+    if ultima is not None and (desde is None or desde <= ultima):
+        resultado.append(archivo.objects.filter(**filtros))
+    return resultado
+
+
+def contar(modelo, desde=None, hasta=None):
+    return sum(qs.count() for qs in querysets(modelo, desde, hasta))
+
+
+def agregar(modelo, grupo, desde=None, hasta=None, **agregados):
+    """``values(*grupo).annotate(**agregados)`` sobre las dos tablas
+
+    Solo para agregados que se pueden sumar entre tablas (``Sum``, ``Count``).
+    """
+    resultado = {}
+    for qs in querysets(modelo, desde, hasta):
+        for fila in qs.values(*grupo).annotate(**agregados).order_by():
+            clave = tuple(fila[campo] for campo in grupo)
+            acumulado = resultado.setdefault(clave, dict.fromkeys(agregados, 0))
+            for nombre in agregados:
+                acumulado[nombre] += fila[nombre] or 0
+    return [
+        {**dict(zip(grupo, clave)), **valores}
+        for clave, valores in resultado.items()
+    ]
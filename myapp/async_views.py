@@ -0,0 +1,247 @@
+"""
+Vistas asíncronas para el despliegue ASGI (``USE_ASGI=True``).
+
+Son las vistas de lectura más consultadas: el menú principal y los paneles de
+producción que la página de administración refresca periódicamente. Mientras
+esperan a la base de datos, el worker de uvicorn atiende otras peticiones en
+lugar de bloquear un worker síncrono por petición.
+
+El ORM asíncrono ejecuta cada consulta en el hilo síncrono compartido
+(``thread_sensitive``), así que las consultas de una misma vista van una tras
+otra aunque se agrupen con ``asyncio.gather``: lo que se gana es capacidad
+del worker, no latencia de cada respuesta. Las estadísticas del dashboard
+(``/api/dashboard/estadisticas/``) las sirve ``DashboardViewSet``, que sí
+lanza sus consultas en paralelo con ``PlanDashboard``.
+
+Las respuestas son las mismas que las de las vistas síncronas de ``views`` y
+``api_views``, que siguen sirviéndose con gunicorn/WSGI.
+"""
+import asyncio
+import functools
+from datetime import date, timedelta
+
+from asgiref.sync import sync_to_async
+from django.contrib import messages
+from django.core.cache import cache
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.http import HttpResponseForbidden, JsonResponse, StreamingHttpResponse
+from django.shortcuts import render
+from django.utils import timezone
+from django.views.decorators.http import require_GET
+
+from . import carrito_anonimo, eventos, recomendaciones, views
+from .alergenos import CHOICES as ALERGENOS_CHOICES, codigos_de_mascara, mascara_desde_parametro
+from .api_views import eficiencia_media
+from .db_routers import lectura_en_replica
+from .menu import amenu_del_dia, filtrar_menu
+from .models import CarritoItem, DisponibilidadPlato, Inventario, Plato, Produccion
+from .search import ids_platos
+from .servicio import NOMBRES_DIA, codigo_dia, fecha_desde_parametros, fechas_servicio
+
+
+def api_autenticada(vista):
+    """Equivalente asíncrono del permiso ``IsAuthenticated`` de la API"""
+    @functools.wraps(vista)
+    async def envoltura(request, *args, **kwargs):
+        usuario = await request.auser()
+        if not usuario.is_authenticated:
+            return JsonResponse(
+                {'detail': 'Las credenciales de autenticación no se proveyeron.'},
+                status=403
+            )
+        return await vista(request, *args, **kwargs)
+    return envoltura
+
+
+async def _lista(queryset):
+    return [fila async for fila in queryset]
+
+
+async def _suma(queryset, campo):
+    return (await queryset.aaggregate(total=Sum(campo)))['total'] or 0
+
+
+# ==================== MENÚ PRINCIPAL ====================
+
+async def main(request):
+    if request.method != 'GET':
+        # Añadir al carrito es una escritura corta: se reutiliza la vista síncrona
+        return await sync_to_async(views.main)(request)
+
+    dias_semana = dict(DisponibilidadPlato.DIAS_SEMANA)
+    try:
+        fecha_actual = fecha_desde_parametros(request.GET.get('fecha'), request.GET.get('dia'))
+    except ValueError as e:
+        messages.error(request, str(e))
+        fecha_actual = fecha_desde_parametros()
+    dia_actual = codigo_dia(fecha_actual)
+    grupo_actual = request.GET.get('grupo', '')
+    busqueda = request.GET.get('q', '').strip()
+
+    try:
+        sin_alergenos = mascara_desde_parametro(','.join(request.GET.getlist('sin_alergenos')))
+    except ValueError as e:
+        messages.error(request, str(e))
+        sin_alergenos = 0
+
+    usuario = await request.auser()
+    carrito = CarritoItem.objects.filter(usuario=usuario) if usuario.is_authenticated else None
+
+    async def obtener_grupos():
+        grupos = await cache.aget('platos_grupos')
+        if grupos is None:
+            grupos = sorted(set(await _lista(Plato.objects.values_list('grupo', flat=True))))
+            await cache.aset('platos_grupos', grupos, 3600)
+        return grupos
+
+    async def buscar():
+        return await sync_to_async(ids_platos)(busqueda) if busqueda else None
+
+    async def obtener_carrito():
+        if carrito is None:
+            # Visitante sin cuenta: carrito de la cookie firmada
+            lineas = await sync_to_async(carrito_anonimo.lineas_carrito)(request)
+            return lineas, sum(item.subtotal() for item in lineas)
+        return await asyncio.gather(
+            _lista(carrito.select_related('plato', 'usuario')),
+            _suma(carrito, F('cantidad') * F('plato__precio')),
+        )
+
+    menu, ids_busqueda, (carrito_items, total_carrito), grupos = await asyncio.gather(
+        amenu_del_dia(fecha_actual),
+        buscar(),
+        obtener_carrito(),
+        obtener_grupos(),
+    )
+
+    disponibles = filtrar_menu(menu, grupo=grupo_actual, sin_alergenos=sin_alergenos)
+    if ids_busqueda is not None:
+        posiciones = {plato_id: i for i, plato_id in enumerate(ids_busqueda)}
+        disponibles = sorted(
+            (d for d in disponibles if d.plato_id in posiciones),
+            key=lambda d: posiciones[d.plato_id]
+        )
+    else:
+        # Lo que más encaja con lo que suele pedir el usuario, primero
+        disponibles = recomendaciones.ordenar(usuario.id, disponibles)
+
+    return await sync_to_async(render)(request, 'main.html', {
+        'dias_semana': dias_semana,
+        'dia_actual': dia_actual,
+        'dia_actual_nombre': dias_semana.get(dia_actual, ''),
+        'fecha_actual': fecha_actual,
+        'fechas': [(fecha, NOMBRES_DIA[codigo_dia(fecha)]) for fecha in fechas_servicio()],
+        'disponibles': disponibles,
+        'carrito_items': carrito_items,
+        'total_carrito': total_carrito,
+        'grupo_actual': grupo_actual,
+        'grupos': grupos,
+        'busqueda': busqueda,
+        'alergenos': ALERGENOS_CHOICES,
+        'sin_alergenos': codigos_de_mascara(sin_alergenos),
+    })
+
+
+# ==================== DASHBOARDS ====================
+
+@require_GET
+@api_autenticada
+@lectura_en_replica
+async def production_dashboard_stats(request):
+    """Versión asíncrona de ``api_views.production_dashboard_stats``"""
+    today = date.today()
+    hace_30_dias = timezone.now() - timedelta(days=30)
+    completadas_30_dias = Produccion.objects.filter(
+        estado='COMPLETADA',
+        fecha_completada__gte=hace_30_dias
+    )
+
+    async def costos():
+        filas = Produccion.objects.filter(
+            estado='COMPLETADA',
+            fecha_completada__date__gte=today - timedelta(days=6)
+        ).annotate(dia=TruncDate('fecha_completada')).values('dia').annotate(
+            total_costos=Sum('costo_ingredientes') + Sum('costo_mano_obra') + Sum('otros_costos')
+        )
+        return {fila['dia']: fila['total_costos'] async for fila in filas}
+
+    (producciones_activas, producciones_completadas_hoy, inventario_critico, completadas,
+     produccion_por_estado, costos_dia, top_platos_produccion) = await asyncio.gather(
+        Produccion.objects.filter(estado__in=['PLANIFICADA', 'EN_PROCESO']).acount(),
+        Produccion.objects.filter(estado='COMPLETADA', fecha_completada__date=today).acount(),
+        Inventario.objects.filter(
+            Q(cantidad_disponible__lte=10) |
+            Q(fecha_vencimiento__lte=today + timedelta(days=2))
+        ).acount(),
+        _lista(completadas_30_dias.only('estado', 'fecha_inicio', 'fecha_completada')),
+        _lista(Produccion.objects.filter(
+            fecha_planificada__gte=today - timedelta(days=30)
+        ).values('estado').annotate(cantidad=Count('id')).order_by('estado')),
+        costos(),
+        _lista(completadas_30_dias.values('plato__nombre').annotate(
+            total_producido=Sum('cantidad_producida')
+        ).order_by('-total_producido')[:5]),
+    )
+
+    costos_por_dia = [
+        {'fecha': fecha.isoformat(), 'costos': float(costos_dia.get(fecha) or 0)}
+        for fecha in (today - timedelta(days=i) for i in range(6, -1, -1))
+    ]
+
+    return JsonResponse({
+        'producciones_activas': producciones_activas,
+        'producciones_completadas_hoy': producciones_completadas_hoy,
+        'inventario_critico': inventario_critico,
+        'eficiencia_promedio': eficiencia_media(completadas),
+        'produccion_por_estado': produccion_por_estado,
+        'costos_por_dia': costos_por_dia,
+        'top_platos_produccion': top_platos_produccion,
+    })
+
+
+@require_GET
+@api_autenticada
+@lectura_en_replica
+async def inventory_alerts(request):
+    """Versión asíncrona de ``api_views.inventory_alerts``"""
+    today = date.today()
+    columnas = ('plato__nombre', 'cantidad_disponible', 'fecha_vencimiento', 'ubicacion')
+
+    bajo_stock, proximo_vencimiento, vencido = await asyncio.gather(
+        _lista(Inventario.objects.filter(cantidad_disponible__lte=10).values(
+            'plato__nombre', 'cantidad_disponible', 'ubicacion'
+        )),
+        _lista(Inventario.objects.filter(
+            fecha_vencimiento__lte=today + timedelta(days=3),
+            fecha_vencimiento__gt=today
+        ).values(*columnas)),
+        _lista(Inventario.objects.filter(fecha_vencimiento__lte=today).values(*columnas)),
+    )
+
+    return JsonResponse({
+        'bajo_stock': bajo_stock,
+        'proximo_vencimiento': [
+            {**item, 'fecha_vencimiento': item['fecha_vencimiento'].isoformat()}
+            for item in proximo_vencimiento
+        ],
+        'vencido': [
+            {**item, 'fecha_vencimiento': item['fecha_vencimiento'].isoformat()}
+            for item in vencido
+        ],
+    })
+
+
+# ==================== EVENTOS EN VIVO ====================
+
+@require_GET
+async def eventos_dashboard(request):
+    """Stream SSE con los deltas de las cifras del dashboard del admin"""
+    usuario = await request.auser()
+    if not usuario.is_staff:
+        return HttpResponseForbidden()
+    respuesta = StreamingHttpResponse(eventos.stream(), content_type='text/event-stream')
+    respuesta['Cache-Control'] = 'no-cache'
+    # Sin buffer en nginx, para que cada evento llegue al momento
+    respuesta['X-Accel-Buffering'] = 'no'
+    return respuesta
@@ -0,0 +1,147 @@
+"""
+Carrito de los visitantes sin cuenta.
+
+Mientras el usuario no inicia sesión, su carrito vive en una cookie firmada
+(``django.core.signing``) con las líneas ``[plato_id, 'AAAA-MM-DD', cantidad]``:
+navegar y llenar el carrito no escribe nada en la base de datos. Cada línea se
+valida contra la instantánea cacheada del menú de su fecha (``menu_del_dia``),
+así que tampoco hace falta consultarla.
+
+Al iniciar sesión (o registrarse), ``fusionar`` pasa la cookie a
+``CarritoItem`` con un único ``bulk_create(update_conflicts=True)`` sobre la
+restricción única ``(usuario, plato, fecha_servicio)``, sumando las cantidades
+a las líneas que el usuario ya tuviera. Las raciones fusionadas no se reservan:
+en el checkout solo se venden si aún caben.
+"""
+from datetime import date
+
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+from django.utils import timezone
+
+from .menu import menu_del_dia
+from .models import CarritoItem
+from .servicio import codigo_dia
+
+NOMBRE_COOKIE = 'carrito'
+SALT = 'myapp.carrito_anonimo'
+MAX_LINEAS = 30  # la cookie no debe pasar de ~4 KB
+MAX_CANTIDAD = 99
+
+
+def _max_age():
+    return settings.CARRITO_CADUCIDAD_DIAS * 24 * 3600
+
+
+def leer(request):
+    """``{(plato_id, fecha): cantidad}`` de la cookie; vacío si falta, está
+    manipulada o ha caducado. Las fechas ya pasadas se descartan."""
+    valor = request.COOKIES.get(NOMBRE_COOKIE)
+    if not valor:
+        return {}
+    try:
+        datos = signing.loads(valor, salt=SALT, max_age=_max_age())
+        hoy = timezone.localdate()
+        lineas = {}
+        for plato_id, fecha, cantidad in datos[:MAX_LINEAS]:
+            fecha = date.fromisoformat(fecha)
+            if fecha >= hoy and 0 < int(cantidad) <= MAX_CANTIDAD:
+                lineas[(int(plato_id), fecha)] = int(cantidad)
+        return lineas
+    except (signing.BadSignature, TypeError, ValueError):
+        return {}
+
+
+def guardar(respuesta, lineas):
+    """Escribe ``lineas`` en la cookie de ``respuesta`` (la borra si está vacío)"""
+    if not lineas:
+        respuesta.delete_cookie(NOMBRE_COOKIE)
+        return
+    valor = signing.dumps(
+        [[plato_id, fecha.isoformat(), cantidad] for (plato_id, fecha), cantidad in lineas.items()],
+        salt=SALT, compress=True,
+    )
+    respuesta.set_cookie(
+        NOMBRE_COOKIE, valor, max_age=_max_age(), httponly=True, samesite='Lax',
+        secure=settings.SESSION_COOKIE_SECURE,
+    )
+
+
+def _en_menu(lineas):
+    """``{(plato_id, fecha): disponibilidad}`` de las líneas que siguen a la venta"""
+    en_menu = {}
+    for fecha in {fecha for _, fecha in lineas}:
+        for disponibilidad in menu_del_dia(fecha):
+            en_menu[(disponibilidad.plato_id, fecha)] = disponibilidad
+    return {clave: en_menu[clave] for clave in lineas if clave in en_menu}
+
+
+def anadir(request, respuesta, plato, fecha, cantidad):
+    """Añade ``cantidad`` raciones de ``plato`` en ``fecha`` a la cookie de ``respuesta``
+
+    ``ValueError`` si el plato no se vende esa fecha o el carrito está lleno.
+    """
+    if cantidad < 1:
+        raise ValueError("La cantidad debe ser al menos 1")
+    clave = (plato.id, fecha)
+    if fecha < timezone.localdate() or not _en_menu([clave]):
+        raise ValueError(f"{plato.nombre} no está a la venta el {fecha:%d/%m/%Y}.")
+    lineas = leer(request)
+    if clave not in lineas and len(lineas) >= MAX_LINEAS:
+        raise ValueError("El carrito está lleno: inicia sesión para seguir añadiendo platos.")
+    lineas[clave] = min(lineas.get(clave, 0) + cantidad, MAX_CANTIDAD)
+    guardar(respuesta, lineas)
+
+
+def quitar(request, respuesta, plato_id, fecha):
+    lineas = leer(request)
+    lineas.pop((plato_id, fecha), None)
+    guardar(respuesta, lineas)
+
+
+def lineas_carrito(request):
+    """Líneas de la cookie como ``CarritoItem`` sin guardar, para mostrarlas
+
+    Los platos salen de la instantánea del menú: sin consultas si está en caché.
+    """
+    lineas = leer(request)
+    return [
+        CarritoItem(plato=disponibilidad.plato, fecha_servicio=fecha, dia_semana=codigo_dia(fecha),
+                    cantidad=lineas[(plato_id, fecha)])
+        for (plato_id, fecha), disponibilidad in sorted(_en_menu(lineas).items(), key=lambda item: item[0][1])
+    ]
+
+
+def fusionar(request, usuario, respuesta):
+    """Pasa el carrito de la cookie al de ``usuario`` y borra la cookie
+
+    Una consulta para las cantidades que ya tenía y un único upsert. Las
+    líneas que ya no están en el menú se descartan. Devuelve cuántas se han
+    fusionado.
+    """
+    lineas = leer(request)
+    if NOMBRE_COOKIE in request.COOKIES:
+        respuesta.delete_cookie(NOMBRE_COOKIE)
+    validas = _en_menu(lineas)
+    if not validas:
+        return 0
+
+    with transaction.atomic():
+        existentes = CarritoItem.objects.filter(
+            usuario=usuario,
+            plato_id__in={plato_id for plato_id, _ in validas},
+            fecha_servicio__in={fecha for _, fecha in validas},
+        ).values_list('plato_id', 'fecha_servicio', 'cantidad')
+        cantidades = {(plato_id, fecha): cantidad for plato_id, fecha, cantidad in existentes}
+        CarritoItem.objects.bulk_create(
+            [
+                CarritoItem(usuario=usuario, plato_id=plato_id, fecha_servicio=fecha, dia_semana=codigo_dia(fecha),
+                            cantidad=cantidades.get((plato_id, fecha), 0) + lineas[(plato_id, fecha)])
+                for plato_id, fecha in validas
+            ],
+            update_conflicts=True,
+            unique_fields=['usuario', 'plato', 'fecha_servicio'],
+            update_fields=['cantidad'],
+        )
+    return len(validas)
@@ -0,0 +1,123 @@
+"""
+Ciclo de vida de los carritos.
+
+Una línea de carrito caduca cuando lleva ``CARRITO_CADUCIDAD_DIAS`` sin
+confirmarse (según ``fecha_agregado``) o cuando su fecha de servicio ya ha
+pasado. ``caducar`` las borra, o las mueve a ``CarritoItemArchivado``, en lotes
+de una transacción; sus reservas de raciones vuelven al cupo en el mismo lote.
+El comando ``caducar_carritos`` lo ejecuta cada noche.
+
+No hay líneas repetidas que fusionar: ``fecha_servicio`` es obligatoria y la
+restricción única ``(usuario, plato, fecha_servicio)`` las impide (las
+migraciones 0024 y 0029 fusionaron las que había).
+
+``repetir_semana_anterior`` rellena el carrito con lo que el usuario pidió la
+semana pasada, cada plato en la misma fecha una semana después.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from . import servicio
+from .menu import menu_del_dia
+from .models import CarritoItem, CarritoItemArchivado, PedidoHistorico
+
+CAMPOS_ARCHIVO = ('id', 'usuario_id', 'plato_id', 'cantidad', 'dia_semana', 'fecha_servicio', 'fecha_agregado')
+
+
+def caducadas(dias=None, ahora=None):
+    """Líneas de carrito caducadas"""
+    ahora = ahora or timezone.now()
+    dias = dias if dias is not None else settings.CARRITO_CADUCIDAD_DIAS
+    return CarritoItem.objects.filter(
+        Q(fecha_agregado__lt=ahora - timedelta(days=dias))
+        | Q(fecha_servicio__lt=timezone.localdate(ahora))
+    )
+
+
+def _quitar(ids, reservas):
+    """Borra las líneas ``ids`` devolviendo antes sus ``reservas`` al cupo"""
+    servicio.liberar(reservas)
+    lineas = CarritoItem.objects.filter(id__in=ids)
+    lineas.update(reservada=0)  # ya liberadas: que la señal de borrado no lo repita
+    lineas.delete()
+
+
+def caducar(dias=None, archivar=False, lote=1000, max_lotes=None):
+    """Borra (o archiva) las líneas caducadas; devuelve cuántas
+
+    Cada lote es una transacción. Las líneas de un checkout en curso están
+    bloqueadas y se dejan para la siguiente ejecución.
+    """
+    pendientes = caducadas(dias)
+    quitadas = lotes = 0
+    while max_lotes is None or lotes < max_lotes:
+        with transaction.atomic():
+            filas = list(
+                pendientes.select_for_update(skip_locked=True).order_by('id')
+                .values(*CAMPOS_ARCHIVO, 'reservada')[:lote]
+            )
+            if not filas:
+                break
+            if archivar:
+                CarritoItemArchivado.objects.bulk_create(
+                    [CarritoItemArchivado(**{campo: fila[campo] for campo in CAMPOS_ARCHIVO}) for fila in filas],
+                    ignore_conflicts=True,
+                )
+            reservas = {}
+            for fila in filas:
+                clave = (fila['plato_id'], fila['fecha_servicio'])
+                reservas[clave] = reservas.get(clave, 0) + fila['reservada']
+            _quitar([fila['id'] for fila in filas], reservas)
+        quitadas += len(filas)
+        lotes += 1
+        if len(filas) < lote:
+            break
+    return quitadas
+
+
+def repetir_semana_anterior(usuario, hoy=None):
+    """Añade al carrito los pedidos de hace una semana de las fechas con servicio de esta
+
+    Una consulta agrupada al histórico (índice ``usuario, fecha_servicio``), el
+    cruce con la instantánea del menú de cada fecha en memoria y un único
+    ``bulk_create``. Las líneas que ya están en el carrito no se tocan y las
+    raciones no se reservan: en el checkout solo se venden si aún caben.
+
+    Devuelve ``{'anadidas', 'no_disponibles', 'en_carrito'}``, listas de
+    ``{'plato', 'nombre', 'fecha_servicio', 'cantidad'}``.
+    """
+    fechas = servicio.fechas_servicio(hoy or timezone.localdate())
+    semana = timedelta(weeks=1)
+    pedidos = (
+        PedidoHistorico.objects.filter(usuario=usuario, fecha_servicio__range=(fechas[0] - semana, fechas[-1] - semana))
+        .values('plato_id', 'plato__nombre', 'fecha_servicio').annotate(cantidad=Sum('cantidad'))
+        .order_by('fecha_servicio', 'plato__nombre')
+    )
+    a_la_venta = {
+        (disponibilidad.plato_id, fecha): disponibilidad for fecha in fechas for disponibilidad in menu_del_dia(fecha)
+    }
+    en_carrito = set(
+        CarritoItem.objects.filter(usuario=usuario, fecha_servicio__in=fechas).values_list('plato_id', 'fecha_servicio')
+    )
+
+    resultado = {'anadidas': [], 'no_disponibles': [], 'en_carrito': []}
+    nuevas = []
+    for pedido in pedidos:
+        plato_id, fecha = pedido['plato_id'], pedido['fecha_servicio'] + semana
+        disponibilidad = a_la_venta.get((plato_id, fecha))
+        if (plato_id, fecha) in en_carrito:
+            grupo = 'en_carrito'
+        elif disponibilidad is None or disponibilidad.restantes == 0:
+            grupo = 'no_disponibles'
+        else:
+            grupo = 'anadidas'
+            nuevas.append(CarritoItem(usuario=usuario, plato_id=plato_id, fecha_servicio=fecha,
+                                      dia_semana=servicio.codigo_dia(fecha), cantidad=pedido['cantidad']))
+        resultado[grupo].append({'plato': plato_id, 'nombre': pedido['plato__nombre'],
+                                 'fecha_servicio': fecha, 'cantidad': pedido['cantidad']})
+    CarritoItem.objects.bulk_create(nuevas, ignore_conflicts=True)
+    return resultado
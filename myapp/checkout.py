@@ -0,0 +1,100 @@
+"""
+Confirmación del carrito: convierte los ``CarritoItem`` de un usuario en un
+``Recibo`` con sus líneas y el ``PedidoHistorico`` correspondiente.
+
+Las raciones de cada plato y fecha de servicio se descuentan dentro de la misma
+transacción (``servicio.vender``): lo reservado al añadir al carrito pasa a
+vendido y lo que no tenía reserva (caducada, o fusionada desde la cookie) solo
+se vende si aún cabe. Las líneas antiguas que solo guardan el día de la semana
+se sirven en la próxima fecha de ese día, que también tiene que estar
+publicada. Una línea cuya fecha ya ha pasado no se vende aunque siga
+publicada. Si alguna fecha se ha agotado o no está a la venta no se crea nada.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from . import hoja_produccion, ranking, servicio
+from .models import CarritoItem, Cliente, DisponibilidadFecha, PedidoHistorico, Recibo, ReciboItem
+from .servicio import CapacidadAgotada, NoALaVenta
+
+
+def confirmar_carrito(usuario):
+    """Crea el recibo del carrito de ``usuario``; ``None`` si está vacío
+
+    ``CapacidadAgotada`` si alguna fecha ya no tiene sitio y ``NoALaVenta``
+    si alguna línea no tiene fecha publicada o su fecha ya ha pasado.
+    """
+    with transaction.atomic():
+        # Bloqueadas: la liberación de reservas caducadas se salta estas líneas
+        carrito_items = list(
+            CarritoItem.objects.filter(usuario=usuario).select_related('plato').select_for_update(of=('self',))
+        )
+        if not carrito_items:
+            return None
+
+        hoy = timezone.localdate()
+        cantidades = {}
+        for item in carrito_items:
+            servicio.completar_fecha_servicio(item, hoy)  # carritos creados sin save()
+            cantidad, reservada = cantidades.get((item.plato_id, item.fecha_servicio), (0, 0))
+            cantidades[(item.plato_id, item.fecha_servicio)] = (cantidad + item.cantidad, reservada + item.reservada)
+        platos = {item.plato_id: item.plato for item in carrito_items}
+        for plato_id, fecha in cantidades:
+            if fecha is None:
+                # Sin fecha ni día de servicio: no hay a qué fecha cargarla
+                raise NoALaVenta(platos[plato_id], None)
+            if fecha < hoy:
+                # Añadida antes de que pasara el día: ese servicio ya no se puede vender
+                raise NoALaVenta(platos[plato_id], fecha)
+        # Siempre en el mismo orden, para que dos checkouts no se bloqueen mutuamente
+        for (plato_id, fecha), (cantidad, reservada) in sorted(cantidades.items()):
+            if not servicio.vender(plato_id, fecha, cantidad, reservada):
+                if not DisponibilidadFecha.objects.filter(plato_id=plato_id, fecha=fecha).exists():
+                    raise NoALaVenta(platos[plato_id], fecha)
+                raise CapacidadAgotada(platos[plato_id], fecha)
+
+        total = sum(item.plato.precio * item.cantidad for item in carrito_items)
+        empresa_id, consolidada = Cliente.objects.filter(usuario=usuario).values_list(
+            'empresa', 'empresa__facturacion_consolidada'
+        ).first() or (None, False)
+
+        recibo = Recibo.objects.create(
+            usuario=usuario,
+            empresa_id=empresa_id,
+            total=total,
+            # Las empresas con facturación consolidada no pagan pedido a pedido
+            metodo_pago=Recibo.METODO_FACTURA_SEMANAL if consolidada else None,
+            estado_pago='facturado' if consolidada else 'pendiente',
+        )
+
+        ReciboItem.objects.bulk_create([
+            ReciboItem(
+                recibo=recibo,
+                plato=item.plato,
+                cantidad=item.cantidad,
+                precio_unitario=item.plato.precio
+            ) for item in carrito_items
+        ])
+
+        # fecha_emision se rellena sola (auto_now_add)
+        PedidoHistorico.objects.bulk_create([
+            PedidoHistorico(
+                usuario=usuario,
+                plato=item.plato,
+                cantidad=item.cantidad,
+                dia_semana=item.dia_semana,
+                fecha_servicio=item.fecha_servicio,
+            ) for item in carrito_items
+        ])
+
+        # Las reservas ya son ventas: que el borrado no las devuelva al cupo
+        vendidos = CarritoItem.objects.filter(id__in=[item.id for item in carrito_items])
+        vendidos.update(reservada=0)
+        vendidos.delete()
+
+        lineas = [(item.plato_id, item.cantidad) for item in carrito_items]
+        fechas = [item.fecha_servicio for item in carrito_items]
+        transaction.on_commit(lambda: ranking.registrar_venta(lineas))
+        transaction.on_commit(lambda: hoja_produccion.invalidar(fechas))
+
+    return recibo
@@ -0,0 +1,139 @@
+"""
+Cohortes de alta y retención mensual.
+
+Cada usuario pertenece a la cohorte del mes de su ``Cliente.Creacion_cuenta``.
+La retención del mes k de una cohorte es la fracción de sus usuarios con algún
+pedido (``PedidoHistorico``, archivados incluidos) k meses después del alta.
+
+El cálculo trabaja sobre un extracto compacto: el mes de alta de cada usuario
+y, por cada mes, el array ordenado de usuarios que pidieron (``int32``). Los
+meses cerrados casi no cambian, así que sus arrays se guardan en la caché
+durante ``TIMEOUT_MES_CERRADO`` y cada mes solo hay que consultar el nuevo; el
+mes en curso se consulta siempre. Si se guarda un pedido de un mes cerrado
+(señal ``post_save`` de ``PedidoHistorico``) o se borran desde el admin,
+``invalidar_meses`` descarta sus arrays. No hay señal ``post_delete``: haría
+que ``archivo.archivar`` cargase y borrase fila a fila, y archivar no cambia
+la retención. La matriz sale de un ``np.bincount`` sobre los pares
+(cohorte, desplazamiento), sin bucles por usuario. El comando
+``calcular_cohortes`` la precalcula el día 1 de cada mes.
+"""
+from datetime import date
+
+import numpy as np
+from django.core.cache import cache
+from django.utils import timezone
+
+from . import archivo
+from .models import Cliente, PedidoHistorico
+
+TIMEOUT_INFORME = 3600  # 1 hora: el mes en curso sigue cambiando
+TIMEOUT_MES_CERRADO = 31 * 24 * 3600  # acota lo que dura un cambio que no pase por la señal (p. ej. un UPDATE)
+
+
+def indice_mes(fecha):
+    """Meses desde el año 0: ``indice_mes(b) - indice_mes(a)`` es la distancia en meses"""
+    return fecha.year * 12 + fecha.month - 1
+
+
+def fecha_mes(indice):
+    return date(indice // 12, indice % 12 + 1, 1)
+
+
+def mes_desde_parametro(valor):
+    """Índice de ``'AAAA-MM'``; ``ValueError`` si no es válido"""
+    try:
+        return indice_mes(date.fromisoformat(f'{valor}-01'))
+    except ValueError:
+        raise ValueError(f"Mes no válido: {valor} (usa AAAA-MM)")
+
+
+def _clave_mes(indice):
+    return f'cohortes:mes:{fecha_mes(indice):%Y-%m}'
+
+
+def invalidar_meses(fechas):
+    """Descarta los arrays cacheados de los meses cerrados de ``fechas`` (uno por mes)"""
+    actual = indice_mes(timezone.localdate())
+    meses = {indice_mes(fecha) for fecha in fechas if fecha}
+    cache.delete_many([_clave_mes(mes) for mes in meses if mes < actual])
+
+
+def usuarios_del_mes(indice, cerrado=True):
+    """Usuarios (``int32`` ordenados, sin repetir) con algún pedido en el mes ``indice``"""
+    clave = _clave_mes(indice)
+    usuarios = cache.get(clave) if cerrado else None
+    if usuarios is None:
+        ids = [
+            usuario
+            for queryset in archivo.querysets(PedidoHistorico, fecha_mes(indice), fecha_mes(indice + 1))
+            for usuario in queryset.values_list('usuario_id', flat=True).distinct()
+        ]
+        usuarios = np.unique(np.array(ids, dtype=np.int32))
+        if cerrado:
+            cache.set(clave, usuarios, TIMEOUT_MES_CERRADO)
+    return usuarios
+
+
+def _altas():
+    """``(usuarios, cohortes)`` ordenados por usuario; con varias fichas, la más antigua"""
+    filas = list(Cliente.objects.values_list('usuario_id', 'Creacion_cuenta'))
+    usuarios = np.array([usuario for usuario, _ in filas], dtype=np.int32)
+    cohortes = np.array([indice_mes(timezone.localtime(alta).date()) for _, alta in filas], dtype=np.int32)
+    orden = np.lexsort((cohortes, usuarios))
+    usuarios, cohortes = usuarios[orden], cohortes[orden]
+    usuarios, primera = np.unique(usuarios, return_index=True)
+    return usuarios, cohortes[primera]
+
+
+def calcular(desde=None, hasta=None, hoy=None):
+    """Matriz de retención de las cohortes ``desde``–``hasta`` (índices de mes)
+
+    Devuelve ``{'cohortes': [{'mes', 'usuarios', 'activos', 'retencion'}]}``;
+    ``retencion[k]`` es la fracción de la cohorte activa k meses después del alta.
+    """
+    actual = indice_mes(hoy or timezone.localdate())
+    usuarios, cohortes = _altas()
+    if not usuarios.size:
+        return {'cohortes': []}
+    desde = int(max(desde if desde is not None else cohortes.min(), cohortes.min()))
+    hasta = min(hasta if hasta is not None else actual, actual)
+    n = max(actual - desde + 1, 0)
+
+    # Extracto (usuario, mes) de los pedidos desde la primera cohorte pedida
+    por_mes = [usuarios_del_mes(mes, cerrado=mes < actual) for mes in range(desde, actual + 1)]
+    pedidos_usuario = np.concatenate(por_mes) if por_mes else np.zeros(0, dtype=np.int32)
+    pedidos_mes = np.repeat(np.arange(desde, actual + 1, dtype=np.int32), [len(u) for u in por_mes])
+
+    # Cohorte de cada par: los usuarios sin ficha de cliente no cuentan
+    posicion = np.minimum(np.searchsorted(usuarios, pedidos_usuario), usuarios.size - 1)
+    con_ficha = usuarios[posicion] == pedidos_usuario
+    cohorte = cohortes[posicion[con_ficha]] - desde
+    desplazamiento = pedidos_mes[con_ficha] - desde - cohorte
+    validos = (cohorte >= 0) & (cohorte <= hasta - desde) & (desplazamiento >= 0)
+    activos = np.bincount(cohorte[validos] * n + desplazamiento[validos], minlength=n * n).reshape(n, n)
+
+    en_rango = (cohortes >= desde) & (cohortes <= hasta)
+    tamanos = np.bincount(cohortes[en_rango] - desde, minlength=n)
+    filas = []
+    for i in range(hasta - desde + 1):
+        if not tamanos[i]:
+            continue
+        meses_transcurridos = actual - desde - i + 1
+        filas.append({
+            'mes': f'{fecha_mes(desde + i):%Y-%m}',
+            'usuarios': int(tamanos[i]),
+            'activos': activos[i, :meses_transcurridos].tolist(),
+            'retencion': np.round(activos[i, :meses_transcurridos] / tamanos[i], 4).tolist(),
+        })
+    return {'cohortes': filas}
+
+
+def informe(desde=None, hasta=None):
+    """``calcular`` cacheado durante ``TIMEOUT_INFORME``"""
+    actual = indice_mes(timezone.localdate())
+    clave = f'cohortes:informe:{actual}:{desde}:{hasta}'
+    resultado = cache.get(clave)
+    if resultado is None:
+        resultado = calcular(desde, hasta)
+        cache.set(clave, resultado, TIMEOUT_INFORME)
+    return resultado
@@ -1,6 +1,7 @@
 from django.db.models import Count, Sum, Q
 from datetime import date, timedelta
-from .models import Plato, DisponibilidadPlato, Cliente, Recibo, ReciboItem, Produccion, Inventario
+from .models import Plato, DisponibilidadPlato, Cliente, Recibo, Produccion, Inventario
+from . import ranking
 
 def admin_stats(request):
     """
@@ -37,9 +38,10 @@ def admin_stats(request):
         ).aggregate(total=Sum('total'))['total'] or 0
         
         # Platos más populares
-        platos_populares = ReciboItem.objects.values('plato__nombre').annotate(
-            cantidad_total=Sum('cantidad')
-        ).order_by('-cantidad_total')[:3]
+        platos_populares = [
+            {'plato__nombre': fila['nombre'], 'cantidad_total': fila['cantidad']}
+            for fila in ranking.mas_vendidos(limite=3)
+        ]
         
         # Disponibilidades por día
         disponibilidades_por_dia = {}
@@ -52,7 +54,7 @@ def admin_stats(request):
         
         # Estado del inventario
         inventario_bajo = Inventario.objects.filter(cantidad_disponible__lt=10).count()
-        produccion_pendiente = Produccion.objects.filter(estado='planificada').count()
+        produccion_pendiente = Produccion.objects.filter(estado='PLANIFICADA').count()
         
         # Clientes por tipo
         clientes_particulares = Cliente.objects.filter(es_particular=True).count()
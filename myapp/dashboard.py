@@ -0,0 +1,146 @@
+"""
+Plan de consultas de los dashboards.
+
+Cada widget de un dashboard es una consulta agregada independiente de las
+demás. ``PlanDashboard`` las declara por nombre y las ejecuta a la vez en un
+pool de hilos (cada hilo usa su propia conexión a la base de datos), así que
+la latencia del dashboard pasa a ser la de la consulta más lenta en lugar de
+la suma de todas.
+
+Si un widget falla o no termina dentro de ``DASHBOARD_TIMEOUT`` segundos se
+devuelve su valor por defecto y su nombre aparece en ``parciales``; el resto
+del dashboard se sirve igualmente. El límite también se aplica en la base de
+datos, para que la consulta no siga ocupando el hilo: en PostgreSQL cada
+consulta del widget lleva un ``statement_timeout`` con el tiempo que le queda
+y en SQLite un progress handler la interrumpe al pasar el plazo. El código
+del widget que no es SQL no se puede interrumpir. Al terminar el widget se
+quita el límite de la conexión: el hilo la conserva para los siguientes
+widgets (o la devuelve al pool de conexiones) y nadie debe heredarlo.
+
+Dentro de una transacción (``ATOMIC_REQUESTS``, tests) los otros hilos no
+verían los datos sin confirmar, de modo que el plan se ejecuta en el hilo
+actual, uno tras otro.
+"""
+import contextlib
+import contextvars
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.db import OperationalError, connection, connections
+
+logger = logging.getLogger(__name__)
+
+_pool = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'DASHBOARD_HILOS', 8),
+    thread_name_prefix='dashboard'
+)
+
+
+def _limitar(limite):
+    """``execute_wrapper`` que corta en la base de datos las consultas que pasan de ``limite``"""
+    def envoltorio(execute, sql, params, many, context):
+        restante = limite - time.monotonic()
+        if restante <= 0:
+            raise OperationalError('Tiempo del dashboard agotado')
+        conexion = context['connection']
+        if conexion.vendor == 'postgresql':
+            # A nivel de sesión: ``_quitar_limite`` lo deshace al terminar el widget
+            context['cursor'].cursor.execute(f'SET statement_timeout = {max(int(restante * 1000), 1)}')
+        elif conexion.vendor == 'sqlite':
+            # Se queda instalado también mientras se leen las filas
+            conexion.connection.set_progress_handler(lambda: time.monotonic() > limite, 1000)
+        return execute(sql, params, many, context)
+    return envoltorio
+
+
+def _quitar_limite(conexion):
+    if conexion.connection is None:
+        return
+    try:
+        if conexion.vendor == 'postgresql':
+            with conexion.connection.cursor() as cursor:
+                cursor.execute('RESET statement_timeout')
+        elif conexion.vendor == 'sqlite':
+            conexion.connection.set_progress_handler(None, 0)
+    except Exception:
+        # Una conexión que ni siquiera acepta el RESET no se vuelve a usar
+        conexion.close()
+
+
+def _en_hilo(consulta, limite):
+    try:
+        with contextlib.ExitStack() as pila:
+            envoltorio = _limitar(limite)
+            for conexion in connections.all():
+                pila.enter_context(conexion.execute_wrapper(envoltorio))
+            return consulta()
+    finally:
+        for conexion in connections.all(initialized_only=True):
+            _quitar_limite(conexion)
+            # Como al final de una petición: se conserva según CONN_MAX_AGE
+            # (o vuelve al pool de conexiones) y se cierra si quedó inservible
+            conexion.close_if_unusable_or_obsolete()
+
+
+class PlanDashboard:
+    def __init__(self, timeout=None, concurrente=None):
+        self.timeout = timeout if timeout is not None else getattr(settings, 'DASHBOARD_TIMEOUT', 5)
+        self.concurrente = concurrente
+        self.widgets = {}
+        self.parciales = []
+
+    def widget(self, nombre, consulta, por_defecto=None):
+        """Declara un widget: ``consulta`` es una función sin argumentos"""
+        self.widgets[nombre] = (consulta, por_defecto)
+        return self
+
+    def ejecutar(self):
+        """Ejecuta todos los widgets y devuelve ``{nombre: resultado}``"""
+        concurrente = self.concurrente
+        if concurrente is None:
+            concurrente = not connection.in_atomic_block
+        if concurrente:
+            return self._ejecutar_concurrente()
+        return self._ejecutar_secuencial()
+
+    def _fallback(self, nombre, motivo):
+        logger.warning('Widget de dashboard %s sin datos: %s', nombre, motivo)
+        self.parciales.append(nombre)
+        return self.widgets[nombre][1]
+
+    def _ejecutar_secuencial(self):
+        resultados = {}
+        limite = time.monotonic() + self.timeout
+        for nombre, (consulta, _) in self.widgets.items():
+            if time.monotonic() > limite:
+                resultados[nombre] = self._fallback(nombre, 'tiempo agotado')
+                continue
+            try:
+                resultados[nombre] = consulta()
+            except Exception as e:
+                resultados[nombre] = self._fallback(nombre, e)
+        return resultados
+
+    def _ejecutar_concurrente(self):
+        # copy_context() lleva a cada hilo el estado de lectura_en_replica
+        limite = time.monotonic() + self.timeout
+        futuros = {
+            nombre: _pool.submit(contextvars.copy_context().run, _en_hilo, consulta, limite)
+            for nombre, (consulta, _) in self.widgets.items()
+        }
+        wait(futuros.values(), timeout=self.timeout)
+
+        resultados = {}
+        for nombre, futuro in futuros.items():
+            if not futuro.done():
+                # Solo descarta los que aún esperan en la cola; los que están en
+                # marcha los corta la base de datos (``_limitar``)
+                futuro.cancel()
+                resultados[nombre] = self._fallback(nombre, 'tiempo agotado')
+            elif futuro.exception() is not None:
+                resultados[nombre] = self._fallback(nombre, futuro.exception())
+            else:
+                resultados[nombre] = futuro.result()
+        return resultados
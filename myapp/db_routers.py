@@ -0,0 +1,65 @@
+"""
+Enrutado de lecturas a la réplica de solo lectura.
+
+Las vistas de dashboard y analítica se decoran con ``lectura_en_replica``; las
+lecturas que hagan mientras se ejecutan van al alias ``replica`` si está
+configurado en ``DATABASES`` (``DB_REPLICA_HOST``). Todo lo demás, y todas las
+escrituras, siguen en ``default``.
+"""
+import functools
+import inspect
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+REPLICA = 'replica'
+
+_usar_replica = ContextVar('usar_replica', default=False)
+
+
+def replica_configurada():
+    return REPLICA in settings.DATABASES
+
+
+@contextmanager
+def lecturas_en_replica():
+    """Envía a la réplica las lecturas hechas dentro del bloque"""
+    token = _usar_replica.set(True)
+    try:
+        yield
+    finally:
+        _usar_replica.reset(token)
+
+
+def lectura_en_replica(vista):
+    """Decorador para vistas de solo lectura (dashboards, estadísticas)"""
+    if inspect.iscoroutinefunction(vista):
+        @functools.wraps(vista)
+        async def envoltura_async(*args, **kwargs):
+            with lecturas_en_replica():
+                return await vista(*args, **kwargs)
+        return envoltura_async
+
+    @functools.wraps(vista)
+    def envoltura(*args, **kwargs):
+        with lecturas_en_replica():
+            return vista(*args, **kwargs)
+    return envoltura
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _usar_replica.get() and replica_configurada():
+            return REPLICA
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Réplica y primaria contienen los mismos datos
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA
@@ -0,0 +1,261 @@
+"""
+Generación de recibos y facturas en PDF.
+
+Los datos de cada documento se preparan en el proceso de Django y la maquetación
+(``pdf.renderizar``) se hace en un pool de procesos, fuera del hilo que atiende
+la petición. Cada PDF se guarda en el almacenamiento de media con la huella
+(SHA-256) de sus datos en el nombre: si el contenido no ha cambiado, no se
+vuelve a generar.
+
+La descarga de un PDF desde el admin no espera a la maquetación:
+``solicitar`` encarga el PDF al pool y la página se recarga hasta que está.
+
+Los lotes grandes (cierre de mes) se encolan con ``lanzar_lote`` desde una
+acción del admin como filas de ``LoteDocumentos``. Los ejecuta el comando
+``generar_documentos`` (cron cada minuto), fuera de los workers web: un lote no
+se pierde si el servidor recicla un worker y su progreso, guardado en la base de
+datos, lo ve cualquier proceso. Cada lote termina en un ZIP descargable.
+"""
+import hashlib
+import json
+import logging
+import multiprocessing
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+from . import pdf
+from .models import FacturaEmpresa, LoteDocumentos, Recibo
+
+logger = logging.getLogger(__name__)
+
+LOTE_CONSULTA = 500
+AVISO_CADA = 25  # documentos entre actualizaciones del progreso
+MINUTOS_SIN_PROGRESO = 15  # un lote en curso sin avanzar tanto tiempo se da por interrumpido
+
+_pool = None
+_pool_lock = threading.Lock()
+_encargados = set()  # rutas de las descargas que se están maquetando en este proceso
+
+
+def _pool_procesos():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: los procesos hijos no heredan hilos ni conexiones del servidor
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.DOCUMENTOS_PROCESOS,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _pool
+
+
+# ==================== DATOS DE CADA DOCUMENTO ====================
+
+def datos_recibo(recibo):
+    """Datos de un recibo (con ``items__plato``, ``usuario`` y ``empresa`` cargados)"""
+    cliente = [recibo.usuario.get_full_name() or recibo.usuario.username]
+    if recibo.empresa:
+        cliente += [recibo.empresa.nombre, f'CIF: {recibo.empresa.cif}', recibo.empresa.direccion or '']
+    if recibo.factura_id:
+        estado = f'Incluido en la factura semanal #{recibo.factura_id}'
+    else:
+        estado = 'Pagado' if recibo.pagado else 'Pendiente de pago'
+    return {
+        'tipo': 'recibo',
+        'titulo': 'Recibo',
+        'numero': str(recibo.id),
+        'fecha': timezone.localdate(recibo.fecha_compra).isoformat(),
+        'cliente': cliente,
+        'lineas': [
+            (item.plato.nombre, item.cantidad, str(item.precio_unitario), str(item.subtotal()))
+            for item in recibo.items.all()
+        ],
+        'total': str(recibo.total),
+        'estado': estado,
+    }
+
+
+def datos_factura(factura):
+    """Datos de una factura de empresa (con ``lineas__plato`` y ``empresa`` cargados)"""
+    empresa = factura.empresa
+    return {
+        'tipo': 'factura',
+        'titulo': 'Factura',
+        'numero': factura.numero,
+        'fecha': timezone.localdate(factura.fecha_emision).isoformat(),
+        'periodo': f'{factura.semana_inicio.isoformat()} - {factura.semana_fin.isoformat()}',
+        'cliente': [empresa.nombre, f'CIF: {empresa.cif}', empresa.direccion or ''],
+        'lineas': [
+            (linea.plato.nombre, linea.cantidad, str(linea.precio_unitario), str(linea.subtotal()))
+            for linea in factura.lineas.all()
+        ],
+        'total': str(factura.total),
+        'estado': 'Pagada' if factura.pagada else 'Pendiente de pago',
+    }
+
+
+# tipo: (queryset con lo necesario precargado, función de datos)
+TIPOS = {
+    'recibo': (
+        lambda: Recibo.objects.select_related('usuario', 'empresa').prefetch_related('items__plato'),
+        datos_recibo,
+    ),
+    'factura': (
+        lambda: FacturaEmpresa.objects.select_related('empresa').prefetch_related('lineas__plato'),
+        datos_factura,
+    ),
+}
+
+
+def huella(datos):
+    contenido = json.dumps(datos, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+
+def ruta(datos):
+    return f"documentos/{datos['tipo']}/{datos['numero']}-{huella(datos)[:16]}.pdf"
+
+
+# ==================== GENERACIÓN ====================
+
+def generar(lista_datos, progreso=None):
+    """Genera los PDF que falten y devuelve sus rutas en el almacenamiento
+
+    ``progreso(hechos)`` se llama a medida que se completan documentos.
+    """
+    rutas = [ruta(datos) for datos in lista_datos]
+    pendientes = {
+        destino: datos for destino, datos in zip(rutas, lista_datos)
+        if not default_storage.exists(destino)
+    }
+    hechos = len(rutas) - len(pendientes)
+    if progreso:
+        progreso(hechos)
+
+    if pendientes:
+        pool = _pool_procesos()
+        futuros = {pool.submit(pdf.renderizar, datos): destino for destino, datos in pendientes.items()}
+        for futuro in as_completed(futuros):
+            default_storage.save(futuros[futuro], ContentFile(futuro.result()))
+            hechos += 1
+            if progreso and (hechos % AVISO_CADA == 0 or hechos == len(rutas)):
+                progreso(hechos)
+    return rutas
+
+
+def _preparar(tipo, pk):
+    consulta, preparar = TIPOS[tipo]
+    datos = preparar(consulta().get(pk=pk))
+    return f"{datos['titulo'].lower()}-{datos['numero']}.pdf", datos
+
+
+def documento(tipo, pk):
+    """``(nombre, ruta)`` del PDF de un recibo o factura, generándolo si hace falta"""
+    nombre, datos = _preparar(tipo, pk)
+    destino, = generar([datos])
+    return nombre, destino
+
+
+def _guardar_encargado(destino, futuro):
+    try:
+        if not default_storage.exists(destino):
+            default_storage.save(destino, ContentFile(futuro.result()))
+    except Exception:
+        logger.exception('Error generando el PDF %s', destino)
+    finally:
+        with _pool_lock:
+            _encargados.discard(destino)
+
+
+def solicitar(tipo, pk):
+    """``(nombre, ruta, listo)``: si el PDF aún no existe, lo encarga al pool sin esperarlo"""
+    nombre, datos = _preparar(tipo, pk)
+    destino = ruta(datos)
+    if default_storage.exists(destino):
+        return nombre, destino, True
+    with _pool_lock:
+        encargar = destino not in _encargados
+        _encargados.add(destino)
+    if encargar:
+        try:
+            futuro = _pool_procesos().submit(pdf.renderizar, datos)
+        except BaseException:
+            with _pool_lock:
+                _encargados.discard(destino)
+            raise
+        futuro.add_done_callback(lambda futuro: _guardar_encargado(destino, futuro))
+    return nombre, destino, False
+
+
+# ==================== LOTES ====================
+
+def estado_lote(tarea):
+    """``LoteDocumentos`` de la tarea o ``None``"""
+    return LoteDocumentos.objects.filter(pk=tarea).first()
+
+
+def lanzar_lote(tipo, ids):
+    """Encola la generación de los PDF de ``ids``; devuelve el id de la tarea"""
+    ids = list(ids)
+    return LoteDocumentos.objects.create(tipo=tipo, ids=ids, total=len(ids)).pk
+
+
+def ejecutar_pendientes():
+    """Ejecuta uno tras otro los lotes pendientes; devuelve cuántos
+
+    Los lotes en curso que llevan ``MINUTOS_SIN_PROGRESO`` sin avanzar (el
+    proceso que los ejecutaba murió) vuelven a la cola. Cada lote se reclama
+    con un UPDATE condicional: dos ejecuciones del comando no lo repiten.
+    """
+    LoteDocumentos.objects.filter(
+        estado='en_curso', actualizado__lt=timezone.now() - timedelta(minutes=MINUTOS_SIN_PROGRESO)
+    ).update(estado='pendiente', actualizado=timezone.now())
+    ejecutados = 0
+    for tarea in LoteDocumentos.objects.filter(estado='pendiente').order_by('pk').values_list('pk', flat=True):
+        if LoteDocumentos.objects.filter(pk=tarea, estado='pendiente').update(
+            estado='en_curso', hechos=0, actualizado=timezone.now()
+        ):
+            ejecutar_lote(tarea)
+            ejecutados += 1
+    return ejecutados
+
+
+def _actualizar(tarea, **cambios):
+    LoteDocumentos.objects.filter(pk=tarea).update(actualizado=timezone.now(), **cambios)
+
+
+def ejecutar_lote(tarea):
+    lote = LoteDocumentos.objects.get(pk=tarea)
+    try:
+        consulta, preparar = TIPOS[lote.tipo]
+        ids = lote.ids
+        lista_datos = []
+        for inicio in range(0, len(ids), LOTE_CONSULTA):
+            lista_datos += [
+                preparar(objeto)
+                for objeto in consulta().filter(pk__in=ids[inicio:inicio + LOTE_CONSULTA]).order_by('pk')
+            ]
+
+        rutas = generar(lista_datos, progreso=lambda hechos: _actualizar(tarea, hechos=hechos))
+
+        with tempfile.TemporaryFile() as temporal:
+            with zipfile.ZipFile(temporal, 'w', zipfile.ZIP_DEFLATED) as archivo_zip:
+                for destino in rutas:
+                    with default_storage.open(destino) as fichero:
+                        archivo_zip.writestr(destino.rsplit('/', 1)[-1], fichero.read())
+            temporal.seek(0)
+            nombre_zip = default_storage.save(f'documentos/lotes/{lote.tipo}s-{tarea}.zip', File(temporal))
+
+        _actualizar(tarea, hechos=len(rutas), estado='terminada', zip=nombre_zip)
+    except Exception as e:
+        logger.exception('Error generando el lote de documentos %s', tarea)
+        _actualizar(tarea, estado='error', error=str(e))
@@ -0,0 +1,186 @@
+"""
+Eventos en vivo para el dashboard del admin (Server-Sent Events).
+
+Cuando cambia un ``Recibo``, una ``Produccion`` o un ``Inventario`` las señales
+calculan una sola vez cómo varían las cifras del dashboard (``admin_stats``) y
+publican ese delta en un bus. Cada pestaña del admin abierta recibe el delta
+por ``/admin/eventos/`` y actualiza sus contadores sin volver a consultar.
+
+El bus es en memoria (un solo proceso) o Redis pub/sub cuando hay varios
+workers o procesos que escriben (``EVENTOS_REDIS_URL``).
+
+Cada instancia recuerda al cargarse su aportación a las cifras; el delta de un
+guardado es la aportación nueva menos la anterior.
+"""
+import asyncio
+import contextlib
+import json
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from .models import Inventario, Produccion, Recibo
+
+logger = logging.getLogger(__name__)
+
+CANAL = 'familia_gastro:eventos'
+INTERVALO_LATIDO = 15  # segundos
+
+
+# ==================== APORTACIONES A LAS CIFRAS ====================
+
+def _aportacion_recibo(recibo):
+    hoy = timezone.localdate()
+    dia = timezone.localdate(recibo.fecha_compra)
+    es_hoy = dia == hoy
+    en_semana = dia >= hoy - timedelta(days=7)
+    ingreso = float(recibo.total or 0) if recibo.pagado else 0.0
+    return {
+        'pedidos_hoy': int(es_hoy),
+        'pedidos_semana': int(en_semana),
+        'ingresos_hoy': ingreso if es_hoy else 0.0,
+        'ingresos_semana': ingreso if en_semana else 0.0,
+    }
+
+
+def _aportacion_produccion(produccion):
+    return {'produccion_pendiente': int(produccion.estado == 'PLANIFICADA')}
+
+
+def _aportacion_inventario(inventario):
+    return {'inventario_bajo': int(inventario.cantidad_disponible < 10)}
+
+
+# (función, campos que necesita) por modelo
+APORTACIONES = {
+    Recibo: (_aportacion_recibo, {'fecha_compra', 'pagado', 'total'}),
+    Produccion: (_aportacion_produccion, {'estado'}),
+    Inventario: (_aportacion_inventario, {'cantidad_disponible'}),
+}
+
+
+def aportacion(instancia):
+    """Aportación de ``instancia`` a las cifras; ``None`` si faltan campos"""
+    funcion, campos = APORTACIONES[type(instancia)]
+    if campos & instancia.get_deferred_fields():
+        # Cargarlos aquí costaría una consulta por instancia
+        return None
+    return funcion(instancia)
+
+
+def delta(anterior, nueva):
+    """Diferencia entre dos aportaciones, sin las cifras que no cambian"""
+    claves = set(anterior or {}) | set(nueva or {})
+    cambios = {
+        clave: (nueva or {}).get(clave, 0) - (anterior or {}).get(clave, 0)
+        for clave in claves
+    }
+    return {clave: round(valor, 2) for clave, valor in cambios.items() if valor}
+
+
+# ==================== BUS ====================
+
+class BusMemoria:
+    """Reparte los eventos entre las conexiones SSE de este proceso"""
+
+    def __init__(self):
+        self._suscriptores = set()
+        self._lock = threading.Lock()
+
+    def publicar(self, evento):
+        with self._lock:
+            suscriptores = list(self._suscriptores)
+        for loop, cola in suscriptores:
+            try:
+                loop.call_soon_threadsafe(cola.put_nowait, evento)
+            except RuntimeError:
+                # El bucle de esa conexión ya se cerró
+                pass
+
+    async def escuchar(self):
+        entrada = (asyncio.get_running_loop(), asyncio.Queue())
+        with self._lock:
+            self._suscriptores.add(entrada)
+        try:
+            while True:
+                yield await entrada[1].get()
+        finally:
+            with self._lock:
+                self._suscriptores.discard(entrada)
+
+
+class BusRedis:
+    """Pub/sub de Redis: comparte los eventos entre workers y procesos"""
+
+    def __init__(self, url):
+        self.url = url
+        self._cliente = None
+
+    def publicar(self, evento):
+        import redis
+        if self._cliente is None:
+            self._cliente = redis.Redis.from_url(self.url)
+        self._cliente.publish(CANAL, json.dumps(evento, cls=DjangoJSONEncoder))
+
+    async def escuchar(self):
+        import redis.asyncio as aioredis
+        cliente = aioredis.Redis.from_url(self.url)
+        pubsub = cliente.pubsub()
+        await pubsub.subscribe(CANAL)
+        try:
+            async for mensaje in pubsub.listen():
+                if mensaje['type'] == 'message':
+                    yield json.loads(mensaje['data'])
+        finally:
+            await pubsub.unsubscribe(CANAL)
+            await cliente.aclose()
+
+
+def _crear_bus():
+    url = getattr(settings, 'EVENTOS_REDIS_URL', '')
+    return BusRedis(url) if url else BusMemoria()
+
+
+bus = _crear_bus()
+
+
+def publicar(evento):
+    try:
+        bus.publicar(evento)
+    except Exception:
+        # Un fallo del bus no debe romper la escritura que lo originó
+        logger.exception('No se pudo publicar el evento %s', evento)
+
+
+# ==================== STREAM SSE ====================
+
+def formatear(evento, nombre='delta'):
+    return f'event: {nombre}\ndata: {json.dumps(evento, cls=DjangoJSONEncoder)}\n\n'
+
+
+async def stream():
+    """Eventos en formato SSE, con un comentario de latido si no hay actividad"""
+    yield f'retry: {INTERVALO_LATIDO * 1000}\n\n'
+    eventos = bus.escuchar()
+    siguiente = None
+    try:
+        while True:
+            if siguiente is None:
+                siguiente = asyncio.ensure_future(anext(eventos))
+            hechos, _ = await asyncio.wait({siguiente}, timeout=INTERVALO_LATIDO)
+            if not hechos:
+                # Mantiene viva la conexión a través de proxies
+                yield ': latido\n\n'
+                continue
+            yield formatear(siguiente.result())
+            siguiente = None
+    finally:
+        if siguiente is not None:
+            siguiente.cancel()
+            with contextlib.suppress(asyncio.CancelledError, StopAsyncIteration):
+                await siguiente
+        await eventos.aclose()
@@ -0,0 +1,139 @@
+"""
+Facturación semanal consolidada para empresas.
+
+Los empleados de una empresa con ``facturacion_consolidada`` confirman sus
+pedidos sin pasar por Paycomet (``Recibo.metodo_pago = 'Factura semanal'``,
+``estado_pago = 'facturado'``: no cuentan como pendientes de pago).
+``facturar_semana`` agrupa después en una sola pasada todas las líneas de esos
+recibos por empresa, plato y precio, y crea una ``FacturaEmpresa`` por empresa
+con escrituras en bloque. Si la semana ya estaba facturada, los recibos nuevos
+suman su total a la factura y sus cantidades a las líneas existentes mientras
+no esté pagada; una factura pagada no cambia y los recibos que llegan después
+van a una factura complementaria de la misma semana (``…-C1``, ``…-C2``).
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Case, Count, Sum, Value, When
+from django.utils import timezone
+
+from .models import Empresa, FacturaEmpresa, LineaFacturaEmpresa, Recibo, ReciboItem
+
+
+def lunes_de(fecha):
+    return fecha - timedelta(days=fecha.weekday())
+
+
+def numero_factura(empresa, lunes, complementaria=0):
+    """Número de la factura de la semana; ``complementaria`` > 0 para las que siguen a una pagada"""
+    anio, semana, _ = lunes.isocalendar()
+    numero = f'F{anio}-S{semana:02d}-{empresa.codigo}'
+    return f'{numero}-C{complementaria}' if complementaria else numero
+
+
+def recibos_pendientes(lunes):
+    """Recibos de empresas consolidadas de la semana que aún no tienen factura"""
+    inicio = timezone.make_aware(datetime.combine(lunes, time.min))
+    return Recibo.objects.filter(
+        empresa__facturacion_consolidada=True,
+        metodo_pago=Recibo.METODO_FACTURA_SEMANAL,
+        factura__isnull=True,
+        fecha_compra__gte=inicio,
+        fecha_compra__lt=inicio + timedelta(days=7),
+    )
+
+
+def facturar_semana(lunes):
+    """Factura la semana que empieza ``lunes``; devuelve las facturas afectadas"""
+    with transaction.atomic():
+        recibos = recibos_pendientes(lunes).select_for_update()
+        recibo_ids = list(recibos.values_list('id', flat=True))
+        if not recibo_ids:
+            return []
+
+        # Una sola consulta agrupada con todas las líneas de la semana
+        lineas_por_empresa = defaultdict(list)
+        filas = ReciboItem.objects.filter(recibo_id__in=recibo_ids).values(
+            'recibo__empresa', 'plato', 'precio_unitario'
+        ).annotate(cantidad=Sum('cantidad')).order_by('recibo__empresa', 'plato')
+        for fila in filas:
+            lineas_por_empresa[fila['recibo__empresa']].append(fila)
+
+        totales = {
+            empresa_id: sum(fila['precio_unitario'] * fila['cantidad'] for fila in lineas)
+            for empresa_id, lineas in lineas_por_empresa.items()
+        }
+
+        # Recibos llegados tras facturar la semana: se suman a la factura aún sin
+        # pagar (bloqueada para que marcar_pagadas no la cobre a medias)
+        semana = FacturaEmpresa.objects.filter(semana_inicio=lunes, empresa_id__in=totales)
+        factura_de = {
+            factura.empresa_id: factura
+            for factura in semana.filter(pagada=False).select_for_update()
+        }
+        for empresa_id, factura in factura_de.items():
+            factura.total += totales[empresa_id]
+        FacturaEmpresa.objects.bulk_update(factura_de.values(), ['total'])
+
+        # Sin factura abierta: la de la semana o, si ya hay pagadas, una complementaria
+        empresas = Empresa.objects.in_bulk([e for e in totales if e not in factura_de])
+        emitidas = dict(
+            semana.filter(empresa_id__in=empresas).values_list('empresa').annotate(n=Count('id')).order_by()
+        )
+        nuevas = FacturaEmpresa.objects.bulk_create([
+            FacturaEmpresa(
+                empresa=empresa,
+                numero=numero_factura(empresa, lunes, emitidas.get(empresa_id, 0)),
+                semana_inicio=lunes,
+                semana_fin=lunes + timedelta(days=6),
+                total=totales[empresa_id],
+            )
+            for empresa_id, empresa in empresas.items()
+        ])
+        if any(factura.pk is None for factura in nuevas):
+            # Backends sin RETURNING en inserciones masivas
+            nuevas = list(semana.filter(empresa_id__in=empresas, pagada=False))
+        factura_de.update({factura.empresa_id: factura for factura in nuevas})
+
+        # Las líneas del mismo plato y precio ya facturadas suman las nuevas cantidades
+        existentes = {
+            (factura_id, plato_id, precio): cantidad
+            for factura_id, plato_id, precio, cantidad in LineaFacturaEmpresa.objects.filter(
+                factura__in=factura_de.values()
+            ).values_list('factura_id', 'plato_id', 'precio_unitario', 'cantidad')
+        }
+        LineaFacturaEmpresa.objects.bulk_create(
+            [
+                LineaFacturaEmpresa(
+                    factura=factura_de[empresa_id],
+                    plato_id=fila['plato'],
+                    cantidad=existentes.get((factura_de[empresa_id].id, fila['plato'], fila['precio_unitario']), 0)
+                    + fila['cantidad'],
+                    precio_unitario=fila['precio_unitario'],
+                )
+                for empresa_id, lineas in lineas_por_empresa.items()
+                for fila in lineas
+            ],
+            update_conflicts=True,
+            unique_fields=['factura', 'plato', 'precio_unitario'],
+            update_fields=['cantidad'],
+        )
+
+        # Un único UPDATE enlaza cada recibo con la factura de su empresa
+        Recibo.objects.filter(id__in=recibo_ids).update(factura=Case(
+            *[When(empresa_id=empresa_id, then=Value(factura.id)) for empresa_id, factura in factura_de.items()]
+        ), actualizado=timezone.now())
+
+    return list(factura_de.values())
+
+
+def marcar_pagadas(facturas):
+    """Marca como pagadas las facturas y todos sus recibos"""
+    ahora = timezone.now()
+    with transaction.atomic():
+        ids = [factura.id for factura in facturas]
+        FacturaEmpresa.objects.filter(id__in=ids).update(pagada=True, fecha_pago=ahora)
+        return Recibo.objects.filter(factura_id__in=ids, pagado=False).update(
+            pagado=True, fecha_pago=ahora, estado_pago='completado', actualizado=ahora
+        )
@@ -0,0 +1,228 @@
+"""
+Serialización rápida de solo lectura para los listados de la API.
+
+Los ``ModelSerializer`` de DRF instancian un campo por columna y por fila, lo
+que domina el tiempo de CPU cuando ``PlatoViewSet`` o ``ReciboViewSet``
+devuelven cientos de filas. Aquí se construyen diccionarios planos a partir de
+filas ``.values()`` con conversores y mapas de ``choices`` precalculados, y se
+escriben directamente a JSON (con orjson si está instalado).
+
+La salida es idéntica a la de ``PlatoSerializer`` y ``ReciboSerializer``.
+"""
+from decimal import Decimal
+
+from django.db import models
+from django.utils import timezone
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
+from rest_framework.response import Response
+from rest_framework.utils import encoders
+
+from .models import Plato, Recibo, ReciboItem
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """Renderer JSON que usa orjson cuando está disponible"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        return orjson.dumps(
+            data,
+            default=encoders.JSONEncoder().default,
+            option=orjson.OPT_NON_STR_KEYS,
+        )
+
+
+# ==================== CONVERSORES ====================
+
+def _sin_conversion(valor):
+    return valor
+
+
+def _conversor_decimal(field):
+    cuanto = Decimal(1).scaleb(-field.decimal_places)
+
+    def convertir(valor):
+        if valor is None:
+            return None
+        return '{:f}'.format(valor.quantize(cuanto))
+    return convertir
+
+
+def _convertir_datetime(valor):
+    if valor is None:
+        return None
+    if timezone.is_aware(valor):
+        valor = timezone.localtime(valor)
+    valor = valor.isoformat()
+    if valor.endswith('+00:00'):
+        valor = valor[:-6] + 'Z'
+    return valor
+
+
+def _convertir_date(valor):
+    return None if valor is None else valor.isoformat()
+
+
+def _conversor_fichero(field, request):
+    storage = field.storage
+
+    def convertir(valor):
+        if not valor:
+            return None
+        url = storage.url(valor)
+        return request.build_absolute_uri(url) if request is not None else url
+    return convertir
+
+
+def conversor_para(field, request=None):
+    """Devuelve la función que replica la representación de DRF para ``field``"""
+    if isinstance(field, models.DecimalField):
+        return _conversor_decimal(field)
+    if isinstance(field, models.DateTimeField):
+        return _convertir_datetime
+    if isinstance(field, models.DateField):
+        return _convertir_date
+    if isinstance(field, models.FileField):
+        return _conversor_fichero(field, request)
+    return _sin_conversion
+
+
+def columnas_modelo(model):
+    """Columnas concretas en el orden de ``fields = '__all__'`` de DRF"""
+    pk = model._meta.pk
+    simples = [f for f in model._meta.concrete_fields if not f.is_relation and f is not pk]
+    relaciones = [f for f in model._meta.concrete_fields if f.is_relation]
+    return [pk] + simples + relaciones
+
+
+# ==================== SERIALIZADORES ====================
+
+class ValuesSerializer:
+    """
+    Serializador de solo lectura basado en ``.values()``.
+
+    ``extras`` declara los campos adicionales del serializer DRF equivalente,
+    en el mismo orden: ``(nombre, lookup)`` para relaciones o
+    ``(nombre, 'display:campo')`` para etiquetas de ``choices``.
+    """
+    model = None
+    extras = ()
+    # Campos extra que DRF omite cuando la relación intermedia es nula
+    omitir_si_nulo = ()
+
+    def __init__(self, request=None):
+        self.request = request
+        columnas = columnas_modelo(self.model)
+        self.lookups = [f.name for f in columnas]
+        self.columnas = [(f.name, conversor_para(f, request)) for f in columnas]
+        self.displays = {}
+        for nombre, lookup in self.extras:
+            if lookup.startswith('display:'):
+                campo = self.model._meta.get_field(lookup[len('display:'):])
+                self.displays[nombre] = (campo.name, dict(campo.flatchoices))
+            else:
+                self.lookups.append(lookup)
+
+    def values(self, queryset):
+        return queryset.values(*self.lookups)
+
+    def fila(self, row):
+        salida = {'id': row['id']}
+        for nombre, lookup in self.extras:
+            if nombre in self.displays:
+                campo, etiquetas = self.displays[nombre]
+                valor = row[campo]
+                salida[nombre] = etiquetas.get(valor, valor)
+            else:
+                valor = row[lookup]
+                if valor is None and nombre in self.omitir_si_nulo:
+                    continue
+                salida[nombre] = valor
+        for nombre, convertir in self.columnas[1:]:
+            salida[nombre] = convertir(row[nombre])
+        return salida
+
+    def serializar(self, rows):
+        return [self.fila(row) for row in rows]
+
+
+class PlatoValuesSerializer(ValuesSerializer):
+    model = Plato
+    extras = (
+        ('grupo_display', 'display:grupo'),
+        ('estado_display', 'display:estado'),
+    )
+
+
+class ReciboItemValuesSerializer(ValuesSerializer):
+    model = ReciboItem
+    extras = (
+        ('plato_nombre', 'plato__nombre'),
+    )
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self._subtotal = conversor_para(models.DecimalField(max_digits=10, decimal_places=2))
+
+    def fila(self, row):
+        salida = super().fila(row)
+        # Mantener el orden de ReciboItemSerializer: subtotal tras plato_nombre
+        subtotal = self._subtotal(row['cantidad'] * row['precio_unitario'])
+        return {
+            'id': salida.pop('id'),
+            'plato_nombre': salida.pop('plato_nombre'),
+            'subtotal': subtotal,
+            **salida,
+        }
+
+
+class ReciboValuesSerializer(ValuesSerializer):
+    model = Recibo
+    extras = (
+        ('usuario_username', 'usuario__username'),
+        ('empresa_nombre', 'empresa__nombre'),
+        ('estado_pago_display', 'display:estado_pago'),
+    )
+    omitir_si_nulo = ('empresa_nombre',)
+
+    def serializar(self, rows):
+        rows = list(rows)
+        items_serializer = ReciboItemValuesSerializer(self.request)
+        items_por_recibo = {row['id']: [] for row in rows}
+        items = items_serializer.values(
+            ReciboItem.objects.filter(recibo_id__in=items_por_recibo)
+        ).order_by('id')
+        for item in items:
+            items_por_recibo[item['recibo']].append(items_serializer.fila(item))
+
+        resultado = []
+        for row in rows:
+            salida = self.fila(row)
+            resultado.append({'id': salida.pop('id'), 'items': items_por_recibo[row['id']], **salida})
+        return resultado
+
+
+class FastListMixin:
+    """
+    Sustituye la acción ``list`` de un ViewSet por la ruta rápida.
+
+    Los filtros, la paginación y el resto de acciones siguen usando
+    ``serializer_class`` con normalidad.
+    """
+    values_serializer_class = None
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+
+    def list(self, request, *args, **kwargs):
+        serializer = self.values_serializer_class(request)
+        queryset = serializer.values(self.filter_queryset(self.get_queryset()))
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(serializer.serializar(page))
+        return Response(serializer.serializar(queryset))
@@ -85,6 +85,7 @@ class CarritoItemForm(forms.ModelForm):
             'plato': forms.Select(attrs={'class': 'form-control'}),
             'cantidad': forms.NumberInput(attrs={'class': 'form-control', 'min': '1'}),
             'dia_semana': forms.Select(attrs={'class': 'form-control'}),
+            'fecha_servicio': forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
         }
 
     def __init__(self, *args, **kwargs):
@@ -0,0 +1,155 @@
+"""
+Hoja de producción y de reparto de un día de entrega.
+
+Para una fecha de entrega suma, en una única consulta agrupada, los pedidos de
+``PedidoHistorico`` con esa ``fecha_servicio`` (un rango del índice de la
+fecha), por plato y por empresa del cliente. La cocina usa los
+totales por plato; el reparto, el detalle por empresa y dirección de entrega.
+
+El resultado se guarda en la caché por fecha. Cada checkout borra la hoja del
+día de entrega afectado, así que la hoja cacheada nunca se queda atrás.
+``planificar`` vuelca los totales en ``Produccion.cantidad_planificada``.
+"""
+import csv
+import io
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import OuterRef, Subquery, Sum
+from django.utils import timezone
+
+from . import pdf
+from .models import Cliente, Empresa, PedidoHistorico, Produccion
+from .servicio import NOMBRES_DIA, codigo_dia
+
+SIN_EMPRESA = 'Particulares'
+TIMEOUT_HOJA = 24 * 3600
+
+
+def _clave(fecha):
+    return f'hoja_produccion:{fecha.isoformat()}'
+
+
+def invalidar(fechas):
+    """Descarta las hojas de las fechas de entrega ``fechas``"""
+    cache.delete_many([_clave(fecha) for fecha in set(fechas)])
+
+
+# ==================== CÁLCULO ====================
+
+def pedidos_del_dia(fecha):
+    """Pedidos a entregar ``fecha`` anotados con el ``cliente_id`` y ``empresa_id``
+    del usuario"""
+    cliente = Cliente.objects.filter(usuario=OuterRef('usuario'))
+    return PedidoHistorico.objects.filter(fecha_servicio=fecha).annotate(
+        cliente_id=Subquery(cliente.values('id')[:1]),
+        empresa_id=Subquery(cliente.values('empresa')[:1]),
+    )
+
+
+def _calcular(fecha):
+    codigo = codigo_dia(fecha)
+    hoja = {'fecha': fecha.isoformat(), 'dia': NOMBRES_DIA.get(codigo, ''), 'platos': [], 'empresas': []}
+    if codigo is None:
+        return hoja
+
+    filas = list(pedidos_del_dia(fecha).values(
+        'plato', 'plato__codigo', 'plato__nombre', 'plato__grupo', 'empresa_id'
+    ).annotate(cantidad=Sum('cantidad')).order_by('plato__nombre'))
+
+    empresas = Empresa.objects.in_bulk({fila['empresa_id'] for fila in filas} - {None})
+    platos, por_empresa = {}, {}
+    for fila in filas:
+        plato = platos.setdefault(fila['plato'], {
+            'plato_id': fila['plato'],
+            'codigo': fila['plato__codigo'],
+            'nombre': fila['plato__nombre'],
+            'grupo': fila['plato__grupo'],
+            'total': 0,
+            'por_empresa': {},
+        })
+        plato['total'] += fila['cantidad']
+        plato['por_empresa'][str(fila['empresa_id'])] = fila['cantidad']
+
+        empresa = empresas.get(fila['empresa_id'])
+        destino = por_empresa.setdefault(fila['empresa_id'], {
+            'empresa_id': fila['empresa_id'],
+            'nombre': empresa.nombre if empresa else SIN_EMPRESA,
+            'direccion': (empresa.direccion or '') if empresa else '',
+            'total': 0,
+            'platos': [],
+        })
+        destino['total'] += fila['cantidad']
+        destino['platos'].append({'plato_id': fila['plato'], 'nombre': fila['plato__nombre'],
+                                  'cantidad': fila['cantidad']})
+
+    hoja['platos'] = list(platos.values())
+    # Particulares al final, el resto por nombre
+    hoja['empresas'] = sorted(por_empresa.values(), key=lambda e: (e['empresa_id'] is None, e['nombre']))
+    return hoja
+
+
+def hoja(fecha):
+    """Hoja del día de entrega ``fecha`` (cacheada)"""
+    resultado = cache.get(_clave(fecha))
+    if resultado is None:
+        resultado = _calcular(fecha)
+        cache.set(_clave(fecha), resultado, TIMEOUT_HOJA)
+    return resultado
+
+
+# ==================== FORMATOS DE SALIDA ====================
+
+def a_csv(datos):
+    """Tabla plato × empresa con una columna de total"""
+    salida = io.StringIO()
+    escritor = csv.writer(salida)
+    empresas = datos['empresas']
+    escritor.writerow(['Código', 'Plato', *[empresa['nombre'] for empresa in empresas], 'Total'])
+    for plato in datos['platos']:
+        escritor.writerow([
+            plato['codigo'], plato['nombre'],
+            *[plato['por_empresa'].get(str(empresa['empresa_id']), 0) for empresa in empresas],
+            plato['total'],
+        ])
+    escritor.writerow(['', 'Total', *[empresa['total'] for empresa in empresas],
+                       sum(plato['total'] for plato in datos['platos'])])
+    return salida.getvalue()
+
+
+def a_pdf(datos):
+    return pdf.renderizar_hoja_produccion(datos)
+
+
+# ==================== PLANIFICACIÓN ====================
+
+def planificar(fecha):
+    """Crea o actualiza las producciones planificadas de ``fecha`` con los totales
+
+    Las producciones ya en proceso, completadas o canceladas no se tocan.
+    Devuelve ``(creadas, actualizadas)``.
+    """
+    totales = {plato['plato_id']: plato['total'] for plato in hoja(fecha)['platos']}
+    with transaction.atomic():
+        existentes = {
+            produccion.plato_id: produccion
+            for produccion in Produccion.objects.select_for_update().filter(
+                fecha_planificada=fecha, estado='PLANIFICADA', plato_id__in=totales
+            )
+        }
+        actualizadas = []
+        ahora = timezone.now()
+        for plato_id, produccion in existentes.items():
+            if produccion.cantidad_planificada != totales[plato_id]:
+                produccion.cantidad_planificada = totales[plato_id]
+                produccion.updated_at = ahora  # bulk_update no aplica auto_now
+                actualizadas.append(produccion)
+        Produccion.objects.bulk_update(actualizadas, ['cantidad_planificada', 'updated_at'])
+
+        ocupados = set(existentes) | set(Produccion.objects.filter(
+            fecha_planificada=fecha, plato_id__in=totales
+        ).values_list('plato_id', flat=True))
+        creadas = Produccion.objects.bulk_create([
+            Produccion(plato_id=plato_id, fecha_planificada=fecha, cantidad_planificada=total)
+            for plato_id, total in totales.items() if plato_id not in ocupados
+        ])
+    return len(creadas), len(actualizadas)
@@ -0,0 +1,54 @@
+"""
+Aplica a las fechas de una semana la plantilla que le asigna la rotación activa
+Uso: python manage.py aplicar_rotacion_menu [--semana 2026-10-26] [--dry-run]
+
+Pensado para ejecutarse cada domingo desde cron: por defecto aplica la semana
+que empieza el próximo lunes. Solo cambian las fechas publicadas de esa semana
+(el menú semanal y las demás semanas no se tocan) y se conservan las que ya
+tienen ventas o reservas. Con --dry-run muestra los cambios y el plan del
+próximo mes sin tocar nada.
+"""
+
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.planificacion import aplicar_rotacion, calendario, comparar_plantilla, plantilla_de_semana, rotacion_activa
+
+
+class Command(BaseCommand):
+    help = 'Aplica la plantilla de menú de la rotación activa para una semana'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--semana', help='Cualquier día de la semana (AAAA-MM-DD), la próxima por defecto')
+        parser.add_argument('--dry-run', action='store_true', help='Mostrar los cambios sin aplicarlos')
+
+    def handle(self, *args, **options):
+        if options['semana']:
+            try:
+                fecha = date.fromisoformat(options['semana'])
+            except ValueError:
+                raise CommandError('Fecha no válida, usa AAAA-MM-DD')
+        else:
+            hoy = date.today()
+            fecha = hoy + timedelta(days=7 - hoy.weekday())
+
+        if options['dry_run']:
+            rotacion = rotacion_activa()
+            if rotacion is None:
+                raise CommandError('No hay ninguna rotación activa')
+            for lunes, plantilla in calendario(rotacion, fecha):
+                self.stdout.write(f'  {lunes}: {plantilla or "-"}')
+            plantilla = plantilla_de_semana(rotacion, fecha)
+            if plantilla:
+                cambios = comparar_plantilla(plantilla, fecha)
+                self.stdout.write(f'«{plantilla}»: {len(cambios["altas"])} altas, {len(cambios["bajas"])} bajas')
+            return
+
+        plantilla, creadas, eliminadas = aplicar_rotacion(fecha)
+        if plantilla is None:
+            self.stdout.write(self.style.WARNING('⚠️ Ninguna plantilla para esa semana'))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ «{plantilla}» aplicada: {creadas} altas, {eliminadas} bajas'
+        ))
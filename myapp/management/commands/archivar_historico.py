@@ -0,0 +1,48 @@
+"""
+Archiva pedidos históricos y movimientos de inventario antiguos
+Uso: python manage.py archivar_historico --meses 12 --lote 5000
+
+Mueve a las tablas de archivo las filas anteriores al horizonte de retención,
+en lotes de una transacción. Se puede interrumpir y volver a lanzar: continúa
+donde lo dejó.
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from myapp import archivo
+from myapp.models import MovimientoInventario, PedidoHistorico
+
+MODELOS = {
+    'pedidos': PedidoHistorico,
+    'movimientos': MovimientoInventario,
+}
+
+
+class Command(BaseCommand):
+    help = 'Mueve al archivo los pedidos y movimientos anteriores al horizonte de retención'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--meses', type=int, default=settings.ARCHIVO_MESES_RETENCION,
+                            help='Meses que se conservan en las tablas principales')
+        parser.add_argument('--lote', type=int, default=5000, help='Filas por transacción')
+        parser.add_argument('--max-lotes', type=int, default=None, help='Parar tras N lotes')
+        parser.add_argument('--solo', choices=MODELOS, help='Archivar solo una de las tablas')
+        parser.add_argument('--dry-run', action='store_true', help='Solo contar las filas a archivar')
+
+    def handle(self, *args, **options):
+        antes_de = archivo.horizonte(options['meses'])
+        self.stdout.write(f'📦 Archivando filas anteriores a {antes_de}')
+
+        for nombre, modelo in MODELOS.items():
+            if options['solo'] and options['solo'] != nombre:
+                continue
+            _, campo, _ = archivo.TABLAS[modelo]
+            if options['dry_run']:
+                pendientes = modelo.objects.filter(**{f'{campo}__lt': archivo._limite(modelo, antes_de)}).count()
+                self.stdout.write(f'{nombre:12} {pendientes} filas por archivar')
+                continue
+            movidas = archivo.archivar(
+                modelo, antes_de, lote=options['lote'], max_lotes=options['max_lotes']
+            )
+            self.stdout.write(self.style.SUCCESS(f'{nombre:12} {movidas} filas archivadas'))
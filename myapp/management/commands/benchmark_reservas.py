@@ -0,0 +1,169 @@
+"""
+Prueba de contención de las reservas de raciones
+Uso: python manage.py benchmark_reservas --compradores 100 --capacidad 60 [--bd-configurada]
+
+Lanza a la vez (con una barrera) ``--compradores`` hilos que añaden el mismo
+plato y fecha a su carrito, y después confirman su carrito también a la vez.
+Comprueba que nunca se reserva ni se vende más que la capacidad y que los
+contadores de ``DisponibilidadFecha`` cuadran con los carritos y los pedidos.
+
+Por defecto se ejecuta sobre una base de datos SQLite temporal con el perfil
+de producción (SQLITE_PRODUCCION); con --bd-configurada, sobre la base de
+datos configurada (p. ej. PostgreSQL), borrando al final los datos de prueba.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.db.models import Sum
+
+from myapp.checkout import confirmar_carrito
+from myapp.models import CarritoItem, DisponibilidadFecha, PedidoHistorico, Plato
+from myapp.servicio import CapacidadAgotada, anadir_al_carrito, fechas_servicio
+
+PREFIJO = 'benchmark_reservas_'
+
+
+class Command(BaseCommand):
+    help = 'Prueba de contención: compradores simultáneos sobre una fecha con capacidad limitada'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--compradores', type=int, default=100)
+        parser.add_argument('--capacidad', type=int, default=60, help='Raciones a la venta')
+        parser.add_argument('--cantidad', type=int, default=1, help='Raciones por comprador')
+        parser.add_argument('--bd-configurada', action='store_true',
+                            help='Usar la base de datos configurada en lugar de una SQLite temporal')
+        # Modo interno usado por el subproceso
+        parser.add_argument('--ejecutar', action='store_true', help='(interno) ejecutar la prueba')
+
+    def handle(self, *args, **options):
+        if options['ejecutar'] or options['bd_configurada']:
+            resultado = self.ejecutar(options['compradores'], options['capacidad'], options['cantidad'])
+        else:
+            resultado = self.en_sqlite_temporal(options)
+
+        if options['ejecutar']:
+            self.stdout.write(json.dumps(resultado))
+            return
+        self.informe(resultado, options)
+
+    # ==================== PROCESO PRINCIPAL ====================
+
+    def en_sqlite_temporal(self, options):
+        with tempfile.TemporaryDirectory() as directorio:
+            env = {
+                **os.environ,
+                'DB_ENGINE': 'django.db.backends.sqlite3',
+                'DB_NAME': str(Path(directorio) / 'benchmark.sqlite3'),
+                'SQLITE_PRODUCCION': 'True',
+            }
+            manage = [sys.executable, str(settings.BASE_DIR / 'manage.py')]
+            subprocess.run(manage + ['migrate', '--verbosity', '0'], env=env, check=True)
+            salida = subprocess.run(
+                manage + [
+                    'benchmark_reservas', '--ejecutar',
+                    '--compradores', str(options['compradores']),
+                    '--capacidad', str(options['capacidad']),
+                    '--cantidad', str(options['cantidad']),
+                ],
+                env=env, check=True, stdout=subprocess.PIPE, text=True,
+            ).stdout
+        return json.loads(salida.strip().splitlines()[-1])
+
+    def informe(self, r, options):
+        esperadas = min(options['compradores'], options['capacidad'] // options['cantidad'])
+        self.stdout.write(f"Compradores: {options['compradores']}  capacidad: {options['capacidad']}  "
+                          f"raciones por compra: {options['cantidad']}")
+        for fase in ('reservas', 'checkouts'):
+            f = r[fase]
+            self.stdout.write(
+                f"{fase:10} ok: {f['ok']:4}  agotadas: {f['agotadas']:4}  bloqueos: {f['errores']:4}  "
+                f"{f['por_segundo']:7.1f}/s  p95: {f['p95_ms']:7.1f} ms"
+            )
+        self.stdout.write(f"Contadores: reservadas={r['reservadas']} vendidas={r['vendidas']} "
+                          f"pedidos={r['pedidos']} en carritos={r['en_carritos']}")
+
+        errores = []
+        if r['vendidas'] + r['reservadas'] > options['capacidad']:
+            errores.append('se ha superado la capacidad')
+        if r['vendidas'] != r['pedidos'] or r['reservadas'] != r['en_carritos']:
+            errores.append('los contadores no cuadran con carritos y pedidos')
+        if r['reservas']['errores'] == 0 and r['reservas']['ok'] != esperadas:
+            errores.append(f"se esperaban {esperadas} reservas")
+        if errores:
+            raise CommandError('; '.join(errores))
+        self.stdout.write(self.style.SUCCESS('✅ Sin sobreventa y con los contadores cuadrados'))
+
+    # ==================== PRUEBA ====================
+
+    def ejecutar(self, compradores, capacidad, cantidad):
+        fecha = fechas_servicio()[0]
+        plato = Plato.objects.create(codigo=f'{PREFIJO}plato', nombre='Plato de prueba', precio=Decimal('8.50'))
+        DisponibilidadFecha.objects.create(plato=plato, fecha=fecha, capacidad=capacidad)
+        User.objects.bulk_create([User(username=f'{PREFIJO}{i}') for i in range(compradores)])
+        usuarios = list(User.objects.filter(username__startswith=PREFIJO).order_by('id'))
+
+        try:
+            reservas = self.a_la_vez(usuarios, lambda usuario: anadir_al_carrito(usuario, plato, fecha, cantidad))
+            con_carrito = [u for u in usuarios if CarritoItem.objects.filter(usuario=u).exists()]
+            checkouts = self.a_la_vez(con_carrito, confirmar_carrito)
+
+            disponibilidad = DisponibilidadFecha.objects.get(plato=plato, fecha=fecha)
+            return {
+                'reservas': reservas,
+                'checkouts': checkouts,
+                'reservadas': disponibilidad.reservadas,
+                'vendidas': disponibilidad.vendidas,
+                'pedidos': PedidoHistorico.objects.filter(plato=plato).aggregate(n=Sum('cantidad'))['n'] or 0,
+                'en_carritos': CarritoItem.objects.filter(plato=plato).aggregate(n=Sum('reservada'))['n'] or 0,
+            }
+        finally:
+            # Recibos, pedidos, carritos y disponibilidades se borran en cascada
+            User.objects.filter(username__startswith=PREFIJO).delete()
+            plato.delete()
+
+    def a_la_vez(self, usuarios, operacion):
+        """Ejecuta ``operacion(usuario)`` en un hilo por usuario, todos a la vez"""
+        barrera = threading.Barrier(len(usuarios)) if usuarios else None
+
+        def comprador(usuario):
+            barrera.wait()
+            inicio = time.perf_counter()
+            try:
+                operacion(usuario)
+                estado = 'ok'
+            except CapacidadAgotada:
+                estado = 'agotadas'
+            except OperationalError:
+                # "database is locked"
+                estado = 'errores'
+            finally:
+                connection.close()
+            return estado, time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(len(usuarios), 1)) as pool:
+            resultados = list(pool.map(comprador, usuarios))
+        duracion = time.perf_counter() - inicio
+
+        latencias = sorted(latencia for _, latencia in resultados)
+        estados = [estado for estado, _ in resultados]
+        return {
+            'ok': estados.count('ok'),
+            'agotadas': estados.count('agotadas'),
+            'errores': estados.count('errores'),
+            'por_segundo': len(resultados) / duracion if duracion else 0,
+            'p95_ms': latencias[int(len(latencias) * 0.95) - 1] * 1000 if latencias else 0,
+        }
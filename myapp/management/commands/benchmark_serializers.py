@@ -0,0 +1,103 @@
+"""
+Compara los serializadores DRF con la ruta rápida basada en ``.values()``
+Uso: python manage.py benchmark_serializers --filas 10000
+
+Los datos de prueba se crean dentro de una transacción que se revierte al
+terminar, por lo que la base de datos queda intacta.
+"""
+
+import time
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from myapp.fast_serializers import FastJSONRenderer, PlatoValuesSerializer, ReciboValuesSerializer
+from myapp.models import Plato, Recibo, ReciboItem
+from myapp.serializers import PlatoSerializer, ReciboSerializer
+
+
+class Command(BaseCommand):
+    help = 'Benchmark de serialización de listados: DRF frente a la ruta rápida'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, default=10000, help='Filas por modelo')
+        parser.add_argument('--repeticiones', type=int, default=3, help='Repeticiones por medición')
+
+    def handle(self, *args, **options):
+        filas = options['filas']
+        repeticiones = options['repeticiones']
+
+        with transaction.atomic():
+            self.stdout.write(f'📦 Creando {filas} platos y {filas} recibos de prueba...')
+            self.crear_datos(filas)
+
+            platos = Plato.objects.order_by('id')
+            recibos = Recibo.objects.select_related('usuario', 'empresa').prefetch_related(
+                'items__plato'
+            ).order_by('id')
+
+            resultados = [
+                ('Platos', self.medir(
+                    repeticiones,
+                    lambda: JSONRenderer().render(PlatoSerializer(platos, many=True).data),
+                    lambda: FastJSONRenderer().render(
+                        PlatoValuesSerializer().serializar(PlatoValuesSerializer().values(platos))
+                    ),
+                )),
+                ('Recibos', self.medir(
+                    repeticiones,
+                    lambda: JSONRenderer().render(ReciboSerializer(recibos, many=True).data),
+                    lambda: FastJSONRenderer().render(
+                        ReciboValuesSerializer().serializar(ReciboValuesSerializer().values(recibos))
+                    ),
+                )),
+            ]
+            transaction.set_rollback(True)
+
+        self.stdout.write('')
+        for nombre, (drf, rapido) in resultados:
+            self.stdout.write(
+                f'{nombre:8} DRF: {drf * 1000:9.1f} ms   rápido: {rapido * 1000:9.1f} ms   '
+                f'x{drf / rapido:.1f}'
+            )
+
+    def crear_datos(self, filas):
+        usuario = User.objects.create_user(username='__benchmark_serializers__')
+        Plato.objects.bulk_create([
+            Plato(
+                codigo=f'__bench_{i}',
+                nombre=f'Plato {i}',
+                descripcion='Plato de prueba para el benchmark',
+                precio=Decimal('9.90'),
+                precio_sin_iva=Decimal('9.00'),
+                grupo='CARNE',
+                estado='COMUN',
+                ingredientes='Ingrediente A, ingrediente B',
+                alergenos='Gluten',
+            )
+            for i in range(filas)
+        ], batch_size=1000)
+        plato = Plato.objects.filter(codigo__startswith='__bench_').first()
+        recibos = Recibo.objects.bulk_create([
+            Recibo(usuario=usuario, total=Decimal('19.80')) for _ in range(filas)
+        ], batch_size=1000)
+        if not recibos[0].pk:
+            recibos = Recibo.objects.filter(usuario=usuario)
+        ReciboItem.objects.bulk_create([
+            ReciboItem(recibo=recibo, plato=plato, cantidad=2, precio_unitario=Decimal('9.90'))
+            for recibo in recibos
+        ], batch_size=1000)
+
+    def medir(self, repeticiones, drf, rapido):
+        return self.mejor_tiempo(repeticiones, drf), self.mejor_tiempo(repeticiones, rapido)
+
+    def mejor_tiempo(self, repeticiones, funcion):
+        tiempos = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            funcion()
+            tiempos.append(time.perf_counter() - inicio)
+        return min(tiempos)
@@ -0,0 +1,37 @@
+"""
+Borra (o archiva) las líneas de carrito abandonadas
+Uso: python manage.py caducar_carritos [--dias 14] [--archivar] [--lote 1000]
+
+Pensado para ejecutarse cada noche desde cron. Quita las líneas con más de
+CARRITO_CADUCIDAD_DIAS sin confirmar o cuya fecha de servicio ya ha pasado,
+en lotes de una transacción. Se puede interrumpir y volver a lanzar.
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from myapp import carritos
+
+
+class Command(BaseCommand):
+    help = 'Borra o archiva las líneas de carrito caducadas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=settings.CARRITO_CADUCIDAD_DIAS,
+                            help='Días sin confirmar tras los que caduca una línea')
+        parser.add_argument('--archivar', action='store_true',
+                            help='Mover las líneas a CarritoItemArchivado en lugar de borrarlas')
+        parser.add_argument('--lote', type=int, default=1000, help='Líneas por transacción')
+        parser.add_argument('--max-lotes', type=int, default=None, help='Parar tras N lotes')
+        parser.add_argument('--dry-run', action='store_true', help='Solo contar las líneas afectadas')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            self.stdout.write(f"{carritos.caducadas(options['dias']).count()} líneas caducadas")
+            return
+
+        quitadas = carritos.caducar(
+            options['dias'], archivar=options['archivar'], lote=options['lote'], max_lotes=options['max_lotes']
+        )
+        accion = 'archivadas' if options['archivar'] else 'borradas'
+        self.stdout.write(self.style.SUCCESS(f'{quitadas} líneas caducadas {accion}'))
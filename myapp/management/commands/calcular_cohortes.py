@@ -0,0 +1,23 @@
+"""
+Precalcula el informe de retención por cohortes
+Uso: python manage.py calcular_cohortes
+
+Pensado para ejecutarse el día 1 de cada mes desde cron: consulta solo los
+meses cerrados que aún no están en la caché (normalmente, el que acaba de
+terminar) y deja el informe completo cacheado.
+"""
+
+from django.core.management.base import BaseCommand
+
+from myapp import cohortes
+
+
+class Command(BaseCommand):
+    help = 'Precalcula la matriz de retención por cohorte de alta'
+
+    def handle(self, *args, **options):
+        filas = cohortes.informe()['cohortes']
+        for fila in filas[-12:]:
+            retencion = ' '.join(f'{valor:4.0%}' for valor in fila['retencion'][:7])
+            self.stdout.write(f"{fila['mes']}  {fila['usuarios']:5}  {retencion}")
+        self.stdout.write(self.style.SUCCESS(f'✅ {len(filas)} cohortes calculadas'))
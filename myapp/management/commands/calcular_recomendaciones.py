@@ -0,0 +1,33 @@
+"""
+Recalcula el modelo de recomendaciones
+Uso: python manage.py calcular_recomendaciones [--dias 180] [--salida data/recomendaciones.npz]
+
+Pensado para ejecutarse cada noche desde cron. Sustituye el fichero de forma
+atómica; los workers lo recargan solos en la siguiente petición.
+"""
+
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from myapp import recomendaciones
+
+
+class Command(BaseCommand):
+    help = 'Calcula las raciones por usuario y la co-ocurrencia de platos a partir del histórico'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=settings.RECOMENDACIONES_DIAS,
+                            help='Días de histórico que se tienen en cuenta')
+        parser.add_argument('--salida', default=str(settings.RECOMENDACIONES_MODELO), help='Fichero .npz')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        modelo = recomendaciones.entrenar(options['dias'])
+        ruta = recomendaciones.guardar(modelo, options['salida'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(modelo['usuarios'])} usuarios × {len(modelo['platos'])} platos → {ruta} "
+            f"({os.path.getsize(ruta) / 1024:.0f} KB, {time.perf_counter() - inicio:.1f} s)"
+        ))
@@ -0,0 +1,30 @@
+"""
+Actualiza la segmentación RFM de clientes y empresas
+Uso: python manage.py calcular_rfm [--completo]
+
+Pensado para ejecutarse cada noche desde cron. Por defecto solo vuelve a
+agregar los clientes y empresas con recibos nuevos o cambiados (pagos fallidos
+incluidos) y repuntúa la tabla; --completo la rehace entera (p. ej. tras
+borrar recibos). Es lo único que escribe la tabla: las consultas solo la leen.
+"""
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from myapp import rfm
+from myapp.models import SegmentoRFM
+
+
+class Command(BaseCommand):
+    help = 'Actualiza la tabla de segmentación RFM desde los recibos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--completo', action='store_true', help='Recalcular todos los clientes y empresas')
+
+    def handle(self, *args, **options):
+        agregadas, repuntuadas = rfm.refrescar(options['completo'])
+        self.stdout.write(f'{agregadas} filas agregadas, {repuntuadas} con puntuación nueva')
+        nombres = dict(SegmentoRFM.SEGMENTOS)
+        for fila in SegmentoRFM.objects.order_by('segmento').values('segmento').annotate(total=Count('id')):
+            self.stdout.write(f"  {nombres.get(fila['segmento'], 'Sin puntuar'):12} {fila['total']}")
+        self.stdout.write(self.style.SUCCESS('✅ Segmentación RFM actualizada'))
@@ -0,0 +1,46 @@
+"""
+Genera las facturas semanales consolidadas de las empresas
+Uso: python manage.py facturar_empresas [--semana 2026-10-12] [--dry-run]
+
+Por defecto factura la última semana completa (lunes a domingo). Volver a
+ejecutarlo solo factura los recibos pendientes, que se suman a la factura ya
+emitida de su empresa para esa semana.
+"""
+
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.facturacion import facturar_semana, lunes_de, recibos_pendientes
+
+
+class Command(BaseCommand):
+    help = 'Genera las facturas semanales consolidadas de las empresas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--semana', help='Cualquier día de la semana a facturar (AAAA-MM-DD)')
+        parser.add_argument('--dry-run', action='store_true', help='Solo contar los recibos pendientes')
+
+    def handle(self, *args, **options):
+        if options['semana']:
+            try:
+                lunes = lunes_de(date.fromisoformat(options['semana']))
+            except ValueError:
+                raise CommandError('Fecha no válida, usa AAAA-MM-DD')
+        else:
+            lunes = lunes_de(date.today()) - timedelta(days=7)
+
+        self.stdout.write(f'🧾 Semana del {lunes} al {lunes + timedelta(days=6)}')
+
+        if options['dry_run']:
+            pendientes = recibos_pendientes(lunes)
+            self.stdout.write(
+                f'{pendientes.count()} recibos pendientes de '
+                f'{pendientes.values("empresa").distinct().count()} empresas'
+            )
+            return
+
+        facturas = facturar_semana(lunes)
+        for factura in facturas:
+            self.stdout.write(f'  {factura.numero:30} €{factura.total:>10}')
+        self.stdout.write(self.style.SUCCESS(f'✅ {len(facturas)} facturas generadas o actualizadas'))
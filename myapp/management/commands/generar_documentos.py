@@ -0,0 +1,30 @@
+"""
+Genera los lotes de PDF encolados desde el admin
+Uso: python manage.py generar_documentos [--esperar SEGUNDOS]
+
+Pensado para ejecutarse cada minuto desde cron: ejecuta los lotes pendientes
+(acción "Generar PDF (ZIP)" de recibos y facturas) y termina. Con --esperar
+sigue comprobando la cola cada SEGUNDOS, como proceso de larga duración.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from myapp import documentos
+
+
+class Command(BaseCommand):
+    help = 'Genera los lotes de documentos PDF pendientes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--esperar', type=int, default=None,
+                            help='No terminar: revisar la cola cada N segundos')
+
+    def handle(self, *args, **options):
+        while True:
+            ejecutados = documentos.ejecutar_pendientes()
+            if ejecutados:
+                self.stdout.write(self.style.SUCCESS(f'{ejecutados} lotes generados'))
+            if options['esperar'] is None:
+                break
+            time.sleep(options['esperar'])
@@ -0,0 +1,33 @@
+"""
+Geocodifica las direcciones de empresas y particulares
+Uso: python manage.py geocodificar_direcciones [--dataset fichero.csv] [--todas]
+
+Solo busca las que aún no tienen coordenadas; con --todas las vuelve a buscar
+todas (por ejemplo, tras cargar un dataset más completo).
+"""
+
+from django.core.management.base import BaseCommand
+
+from myapp.models import Cliente, Empresa
+from myapp.reparto import geocodificar_pendientes
+
+
+class Command(BaseCommand):
+    help = 'Geocodifica las direcciones de entrega con el dataset local'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dataset', help='CSV clave,latitud,longitud (por defecto GEOCODIFICACION_DATASET)')
+        parser.add_argument('--todas', action='store_true', help='Volver a geocodificar también las ya resueltas')
+
+    def handle(self, *args, **options):
+        for modelo, queryset in (
+            (Empresa, Empresa.objects.all()),
+            (Cliente, Cliente.objects.filter(empresa__isnull=True)),
+        ):
+            if options['todas']:
+                queryset.update(latitud=None, longitud=None)
+            resueltas, fallidas = geocodificar_pendientes(queryset, options['dataset'])
+            self.stdout.write(
+                f'{modelo._meta.verbose_name_plural}: {resueltas} geocodificadas, {fallidas} sin encontrar'
+            )
+        self.stdout.write(self.style.SUCCESS('✅ Geocodificación terminada'))
@@ -0,0 +1,57 @@
+"""
+Hoja de producción y reparto de un día de entrega
+Uso: python manage.py hoja_produccion [--fecha 2026-10-20] [--formato csv|json|pdf] [--salida fichero] [--planificar]
+
+Por defecto muestra la de mañana. Con --planificar además crea o actualiza las
+producciones planificadas de ese día con los totales por plato.
+"""
+
+import json
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp import hoja_produccion
+
+
+class Command(BaseCommand):
+    help = 'Genera la hoja de producción y reparto de un día de entrega'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fecha', help='Día de entrega (AAAA-MM-DD), mañana por defecto')
+        parser.add_argument('--formato', choices=['csv', 'json', 'pdf'], default='csv')
+        parser.add_argument('--salida', help='Fichero de salida (obligatorio para pdf)')
+        parser.add_argument('--planificar', action='store_true',
+                            help='Volcar los totales en las producciones planificadas')
+
+    def handle(self, *args, **options):
+        if options['fecha']:
+            try:
+                fecha = date.fromisoformat(options['fecha'])
+            except ValueError:
+                raise CommandError('Fecha no válida, usa AAAA-MM-DD')
+        else:
+            fecha = date.today() + timedelta(days=1)
+
+        datos = hoja_produccion.hoja(fecha)
+        if options['formato'] == 'pdf':
+            if not options['salida']:
+                raise CommandError('Indica --salida para el formato pdf')
+            contenido = hoja_produccion.a_pdf(datos)
+        elif options['formato'] == 'json':
+            contenido = json.dumps(datos, ensure_ascii=False, indent=2)
+        else:
+            contenido = hoja_produccion.a_csv(datos)
+
+        if options['salida']:
+            with open(options['salida'], 'wb') as fichero:
+                fichero.write(contenido if isinstance(contenido, bytes) else contenido.encode('utf-8'))
+            self.stdout.write(self.style.SUCCESS(f"✅ Hoja del {fecha} guardada en {options['salida']}"))
+        else:
+            self.stdout.write(contenido)
+
+        if options['planificar']:
+            creadas, actualizadas = hoja_produccion.planificar(fecha)
+            self.stdout.write(self.style.SUCCESS(
+                f'✅ Producciones planificadas: {creadas} creadas, {actualizadas} actualizadas'
+            ))
@@ -0,0 +1,28 @@
+"""
+Devuelve al cupo las raciones reservadas por carritos abandonados
+Uso: python manage.py liberar_reservas [--lote 1000]
+
+Pensado para ejecutarse cada pocos minutos desde cron. Libera las reservas de
+los carritos sin tocar durante CARRITO_RESERVA_MINUTOS; las líneas siguen en
+el carrito, pero en el checkout solo se venden si aún quedan raciones.
+"""
+
+from django.core.management.base import BaseCommand
+
+from myapp.servicio import liberar_caducadas
+
+
+class Command(BaseCommand):
+    help = 'Libera las reservas de raciones de los carritos abandonados'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000, help='Líneas de carrito por transacción')
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            liberadas = liberar_caducadas(limite=options['lote'])
+            total += liberadas
+            if liberadas < options['lote']:
+                break
+        self.stdout.write(self.style.SUCCESS(f'{total} líneas de carrito liberadas'))
@@ -0,0 +1,137 @@
+"""
+Prueba de carga de checkouts concurrentes sobre SQLite
+Uso: python manage.py loadtest_checkout --procesos 3 --pedidos 50
+
+Compara el perfil por defecto con el perfil de producción (SQLITE_PRODUCCION)
+lanzando varios procesos, como los workers de gunicorn, que confirman carritos
+a la vez sobre una base de datos temporal. La base de datos configurada no se
+toca.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import OperationalError
+
+from myapp.checkout import confirmar_carrito
+from myapp.models import CarritoItem, DisponibilidadPlato, Plato
+from myapp.servicio import publicar_menu
+
+PREFIJO_USUARIO = 'loadtest_'
+
+
+class Command(BaseCommand):
+    help = 'Prueba de carga de checkouts concurrentes: SQLite por defecto frente al perfil de producción'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, default=3, help='Procesos concurrentes (workers)')
+        parser.add_argument('--pedidos', type=int, default=50, help='Checkouts por proceso')
+        parser.add_argument('--platos-por-pedido', type=int, default=3)
+        # Modos internos usados por los subprocesos
+        parser.add_argument('--preparar', action='store_true', help='(interno) crear datos de prueba')
+        parser.add_argument('--worker', type=int, default=None, help='(interno) ejecutar un worker')
+
+    def handle(self, *args, **options):
+        if options['preparar']:
+            return self.preparar(options['procesos'])
+        if options['worker'] is not None:
+            return self.worker(options['worker'], options['pedidos'], options['platos_por_pedido'])
+
+        if 'sqlite' not in settings.DATABASES['default']['ENGINE']:
+            self.stdout.write(self.style.WARNING('⚠️  Esta prueba solo tiene sentido con SQLite'))
+            return
+
+        resultados = {}
+        for perfil, produccion in (('por defecto', False), ('producción', True)):
+            self.stdout.write(f'🚀 Perfil {perfil}...')
+            resultados[perfil] = self.ejecutar_perfil(produccion, options)
+
+        self.stdout.write('')
+        for perfil, r in resultados.items():
+            self.stdout.write(
+                f'{perfil:12} ok: {r["ok"]:5}  bloqueos: {r["errores"]:5}  '
+                f'{r["checkouts_por_segundo"]:7.1f} checkouts/s  p95: {r["p95_ms"]:7.1f} ms'
+            )
+
+    # ==================== PROCESO PRINCIPAL ====================
+
+    def ejecutar_perfil(self, produccion, options):
+        with tempfile.TemporaryDirectory() as directorio:
+            env = {
+                **os.environ,
+                'DB_ENGINE': 'django.db.backends.sqlite3',
+                'DB_NAME': str(Path(directorio) / 'loadtest.sqlite3'),
+                'SQLITE_PRODUCCION': str(produccion),
+            }
+            manage = [sys.executable, str(settings.BASE_DIR / 'manage.py')]
+            subprocess.run(manage + ['migrate', '--verbosity', '0'], env=env, check=True)
+            subprocess.run(
+                manage + ['loadtest_checkout', '--preparar', '--procesos', str(options['procesos'])],
+                env=env, check=True,
+            )
+
+            inicio = time.perf_counter()
+            workers = [
+                subprocess.Popen(
+                    manage + [
+                        'loadtest_checkout', '--worker', str(i),
+                        '--pedidos', str(options['pedidos']),
+                        '--platos-por-pedido', str(options['platos_por_pedido']),
+                    ],
+                    env=env, stdout=subprocess.PIPE, text=True,
+                )
+                for i in range(options['procesos'])
+            ]
+            salidas = [json.loads(w.communicate()[0].strip().splitlines()[-1]) for w in workers]
+            duracion = time.perf_counter() - inicio
+
+        latencias = sorted(l for s in salidas for l in s['latencias'])
+        ok = sum(s['ok'] for s in salidas)
+        return {
+            'ok': ok,
+            'errores': sum(s['errores'] for s in salidas),
+            'checkouts_por_segundo': ok / duracion if duracion else 0,
+            'p95_ms': latencias[int(len(latencias) * 0.95) - 1] * 1000 if latencias else 0,
+        }
+
+    # ==================== SUBPROCESOS ====================
+
+    def preparar(self, procesos):
+        platos = Plato.objects.bulk_create([
+            Plato(codigo=f'LT{i:03d}', nombre=f'Plato carga {i}', precio=Decimal('8.50'))
+            for i in range(10)
+        ])
+        # Solo se vende lo publicado: los carritos del worker son del lunes
+        DisponibilidadPlato.objects.bulk_create([DisponibilidadPlato(plato=plato, dia='LUN') for plato in platos])
+        publicar_menu(semanas=1)
+        for i in range(procesos):
+            User.objects.create_user(username=f'{PREFIJO_USUARIO}{i}')
+
+    def worker(self, numero, pedidos, platos_por_pedido):
+        usuario = User.objects.get(username=f'{PREFIJO_USUARIO}{numero}')
+        platos = list(Plato.objects.all()[:platos_por_pedido])
+        ok = errores = 0
+        latencias = []
+        for _ in range(pedidos):
+            inicio = time.perf_counter()
+            try:
+                CarritoItem.objects.bulk_create([
+                    CarritoItem(usuario=usuario, plato=plato, cantidad=1, dia_semana='LUN')
+                    for plato in platos
+                ])
+                confirmar_carrito(usuario)
+                ok += 1
+            except OperationalError:
+                # "database is locked"
+                errores += 1
+            latencias.append(time.perf_counter() - inicio)
+        self.stdout.write(json.dumps({'ok': ok, 'errores': errores, 'latencias': latencias}))
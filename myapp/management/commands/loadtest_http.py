@@ -0,0 +1,79 @@
+"""
+Prueba de carga HTTP contra uno o varios despliegues en marcha
+Uso: python manage.py loadtest_http --servidor http://localhost:8000 --servidor http://localhost:8001 \
+        --ruta /api/dashboard/estadisticas/ --sesion <sessionid> --concurrencia 50
+
+Pensado para comparar el mismo código servido con gunicorn/WSGI y con workers
+de uvicorn (USE_ASGI=True): lanza las mismas peticiones concurrentes contra
+cada servidor y muestra peticiones por segundo, p50 y p95.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+from django.core.management.base import BaseCommand
+
+RUTAS_POR_DEFECTO = [
+    '/main/',
+    '/api/dashboard/estadisticas/',
+    '/api/production/dashboard/stats/',
+    '/api/production/inventory/alerts/',
+]
+
+
+def percentil(valores, p):
+    return valores[max(int(len(valores) * p) - 1, 0)] if valores else 0
+
+
+class Command(BaseCommand):
+    help = 'Compara latencia y rendimiento HTTP de varios servidores (p. ej. WSGI frente a ASGI)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--servidor', action='append', required=True,
+                            help='URL base del servidor (repetible)')
+        parser.add_argument('--ruta', action='append', help='Ruta a probar (repetible)')
+        parser.add_argument('--peticiones', type=int, default=500, help='Peticiones por ruta y servidor')
+        parser.add_argument('--concurrencia', type=int, default=50, help='Peticiones simultáneas')
+        parser.add_argument('--sesion', default='', help='Cookie sessionid de un usuario staff')
+        parser.add_argument('--timeout', type=float, default=30)
+
+    def handle(self, *args, **options):
+        rutas = options['ruta'] or RUTAS_POR_DEFECTO
+        cabeceras = {'Cookie': f"sessionid={options['sesion']}"} if options['sesion'] else {}
+
+        for ruta in rutas:
+            self.stdout.write(f'\n🚀 {ruta}')
+            for servidor in options['servidor']:
+                r = self.medir(servidor.rstrip('/') + ruta, cabeceras, options)
+                self.stdout.write(
+                    f'{servidor:30} ok: {r["ok"]:5}  errores: {r["errores"]:5}  '
+                    f'{r["rps"]:8.1f} req/s  p50: {r["p50_ms"]:7.1f} ms  p95: {r["p95_ms"]:7.1f} ms'
+                )
+
+    def medir(self, url, cabeceras, options):
+        def peticion(_):
+            inicio = time.perf_counter()
+            try:
+                with urlopen(Request(url, headers=cabeceras), timeout=options['timeout']) as respuesta:
+                    respuesta.read()
+                    correcta = respuesta.status < 400
+            except (HTTPError, URLError, TimeoutError, ConnectionError):
+                correcta = False
+            return correcta, time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrencia']) as pool:
+            resultados = list(pool.map(peticion, range(options['peticiones'])))
+        duracion = time.perf_counter() - inicio
+
+        latencias = sorted(latencia for _, latencia in resultados)
+        ok = sum(1 for correcta, _ in resultados if correcta)
+        return {
+            'ok': ok,
+            'errores': len(resultados) - ok,
+            'rps': ok / duracion if duracion else 0,
+            'p50_ms': percentil(latencias, 0.50) * 1000,
+            'p95_ms': percentil(latencias, 0.95) * 1000,
+        }
@@ -0,0 +1,35 @@
+"""
+Publica las fechas de servicio de las próximas semanas según el menú semanal
+Uso: python manage.py publicar_menu [--desde 2026-10-26] [--semanas 4]
+
+Pensado para ejecutarse cada noche desde cron (después de aplicar_rotacion_menu
+los domingos). Solo crea las fechas que faltan: las ya publicadas conservan su
+capacidad y sus ventas.
+"""
+
+from datetime import date
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.servicio import publicar_menu
+
+
+class Command(BaseCommand):
+    help = 'Publica las fechas de servicio de las próximas semanas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='Primera fecha (AAAA-MM-DD), hoy por defecto')
+        parser.add_argument('--semanas', type=int, default=settings.MENU_SEMANAS_PUBLICADAS,
+                            help='Semanas a publicar')
+
+    def handle(self, *args, **options):
+        desde = None
+        if options['desde']:
+            try:
+                desde = date.fromisoformat(options['desde'])
+            except ValueError:
+                raise CommandError('Fecha no válida, usa AAAA-MM-DD')
+
+        creadas = publicar_menu(desde, options['semanas'])
+        self.stdout.write(self.style.SUCCESS(f'{creadas} fechas de servicio publicadas'))
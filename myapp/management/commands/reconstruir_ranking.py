@@ -0,0 +1,28 @@
+"""
+Reconstruye el ranking de platos más vendidos desde ReciboItem
+Uso: python manage.py reconstruir_ranking
+
+Pensado para ejecutarse cada noche (cron): corrige cualquier desvío de las
+sumas incrementales de la caché. Es el único momento, aparte del arranque en
+frío, en que se recorre todo el histórico de ventas. Solo afecta a los servidores si la caché es
+compartida (Redis); con LocMemCache cada proceso reconstruye la suya al caducar.
+"""
+
+from django.core.management.base import BaseCommand
+
+from myapp import ranking
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el ranking de platos más vendidos'
+
+    def handle(self, *args, **options):
+        ranking.invalidar_ranking()
+        ranking.invalidar_platos()
+        ranking.reconstruir()
+
+        for ventana in ranking.VENTANAS:
+            top = ranking.mas_vendidos(ventana, limite=5)
+            resumen = ', '.join(f"{fila['nombre']} ({fila['cantidad']})" for fila in top) or '-'
+            self.stdout.write(f'{ventana:6} {resumen}')
+        self.stdout.write(self.style.SUCCESS('✅ Ranking reconstruido'))
@@ -0,0 +1,103 @@
+"""
+Instantánea cacheada del menú de cada día.
+
+``menu_del_dia`` devuelve la lista de ``DisponibilidadFecha`` (con su plato ya
+cargado) de una fecha de servicio y la guarda en la caché. Los filtros por
+grupo y alérgenos se aplican en memoria sobre esa lista, sin consultas
+adicionales.
+
+La caché se invalida subiendo un número de versión (``invalidar_menu``) cada
+vez que cambia un plato o se publican o retiran fechas. Las raciones vendidas
+no invalidan la instantánea: el límite se comprueba en el checkout. Dentro de
+``invalidacion_agrupada`` las invalidaciones se acumulan y se aplican una sola
+vez al salir del bloque.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.core.cache import cache
+
+from .models import DisponibilidadFecha
+
+CLAVE_VERSION = 'menu:version'
+TIMEOUT_MENU = 3600  # 1 hora
+
+_agrupadas = ContextVar('menu_invalidaciones_agrupadas', default=None)
+
+
+def version_menu():
+    version = cache.get(CLAVE_VERSION)
+    if version is None:
+        cache.add(CLAVE_VERSION, 1, None)
+        version = cache.get(CLAVE_VERSION, 1)
+    return version
+
+
+async def aversion_menu():
+    version = await cache.aget(CLAVE_VERSION)
+    if version is None:
+        await cache.aadd(CLAVE_VERSION, 1, None)
+        version = await cache.aget(CLAVE_VERSION, 1)
+    return version
+
+
+def invalidar_menu():
+    """Descarta todas las instantáneas del menú"""
+    pendientes = _agrupadas.get()
+    if pendientes is not None:
+        pendientes.append(True)
+        return
+    try:
+        cache.incr(CLAVE_VERSION)
+    except ValueError:
+        cache.set(CLAVE_VERSION, 2, None)
+
+
+@contextmanager
+def invalidacion_agrupada():
+    """Agrupa las invalidaciones del bloque (p. ej. una por fila borrada) en una"""
+    pendientes = []
+    token = _agrupadas.set(pendientes)
+    try:
+        yield
+    finally:
+        _agrupadas.reset(token)
+        if pendientes:
+            invalidar_menu()
+
+
+def _consulta_menu(fecha):
+    return (
+        DisponibilidadFecha.objects.filter(fecha=fecha)
+        .select_related('plato')
+        .order_by('plato__nombre')
+    )
+
+
+def menu_del_dia(fecha):
+    """Disponibilidades de la fecha de servicio ``fecha`` con su plato, ordenadas por nombre"""
+    clave = f'menu:{version_menu()}:{fecha.isoformat()}'
+    menu = cache.get(clave)
+    if menu is None:
+        menu = list(_consulta_menu(fecha))
+        cache.set(clave, menu, TIMEOUT_MENU)
+    return menu
+
+
+async def amenu_del_dia(fecha):
+    """Versión asíncrona de ``menu_del_dia``"""
+    clave = f'menu:{await aversion_menu()}:{fecha.isoformat()}'
+    menu = await cache.aget(clave)
+    if menu is None:
+        menu = [disponibilidad async for disponibilidad in _consulta_menu(fecha)]
+        await cache.aset(clave, menu, TIMEOUT_MENU)
+    return menu
+
+
+def filtrar_menu(menu, grupo=None, sin_alergenos=0):
+    """Filtra una instantánea en memoria por grupo y alérgenos excluidos"""
+    return [
+        disponibilidad for disponibilidad in menu
+        if (not grupo or disponibilidad.plato.grupo == grupo)
+        and not disponibilidad.plato.alergenos_mascara & sin_alergenos
+    ]
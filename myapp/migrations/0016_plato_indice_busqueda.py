@@ -0,0 +1,79 @@
+"""
+Índice de búsqueda de platos (ver ``myapp/search.py``).
+
+PostgreSQL: columna tsvector generada con índice GIN e índice de trigramas
+sobre ``nombre``. SQLite: tabla virtual FTS5 más su tabla de vocabulario.
+"""
+
+from django.db import migrations
+
+POSTGRES_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    ALTER TABLE myapp_plato ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('spanish', coalesce(nombre, '')), 'A') ||
+        setweight(to_tsvector('spanish', coalesce(ingredientes, '')), 'B') ||
+        setweight(to_tsvector('spanish', coalesce(alergenos, '')), 'C')
+    ) STORED
+    """,
+    "CREATE INDEX myapp_plato_search_vector_gin ON myapp_plato USING gin (search_vector)",
+    "CREATE INDEX myapp_plato_nombre_trgm ON myapp_plato USING gin (nombre gin_trgm_ops)",
+]
+
+POSTGRES_REVERSE_SQL = [
+    "DROP INDEX IF EXISTS myapp_plato_nombre_trgm",
+    "DROP INDEX IF EXISTS myapp_plato_search_vector_gin",
+    "ALTER TABLE myapp_plato DROP COLUMN IF EXISTS search_vector",
+]
+
+SQLITE_SQL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS myapp_plato_fts USING fts5(
+        nombre, ingredientes, alergenos,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    "CREATE VIRTUAL TABLE IF NOT EXISTS myapp_plato_fts_vocab USING fts5vocab(myapp_plato_fts, 'row')",
+    """
+    INSERT INTO myapp_plato_fts (rowid, nombre, ingredientes, alergenos)
+    SELECT id, nombre, ingredientes, alergenos FROM myapp_plato
+    """,
+]
+
+SQLITE_REVERSE_SQL = [
+    "DROP TABLE IF EXISTS myapp_plato_fts_vocab",
+    "DROP TABLE IF EXISTS myapp_plato_fts",
+]
+
+
+def _ejecutar(schema_editor, sentencias):
+    for sql in sentencias:
+        schema_editor.execute(sql)
+
+
+def crear_indice(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        _ejecutar(schema_editor, POSTGRES_SQL)
+    elif vendor == 'sqlite':
+        _ejecutar(schema_editor, SQLITE_SQL)
+
+
+def eliminar_indice(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        _ejecutar(schema_editor, POSTGRES_REVERSE_SQL)
+    elif vendor == 'sqlite':
+        _ejecutar(schema_editor, SQLITE_REVERSE_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0015_inventario_movimientoinventario_produccion_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, eliminar_indice),
+    ]
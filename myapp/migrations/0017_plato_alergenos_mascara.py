@@ -0,0 +1,67 @@
+# Generated by Django 5.2.1 on 2026-10-19 11:13
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+# Copia de la detección de myapp.alergenos en el momento de esta migración: la
+# migración no debe cambiar aunque el módulo evolucione. Los bits siguen el
+# orden de la lista.
+PALABRAS = [
+    ('gluten', 'trigo', 'cebada', 'centeno', 'avena', 'espelta', 'kamut'),
+    ('crustaceo', 'gamba', 'langostino', 'cigala', 'cangrejo', 'bogavante'),
+    ('huevo',),
+    ('pescado', 'merluza', 'bacalao', 'atun', 'salmon', 'anchoa'),
+    ('cacahuete', 'mani'),
+    ('soja',),
+    ('leche', 'lacteo', 'lactosa', 'queso', 'nata', 'mantequilla', 'yogur'),
+    ('frutos de cascara', 'frutos secos', 'almendra', 'avellana', 'nuez', 'nueces',
+     'anacardo', 'pistacho', 'macadamia', 'pacana'),
+    ('apio',),
+    ('mostaza',),
+    ('sesamo',),
+    ('sulfito', 'azufre'),
+    ('altramuz', 'altramuces'),
+    ('molusco', 'mejillon', 'almeja', 'calamar', 'sepia', 'pulpo', 'berberecho'),
+]
+
+
+def _alternativas(palabras):
+    return r'\b(?:' + '|'.join(re.escape(p) for p in palabras) + r')(?:s|es)?\b'
+
+
+_PATRONES = [(1 << posicion, re.compile(_alternativas(palabras))) for posicion, palabras in enumerate(PALABRAS)]
+_CUALQUIERA = _alternativas(p for palabras in PALABRAS for p in palabras)
+_NEGACION = re.compile(r'\b(?:sin|libres? de)\s+' + _CUALQUIERA + r'(?:\s+(?:ni|o)\s+' + _CUALQUIERA + r')*')
+
+
+def mascara_desde_texto(texto):
+    texto = unicodedata.normalize('NFKD', texto or '')
+    texto = ''.join(c for c in texto if not unicodedata.combining(c)).lower()
+    texto = _NEGACION.sub(' ', texto)
+    return sum(bit for bit, patron in _PATRONES if patron.search(texto))
+
+
+def calcular_mascaras(apps, schema_editor):
+    Plato = apps.get_model('myapp', 'Plato')
+    platos = list(Plato.objects.only('id', 'alergenos'))
+    for plato in platos:
+        plato.alergenos_mascara = mascara_desde_texto(plato.alergenos)
+    Plato.objects.bulk_update(platos, ['alergenos_mascara'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0016_plato_indice_busqueda'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plato',
+            name='alergenos_mascara',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text="Alérgenos UE detectados en 'alergenos', como máscara de bits"),
+        ),
+        migrations.RunPython(calcular_mascaras, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.1 on 2026-10-19 11:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0017_plato_alergenos_mascara'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='movimientoinventario',
+            name='fecha_movimiento',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='pedidohistorico',
+            name='fecha_emision',
+            field=models.DateField(auto_now_add=True, db_index=True),
+        ),
+        migrations.CreateModel(
+            name='MovimientoInventarioArchivado',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('tipo_movimiento', models.CharField(choices=[('ENTRADA', 'Entrada (Producción)'), ('SALIDA', 'Salida (Venta)'), ('AJUSTE', 'Ajuste de Inventario'), ('MERMA', 'Merma/Desperdicio')], max_length=20)),
+                ('cantidad', models.IntegerField()),
+                ('motivo', models.CharField(max_length=200)),
+                ('fecha_movimiento', models.DateTimeField(db_index=True)),
+                ('inventario', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='myapp.inventario')),
+                ('recibo', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='myapp.recibo')),
+                ('usuario_responsable', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Movimiento de inventario archivado',
+                'verbose_name_plural': 'Movimientos de inventario archivados',
+            },
+        ),
+        migrations.CreateModel(
+            name='PedidoHistoricoArchivado',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('cantidad', models.PositiveIntegerField(default=1)),
+                ('dia_semana', models.CharField(choices=[('LUN', 'Lunes'), ('MAR', 'Martes'), ('MIE', 'Miércoles'), ('JUE', 'Jueves'), ('VIE', 'Viernes'), ('SAB', 'Sábado')], max_length=3)),
+                ('fecha_emision', models.DateField(db_index=True)),
+                ('plato', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='myapp.plato')),
+                ('usuario', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Pedido histórico archivado',
+                'verbose_name_plural': 'Pedidos históricos archivados',
+            },
+        ),
+    ]
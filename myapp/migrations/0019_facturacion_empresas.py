@@ -0,0 +1,57 @@
+# Generated by Django 5.2.1 on 2026-10-19 11:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0018_archivo_historico'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='empresa',
+            name='facturacion_consolidada',
+            field=models.BooleanField(default=False, help_text='Los pedidos de sus empleados no se pagan uno a uno: se facturan juntos cada semana', verbose_name='Facturación semanal consolidada'),
+        ),
+        migrations.CreateModel(
+            name='FacturaEmpresa',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('numero', models.CharField(max_length=80, unique=True)),
+                ('semana_inicio', models.DateField(help_text='Lunes de la semana facturada')),
+                ('semana_fin', models.DateField(help_text='Domingo de la semana facturada')),
+                ('total', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('fecha_emision', models.DateTimeField(auto_now_add=True)),
+                ('pagada', models.BooleanField(default=False)),
+                ('fecha_pago', models.DateTimeField(blank=True, null=True)),
+                ('empresa', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='facturas', to='myapp.empresa')),
+            ],
+            options={
+                'verbose_name': 'Factura de empresa',
+                'verbose_name_plural': 'Facturas de empresa',
+                'ordering': ['-semana_inicio', 'empresa'],
+            },
+        ),
+        migrations.AddField(
+            model_name='recibo',
+            name='factura',
+            field=models.ForeignKey(blank=True, help_text='Factura semanal consolidada que incluye este recibo', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='recibos', to='myapp.facturaempresa'),
+        ),
+        migrations.CreateModel(
+            name='LineaFacturaEmpresa',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad', models.PositiveIntegerField()),
+                ('precio_unitario', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('factura', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lineas', to='myapp.facturaempresa')),
+                ('plato', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='myapp.plato')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='facturaempresa',
+            constraint=models.UniqueConstraint(fields=('empresa', 'semana_inicio'), name='factura_empresa_semana_unica'),
+        ),
+    ]
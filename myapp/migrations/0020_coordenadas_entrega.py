@@ -0,0 +1,33 @@
+# Generated by Django 5.2.1 on 2026-10-19 11:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0019_facturacion_empresas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cliente',
+            name='latitud',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='cliente',
+            name='longitud',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='empresa',
+            name='latitud',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='empresa',
+            name='longitud',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
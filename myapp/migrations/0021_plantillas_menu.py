@@ -0,0 +1,66 @@
+# Generated by Django 5.2.1 on 2026-10-19 11:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0020_coordenadas_entrega'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlantillaMenu',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100, unique=True)),
+                ('descripcion', models.TextField(blank=True)),
+                ('creada', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Plantilla de menú',
+                'verbose_name_plural': 'Plantillas de menú',
+                'ordering': ['nombre'],
+            },
+        ),
+        migrations.CreateModel(
+            name='RotacionMenu',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100, unique=True)),
+                ('fecha_inicio', models.DateField(help_text='Lunes de la semana que usa el primer paso')),
+                ('activa', models.BooleanField(default=True, help_text='Solo una rotación activa se aplica cada semana')),
+            ],
+            options={
+                'verbose_name': 'Rotación de menú',
+                'verbose_name_plural': 'Rotaciones de menú',
+                'ordering': ['-activa', 'nombre'],
+            },
+        ),
+        migrations.CreateModel(
+            name='RotacionMenuPaso',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('orden', models.PositiveIntegerField(default=0)),
+                ('plantilla', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='myapp.plantillamenu')),
+                ('rotacion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pasos', to='myapp.rotacionmenu')),
+            ],
+            options={
+                'ordering': ['orden', 'id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PlantillaMenuPlato',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.CharField(choices=[('LUN', 'Lunes'), ('MAR', 'Martes'), ('MIE', 'Miércoles'), ('JUE', 'Jueves'), ('VIE', 'Viernes'), ('SAB', 'Sábado')], max_length=3)),
+                ('plantilla', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='casillas', to='myapp.plantillamenu')),
+                ('plato', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='myapp.plato')),
+            ],
+            options={
+                'unique_together': {('plantilla', 'plato', 'dia')},
+            },
+        ),
+    ]
@@ -0,0 +1,100 @@
+# Generated by Django 5.2.1 on 2026-10-19 12:02
+
+from datetime import date, timedelta
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+DIAS = ['LUN', 'MAR', 'MIE', 'JUE', 'VIE', 'SAB']
+SEMANAS_PUBLICADAS = 4
+
+
+def proxima_fecha(codigo, desde):
+    return desde + timedelta(days=(DIAS.index(codigo) - desde.weekday()) % 7)
+
+
+def fechar_lineas(apps, schema_editor):
+    """Pasa los códigos de día a fechas de servicio concretas
+
+    Carritos: la próxima fecha de ese día a partir de hoy. Histórico y archivo:
+    la primera fecha de ese día a partir de la fecha del pedido.
+    """
+    hoy = date.today()
+    CarritoItem = apps.get_model('myapp', 'CarritoItem')
+    for codigo in DIAS:
+        CarritoItem.objects.filter(dia_semana=codigo, fecha_servicio__isnull=True).update(
+            fecha_servicio=proxima_fecha(codigo, hoy)
+        )
+
+    for nombre in ('PedidoHistorico', 'PedidoHistoricoArchivado'):
+        modelo = apps.get_model('myapp', nombre)
+        lote = []
+        for pedido in modelo.objects.filter(fecha_servicio__isnull=True).only(
+            'id', 'dia_semana', 'fecha_emision'
+        ).iterator(chunk_size=2000):
+            if pedido.dia_semana in DIAS:
+                pedido.fecha_servicio = proxima_fecha(pedido.dia_semana, pedido.fecha_emision)
+                lote.append(pedido)
+            if len(lote) >= 2000:
+                modelo.objects.bulk_update(lote, ['fecha_servicio'])
+                lote = []
+        modelo.objects.bulk_update(lote, ['fecha_servicio'])
+
+
+def publicar_menu(apps, schema_editor):
+    """Publica las próximas semanas a partir del menú semanal"""
+    DisponibilidadPlato = apps.get_model('myapp', 'DisponibilidadPlato')
+    DisponibilidadFecha = apps.get_model('myapp', 'DisponibilidadFecha')
+    hoy = date.today()
+    DisponibilidadFecha.objects.bulk_create([
+        DisponibilidadFecha(plato_id=plato_id, fecha=proxima_fecha(dia, hoy) + timedelta(weeks=semana))
+        for plato_id, dia in DisponibilidadPlato.objects.filter(dia__in=DIAS).values_list('plato_id', 'dia')
+        for semana in range(SEMANAS_PUBLICADAS)
+    ], ignore_conflicts=True, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0021_plantillas_menu'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='carritoitem',
+            name='fecha_servicio',
+            field=models.DateField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='pedidohistorico',
+            name='fecha_servicio',
+            field=models.DateField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='pedidohistoricoarchivado',
+            name='fecha_servicio',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='plato',
+            name='capacidad_diaria',
+            field=models.PositiveIntegerField(blank=True, help_text='Raciones a la venta por fecha de servicio al publicar el menú (vacío: sin límite)', null=True),
+        ),
+        migrations.CreateModel(
+            name='DisponibilidadFecha',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('capacidad', models.PositiveIntegerField(blank=True, help_text='Raciones a la venta (vacío: sin límite)', null=True)),
+                ('vendidas', models.PositiveIntegerField(default=0)),
+                ('plato', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fechas_servicio', to='myapp.plato')),
+            ],
+            options={
+                'verbose_name': 'Disponibilidad por fecha',
+                'verbose_name_plural': 'Disponibilidades por fecha',
+                'unique_together': {('fecha', 'plato')},
+            },
+        ),
+        migrations.RunPython(fechar_lineas, migrations.RunPython.noop),
+        migrations.RunPython(publicar_menu, migrations.RunPython.noop),
+    ]
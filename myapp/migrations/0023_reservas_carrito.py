@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-19 12:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0022_fechas_servicio'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='carritoitem',
+            name='reserva_expira',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='carritoitem',
+            name='reservada',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='disponibilidadfecha',
+            name='reservadas',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.1 on 2026-10-19 13:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Sum
+
+
+def fusionar_duplicadas(apps, schema_editor):
+    """Deja una línea por (usuario, plato, fecha_servicio): la primera, con la suma"""
+    CarritoItem = apps.get_model('myapp', 'CarritoItem')
+    grupos = (
+        CarritoItem.objects.exclude(fecha_servicio__isnull=True)
+        .values('usuario', 'plato', 'fecha_servicio')
+        .annotate(lineas=Count('id'), primera=Min('id'), cantidad=Sum('cantidad'),
+                  reservada=Sum('reservada'), expira=Max('reserva_expira'))
+        .filter(lineas__gt=1).order_by()
+    )
+    for grupo in list(grupos):
+        CarritoItem.objects.filter(id=grupo['primera']).update(
+            cantidad=grupo['cantidad'], reservada=grupo['reservada'], reserva_expira=grupo['expira']
+        )
+        CarritoItem.objects.filter(
+            usuario=grupo['usuario'], plato=grupo['plato'], fecha_servicio=grupo['fecha_servicio']
+        ).exclude(id=grupo['primera']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0023_reservas_carrito'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(fusionar_duplicadas, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='carritoitem',
+            unique_together={('usuario', 'plato', 'fecha_servicio')},
+        ),
+        migrations.CreateModel(
+            name='CarritoItemArchivado',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('cantidad', models.PositiveIntegerField(default=1)),
+                ('dia_semana', models.CharField(choices=[('LUN', 'Lunes'), ('MAR', 'Martes'), ('MIE', 'Miércoles'), ('JUE', 'Jueves'), ('VIE', 'Viernes'), ('SAB', 'Sábado')], max_length=3)),
+                ('fecha_servicio', models.DateField(blank=True, null=True)),
+                ('fecha_agregado', models.DateTimeField(db_index=True)),
+                ('plato', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='myapp.plato')),
+                ('usuario', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Carrito abandonado',
+                'verbose_name_plural': 'Carritos abandonados',
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.1 on 2026-10-19 13:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0024_caducidad_carritos'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pedidohistorico',
+            index=models.Index(fields=['usuario', 'fecha_servicio'], name='pedido_usuario_fecha_idx'),
+        ),
+    ]
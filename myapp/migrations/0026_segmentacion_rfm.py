@@ -0,0 +1,36 @@
+# Generated by Django 5.2.1 on 2026-10-19 14:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0025_indice_pedidos_usuario_fecha'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SegmentoRFM',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ultima_compra', models.DateTimeField(db_index=True)),
+                ('recibos', models.PositiveIntegerField(default=0)),
+                ('importe', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('ultimo_recibo', models.BigIntegerField(default=0, help_text='Último recibo contado (refresco incremental)')),
+                ('r', models.PositiveSmallIntegerField(default=0, verbose_name='R')),
+                ('f', models.PositiveSmallIntegerField(default=0, verbose_name='F')),
+                ('m', models.PositiveSmallIntegerField(default=0, verbose_name='M')),
+                ('segmento', models.CharField(blank=True, choices=[('CAMPEONES', 'Campeones'), ('LEALES', 'Leales'), ('NUEVOS', 'Nuevos'), ('EN_RIESGO', 'En riesgo'), ('PERDIDOS', 'Perdidos'), ('POTENCIALES', 'Potenciales')], db_index=True, max_length=12)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+                ('cliente', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='rfm', to='myapp.cliente')),
+                ('empresa', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='rfm', to='myapp.empresa')),
+            ],
+            options={
+                'verbose_name': 'Segmento RFM',
+                'verbose_name_plural': 'Segmentos RFM',
+                'constraints': [models.CheckConstraint(condition=models.Q(('cliente__isnull', True), ('empresa__isnull', True), _connector='XOR'), name='rfm_cliente_o_empresa')],
+            },
+        ),
+    ]
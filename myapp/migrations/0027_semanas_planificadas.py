@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-19 16:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0026_segmentacion_rfm'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SemanaMenu',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lunes', models.DateField(unique=True)),
+                ('aplicada', models.DateTimeField(auto_now=True)),
+                ('plantilla', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='semanas', to='myapp.plantillamenu')),
+            ],
+            options={
+                'verbose_name': 'Semana planificada',
+                'verbose_name_plural': 'Semanas planificadas',
+                'ordering': ['-lunes'],
+            },
+        ),
+    ]
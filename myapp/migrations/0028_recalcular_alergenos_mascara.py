@@ -0,0 +1,19 @@
+# Generated by Django 5.2.1 on 2026-10-19 16:20
+
+from importlib import import_module
+
+from django.db import migrations
+
+# La detección congelada en 0017 (palabras completas y sin menciones negadas)
+calcular_mascaras = import_module('myapp.migrations.0017_plato_alergenos_mascara').calcular_mascaras
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0027_semanas_planificadas'),
+    ]
+
+    operations = [
+        migrations.RunPython(calcular_mascaras, migrations.RunPython.noop),
+    ]
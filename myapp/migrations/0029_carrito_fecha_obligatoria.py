@@ -0,0 +1,53 @@
+# Generated by Django 5.2.1 on 2026-10-19 16:35
+
+from datetime import date, timedelta
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Sum
+
+DIAS = ['LUN', 'MAR', 'MIE', 'JUE', 'VIE', 'SAB']
+
+
+def fechar_y_fusionar(apps, schema_editor):
+    """Da fecha a las líneas que aún no la tienen y deja una por (usuario, plato, fecha)
+
+    Con ``fecha_servicio`` NULL la restricción única no impedía duplicados. Las
+    líneas sin un día válido no se pueden servir y se borran.
+    """
+    CarritoItem = apps.get_model('myapp', 'CarritoItem')
+    hoy = date.today()
+    for codigo in DIAS:
+        CarritoItem.objects.filter(dia_semana=codigo, fecha_servicio__isnull=True).update(
+            fecha_servicio=hoy + timedelta(days=(DIAS.index(codigo) - hoy.weekday()) % 7)
+        )
+    CarritoItem.objects.filter(fecha_servicio__isnull=True).delete()
+
+    grupos = (
+        CarritoItem.objects.values('usuario', 'plato', 'fecha_servicio')
+        .annotate(lineas=Count('id'), primera=Min('id'), cantidad=Sum('cantidad'),
+                  reservada=Sum('reservada'), expira=Max('reserva_expira'))
+        .filter(lineas__gt=1).order_by()
+    )
+    for grupo in list(grupos):
+        CarritoItem.objects.filter(id=grupo['primera']).update(
+            cantidad=grupo['cantidad'], reservada=grupo['reservada'], reserva_expira=grupo['expira']
+        )
+        CarritoItem.objects.filter(
+            usuario=grupo['usuario'], plato=grupo['plato'], fecha_servicio=grupo['fecha_servicio']
+        ).exclude(id=grupo['primera']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0028_recalcular_alergenos_mascara'),
+    ]
+
+    operations = [
+        migrations.RunPython(fechar_y_fusionar, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='carritoitem',
+            name='fecha_servicio',
+            field=models.DateField(blank=True, db_index=True),
+        ),
+    ]
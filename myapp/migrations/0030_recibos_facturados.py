@@ -0,0 +1,49 @@
+# Generated by Django 5.2.1 on 2026-10-19 16:50
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def marcar_facturados(apps, schema_editor):
+    """Los recibos B2B sin cobrar pasan a 'facturado' y se fusionan las líneas repetidas"""
+    Recibo = apps.get_model('myapp', 'Recibo')
+    Recibo.objects.filter(metodo_pago='Factura semanal', pagado=False, estado_pago='pendiente').update(
+        estado_pago='facturado'
+    )
+
+    LineaFacturaEmpresa = apps.get_model('myapp', 'LineaFacturaEmpresa')
+    grupos = (
+        LineaFacturaEmpresa.objects.values('factura', 'plato', 'precio_unitario')
+        .annotate(lineas=Count('id'), primera=Min('id'), cantidad=Sum('cantidad'))
+        .filter(lineas__gt=1).order_by()
+    )
+    for grupo in list(grupos):
+        LineaFacturaEmpresa.objects.filter(id=grupo['primera']).update(cantidad=grupo['cantidad'])
+        LineaFacturaEmpresa.objects.filter(
+            factura=grupo['factura'], plato=grupo['plato'], precio_unitario=grupo['precio_unitario']
+        ).exclude(id=grupo['primera']).delete()
+
+
+def desmarcar_facturados(apps, schema_editor):
+    Recibo = apps.get_model('myapp', 'Recibo')
+    Recibo.objects.filter(estado_pago='facturado').update(estado_pago='pendiente')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0029_carrito_fecha_obligatoria'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recibo',
+            name='estado_pago',
+            field=models.CharField(choices=[('pendiente', 'Pendiente'), ('completado', 'Completado'), ('fallido', 'Fallido'), ('facturado', 'En factura semanal')], default='pendiente', max_length=30),
+        ),
+        migrations.RunPython(marcar_facturados, desmarcar_facturados),
+        migrations.AddConstraint(
+            model_name='lineafacturaempresa',
+            constraint=models.UniqueConstraint(fields=('factura', 'plato', 'precio_unitario'), name='linea_factura_unica'),
+        ),
+    ]
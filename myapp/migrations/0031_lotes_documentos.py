@@ -0,0 +1,32 @@
+# Generated by Django 5.2.1 on 2026-10-19 17:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0030_recibos_facturados'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoteDocumentos',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('recibo', 'Recibos'), ('factura', 'Facturas')], max_length=10)),
+                ('ids', models.JSONField(help_text='Claves primarias de los documentos')),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('hechos', models.PositiveIntegerField(default=0)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('en_curso', 'En curso'), ('terminada', 'Terminada'), ('error', 'Error')], db_index=True, default='pendiente', max_length=10)),
+                ('zip', models.CharField(blank=True, max_length=255)),
+                ('error', models.TextField(blank=True)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Lote de documentos',
+                'verbose_name_plural': 'Lotes de documentos',
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.1 on 2026-10-19 17:20
+
+from django.db import migrations, models
+from django.db.models import F
+from django.utils import timezone
+
+
+def fechar_cambios(apps, schema_editor):
+    """Los recibos existentes se dan por cambiados en su fecha de compra"""
+    Recibo = apps.get_model('myapp', 'Recibo')
+    Recibo.objects.update(actualizado=F('fecha_compra'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0031_lotes_documentos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recibo',
+            name='actualizado',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fechar_cambios, migrations.RunPython.noop),
+        # Sin marca, el próximo calcular_rfm vuelve a agregar a todos una vez
+        migrations.RemoveField(
+            model_name='segmentorfm',
+            name='ultimo_recibo',
+        ),
+        migrations.AddField(
+            model_name='segmentorfm',
+            name='recibos_hasta',
+            field=models.DateTimeField(blank=True, help_text='Cambios de recibos ya contados (Recibo.actualizado, refresco incremental)', null=True),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.1 on 2026-10-19 17:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0032_marca_cambios_recibos'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='facturaempresa',
+            name='factura_empresa_semana_unica',
+        ),
+        migrations.AddConstraint(
+            model_name='facturaempresa',
+            constraint=models.UniqueConstraint(condition=models.Q(('pagada', False)), fields=('empresa', 'semana_inicio'), name='factura_empresa_semana_abierta'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.1 on 2026-10-19 17:50
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0033_facturas_complementarias'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recibo',
+            name='fecha_compra',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+    ]
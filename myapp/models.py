@@ -5,6 +5,8 @@ from django.core.validators import EmailValidator
 from decimal import Decimal
 from django.utils import timezone
 
+from .alergenos import mascara_desde_texto
+
 # -------------------- MODELO CLIENTE --------------------
 class Cliente(models.Model):
     Nombre_Completo = models.CharField(max_length=100)
@@ -17,6 +19,9 @@ class Cliente(models.Model):
     celular = models.CharField(max_length=20, blank=True, null=True)
     dni = models.CharField("NIE/DNI", max_length=30, blank=True, null=True)
     correo = models.EmailField("Correo electrónico", validators=[EmailValidator()], null=True, blank=True)
+    # Coordenadas de direccion_particular (las rellena myapp.reparto al geocodificar)
+    latitud = models.FloatField(null=True, blank=True)
+    longitud = models.FloatField(null=True, blank=True)
 
     def __str__(self):
         if self.es_particular:
@@ -30,6 +35,13 @@ class Empresa(models.Model):
     nombre = models.CharField(max_length=100)
     direccion = models.TextField("Dirección de entrega", blank=True, null=True)
     cif = models.CharField("CIF", max_length=20, unique=True)
+    facturacion_consolidada = models.BooleanField(
+        "Facturación semanal consolidada", default=False,
+        help_text="Los pedidos de sus empleados no se pagan uno a uno: se facturan juntos cada semana"
+    )
+    # Coordenadas de la dirección de entrega (las rellena myapp.reparto al geocodificar)
+    latitud = models.FloatField(null=True, blank=True)
+    longitud = models.FloatField(null=True, blank=True)
 
     def __str__(self):
         return f"{self.nombre} - {self.direccion}"
@@ -56,6 +68,10 @@ class Plato(models.Model):
 
     ingredientes = models.TextField(blank=True, help_text="Lista de ingredientes del plato")
     alergenos = models.TextField(blank=True, help_text="Alergenos presentes en el plato")
+    alergenos_mascara = models.PositiveIntegerField(
+        default=0, editable=False,
+        help_text="Alérgenos UE detectados en 'alergenos', como máscara de bits"
+    )
     vida_util = models.CharField(max_length=100, default="5 días")
 
     precio_sin_iva = models.DecimalField(max_digits=6, decimal_places=2, default=5.99)
@@ -73,10 +89,15 @@ class Plato(models.Model):
         ('COMUN', 'Común'),
     ]
     estado = models.CharField(max_length=30, choices=ESTADO_CHOICES, default='NUEVO')
+    capacidad_diaria = models.PositiveIntegerField(
+        null=True, blank=True,
+        help_text="Raciones a la venta por fecha de servicio al publicar el menú (vacío: sin límite)"
+    )
 
     def save(self, *args, **kwargs):
         iva = Decimal('1.10')  # IVA como Decimal
         self.precio_sin_iva = (self.precio / iva).quantize(Decimal('0.01'))  # redondeo a 2 decimales
+        self.alergenos_mascara = mascara_desde_texto(self.alergenos)
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -102,6 +123,107 @@ class DisponibilidadPlato(models.Model):
     def __str__(self):
         return f"{self.plato.nombre} disponible el {self.get_dia_display()}"
 
+
+class DisponibilidadFecha(models.Model):
+    """Plato a la venta en una fecha de servicio concreta
+
+    Se publica a partir del menú semanal (``DisponibilidadPlato``), ver
+    myapp/servicio.py. ``reservadas`` (en carritos) y ``vendidas`` solo se
+    modifican con UPDATE condicionales.
+    """
+    plato = models.ForeignKey(Plato, related_name='fechas_servicio', on_delete=models.CASCADE)
+    fecha = models.DateField()
+    capacidad = models.PositiveIntegerField(null=True, blank=True, help_text="Raciones a la venta (vacío: sin límite)")
+    reservadas = models.PositiveIntegerField(default=0)
+    vendidas = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        # El índice único empieza por la fecha: el menú de un día es un rango del índice
+        unique_together = ('fecha', 'plato')
+        verbose_name = "Disponibilidad por fecha"
+        verbose_name_plural = "Disponibilidades por fecha"
+
+    def get_dia_display(self):
+        dias = DisponibilidadPlato.DIAS_SEMANA
+        return dias[self.fecha.weekday()][1] if self.fecha.weekday() < len(dias) else ''
+
+    @property
+    def restantes(self):
+        """Raciones que quedan (``None`` si no hay límite)"""
+        return None if self.capacidad is None else max(self.capacidad - self.vendidas - self.reservadas, 0)
+
+    def __str__(self):
+        return f"{self.plato.nombre} el {self.fecha:%d/%m/%Y}"
+
+# -------------------- PLANTILLAS Y ROTACIONES DE MENÚ --------------------
+class PlantillaMenu(models.Model):
+    """Conjunto guardado de casillas plato × día que se puede volcar al menú"""
+    nombre = models.CharField(max_length=100, unique=True)
+    descripcion = models.TextField(blank=True)
+    creada = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['nombre']
+        verbose_name = "Plantilla de menú"
+        verbose_name_plural = "Plantillas de menú"
+
+    def __str__(self):
+        return self.nombre
+
+
+class PlantillaMenuPlato(models.Model):
+    plantilla = models.ForeignKey(PlantillaMenu, related_name='casillas', on_delete=models.CASCADE)
+    plato = models.ForeignKey(Plato, on_delete=models.CASCADE)
+    dia = models.CharField(max_length=3, choices=DisponibilidadPlato.DIAS_SEMANA)
+
+    class Meta:
+        unique_together = ('plantilla', 'plato', 'dia')
+
+    def __str__(self):
+        return f"{self.plato.nombre} ({self.get_dia_display()})"
+
+
+class RotacionMenu(models.Model):
+    """Secuencia de plantillas que se repite semana a semana desde ``fecha_inicio``"""
+    nombre = models.CharField(max_length=100, unique=True)
+    fecha_inicio = models.DateField(help_text="Lunes de la semana que usa el primer paso")
+    activa = models.BooleanField(default=True, help_text="Solo una rotación activa se aplica cada semana")
+
+    class Meta:
+        ordering = ['-activa', 'nombre']
+        verbose_name = "Rotación de menú"
+        verbose_name_plural = "Rotaciones de menú"
+
+    def __str__(self):
+        return self.nombre
+
+
+class RotacionMenuPaso(models.Model):
+    rotacion = models.ForeignKey(RotacionMenu, related_name='pasos', on_delete=models.CASCADE)
+    plantilla = models.ForeignKey(PlantillaMenu, on_delete=models.PROTECT)
+    orden = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['orden', 'id']
+
+    def __str__(self):
+        return f"{self.orden}. {self.plantilla.nombre}"
+
+
+class SemanaMenu(models.Model):
+    """Plantilla aplicada a una semana concreta: sus fechas se publican con ella y no con el menú semanal"""
+    lunes = models.DateField(unique=True)
+    plantilla = models.ForeignKey(PlantillaMenu, related_name='semanas', on_delete=models.PROTECT)
+    aplicada = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-lunes']
+        verbose_name = "Semana planificada"
+        verbose_name_plural = "Semanas planificadas"
+
+    def __str__(self):
+        return f"Semana del {self.lunes:%d/%m/%Y}: {self.plantilla.nombre}"
+
 class CarritoItem(models.Model):
     DIAS_SEMANA = [
         ('LUN', 'Lunes'),
@@ -116,7 +238,21 @@ class CarritoItem(models.Model):
     plato = models.ForeignKey(Plato, on_delete=models.CASCADE)
     cantidad = models.PositiveIntegerField(default=1)
     dia_semana = models.CharField(max_length=3, choices=DIAS_SEMANA, default='LUN')
+    # Obligatoria en la BD (la restricción única no vale con NULL); save() la deduce del día si falta
+    fecha_servicio = models.DateField(blank=True, db_index=True)
     fecha_agregado = models.DateTimeField(auto_now_add=True)
+    # Raciones apartadas en DisponibilidadFecha.reservadas hasta reserva_expira
+    reservada = models.PositiveIntegerField(default=0, editable=False)
+    reserva_expira = models.DateTimeField(null=True, blank=True, editable=False, db_index=True)
+
+    class Meta:
+        # Una línea por plato y fecha; el índice también sirve para leer el carrito de un usuario
+        unique_together = ('usuario', 'plato', 'fecha_servicio')
+
+    def save(self, *args, **kwargs):
+        from .servicio import completar_fecha_servicio
+        completar_fecha_servicio(self, timezone.localdate())
+        super().save(*args, **kwargs)
 
     def subtotal(self):
         return self.cantidad * self.plato.precio
@@ -131,7 +267,8 @@ class Recibo(models.Model):
     usuario = models.ForeignKey(User, on_delete=models.CASCADE)
     empresa = models.ForeignKey('Empresa', null=True, blank=True, on_delete=models.SET_NULL)
     total = models.DecimalField(max_digits=8, decimal_places=2)
-    fecha_compra = models.DateTimeField(default=timezone.now)
+    # Indexado: el ranking (myapp/ranking.py) consulta las ventas día a día
+    fecha_compra = models.DateTimeField(default=timezone.now, db_index=True)
 
     # NUEVOS CAMPOS
     pagado = models.BooleanField(default=False)
@@ -142,8 +279,18 @@ class Recibo(models.Model):
         ('pendiente', 'Pendiente'),
         ('completado', 'Completado'),
         ('fallido', 'Fallido'),
+        # Empresa con facturación consolidada: se cobra con la factura semanal (ver facturacion.py)
+        ('facturado', 'En factura semanal'),
     ])
     url_iframe = models.URLField(blank=True, null=True, help_text="URL del iframe de Paycomet")
+    factura = models.ForeignKey(
+        'FacturaEmpresa', null=True, blank=True, on_delete=models.SET_NULL, related_name='recibos',
+        help_text="Factura semanal consolidada que incluye este recibo"
+    )
+    # Último cambio (alta, pago, fallo...): los UPDATE en bloque lo ponen a mano. Ver myapp/rfm.py
+    actualizado = models.DateTimeField(auto_now=True, db_index=True)
+
+    METODO_FACTURA_SEMANAL = 'Factura semanal'
 
     def __str__(self):
         return f"Recibo #{self.id} - {self.usuario.username}"
@@ -161,6 +308,83 @@ class ReciboItem(models.Model):
     def __str__(self):
         return f"{self.cantidad} x {self.plato.nombre}"
 
+# -------------------- FACTURACIÓN A EMPRESAS --------------------
+class FacturaEmpresa(models.Model):
+    """Factura semanal que agrupa los recibos de los empleados de una empresa"""
+    empresa = models.ForeignKey(Empresa, on_delete=models.PROTECT, related_name='facturas')
+    numero = models.CharField(max_length=80, unique=True)
+    semana_inicio = models.DateField(help_text="Lunes de la semana facturada")
+    semana_fin = models.DateField(help_text="Domingo de la semana facturada")
+    total = models.DecimalField(max_digits=10, decimal_places=2)
+    fecha_emision = models.DateTimeField(auto_now_add=True)
+    pagada = models.BooleanField(default=False)
+    fecha_pago = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-semana_inicio', 'empresa']
+        verbose_name = "Factura de empresa"
+        verbose_name_plural = "Facturas de empresa"
+        constraints = [
+            # Una factura abierta por empresa y semana; tras pagarla, las complementarias
+            models.UniqueConstraint(
+                fields=['empresa', 'semana_inicio'], condition=models.Q(pagada=False),
+                name='factura_empresa_semana_abierta',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Factura {self.numero} - {self.empresa.nombre}"
+
+
+class LineaFacturaEmpresa(models.Model):
+    factura = models.ForeignKey(FacturaEmpresa, related_name='lineas', on_delete=models.CASCADE)
+    plato = models.ForeignKey(Plato, on_delete=models.PROTECT)
+    cantidad = models.PositiveIntegerField()
+    precio_unitario = models.DecimalField(max_digits=8, decimal_places=2)
+
+    class Meta:
+        constraints = [
+            # Una línea por plato y precio: los recibos que llegan tarde suman a la suya
+            models.UniqueConstraint(fields=['factura', 'plato', 'precio_unitario'], name='linea_factura_unica'),
+        ]
+
+    def subtotal(self):
+        return self.cantidad * self.precio_unitario
+
+    def __str__(self):
+        return f"{self.cantidad} x {self.plato.nombre}"
+
+# -------------------- DOCUMENTOS PDF --------------------
+class LoteDocumentos(models.Model):
+    """Generación masiva de PDF pedida desde el admin (ver myapp/documentos.py)
+
+    El comando ``generar_documentos`` ejecuta los lotes pendientes; el progreso
+    se guarda aquí para que cualquier worker lo pueda mostrar.
+    """
+    ESTADOS = [
+        ('pendiente', 'Pendiente'),
+        ('en_curso', 'En curso'),
+        ('terminada', 'Terminada'),
+        ('error', 'Error'),
+    ]
+
+    tipo = models.CharField(max_length=10, choices=[('recibo', 'Recibos'), ('factura', 'Facturas')])
+    ids = models.JSONField(help_text="Claves primarias de los documentos")
+    total = models.PositiveIntegerField(default=0)
+    hechos = models.PositiveIntegerField(default=0)
+    estado = models.CharField(max_length=10, choices=ESTADOS, default='pendiente', db_index=True)
+    zip = models.CharField(max_length=255, blank=True)
+    error = models.TextField(blank=True)
+    creado = models.DateTimeField(auto_now_add=True)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Lote de documentos"
+        verbose_name_plural = "Lotes de documentos"
+
+    def __str__(self):
+        return f"Lote #{self.pk} ({self.tipo}, {self.get_estado_display()})"
+
 # models.py
 
 class PedidoHistorico(models.Model):
@@ -170,7 +394,19 @@ class PedidoHistorico(models.Model):
     plato = models.ForeignKey(Plato, on_delete=models.CASCADE)
     cantidad = models.PositiveIntegerField(default=1)
     dia_semana = models.CharField(max_length=3, choices=DIAS_SEMANA)
-    fecha_emision = models.DateField(auto_now_add=True)  # fecha del pedido
+    fecha_servicio = models.DateField(null=True, blank=True, db_index=True)  # fecha de entrega
+    fecha_emision = models.DateField(auto_now_add=True, db_index=True)  # fecha del pedido
+
+    class Meta:
+        indexes = [
+            # Pedidos de un usuario en unas fechas (repetir la semana anterior)
+            models.Index(fields=['usuario', 'fecha_servicio'], name='pedido_usuario_fecha_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        from .servicio import completar_fecha_servicio
+        completar_fecha_servicio(self, self.fecha_emision or timezone.localdate())
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.cantidad} x {self.plato.nombre} - {self.usuario.username} ({self.get_dia_semana_display()}) {self.fecha_emision}"
@@ -298,7 +534,7 @@ class MovimientoInventario(models.Model):
     recibo = models.ForeignKey(Recibo, on_delete=models.SET_NULL, null=True, blank=True, help_text="Recibo relacionado (si es venta)")
     usuario_responsable = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     
-    fecha_movimiento = models.DateTimeField(auto_now_add=True)
+    fecha_movimiento = models.DateTimeField(auto_now_add=True, db_index=True)
     
     class Meta:
         ordering = ['-fecha_movimiento']
@@ -308,3 +544,108 @@ class MovimientoInventario(models.Model):
     def __str__(self):
         signo = "+" if self.cantidad >= 0 else ""
         return f"{self.inventario.plato.nombre} - {signo}{self.cantidad} ({self.get_tipo_movimiento_display()})"
+
+
+# -------------------- ARCHIVO HISTÓRICO --------------------
+# Filas de PedidoHistorico y MovimientoInventario anteriores al horizonte de
+# retención (ver myapp/archivo.py). Conservan el id original y no tienen claves
+# foráneas reales: el archivo no debe bloquear ni seguir los borrados.
+
+class PedidoHistoricoArchivado(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    usuario = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    plato = models.ForeignKey(Plato, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    cantidad = models.PositiveIntegerField(default=1)
+    dia_semana = models.CharField(max_length=3, choices=PedidoHistorico.DIAS_SEMANA)
+    fecha_servicio = models.DateField(null=True, blank=True)
+    fecha_emision = models.DateField(db_index=True)
+
+    class Meta:
+        verbose_name = "Pedido histórico archivado"
+        verbose_name_plural = "Pedidos históricos archivados"
+
+    def __str__(self):
+        return f"{self.cantidad} x plato {self.plato_id} ({self.fecha_emision}) [archivo]"
+
+
+class MovimientoInventarioArchivado(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    inventario = models.ForeignKey(Inventario, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    tipo_movimiento = models.CharField(max_length=20, choices=MovimientoInventario.TIPO_MOVIMIENTO_CHOICES)
+    cantidad = models.IntegerField()
+    motivo = models.CharField(max_length=200)
+    recibo = models.ForeignKey(Recibo, on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name='+')
+    usuario_responsable = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name='+')
+    fecha_movimiento = models.DateTimeField(db_index=True)
+
+    class Meta:
+        verbose_name = "Movimiento de inventario archivado"
+        verbose_name_plural = "Movimientos de inventario archivados"
+
+    def __str__(self):
+        return f"{self.get_tipo_movimiento_display()} {self.cantidad} ({self.fecha_movimiento:%Y-%m-%d}) [archivo]"
+
+
+class CarritoItemArchivado(models.Model):
+    """Línea de un carrito abandonado (ver myapp/carritos.py)"""
+    id = models.BigIntegerField(primary_key=True)
+    usuario = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    plato = models.ForeignKey(Plato, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    cantidad = models.PositiveIntegerField(default=1)
+    dia_semana = models.CharField(max_length=3, choices=CarritoItem.DIAS_SEMANA)
+    fecha_servicio = models.DateField(null=True, blank=True)
+    fecha_agregado = models.DateTimeField(db_index=True)
+
+    class Meta:
+        verbose_name = "Carrito abandonado"
+        verbose_name_plural = "Carritos abandonados"
+
+    def __str__(self):
+        return f"{self.cantidad} x plato {self.plato_id} ({self.fecha_servicio}) [archivo]"
+
+
+# -------------------- ANALÍTICA DE CLIENTES --------------------
+
+class SegmentoRFM(models.Model):
+    """Recencia, frecuencia e importe de un cliente o una empresa (ver myapp/rfm.py)
+
+    Tabla resumen que recalcula el comando ``calcular_rfm``: las consultas de
+    marketing la filtran y ordenan sin recorrer el histórico de recibos.
+    """
+    SEGMENTOS = [
+        ('CAMPEONES', 'Campeones'),
+        ('LEALES', 'Leales'),
+        ('NUEVOS', 'Nuevos'),
+        ('EN_RIESGO', 'En riesgo'),
+        ('PERDIDOS', 'Perdidos'),
+        ('POTENCIALES', 'Potenciales'),
+    ]
+
+    cliente = models.OneToOneField(Cliente, null=True, blank=True, on_delete=models.CASCADE, related_name='rfm')
+    empresa = models.OneToOneField(Empresa, null=True, blank=True, on_delete=models.CASCADE, related_name='rfm')
+    ultima_compra = models.DateTimeField(db_index=True)
+    recibos = models.PositiveIntegerField(default=0)
+    importe = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    recibos_hasta = models.DateTimeField(
+        null=True, blank=True, help_text="Cambios de recibos ya contados (Recibo.actualizado, refresco incremental)"
+    )
+    # Puntuaciones de 1 a 5 por quintiles (0: aún sin puntuar)
+    r = models.PositiveSmallIntegerField("R", default=0)
+    f = models.PositiveSmallIntegerField("F", default=0)
+    m = models.PositiveSmallIntegerField("M", default=0)
+    segmento = models.CharField(max_length=12, choices=SEGMENTOS, blank=True, db_index=True)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Segmento RFM"
+        verbose_name_plural = "Segmentos RFM"
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(cliente__isnull=True) ^ models.Q(empresa__isnull=True),
+                name='rfm_cliente_o_empresa',
+            ),
+        ]
+
+    def __str__(self):
+        titular = self.cliente.Nombre_Completo if self.cliente_id else self.empresa.nombre
+        return f"{titular}: R{self.r} F{self.f} M{self.m} ({self.get_segmento_display() or 'sin puntuar'})"
@@ -0,0 +1,138 @@
+"""
+Maquetación en PDF de recibos, facturas y hojas de producción.
+
+Solo depende de ReportLab y recibe datos ya preparados (ver
+``documentos.datos_recibo``), sin tocar Django: así se puede ejecutar en los
+procesos del pool de ``documentos`` sin configurar el ORM en cada uno.
+"""
+from io import BytesIO
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import mm
+from reportlab.pdfgen import canvas
+
+MARGEN = 20 * mm
+ALTO_LINEA = 6 * mm
+EMISOR = 'Familia Gastro'
+
+
+def _euros(valor):
+    return f'{valor} €'
+
+
+def _cabecera_tabla(c, y, ancho):
+    c.setFont('Helvetica-Bold', 10)
+    c.drawString(MARGEN, y, 'Plato')
+    c.drawRightString(ancho - MARGEN - 70 * mm, y, 'Cantidad')
+    c.drawRightString(ancho - MARGEN - 35 * mm, y, 'Precio')
+    c.drawRightString(ancho - MARGEN, y, 'Importe')
+    c.setStrokeColor(colors.grey)
+    c.line(MARGEN, y - 2 * mm, ancho - MARGEN, y - 2 * mm)
+    c.setFont('Helvetica', 10)
+    return y - ALTO_LINEA - 2 * mm
+
+
+def renderizar(datos):
+    """Devuelve los bytes del PDF de un recibo o factura"""
+    buffer = BytesIO()
+    ancho, alto = A4
+    c = canvas.Canvas(buffer, pagesize=A4, pageCompression=1, invariant=1)
+    c.setTitle(f"{datos['titulo']} {datos['numero']}")
+    c.setAuthor(EMISOR)
+
+    y = alto - MARGEN
+    c.setFont('Helvetica-Bold', 16)
+    c.drawString(MARGEN, y, EMISOR)
+    c.drawRightString(ancho - MARGEN, y, f"{datos['titulo']} {datos['numero']}")
+    y -= 8 * mm
+    c.setFont('Helvetica', 10)
+    c.drawRightString(ancho - MARGEN, y, f"Fecha: {datos['fecha']}")
+    if datos.get('periodo'):
+        y -= ALTO_LINEA
+        c.drawRightString(ancho - MARGEN, y, f"Periodo: {datos['periodo']}")
+
+    y -= 10 * mm
+    c.setFont('Helvetica-Bold', 11)
+    c.drawString(MARGEN, y, 'Cliente')
+    c.setFont('Helvetica', 10)
+    for linea in datos['cliente']:
+        y -= ALTO_LINEA
+        c.drawString(MARGEN, y, linea)
+
+    y = _cabecera_tabla(c, y - 12 * mm, ancho)
+    for nombre, cantidad, precio, importe in datos['lineas']:
+        if y < MARGEN + 3 * ALTO_LINEA:
+            c.showPage()
+            y = _cabecera_tabla(c, alto - MARGEN, ancho)
+        c.drawString(MARGEN, y, nombre[:60])
+        c.drawRightString(ancho - MARGEN - 70 * mm, y, str(cantidad))
+        c.drawRightString(ancho - MARGEN - 35 * mm, y, _euros(precio))
+        c.drawRightString(ancho - MARGEN, y, _euros(importe))
+        y -= ALTO_LINEA
+
+    c.line(MARGEN, y, ancho - MARGEN, y)
+    y -= ALTO_LINEA + 2 * mm
+    c.setFont('Helvetica-Bold', 12)
+    c.drawString(ancho - MARGEN - 70 * mm, y, 'Total (IVA incl.)')
+    c.drawRightString(ancho - MARGEN, y, _euros(datos['total']))
+    if datos.get('estado'):
+        y -= ALTO_LINEA + 2 * mm
+        c.setFont('Helvetica', 10)
+        c.drawString(ancho - MARGEN - 70 * mm, y, datos['estado'])
+
+    c.showPage()
+    c.save()
+    return buffer.getvalue()
+
+
+def renderizar_hoja_produccion(datos):
+    """PDF de la hoja de producción: totales por plato y una hoja de reparto por empresa"""
+    buffer = BytesIO()
+    ancho, alto = A4
+    c = canvas.Canvas(buffer, pagesize=A4, pageCompression=1, invariant=1)
+    c.setTitle(f"Producción {datos['fecha']}")
+    c.setAuthor(EMISOR)
+
+    def titulo(texto, subtitulo=''):
+        y = alto - MARGEN
+        c.setFont('Helvetica-Bold', 16)
+        c.drawString(MARGEN, y, texto)
+        c.setFont('Helvetica', 10)
+        c.drawRightString(ancho - MARGEN, y, f"{datos['dia']} {datos['fecha']}")
+        if subtitulo:
+            y -= ALTO_LINEA
+            c.drawString(MARGEN, y, subtitulo)
+        return y - 2 * ALTO_LINEA
+
+    def tabla(y, filas):
+        c.setFont('Helvetica-Bold', 10)
+        c.drawString(MARGEN, y, 'Plato')
+        c.drawRightString(ancho - MARGEN, y, 'Cantidad')
+        c.setFont('Helvetica', 10)
+        y -= ALTO_LINEA
+        for nombre, cantidad in filas:
+            if y < MARGEN + ALTO_LINEA:
+                c.showPage()
+                c.setFont('Helvetica', 10)
+                y = alto - MARGEN
+            c.drawString(MARGEN, y, nombre[:70])
+            c.drawRightString(ancho - MARGEN, y, str(cantidad))
+            y -= ALTO_LINEA
+        return y
+
+    y = titulo('Hoja de producción')
+    y = tabla(y, [(plato['nombre'], plato['total']) for plato in datos['platos']])
+    c.setFont('Helvetica-Bold', 11)
+    c.drawRightString(ancho - MARGEN, y - 2 * mm, f"Total: {sum(p['total'] for p in datos['platos'])}")
+
+    for empresa in datos['empresas']:
+        c.showPage()
+        y = titulo(f"Reparto: {empresa['nombre']}", empresa['direccion'][:90])
+        y = tabla(y, [(plato['nombre'], plato['cantidad']) for plato in empresa['platos']])
+        c.setFont('Helvetica-Bold', 11)
+        c.drawRightString(ancho - MARGEN, y - 2 * mm, f"Total: {empresa['total']}")
+
+    c.showPage()
+    c.save()
+    return buffer.getvalue()
@@ -0,0 +1,269 @@
+"""
+Planificación semanal del menú (matriz plato × día de ``DisponibilidadPlato``).
+
+El editor del admin y la API envían la semana como diferencia: las casillas
+que se marcan (``altas``) y las que se desmarcan (``bajas``). ``aplicar_cambios_menu``
+lo aplica con un único ``bulk_create(ignore_conflicts=True)`` y un único DELETE,
+lleva el cambio a las fechas ya publicadas (``servicio``) e invalida la caché
+del menú una sola vez.
+
+Las plantillas (``PlantillaMenu``) guardan una matriz completa y las rotaciones
+(``RotacionMenu``) eligen qué plantilla toca cada semana. Una plantilla se
+aplica a una semana concreta, no al patrón: ``aplicar_plantilla`` deja las
+fechas publicadas de esa semana (``DisponibilidadFecha``) como la plantilla,
+sin quitar las que ya tienen ventas o reservas, y lo anota en ``SemanaMenu``
+para que ``publicar_menu`` siga usando la plantilla en esa semana. Comparar o
+aplicar una plantilla son dos consultas (fechas de la semana y casillas de la
+plantilla) y operaciones de conjuntos en memoria.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import servicio
+from .menu import invalidacion_agrupada, invalidar_menu
+from .models import (DisponibilidadFecha, DisponibilidadPlato, Plato, PlantillaMenu, PlantillaMenuPlato, RotacionMenu,
+                     SemanaMenu)
+
+DIAS = [codigo for codigo, _ in DisponibilidadPlato.DIAS_SEMANA]
+
+
+def matriz(platos=None):
+    """``{plato_id: set(dias)}`` de los platos dados (todos por defecto)"""
+    disponibilidades = DisponibilidadPlato.objects.all()
+    if platos is not None:
+        disponibilidades = disponibilidades.filter(plato__in=platos)
+    resultado = {}
+    for plato_id, dia in disponibilidades.values_list('plato_id', 'dia'):
+        resultado.setdefault(plato_id, set()).add(dia)
+    return resultado
+
+
+def _normalizar(casillas):
+    try:
+        return {(int(plato_id), dia) for plato_id, dia in casillas}
+    except (TypeError, ValueError):
+        raise ValueError("Cada casilla es un par (plato_id, dia)")
+
+
+def validar_casillas(casillas):
+    """``ValueError`` si algún día o plato de las casillas no existe"""
+    dias_invalidos = {dia for _, dia in casillas} - set(DIAS)
+    if dias_invalidos:
+        raise ValueError(f"Días no válidos: {', '.join(sorted(dias_invalidos))}")
+    platos = {plato_id for plato_id, _ in casillas}
+    inexistentes = platos - set(Plato.objects.filter(id__in=platos).values_list('id', flat=True))
+    if inexistentes:
+        raise ValueError(f"Platos inexistentes: {', '.join(map(str, sorted(inexistentes)))}")
+
+
+def _casillas(casillas):
+    """Filtro de las casillas agrupado por día: ``(dia=X AND plato IN (...)) OR ...``"""
+    por_dia = {}
+    for plato_id, dia in casillas:
+        por_dia.setdefault(dia, []).append(plato_id)
+    filtro = Q()
+    for dia, platos in por_dia.items():
+        filtro |= Q(dia=dia, plato_id__in=platos)
+    return filtro
+
+
+def aplicar_cambios_menu(altas=(), bajas=()):
+    """Marca ``altas`` y desmarca ``bajas`` (pares ``(plato_id, dia)``)
+
+    Devuelve ``(creadas, eliminadas)``. Una casilla en las dos listas se
+    considera alta.
+    """
+    altas = _normalizar(altas)
+    bajas = _normalizar(bajas) - altas
+    validar_casillas(altas | bajas)
+
+    with transaction.atomic(), invalidacion_agrupada():
+        creadas = 0
+        if altas:
+            existentes = DisponibilidadPlato.objects.filter(
+                _casillas(altas)
+            ).values_list('plato_id', 'dia')
+            creadas = len(altas - set(existentes))
+            DisponibilidadPlato.objects.bulk_create(
+                [DisponibilidadPlato(plato_id=plato_id, dia=dia) for plato_id, dia in altas],
+                ignore_conflicts=True,
+            )
+        eliminadas = 0
+        if bajas:
+            eliminadas, _ = DisponibilidadPlato.objects.filter(_casillas(bajas)).delete()
+
+        if creadas:
+            servicio.publicar_menu(platos={plato_id for plato_id, _ in altas})
+        if eliminadas:
+            servicio.retirar(bajas)
+    return creadas, eliminadas
+
+
+def diferencia(platos, marcadas):
+    """``(altas, bajas)`` para que la matriz de ``platos`` quede como ``marcadas``"""
+    actuales = {
+        (plato_id, dia) for plato_id, dias in matriz(platos).items() for dia in dias
+    }
+    marcadas = set(marcadas)
+    return marcadas - actuales, actuales - marcadas
+
+
+def casillas_actuales():
+    return {(plato_id, dia) for plato_id, dias in matriz().items() for dia in dias}
+
+
+# ==================== PLANTILLAS ====================
+
+def casillas_plantilla(plantilla):
+    return set(plantilla.casillas.values_list('plato_id', 'dia'))
+
+
+def guardar_plantilla(nombre, descripcion=''):
+    """Crea (o sobrescribe) la plantilla ``nombre`` con el menú actual
+
+    ``ValueError`` si el nombre está vacío o solo tiene espacios.
+    """
+    nombre = (nombre or '').strip()
+    if not nombre:
+        raise ValueError("Indica un nombre para la plantilla.")
+    with transaction.atomic():
+        plantilla, _ = PlantillaMenu.objects.update_or_create(nombre=nombre, defaults={'descripcion': descripcion})
+        plantilla.casillas.all().delete()
+        PlantillaMenuPlato.objects.bulk_create([
+            PlantillaMenuPlato(plantilla=plantilla, plato_id=plato_id, dia=dia)
+            for plato_id, dia in casillas_actuales()
+        ])
+    return plantilla
+
+
+def _fechas_semana(fecha):
+    """``{dia: fecha}`` de las fechas con servicio que quedan en la semana de ``fecha``"""
+    lunes = servicio.lunes_de(fecha)
+    desde = max(lunes, timezone.localdate())
+    return {
+        servicio.codigo_dia(dia): dia
+        for dia in servicio.fechas_servicio(desde, (lunes + timedelta(days=7) - desde).days)
+    }
+
+
+def comparar_plantilla(plantilla, fecha):
+    """Qué cambiaría al aplicar ``plantilla`` a la semana de ``fecha``: ``{'altas', 'bajas', 'iguales'}``
+
+    Solo cuentan los días que quedan de la semana; las casillas son ``(plato_id, dia)``.
+    """
+    fechas = _fechas_semana(fecha)
+    if not fechas:
+        return {'altas': set(), 'bajas': set(), 'iguales': set()}
+    actuales = {
+        (plato_id, servicio.codigo_dia(dia))
+        for plato_id, dia in DisponibilidadFecha.objects.filter(
+            fecha__in=fechas.values()
+        ).values_list('plato_id', 'fecha')
+    }
+    objetivo = {(plato_id, dia) for plato_id, dia in casillas_plantilla(plantilla) if dia in fechas}
+    return {'altas': objetivo - actuales, 'bajas': actuales - objetivo, 'iguales': actuales & objetivo}
+
+
+def aplicar_plantilla(plantilla, fecha):
+    """Deja la semana de ``fecha`` como ``plantilla``; devuelve ``(creadas, eliminadas)``
+
+    Solo se tocan las fechas que quedan de esa semana. Las fechas con ventas o
+    reservas que no están en la plantilla se conservan.
+    """
+    fechas = _fechas_semana(fecha)
+    if not fechas:
+        return 0, 0
+    objetivo = {
+        (plato_id, fechas[dia]): capacidad
+        for plato_id, dia, capacidad in plantilla.casillas.values_list('plato_id', 'dia', 'plato__capacidad_diaria')
+        if dia in fechas
+    }
+
+    with transaction.atomic(), invalidacion_agrupada():
+        publicadas = DisponibilidadFecha.objects.filter(fecha__in=fechas.values())
+        actuales = set(publicadas.values_list('plato_id', 'fecha'))
+        altas = [
+            DisponibilidadFecha(plato_id=plato_id, fecha=dia, capacidad=capacidad)
+            for (plato_id, dia), capacidad in objetivo.items()
+            if (plato_id, dia) not in actuales
+        ]
+        DisponibilidadFecha.objects.bulk_create(altas, ignore_conflicts=True)
+        bajas = actuales - set(objetivo)
+        eliminadas = 0
+        if bajas:
+            filtro = Q()
+            for plato_id, dia in bajas:
+                filtro |= Q(plato_id=plato_id, fecha=dia)
+            eliminadas, _ = publicadas.filter(filtro, vendidas=0, reservadas=0).delete()
+        SemanaMenu.objects.update_or_create(lunes=servicio.lunes_de(fecha), defaults={'plantilla': plantilla})
+        if altas or eliminadas:
+            invalidar_menu()
+    return len(altas), eliminadas
+
+
+# ==================== ROTACIONES ====================
+
+def rotacion_activa():
+    return RotacionMenu.objects.filter(activa=True).order_by('nombre').first()
+
+
+def _paso(pasos, rotacion, fecha):
+    semanas = (fecha - rotacion.fecha_inicio).days // 7
+    if not pasos or semanas < 0:
+        return None
+    return pasos[semanas % len(pasos)]
+
+
+def plantilla_de_semana(rotacion, fecha, pasos=None):
+    """Plantilla que la rotación asigna a la semana de ``fecha`` (``None`` si no tiene pasos
+    o la semana es anterior al inicio)"""
+    pasos = pasos if pasos is not None else list(rotacion.pasos.select_related('plantilla'))
+    paso = _paso(pasos, rotacion, fecha)
+    return paso.plantilla if paso else None
+
+
+def plantillas_asignadas(desde, hasta):
+    """``{lunes: plantilla_id}`` de las semanas entre los lunes ``desde`` y ``hasta`` con plantilla
+
+    La aplicada a la semana (``SemanaMenu``) manda sobre la de la rotación activa.
+    """
+    asignadas = {}
+    rotacion = rotacion_activa()
+    if rotacion is not None:
+        pasos = list(rotacion.pasos.all())
+        lunes = desde
+        while lunes <= hasta:
+            paso = _paso(pasos, rotacion, lunes)
+            if paso is not None:
+                asignadas[lunes] = paso.plantilla_id
+            lunes += timedelta(weeks=1)
+    asignadas.update(
+        SemanaMenu.objects.filter(lunes__gte=desde, lunes__lte=hasta).values_list('lunes', 'plantilla_id').order_by()
+    )
+    return asignadas
+
+
+def calendario(rotacion, desde, semanas=5):
+    """``[(lunes, plantilla)]`` de las próximas ``semanas`` (por defecto, un mes)"""
+    pasos = list(rotacion.pasos.select_related('plantilla'))
+    lunes = servicio.lunes_de(desde)
+    return [
+        (lunes + timedelta(weeks=i), plantilla_de_semana(rotacion, lunes + timedelta(weeks=i), pasos))
+        for i in range(semanas)
+    ]
+
+
+def aplicar_rotacion(fecha):
+    """Aplica a la semana de ``fecha`` la plantilla que le toca por la rotación activa
+
+    Devuelve ``(plantilla, creadas, eliminadas)``; ``plantilla`` es ``None`` si
+    no hay rotación activa o no le toca ninguna.
+    """
+    rotacion = rotacion_activa()
+    plantilla = plantilla_de_semana(rotacion, fecha) if rotacion else None
+    if plantilla is None:
+        return None, 0, 0
+    return (plantilla, *aplicar_plantilla(plantilla, fecha))
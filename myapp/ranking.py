@@ -0,0 +1,261 @@
+"""
+Ranking materializado de platos más vendidos.
+
+Las unidades vendidas se guardan en la caché por días: un cubo por fecha con
+las unidades de cada plato, que caduca al salir de la ventana más larga
+(``DIAS_GUARDADOS``). Las ventanas de 7 y 30 días suman sus cubos y la de
+siempre suma el cubo de hoy a un histórico acumulado hasta ayer, que cada día
+avanza con la consulta de los días nuevos (solo se recorre todo ``ReciboItem``
+en frío o con ``reconstruir_ranking``). Cada ventana queda en la caché con la
+lista ya ordenada de los ``TOP`` primeros, así que leer el ranking es un único
+``cache.get`` y un corte de la lista.
+
+Cada checkout suma sus líneas al cubo de hoy y a las ventanas que estén en la
+caché, bajo un cerrojo (``cache.add``) para que dos ventas a la vez no se
+pisen. El cubo de hoy y las ventanas caducan a los ``TIMEOUT_RANKING``
+segundos y se rehacen desde la base de datos (solo el día de hoy), así que una
+venta que un worker no ve (caché por proceso) o que coincide con una
+reconstrucción solo descuadra el ranking hasta entonces.
+"""
+import heapq
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from django.core.cache import cache
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Plato, ReciboItem
+
+VENTANAS = {'7d': 7, '30d': 30, 'total': None}
+DIAS_GUARDADOS = 30  # cubos diarios guardados: los de la ventana más larga
+TOP = 50  # posiciones guardadas por ventana; ``mas_vendidos`` no pide más de 10
+TIMEOUT_RANKING = 600  # 10 minutos: ventanas y cubo de hoy
+TIMEOUT_HISTORICO = 2 * 24 * 3600
+TIMEOUT_PLATOS = 3600
+TIMEOUT_VERSION = 24 * 3600
+TIMEOUT_CERROJO = 5
+ESPERA_CERROJO = 2
+
+CLAVE_VERSION = 'ranking:version'
+CLAVE_PLATOS = 'ranking:platos'
+CLAVE_CERROJO = 'ranking:cerrojo'
+
+
+def _version():
+    version = cache.get(CLAVE_VERSION)
+    if version is None:
+        cache.add(CLAVE_VERSION, 1, TIMEOUT_VERSION)
+        version = cache.get(CLAVE_VERSION, 1)
+    return version
+
+
+def _clave(ventana, version=None):
+    # Las ventanas dependen de la fecha: cambian de clave a medianoche
+    return f'ranking:{version or _version()}:{ventana}:{timezone.localdate().isoformat()}'
+
+
+def _clave_dia(version, fecha):
+    return f'ranking:{version}:dia:{fecha.isoformat()}'
+
+
+def _clave_historico(version):
+    return f'ranking:{version}:historico'
+
+
+def invalidar_ranking():
+    """Descarta cubos y ventanas; la próxima lectura los reconstruye"""
+    try:
+        cache.incr(CLAVE_VERSION)
+    except ValueError:
+        cache.set(CLAVE_VERSION, 2, TIMEOUT_VERSION)
+
+
+def invalidar_platos():
+    cache.delete(CLAVE_PLATOS)
+
+
+def _platos():
+    """``{id: nombre}`` de todos los platos"""
+    platos = cache.get(CLAVE_PLATOS)
+    if platos is None:
+        platos = dict(Plato.objects.values_list('id', 'nombre'))
+        cache.set(CLAVE_PLATOS, platos, TIMEOUT_PLATOS)
+    return platos
+
+
+@contextmanager
+def _cerrojo():
+    """Serializa las sumas de las ventas; ``TimeoutError`` si no se consigue a tiempo"""
+    limite = time.monotonic() + ESPERA_CERROJO
+    while not cache.add(CLAVE_CERROJO, 1, TIMEOUT_CERROJO):
+        if time.monotonic() > limite:
+            raise TimeoutError('Cerrojo del ranking ocupado')
+        time.sleep(0.01)
+    try:
+        yield
+    finally:
+        cache.delete(CLAVE_CERROJO)
+
+
+def _sumar(cantidades, pares):
+    """Suma a ``cantidades`` los ``(plato_id, cantidad)`` de ``pares``"""
+    for plato_id, cantidad in pares:
+        cantidades[plato_id] = cantidades.get(plato_id, 0) + cantidad
+    return cantidades
+
+
+def _ordenar(cantidades, platos):
+    """Los ``TOP`` primeros ``(plato_id, cantidad)``; a igual cantidad, por nombre"""
+    return [
+        (plato_id, -cantidad)
+        for cantidad, _, plato_id in heapq.nsmallest(
+            TOP,
+            ((-cantidad, platos.get(plato_id, ''), plato_id) for plato_id, cantidad in cantidades.items() if cantidad),
+        )
+    ]
+
+
+def _medianoche(fecha):
+    return timezone.make_aware(datetime.combine(fecha, datetime.min.time()))
+
+
+def _vendidos(desde=None, hasta=None):
+    """Líneas de ``ReciboItem`` vendidas entre ``desde`` y ``hasta`` (incluidos)"""
+    items = ReciboItem.objects.exclude(recibo__estado_pago='fallido')
+    if desde is not None:
+        items = items.filter(recibo__fecha_compra__gte=_medianoche(desde))
+    if hasta is not None:
+        items = items.filter(recibo__fecha_compra__lt=_medianoche(hasta + timedelta(days=1)))
+    return items
+
+
+def _por_plato(items):
+    return {
+        plato_id: cantidad
+        for plato_id, cantidad in items.values_list('plato_id').annotate(cantidad=Sum('cantidad')).order_by()
+        if cantidad
+    }
+
+
+def _timeout_dia(fecha, hoy):
+    """El cubo de hoy se rehace a menudo; los pasados duran hasta salir de la ventana"""
+    if fecha >= hoy:
+        return TIMEOUT_RANKING
+    return max((fecha + timedelta(days=DIAS_GUARDADOS) - hoy).days * 24 * 3600, 1)
+
+
+def _cubos(fechas, version, hoy):
+    """``{fecha: {plato_id: cantidad}}``; los que faltan en la caché salen de una consulta"""
+    claves = {_clave_dia(version, fecha): fecha for fecha in fechas}
+    cubos = {claves[clave]: entrada['cantidades'] for clave, entrada in cache.get_many(list(claves)).items()}
+    faltan = sorted(set(fechas) - set(cubos))
+    if faltan:
+        nuevos = {fecha: {} for fecha in faltan}
+        filas = _vendidos(faltan[0], faltan[-1]).annotate(dia=TruncDate('recibo__fecha_compra')).values_list(
+            'dia', 'plato_id'
+        ).annotate(cantidad=Sum('cantidad')).order_by()
+        for dia, plato_id, cantidad in filas:
+            if dia in nuevos and cantidad:
+                nuevos[dia][plato_id] = cantidad
+        ahora = time.time()
+        for fecha, cantidades in nuevos.items():
+            timeout = _timeout_dia(fecha, hoy)
+            cache.set(_clave_dia(version, fecha), {'cantidades': cantidades, 'caduca': ahora + timeout}, timeout)
+        cubos.update(nuevos)
+    return cubos
+
+
+def _historico(version, hasta):
+    """Unidades por plato vendidas hasta ``hasta`` (incluido)
+
+    Avanza el acumulado guardado con los días que le faltan; sin él (o si se
+    ha quedado muy atrás) recorre todo ``ReciboItem``.
+    """
+    entrada = cache.get(_clave_historico(version))
+    if entrada is not None and entrada['hasta'] == hasta:
+        return entrada['cantidades']
+
+    if entrada is not None and 0 < (hasta - entrada['hasta']).days <= DIAS_GUARDADOS:
+        # Desde la base de datos, no de los cubos: el de un día recién cerrado
+        # puede no tener las ventas de otros workers
+        nuevos = _por_plato(_vendidos(entrada['hasta'] + timedelta(days=1), hasta))
+        cantidades = _sumar(dict(entrada['cantidades']), nuevos.items())
+    else:
+        cantidades = _por_plato(_vendidos(hasta=hasta))
+    cache.set(_clave_historico(version), {'hasta': hasta, 'cantidades': cantidades}, TIMEOUT_HISTORICO)
+    return cantidades
+
+
+def reconstruir(ventana=None, version=None):
+    """Rehace la ventana (todas si no se indica) desde los cubos y la guarda en la caché"""
+    version = version or _version()
+    ventanas = [ventana] if ventana else list(VENTANAS)
+    hoy = timezone.localdate()
+    dias = max(VENTANAS[nombre] or 1 for nombre in ventanas)
+    cubos = _cubos([hoy - timedelta(days=i) for i in range(dias)], version, hoy)
+    platos = _platos()
+    caduca = time.time() + TIMEOUT_RANKING
+    entradas = {}
+    for nombre in ventanas:
+        if VENTANAS[nombre] is None:
+            cantidades = _sumar(dict(_historico(version, hoy - timedelta(days=1))), cubos[hoy].items())
+        else:
+            cantidades = {}
+            for i in range(VENTANAS[nombre]):
+                _sumar(cantidades, cubos[hoy - timedelta(days=i)].items())
+        entradas[_clave(nombre, version)] = {
+            'cantidades': cantidades, 'top': _ordenar(cantidades, platos), 'caduca': caduca,
+        }
+    cache.set_many(entradas, TIMEOUT_RANKING)
+    return entradas
+
+
+def registrar_venta(lineas):
+    """Suma las ``(plato_id, cantidad)`` vendidas hoy al cubo de hoy y a las ventanas en la caché
+
+    Lo que no esté en la caché se reconstruye en la próxima lectura, que ya incluye la venta.
+    """
+    version = _version()
+    claves = [_clave_dia(version, timezone.localdate())] + [_clave(ventana, version) for ventana in VENTANAS]
+    try:
+        with _cerrojo():
+            entradas = cache.get_many(claves)
+            if not entradas:
+                return
+
+            platos = _platos()
+            if any(plato_id not in platos for plato_id, _ in lineas):
+                invalidar_platos()
+                platos = _platos()
+            # Conserva la caducidad original: con ventas continuas se sigue reconstruyendo
+            ahora = time.time()
+            for clave, entrada in entradas.items():
+                _sumar(entrada['cantidades'], lineas)
+                if 'top' in entrada:
+                    entrada['top'] = _ordenar(entrada['cantidades'], platos)
+                restante = int(entrada['caduca'] - ahora)
+                if restante > 0:
+                    cache.set(clave, entrada, restante)
+    except TimeoutError:
+        # Sin el cerrojo la suma podría perderse: que la próxima lectura rehaga hoy
+        cache.delete_many(claves)
+
+
+def mas_vendidos(ventana='total', limite=10):
+    """Top ``limite`` de la ventana: ``[{'plato_id', 'nombre', 'cantidad'}]``"""
+    if ventana not in VENTANAS:
+        raise ValueError(f"Ventana desconocida: {ventana}")
+
+    version = _version()
+    entrada = cache.get(_clave(ventana, version))
+    if entrada is None:
+        entrada = reconstruir(ventana, version)[_clave(ventana, version)]
+
+    platos = _platos()
+    return [
+        {'plato_id': plato_id, 'nombre': platos.get(plato_id, ''), 'cantidad': cantidad}
+        for plato_id, cantidad in entrada['top'][:limite]
+    ]
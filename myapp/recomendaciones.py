@@ -0,0 +1,249 @@
+"""
+Recomendaciones personalizadas a partir de lo que se compra junto.
+
+``entrenar`` lee de ``PedidoHistorico`` las raciones de cada usuario y plato
+de los últimos ``RECOMENDACIONES_DIAS`` (una consulta agrupada) y construye:
+
+- la matriz dispersa usuario × plato ``R`` (``log1p`` de las raciones),
+- la co-ocurrencia plato × plato ``C = Bᵀ·B`` sobre la matriz binaria ``B``
+  (cuántos usuarios han pedido los dos platos), normalizada por coseno y sin
+  diagonal,
+- la popularidad de cada plato para los usuarios sin historial.
+
+``R`` y ``C`` se guardan en CSR (``datos``, ``indices``, ``punteros``): el
+modelo ocupa lo que sus valores no nulos y nunca hay una matriz densa usuarios
+× platos. La afinidad ``A[u] = R[u]·C + PESO_REPETIR·R[u]`` de un usuario se
+calcula al pedirla, sumando las filas de ``C`` de los platos que ha pedido, y
+se escala a [0, 1]. Con SciPy ``Bᵀ·B`` es un producto disperso; sin él se
+acumula por bloques de usuarios en una matriz platos × platos.
+
+El modelo se guarda en un ``.npz`` sin comprimir (comando
+``calcular_recomendaciones``, cada noche) y los workers mapean sus arrays en
+memoria con ``np.memmap``: cargarlo no copia nada y ordenar el menú del día de
+un usuario es una búsqueda binaria, unas decenas de filas dispersas y un
+``argsort``, del orden de microsegundos.
+"""
+import os
+import struct
+import tempfile
+import zipfile
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import PedidoHistorico
+
+try:
+    from scipy import sparse
+except ImportError:  # SciPy es opcional
+    sparse = None
+
+PESO_REPETIR = 0.5  # cuánto pesa lo que el usuario ya pide frente a lo que se pide con ello
+LOTE_USUARIOS = 10000  # filas de B por bloque en la co-ocurrencia sin SciPy
+ARRAYS = ('usuarios', 'platos', 'r_datos', 'r_indices', 'r_punteros', 'c_datos', 'c_indices', 'c_punteros',
+          'popularidad')
+
+_cargado = None  # ((ruta, mtime, tamaño), modelo)
+
+
+# ==================== ENTRENAMIENTO ====================
+
+def _csr(filas, columnas, valores, num_filas):
+    """``(datos, indices, punteros)`` de los pares ``(fila, columna)``, que no se repiten"""
+    orden = np.lexsort((columnas, filas))
+    punteros = np.zeros(num_filas + 1, dtype=np.int64)
+    np.cumsum(np.bincount(filas, minlength=num_filas), out=punteros[1:])
+    return (
+        np.asarray(valores, dtype=np.float32)[orden],
+        np.asarray(columnas, dtype=np.int32)[orden],
+        punteros,
+    )
+
+
+def _coocurrencia(fila_usuario, columna_plato, forma):
+    """``(plato_i, plato_j, usuarios)`` de cada par con algún usuario en común (``Bᵀ·B``)"""
+    if sparse is not None:
+        compradores = sparse.csr_matrix(
+            (np.ones(len(fila_usuario), dtype=np.float32), (fila_usuario, columna_plato)), shape=forma
+        )
+        pares = (compradores.T @ compradores).tocoo()
+        return pares.row, pares.col, pares.data
+    # Sin SciPy: por bloques de usuarios, sin tener B entera en memoria
+    conteo = np.zeros((forma[1], forma[1]), dtype=np.float32)
+    orden = np.argsort(fila_usuario, kind='stable')
+    filas, columnas = fila_usuario[orden], columna_plato[orden]
+    for inicio in range(0, forma[0], LOTE_USUARIOS):
+        desde, hasta = np.searchsorted(filas, [inicio, inicio + LOTE_USUARIOS])
+        bloque = np.zeros((min(LOTE_USUARIOS, forma[0] - inicio), forma[1]), dtype=np.float32)
+        bloque[filas[desde:hasta] - inicio, columnas[desde:hasta]] = 1
+        conteo += bloque.T @ bloque
+    filas, columnas = np.nonzero(conteo)
+    return filas, columnas, conteo[filas, columnas]
+
+
+def entrenar(dias=None, hoy=None):
+    """Calcula el modelo con el histórico reciente; ``{nombre: array}``"""
+    dias = dias if dias is not None else settings.RECOMENDACIONES_DIAS
+    desde = (hoy or timezone.localdate()) - timedelta(days=dias)
+    filas = np.array(
+        list(
+            PedidoHistorico.objects.filter(fecha_emision__gte=desde)
+            .values_list('usuario_id', 'plato_id').annotate(raciones=Sum('cantidad')).order_by()
+        ),
+        dtype=np.int64,
+    ).reshape(-1, 3)
+
+    usuarios, fila_usuario = np.unique(filas[:, 0], return_inverse=True)
+    platos, columna_plato = np.unique(filas[:, 1], return_inverse=True)
+    r_datos, r_indices, r_punteros = _csr(fila_usuario, columna_plato, np.log1p(filas[:, 2]), len(usuarios))
+
+    # Coseno sin diagonal: C[i, j] = usuarios(i, j) / √(usuarios(i) · usuarios(j))
+    plato_i, plato_j, comunes = _coocurrencia(fila_usuario, columna_plato, (len(usuarios), len(platos)))
+    diagonal = plato_i == plato_j
+    por_plato = np.ones(len(platos), dtype=np.float64)
+    por_plato[plato_i[diagonal]] = np.sqrt(comunes[diagonal])
+    fuera = ~diagonal
+    c_datos, c_indices, c_punteros = _csr(
+        plato_i[fuera], plato_j[fuera],
+        comunes[fuera] / por_plato[plato_i[fuera]] / por_plato[plato_j[fuera]],
+        len(platos),
+    )
+
+    popularidad = np.bincount(columna_plato, minlength=len(platos)).astype(np.float32)
+    if popularidad.size:
+        popularidad /= popularidad.max()
+    return {
+        'usuarios': usuarios,
+        'platos': platos,
+        'r_datos': r_datos,
+        'r_indices': r_indices,
+        'r_punteros': r_punteros,
+        'c_datos': c_datos,
+        'c_indices': c_indices,
+        'c_punteros': c_punteros,
+        'popularidad': popularidad,
+    }
+
+
+def guardar(modelo, ruta=None):
+    """Escribe el modelo de forma atómica: los workers ven el anterior o el nuevo"""
+    ruta = str(ruta or settings.RECOMENDACIONES_MODELO)
+    directorio = os.path.dirname(ruta) or '.'
+    os.makedirs(directorio, exist_ok=True)
+    descriptor, temporal = tempfile.mkstemp(suffix='.npz', dir=directorio)
+    try:
+        with os.fdopen(descriptor, 'wb') as fichero:
+            np.savez(fichero, **modelo)  # sin comprimir: se puede mapear en memoria
+        os.replace(temporal, ruta)
+    except BaseException:
+        os.unlink(temporal)
+        raise
+    return ruta
+
+
+# ==================== CARGA ====================
+
+_LEER_CABECERA = {
+    (1, 0): np.lib.format.read_array_header_1_0,
+    (2, 0): np.lib.format.read_array_header_2_0,
+}
+
+
+def mapear(ruta):
+    """Arrays de un ``.npz`` sin comprimir mapeados en memoria (solo lectura)
+
+    ``np.load`` no mapea los ``.npz``: se localiza cada ``.npy`` dentro del zip
+    y se abre con ``np.memmap`` en su posición.
+    """
+    arrays = {}
+    with zipfile.ZipFile(ruta) as zip_, open(ruta, 'rb') as fichero:
+        for info in zip_.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{info.filename} está comprimido y no se puede mapear")
+            fichero.seek(info.header_offset + 26)
+            largo_nombre, largo_extra = struct.unpack('<HH', fichero.read(4))
+            fichero.seek(info.header_offset + 30 + largo_nombre + largo_extra)
+            version = np.lib.format.read_magic(fichero)
+            forma, fortran, dtype = _LEER_CABECERA[version](fichero)
+            nombre = info.filename.removesuffix('.npy')
+            if 0 in forma:
+                arrays[nombre] = np.empty(forma, dtype=dtype)
+            else:
+                arrays[nombre] = np.memmap(ruta, dtype=dtype, mode='r', offset=fichero.tell(), shape=forma,
+                                           order='F' if fortran else 'C')
+    return arrays
+
+
+def modelo(ruta=None):
+    """Modelo vigente (``None`` si aún no se ha calculado); se recarga si cambia el fichero"""
+    global _cargado
+    ruta = str(ruta or settings.RECOMENDACIONES_MODELO)
+    try:
+        estado = os.stat(ruta)
+    except FileNotFoundError:
+        return None
+    clave = (ruta, estado.st_mtime_ns, estado.st_size)
+    if _cargado is None or _cargado[0] != clave:
+        _cargado = (clave, mapear(ruta))
+    return _cargado[1]
+
+
+# ==================== RANKING ====================
+
+def afinidad(arrays, posicion):
+    """``R[u]·C + PESO_REPETIR·R[u]`` del usuario en ``posicion``, escalada a [0, 1]
+
+    Suma las filas de ``C`` de los platos que ha pedido, ponderadas por sus
+    raciones: cuesta lo que esas filas, no lo que la matriz.
+    """
+    inicio, fin = arrays['r_punteros'][posicion], arrays['r_punteros'][posicion + 1]
+    pedidos, raciones = arrays['r_indices'][inicio:fin], arrays['r_datos'][inicio:fin]
+    punteros = arrays['c_punteros']
+    largos = punteros[pedidos + 1] - punteros[pedidos]
+    # Posiciones en c_datos/c_indices de las filas de C de los platos pedidos, seguidas
+    desplazamientos = np.arange(largos.sum()) - np.repeat(np.cumsum(largos) - largos, largos)
+    posiciones = np.repeat(punteros[pedidos], largos) + desplazamientos
+
+    num_platos = arrays['platos'].size
+    pesos = np.repeat(raciones, largos) * arrays['c_datos'][posiciones]
+    fila = np.bincount(arrays['c_indices'][posiciones], weights=pesos, minlength=num_platos)
+    fila += PESO_REPETIR * np.bincount(pedidos, weights=raciones, minlength=num_platos)
+    maximo = fila.max(initial=0)
+    return (fila / maximo if maximo else fila).astype(np.float32)
+
+
+def puntuaciones(usuario_id, platos_ids, ruta=None):
+    """Puntuación de cada plato de ``platos_ids`` para el usuario (0 sin modelo)
+
+    Los usuarios sin historial reciben la popularidad; los platos nuevos, 0.
+    """
+    arrays = modelo(ruta)
+    platos_ids = np.asarray(platos_ids, dtype=np.int64)
+    if arrays is None or not platos_ids.size or not arrays['platos'].size:
+        return np.zeros(len(platos_ids), dtype=np.float32)
+
+    usuarios, platos = arrays['usuarios'], arrays['platos']
+    fila = arrays['popularidad']
+    if usuario_id is not None and usuarios.size:
+        posicion = np.searchsorted(usuarios, usuario_id)
+        if posicion < usuarios.size and usuarios[posicion] == usuario_id:
+            fila = afinidad(arrays, posicion)
+
+    columnas = np.minimum(np.searchsorted(platos, platos_ids), platos.size - 1)
+    conocidos = platos[columnas] == platos_ids
+    return np.where(conocidos, fila[columnas], 0).astype(np.float32)
+
+
+def ordenar(usuario_id, elementos, plato_id=lambda elemento: elemento.plato_id, ruta=None):
+    """``elementos`` (p. ej. las disponibilidades del menú) de más a menos recomendado
+
+    Con empates (o sin modelo) se conserva el orden original.
+    """
+    elementos = list(elementos)
+    if not elementos:
+        return elementos
+    valores = puntuaciones(usuario_id, [plato_id(elemento) for elemento in elementos], ruta)
+    return [elementos[i] for i in np.argsort(-valores, kind='stable')]
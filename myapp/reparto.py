@@ -0,0 +1,219 @@
+"""
+Planificación de las rutas de reparto de un día de entrega.
+
+Las direcciones de ``Empresa.direccion`` y ``Cliente.direccion_particular`` se
+geocodifican una sola vez contra un fichero local (``GEOCODIFICACION_DATASET``)
+y las coordenadas se guardan en el propio modelo. Si la dirección cambia, las
+señales las vacían y se vuelven a buscar en la siguiente planificación.
+
+Cada empresa es una parada (un único reparto para todos sus empleados) y cada
+particular la suya. Las paradas se reparten en rutas con un barrido angular
+alrededor de la cocina (``REPARTO_ORIGEN``) respetando la capacidad del
+vehículo, y cada ruta se ordena con vecino más cercano más 2-opt sobre una
+matriz de distancias de NumPy.
+
+Formato del dataset (CSV con cabecera): ``clave,latitud,longitud``, donde
+``clave`` es una dirección completa o un código postal de cinco cifras.
+"""
+import csv
+import logging
+import re
+import unicodedata
+from functools import lru_cache
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Sum
+
+from .hoja_produccion import pedidos_del_dia
+from .models import Cliente, Empresa
+from .servicio import codigo_dia
+
+logger = logging.getLogger(__name__)
+
+RADIO_TIERRA_KM = 6371.0
+CODIGO_POSTAL = re.compile(r'\b(\d{5})\b')
+
+
+# ==================== GEOCODIFICACIÓN ====================
+
+def normalizar(direccion):
+    """Minúsculas, sin tildes ni signos y con los espacios colapsados"""
+    texto = unicodedata.normalize('NFKD', direccion or '').encode('ascii', 'ignore').decode().lower()
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', texto).split())
+
+
+@lru_cache(maxsize=1)
+def _dataset(ruta):
+    coordenadas = {}
+    try:
+        with open(ruta, newline='', encoding='utf-8') as fichero:
+            for fila in csv.DictReader(fichero):
+                coordenadas[normalizar(fila['clave'])] = (float(fila['latitud']), float(fila['longitud']))
+    except FileNotFoundError:
+        logger.warning('No existe el dataset de geocodificación %s', ruta)
+    return coordenadas
+
+
+def geocodificar(direccion, dataset=None):
+    """``(latitud, longitud)`` de la dirección o, si no está, de su código postal"""
+    coordenadas = _dataset(str(dataset or settings.GEOCODIFICACION_DATASET))
+    encontrada = coordenadas.get(normalizar(direccion))
+    if encontrada is None:
+        codigo_postal = CODIGO_POSTAL.search(direccion or '')
+        if codigo_postal:
+            encontrada = coordenadas.get(codigo_postal.group(1))
+    return encontrada
+
+
+# modelo: campo con la dirección
+DIRECCIONES = {Empresa: 'direccion', Cliente: 'direccion_particular'}
+
+
+def geocodificar_pendientes(queryset, dataset=None):
+    """Rellena las coordenadas que falten en ``queryset``; devuelve ``(resueltas, fallidas)``"""
+    campo = DIRECCIONES[queryset.model]
+    pendientes = list(queryset.filter(latitud__isnull=True).exclude(**{f'{campo}__isnull': True})
+                      .exclude(**{campo: ''}).only('id', campo))
+    resueltas = []
+    for objeto in pendientes:
+        coordenadas = geocodificar(getattr(objeto, campo), dataset)
+        if coordenadas:
+            objeto.latitud, objeto.longitud = coordenadas
+            resueltas.append(objeto)
+    queryset.model.objects.bulk_update(resueltas, ['latitud', 'longitud'])
+    return len(resueltas), len(pendientes) - len(resueltas)
+
+
+# ==================== RUTAS ====================
+
+def matriz_distancias(coordenadas):
+    """Distancias en km (haversine) entre todos los pares de ``coordenadas`` (n × 2, grados)"""
+    lat, lon = np.radians(np.asarray(coordenadas, dtype=float)).T
+    dlat = lat[:, None] - lat[None, :]
+    dlon = lon[:, None] - lon[None, :]
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat)[:, None] * np.cos(lat)[None, :] * np.sin(dlon / 2) ** 2
+    return 2 * RADIO_TIERRA_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def vecino_mas_cercano(distancias):
+    """Recorrido desde el nodo 0 yendo siempre al nodo libre más cercano"""
+    n = len(distancias)
+    visitado = np.zeros(n, dtype=bool)
+    visitado[0] = True
+    orden = [0]
+    for _ in range(n - 1):
+        siguiente = int(np.where(visitado, np.inf, distancias[orden[-1]]).argmin())
+        visitado[siguiente] = True
+        orden.append(siguiente)
+    return np.array(orden)
+
+
+def dos_opt(orden, distancias, max_pasadas=50):
+    """Mejora un recorrido cerrado invirtiendo tramos mientras acorten la ruta
+
+    Para cada arista evalúa de una vez (vectorizado) todos los cortes posibles
+    y aplica el mejor. El nodo 0 (la cocina) se queda al principio.
+    """
+    ruta = np.append(orden, orden[0])
+    for _ in range(max_pasadas):
+        mejorada = False
+        for i in range(1, len(ruta) - 2):
+            j = np.arange(i + 1, len(ruta) - 1)
+            a, b, c, d = ruta[i - 1], ruta[i], ruta[j], ruta[j + 1]
+            ahorro = distancias[a, c] + distancias[b, d] - distancias[a, b] - distancias[c, d]
+            k = int(ahorro.argmin())
+            if ahorro[k] < -1e-9:
+                ruta[i:j[k] + 1] = ruta[i:j[k] + 1][::-1].copy()
+                mejorada = True
+        if not mejorada:
+            break
+    return ruta[:-1]
+
+
+def longitud_ruta(orden, distancias):
+    return float(distancias[orden, np.roll(orden, -1)].sum())
+
+
+def agrupar(coordenadas, cantidades, origen, capacidad, max_paradas):
+    """Barrido angular: listas de índices de paradas por ruta"""
+    coordenadas = np.asarray(coordenadas, dtype=float)
+    angulos = np.arctan2(coordenadas[:, 0] - origen[0], coordenadas[:, 1] - origen[1])
+    rutas, actual, carga = [], [], 0
+    for indice in np.argsort(angulos, kind='stable'):
+        if actual and (carga + cantidades[indice] > capacidad or len(actual) >= max_paradas):
+            rutas.append(actual)
+            actual, carga = [], 0
+        actual.append(int(indice))
+        carga += cantidades[indice]
+    if actual:
+        rutas.append(actual)
+    return rutas
+
+
+def paradas_del_dia(fecha):
+    """Paradas (empresas y particulares) con la cantidad de platos a entregar"""
+    if codigo_dia(fecha) is None:
+        return []
+    filas = list(pedidos_del_dia(fecha).values('empresa_id', 'cliente_id').annotate(cantidad=Sum('cantidad')))
+
+    por_empresa, por_cliente = {}, {}
+    for fila in filas:
+        if fila['empresa_id'] is not None:
+            por_empresa[fila['empresa_id']] = por_empresa.get(fila['empresa_id'], 0) + fila['cantidad']
+        elif fila['cliente_id'] is not None:
+            por_cliente[fila['cliente_id']] = por_cliente.get(fila['cliente_id'], 0) + fila['cantidad']
+
+    empresas = Empresa.objects.filter(id__in=por_empresa)
+    clientes = Cliente.objects.filter(id__in=por_cliente)
+    geocodificar_pendientes(empresas)
+    geocodificar_pendientes(clientes)
+
+    paradas = [
+        {'tipo': 'empresa', 'id': e.id, 'nombre': e.nombre, 'direccion': e.direccion or '',
+         'latitud': e.latitud, 'longitud': e.longitud, 'cantidad': por_empresa[e.id]}
+        for e in empresas.order_by('id')
+    ]
+    paradas += [
+        {'tipo': 'particular', 'id': c.id, 'nombre': c.Nombre_Completo, 'direccion': c.direccion_particular or '',
+         'latitud': c.latitud, 'longitud': c.longitud, 'cantidad': por_cliente[c.id]}
+        for c in clientes.order_by('id')
+    ]
+    return paradas
+
+
+def resolver(paradas, origen=None, capacidad=None, max_paradas=None):
+    """Reparte las paradas geolocalizadas en rutas ordenadas"""
+    origen = tuple(origen or settings.REPARTO_ORIGEN)
+    capacidad = capacidad or settings.REPARTO_CAPACIDAD
+    max_paradas = max_paradas or settings.REPARTO_MAX_PARADAS
+
+    ubicadas = [parada for parada in paradas if parada['latitud'] is not None]
+    resultado = {
+        'origen': {'latitud': origen[0], 'longitud': origen[1]},
+        'rutas': [],
+        'sin_ubicacion': [parada for parada in paradas if parada['latitud'] is None],
+    }
+    if not ubicadas:
+        return resultado
+
+    coordenadas = np.array([(parada['latitud'], parada['longitud']) for parada in ubicadas])
+    cantidades = [parada['cantidad'] for parada in ubicadas]
+    for numero, grupo in enumerate(agrupar(coordenadas, cantidades, origen, capacidad, max_paradas), 1):
+        # Nodo 0: la cocina; nodo k: la parada grupo[k - 1]
+        distancias = matriz_distancias(np.vstack([origen, coordenadas[grupo]]))
+        orden = dos_opt(vecino_mas_cercano(distancias), distancias)
+        resultado['rutas'].append({
+            'numero': numero,
+            'distancia_km': round(longitud_ruta(orden, distancias), 2),
+            'cantidad': sum(cantidades[i] for i in grupo),
+            'paradas': [ubicadas[grupo[nodo - 1]] for nodo in orden[1:]],
+        })
+    return resultado
+
+
+def planificar_rutas(fecha, **opciones):
+    """Rutas de reparto del día de entrega ``fecha``"""
+    resultado = resolver(paradas_del_dia(fecha), **opciones)
+    resultado['fecha'] = fecha.isoformat()
+    return resultado
@@ -0,0 +1,153 @@
+"""
+Segmentación RFM (recencia, frecuencia, importe) de clientes y empresas.
+
+``SegmentoRFM`` guarda por cliente y por empresa la fecha del último recibo,
+el número de recibos y el importe total (los recibos fallidos no cuentan), y
+sus puntuaciones de 1 a 5 por quintiles con el segmento que les corresponde.
+
+``actualizar`` es incremental: solo vuelve a agregar, con una consulta
+agrupada por nivel, los clientes y empresas con recibos creados o modificados
+(``Recibo.actualizado``, p. ej. un pago que pasa a fallido) después de la
+marca guardada en ``recibos_hasta``; los que se quedan sin recibos válidos
+salen de la tabla. ``actualizado`` se pone al guardar, antes del commit, así
+que la marca se queda ``MARGEN_MARCA`` por detrás de la hora de la ejecución:
+un recibo que se confirma después de leerla tiene que tener un
+``actualizado`` posterior a la marca y entra en la siguiente. ``puntuar`` recalcula los quintiles sobre la tabla resumen
+con NumPy y guarda solo las filas que cambian. El comando ``calcular_rfm`` hace
+las dos cosas cada noche; con ``--completo`` rehace la tabla entera (recibos
+borrados). Las lecturas (``activos``) no escriben: ven la tabla del último
+cálculo.
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, Max, Q, Sum
+from django.utils import timezone
+
+from .models import Cliente, Recibo, SegmentoRFM
+
+CAMPOS_AGREGADOS = ['ultima_compra', 'recibos', 'importe', 'recibos_hasta', 'actualizado']
+MARGEN_MARCA = timedelta(minutes=5)  # más que la transacción más larga que guarda recibos
+
+
+def _recibos():
+    return Recibo.objects.exclude(estado_pago='fallido')
+
+
+def _agregar(recibos, campo, marca):
+    """``{valor de campo: fila}`` con la última compra, nº de recibos e importe"""
+    filas = recibos.values(campo).annotate(
+        ultima_compra=Max('fecha_compra'), recibos=Count('id'), importe=Sum('total'),
+    ).order_by()
+    return {fila.pop(campo): {**fila, 'recibos_hasta': marca} for fila in filas}
+
+
+def actualizar(completo=False, ahora=None):
+    """Vuelve a agregar los clientes y empresas con recibos nuevos o cambiados; devuelve cuántas filas"""
+    recibos = _recibos()
+    # Los cambios posteriores a la marca quedan para la próxima vez
+    marca = (ahora or timezone.now()) - MARGEN_MARCA
+    if completo:
+        usuarios = empresas = None
+    else:
+        # Todos los estados: un recibo que pasa a fallido también cambia los agregados
+        cambiados = Recibo.objects.filter(actualizado__lte=marca)
+        anterior = SegmentoRFM.objects.aggregate(anterior=Max('recibos_hasta'))['anterior']
+        if anterior is not None:
+            cambiados = cambiados.filter(actualizado__gt=anterior)
+        nuevos = set(cambiados.values_list('usuario_id', 'empresa_id').distinct())
+        if not nuevos:
+            return 0
+        usuarios = {usuario for usuario, _ in nuevos}
+        empresas = {empresa for _, empresa in nuevos if empresa is not None}
+
+    por_usuario = _agregar(recibos if completo else recibos.filter(usuario_id__in=usuarios), 'usuario_id', marca)
+    por_empresa = _agregar(
+        recibos.exclude(empresa=None) if completo else recibos.filter(empresa_id__in=empresas), 'empresa_id', marca
+    )
+    clientes = Cliente.objects.all() if completo else Cliente.objects.filter(usuario_id__in=usuarios)
+    filas_clientes = [
+        SegmentoRFM(cliente_id=cliente_id, **por_usuario[usuario_id])
+        for cliente_id, usuario_id in clientes.values_list('id', 'usuario_id')
+        if usuario_id in por_usuario
+    ]
+    filas_empresas = [SegmentoRFM(empresa_id=empresa_id, **fila) for empresa_id, fila in por_empresa.items()]
+
+    inicio = timezone.now()
+    with transaction.atomic():
+        for filas, clave in ((filas_clientes, 'cliente'), (filas_empresas, 'empresa')):
+            SegmentoRFM.objects.bulk_create(
+                filas, batch_size=1000, update_conflicts=True, unique_fields=[clave], update_fields=CAMPOS_AGREGADOS,
+            )
+        if completo:
+            # Las filas que no se han reescrito ya no tienen recibos válidos
+            SegmentoRFM.objects.filter(actualizado__lt=inicio).delete()
+            return len(filas_clientes) + len(filas_empresas)
+        # Sin recibos válidos (p. ej. su único pago falló): fuera de la tabla
+        borradas, _ = SegmentoRFM.objects.filter(
+            Q(cliente__usuario_id__in=usuarios - por_usuario.keys()) | Q(empresa_id__in=empresas - por_empresa.keys())
+        ).delete()
+    return len(filas_clientes) + len(filas_empresas) + borradas
+
+
+# ==================== PUNTUACIONES ====================
+
+def quintiles(valores):
+    """Puntuación de 1 a 5 de cada valor según su posición (los empates, la misma)"""
+    valores = np.asarray(valores, dtype=np.float64)
+    if not valores.size:
+        return np.zeros(0, dtype=np.int64)
+    ordenados = np.sort(valores)
+    # Percentil medio de cada valor: los empates comparten puntuación
+    posicion = (np.searchsorted(ordenados, valores, 'left') + np.searchsorted(ordenados, valores, 'right')) / 2
+    return np.minimum((posicion / valores.size * 5).astype(np.int64) + 1, 5)
+
+
+def segmentos(r, f):
+    """Segmento de cada par de puntuaciones (arrays)"""
+    return np.select(
+        [(r >= 4) & (f >= 4), (r <= 2) & (f >= 3), f >= 4, (r >= 4) & (f <= 2), r <= 2],
+        ['CAMPEONES', 'EN_RIESGO', 'LEALES', 'NUEVOS', 'PERDIDOS'],
+        default='POTENCIALES',
+    )
+
+
+def puntuar():
+    """Recalcula R, F, M y el segmento de toda la tabla; devuelve cuántas filas cambian
+
+    Clientes y empresas se puntúan por separado: no se comparan entre sí.
+    """
+    cambiadas = []
+    for filtro in ({'empresa': None}, {'cliente': None}):
+        filas = list(SegmentoRFM.objects.filter(**filtro).values_list(
+            'id', 'ultima_compra', 'recibos', 'importe', 'r', 'f', 'm', 'segmento'
+        ))
+        if not filas:
+            continue
+        ids, ultimas, recibos, importes, *actuales = zip(*filas)
+        r = quintiles([ultima.timestamp() for ultima in ultimas])
+        f = quintiles(recibos)
+        m = quintiles([float(importe) for importe in importes])
+        segmento = segmentos(r, f)
+        for i, id_ in enumerate(ids):
+            nuevos = (int(r[i]), int(f[i]), int(m[i]), str(segmento[i]))
+            if nuevos != tuple(actual[i] for actual in actuales):
+                cambiadas.append(SegmentoRFM(id=id_, r=nuevos[0], f=nuevos[1], m=nuevos[2], segmento=nuevos[3]))
+    SegmentoRFM.objects.bulk_update(cambiadas, ['r', 'f', 'm', 'segmento'], batch_size=1000)
+    return len(cambiadas)
+
+
+def refrescar(completo=False, ahora=None):
+    """``actualizar`` y ``puntuar``; devuelve ``(agregadas, repuntuadas)``"""
+    agregadas = actualizar(completo, ahora)
+    return agregadas, puntuar() if agregadas or completo else 0
+
+
+def activos(dias=30, ahora=None):
+    """Clientes con algún recibo en los últimos ``dias`` según la tabla resumen
+
+    Solo lee: la tabla la mantiene al día ``calcular_rfm``.
+    """
+    limite = (ahora or timezone.now()) - timedelta(days=dias)
+    return Cliente.objects.filter(rfm__ultima_compra__gte=limite)
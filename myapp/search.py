@@ -0,0 +1,220 @@
+"""
+Búsqueda de platos por nombre, ingredientes y alérgenos.
+
+Un único punto de entrada (``buscar_platos``) que usan la página del menú, el
+admin y ``PlatoViewSet``:
+
+- PostgreSQL: columna ``search_vector`` (tsvector generado) con índice GIN y
+  similitud por trigramas sobre ``nombre`` para tolerar errores de escritura.
+- SQLite: tabla virtual FTS5 ``myapp_plato_fts`` sincronizada por señales. Si
+  la búsqueda no encuentra nada, los términos mal escritos se corrigen contra
+  el vocabulario del propio índice (cacheado; ``indexar_plato`` lo invalida).
+- Otros motores: ``icontains`` como antes.
+
+Los índices se crean en la migración ``0016_plato_indice_busqueda``.
+"""
+import difflib
+import re
+import unicodedata
+
+from django.core.cache import cache
+from django.db import DatabaseError, connection
+from django.db.models import Case, IntegerField, Q, Value, When
+from rest_framework.filters import SearchFilter
+
+from .models import Plato
+
+FTS_TABLE = 'myapp_plato_fts'
+FTS_VOCAB_TABLE = 'myapp_plato_fts_vocab'
+SEARCH_CONFIG = 'spanish'
+
+# Pesos bm25 por columna: nombre, ingredientes, alergenos
+PESOS_FTS = (10.0, 3.0, 1.0)
+UMBRAL_CORRECCION = 0.75
+LIMITE_RESULTADOS = 200  # solo para el menú (``ids_platos``); el admin y la API paginan
+CLAVE_VOCABULARIO = 'busqueda:vocabulario'
+TIMEOUT_VOCABULARIO = 3600
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def normalizar(texto):
+    """Minúsculas y sin tildes, igual que el tokenizador unicode61 de FTS5"""
+    texto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in texto if not unicodedata.combining(c)).lower()
+
+
+def tokens(texto):
+    return _TOKEN_RE.findall(normalizar(texto))
+
+
+# ==================== API PÚBLICA ====================
+
+def buscar_platos(texto, queryset=None, limite=None):
+    """Filtra ``queryset`` por ``texto`` y lo ordena por relevancia
+
+    En SQLite, ``limite`` acota los ids que devuelve el índice; sin él, todos.
+    """
+    if queryset is None:
+        queryset = Plato.objects.all()
+    texto = (texto or '').strip()
+    if not texto:
+        return queryset
+
+    if connection.vendor == 'postgresql':
+        return _buscar_postgres(texto, queryset)
+    if connection.vendor == 'sqlite':
+        ids = _ids_sqlite(texto, limite)
+        if ids is not None:
+            return ordenar_por_ids(queryset.filter(id__in=ids), ids)
+    return _buscar_icontains(texto, queryset)
+
+
+def ids_platos(texto, limite=LIMITE_RESULTADOS):
+    """Ids de platos que coinciden con ``texto``, del más al menos relevante"""
+    return list(buscar_platos(texto, limite=limite).values_list('id', flat=True)[:limite])
+
+
+def ordenar_por_ids(queryset, ids, campo='id'):
+    """Ordena ``queryset`` según la posición de ``campo`` en ``ids``"""
+    if not ids:
+        return queryset.none()
+    orden = Case(
+        *[When(**{campo: plato_id}, then=Value(posicion)) for posicion, plato_id in enumerate(ids)],
+        output_field=IntegerField(),
+    )
+    return queryset.order_by(orden)
+
+
+# ==================== POSTGRESQL ====================
+
+def _buscar_postgres(texto, queryset):
+    from django.contrib.postgres.search import (
+        SearchQuery, SearchRank, SearchVectorField, TrigramSimilarity,
+    )
+    from django.db.models.expressions import RawSQL
+
+    tabla = Plato._meta.db_table
+    vector = RawSQL(f'{tabla}.search_vector', (), output_field=SearchVectorField())
+    consulta = SearchQuery(texto, config=SEARCH_CONFIG, search_type='websearch')
+    return queryset.extra(
+        where=[
+            f"({tabla}.search_vector @@ websearch_to_tsquery(%s, %s) "
+            f"OR {tabla}.nombre %% %s)"
+        ],
+        params=[SEARCH_CONFIG, texto, texto],
+    ).annotate(
+        relevancia=SearchRank(vector, consulta) + TrigramSimilarity('nombre', texto),
+    ).order_by('-relevancia', 'nombre')
+
+
+# ==================== SQLITE (FTS5) ====================
+
+def _ids_sqlite(texto, limite=None):
+    """Ids ordenados por bm25, o ``None`` si el índice FTS5 no está disponible
+
+    Primero se buscan los términos tal cual (con prefijo); solo si no hay
+    resultados se corrigen contra el vocabulario.
+    """
+    terminos = tokens(texto)
+    if not terminos:
+        return []
+    try:
+        with connection.cursor() as cursor:
+            ids = _match(cursor, ' AND '.join(f'"{termino}"*' for termino in terminos), limite)
+            if ids:
+                return ids
+            consulta = _consulta_fts(terminos, _vocabulario(cursor))
+            return _match(cursor, consulta, limite) if consulta else []
+    except DatabaseError:
+        return None
+
+
+def _match(cursor, consulta, limite):
+    cursor.execute(
+        f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+        f'ORDER BY bm25({FTS_TABLE}, %s, %s, %s) LIMIT %s',
+        [consulta, *PESOS_FTS, -1 if limite is None else limite],  # -1: sin límite
+    )
+    return [fila[0] for fila in cursor.fetchall()]
+
+
+def _vocabulario(cursor):
+    vocabulario = cache.get(CLAVE_VOCABULARIO)
+    if vocabulario is None:
+        cursor.execute(f'SELECT term FROM {FTS_VOCAB_TABLE}')
+        vocabulario = [fila[0] for fila in cursor.fetchall()]
+        cache.set(CLAVE_VOCABULARIO, vocabulario, TIMEOUT_VOCABULARIO)
+    return vocabulario
+
+
+def _consulta_fts(terminos, vocabulario):
+    """
+    Construye la expresión MATCH: cada término admite prefijo y, si no está en
+    el vocabulario, sus correcciones más parecidas.
+    """
+    conocidos = set(vocabulario)
+    grupos = []
+    for termino in terminos:
+        alternativas = [f'"{termino}"*']
+        if termino not in conocidos and not any(v.startswith(termino) for v in vocabulario):
+            correcciones = difflib.get_close_matches(
+                termino, vocabulario, n=3, cutoff=UMBRAL_CORRECCION
+            )
+            if not correcciones:
+                continue
+            alternativas = [f'"{c}"' for c in correcciones]
+        grupos.append('(' + ' OR '.join(alternativas) + ')')
+    return ' AND '.join(grupos)
+
+
+def indexar_plato(plato):
+    """Inserta o actualiza un plato en el índice FTS5"""
+    if connection.vendor != 'sqlite':
+        return
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [plato.pk])
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, nombre, ingredientes, alergenos) '
+                f'VALUES (%s, %s, %s, %s)',
+                [plato.pk, plato.nombre, plato.ingredientes, plato.alergenos],
+            )
+    except DatabaseError:
+        pass
+    cache.delete(CLAVE_VOCABULARIO)
+
+
+def desindexar_plato(plato_id):
+    """Elimina un plato del índice FTS5"""
+    if connection.vendor != 'sqlite':
+        return
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [plato_id])
+    except DatabaseError:
+        pass
+    cache.delete(CLAVE_VOCABULARIO)
+
+
+# ==================== OTROS MOTORES ====================
+
+def _buscar_icontains(texto, queryset):
+    filtro = Q()
+    for termino in texto.split():
+        filtro &= (
+            Q(nombre__icontains=termino)
+            | Q(ingredientes__icontains=termino)
+            | Q(alergenos__icontains=termino)
+        )
+    return queryset.filter(filtro).order_by('nombre')
+
+
+# ==================== INTEGRACIÓN CON DRF ====================
+
+class PlatoSearchFilter(SearchFilter):
+    """``?search=`` de DRF resuelto con el índice de búsqueda de platos"""
+
+    def filter_queryset(self, request, queryset, view):
+        texto = request.query_params.get(self.search_param, '')
+        return buscar_platos(texto, queryset)
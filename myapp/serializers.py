@@ -1,5 +1,7 @@
+from django.utils import timezone
 from rest_framework import serializers
-from .models import Plato, Cliente, Empresa, CarritoItem, Recibo, ReciboItem, PedidoHistorico
+from .models import Plato, Cliente, Empresa, CarritoItem, Recibo, ReciboItem, PedidoHistorico, SegmentoRFM
+from .servicio import completar_fecha_servicio
 
 
 class EmpresaSerializer(serializers.ModelSerializer):
@@ -35,6 +37,28 @@ class CarritoItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = CarritoItem
         fields = '__all__'
+        # El usuario es el de la petición; las altas repetidas suman cantidad (servicio.anadir_al_carrito)
+        read_only_fields = ('usuario',)
+        validators = []
+    
+    def validate(self, attrs):
+        if self.instance is not None:
+            # La reserva es de ese plato y esa fecha: para cambiarlos, quitar la línea y añadirla de nuevo
+            cambiados = {
+                campo: 'No se puede cambiar en una línea del carrito; quítala y añádela de nuevo.'
+                for campo in ('plato', 'dia_semana', 'fecha_servicio')
+                if campo in attrs and attrs[campo] != getattr(self.instance, campo)
+            }
+            if cambiados:
+                raise serializers.ValidationError(cambiados)
+            return attrs
+        
+        linea = CarritoItem(**{campo: attrs.get(campo) for campo in ('plato', 'dia_semana', 'fecha_servicio')})
+        completar_fecha_servicio(linea, timezone.localdate())
+        if linea.fecha_servicio is None:
+            raise serializers.ValidationError({'fecha_servicio': 'Indica la fecha de servicio o el día de la semana.'})
+        attrs['dia_semana'], attrs['fecha_servicio'] = linea.dia_semana, linea.fecha_servicio
+        return attrs
 
 
 class ReciboItemSerializer(serializers.ModelSerializer):
@@ -67,6 +91,18 @@ class PedidoHistoricoSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class SegmentoRFMSerializer(serializers.ModelSerializer):
+    nombre = serializers.SerializerMethodField()
+    segmento_display = serializers.CharField(source='get_segmento_display', read_only=True)
+    
+    class Meta:
+        model = SegmentoRFM
+        fields = '__all__'
+    
+    def get_nombre(self, obj):
+        return obj.cliente.Nombre_Completo if obj.cliente_id else obj.empresa.nombre
+
+
 class DashboardStatsSerializer(serializers.Serializer):
     """Serializer para estadísticas del dashboard"""
     total_pedidos = serializers.IntegerField()
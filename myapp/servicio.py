@@ -0,0 +1,325 @@
+"""
+Fechas de servicio.
+
+El menú semanal (``DisponibilidadPlato``, plato × día de la semana) es el
+patrón; lo que se vende son fechas concretas (``DisponibilidadFecha``). Las
+líneas del carrito y del histórico guardan su ``fecha_servicio`` y el
+``dia_semana`` queda como dato derivado.
+
+``publicar_menu`` crea las fechas de las próximas semanas a partir del patrón
+(el comando ``publicar_menu`` lo hace cada noche) y ``retirar`` quita de las
+fechas futuras las casillas desmarcadas, salvo las que ya tienen ventas o
+reservas. Las semanas con plantilla propia (``SemanaMenu``) o de la rotación
+activa se publican con esa plantilla y los cambios del patrón no las tocan
+(ver ``planificacion.aplicar_plantilla``).
+El límite de raciones de cada fecha se reserva al añadir al carrito y se
+descuenta en el checkout, siempre con UPDATE condicionales que no necesitan
+bloqueos.
+"""
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Max, Q
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .menu import invalidacion_agrupada, invalidar_menu
+from .models import CarritoItem, DisponibilidadFecha, DisponibilidadPlato, PlantillaMenuPlato
+
+CODIGOS_DIA = [codigo for codigo, _ in DisponibilidadPlato.DIAS_SEMANA]  # lunes = 0
+NOMBRES_DIA = dict(DisponibilidadPlato.DIAS_SEMANA)
+
+
+def codigo_dia(fecha):
+    """Código de día de la semana de ``fecha`` (``None`` en domingo, sin servicio)"""
+    dia = fecha.weekday()
+    return CODIGOS_DIA[dia] if dia < len(CODIGOS_DIA) else None
+
+
+def proxima_fecha(codigo, desde):
+    """Primera fecha a partir de ``desde`` (incluida) que cae en ``codigo``"""
+    return desde + timedelta(days=(CODIGOS_DIA.index(codigo) - desde.weekday()) % 7)
+
+
+def completar_fecha_servicio(linea, referencia):
+    """Rellena ``fecha_servicio`` o ``dia_semana`` de una línea a partir del otro
+
+    Las líneas que solo traen el día (API y clientes antiguos) se sirven en la
+    próxima fecha de ese día a partir de ``referencia``.
+    """
+    if linea.fecha_servicio is None:
+        if linea.dia_semana:
+            linea.fecha_servicio = proxima_fecha(linea.dia_semana, referencia)
+    elif codigo_dia(linea.fecha_servicio):
+        linea.dia_semana = codigo_dia(linea.fecha_servicio)
+
+
+def lunes_de(fecha):
+    return fecha - timedelta(days=fecha.weekday())
+
+
+def fechas_servicio(desde=None, dias=7):
+    """Fechas con servicio (sin domingos) de los ``dias`` siguientes a ``desde`` (incluido)"""
+    desde = desde or timezone.localdate()
+    return [desde + timedelta(days=i) for i in range(dias) if codigo_dia(desde + timedelta(days=i))]
+
+
+def fecha_desde_parametros(fecha=None, dia=None, hoy=None, defecto=None):
+    """Fecha de servicio pedida por ``?fecha=AAAA-MM-DD`` o, en su defecto, ``?dia=LUN``
+
+    Sin parámetros, ``defecto`` o la próxima fecha con servicio. ``ValueError``
+    si no es válida.
+    """
+    hoy = hoy or timezone.localdate()
+    if fecha:
+        try:
+            resultado = date.fromisoformat(fecha)
+        except ValueError:
+            raise ValueError(f"Fecha no válida: {fecha}")
+        if codigo_dia(resultado) is None:
+            raise ValueError("Los domingos no hay servicio")
+        return resultado
+    if dia:
+        if dia not in CODIGOS_DIA:
+            raise ValueError(f"Día no válido: {dia}")
+        return proxima_fecha(dia, hoy)
+    return defecto or fechas_servicio(hoy)[0]
+
+
+# ==================== PUBLICACIÓN ====================
+
+def plantillas_de_semanas(desde, hasta):
+    """``{lunes: plantilla_id}`` de las semanas entre ``desde`` y ``hasta`` que no siguen el patrón
+
+    La plantilla aplicada a la semana (``SemanaMenu``) manda sobre la que le
+    toca por la rotación activa.
+    """
+    # planificacion importa este módulo
+    from .planificacion import plantillas_asignadas
+    return plantillas_asignadas(lunes_de(desde), lunes_de(hasta))
+
+
+def publicar_menu(desde=None, semanas=None, platos=None):
+    """Crea las ``DisponibilidadFecha`` que falten según el menú de cada semana
+
+    Cubre ``semanas`` (``MENU_SEMANAS_PUBLICADAS`` por defecto) desde ``desde``.
+    Cada semana sale de su plantilla (``plantillas_de_semanas``) o, si no
+    tiene, del menú semanal. Las fechas ya publicadas no se tocan: conservan
+    su capacidad y sus ventas. Devuelve el número de fechas creadas.
+    """
+    desde = desde or timezone.localdate()
+    semanas = semanas if semanas is not None else settings.MENU_SEMANAS_PUBLICADAS
+    fechas = fechas_servicio(desde, semanas * 7)
+    if not fechas:
+        return 0
+
+    plantillas = plantillas_de_semanas(fechas[0], fechas[-1])
+    patron = DisponibilidadPlato.objects.all()
+    casillas_plantillas = PlantillaMenuPlato.objects.filter(plantilla_id__in=set(plantillas.values()))
+    if platos is not None:
+        patron = patron.filter(plato__in=platos)
+        casillas_plantillas = casillas_plantillas.filter(plato__in=platos)
+    # {(plantilla_id o None para el patrón, dia): [(plato_id, capacidad)]}
+    por_dia = {}
+    for plato_id, dia, capacidad in patron.values_list('plato_id', 'dia', 'plato__capacidad_diaria'):
+        por_dia.setdefault((None, dia), []).append((plato_id, capacidad))
+    if plantillas:
+        for plantilla_id, plato_id, dia, capacidad in casillas_plantillas.values_list(
+            'plantilla_id', 'plato_id', 'dia', 'plato__capacidad_diaria'
+        ):
+            por_dia.setdefault((plantilla_id, dia), []).append((plato_id, capacidad))
+
+    existentes = DisponibilidadFecha.objects.filter(fecha__gte=fechas[0], fecha__lte=fechas[-1])
+    if platos is not None:
+        existentes = existentes.filter(plato__in=platos)
+    existentes = set(existentes.values_list('plato_id', 'fecha'))
+    nuevas = [
+        DisponibilidadFecha(plato_id=plato_id, fecha=fecha, capacidad=capacidad)
+        for fecha in fechas
+        for plato_id, capacidad in por_dia.get((plantillas.get(lunes_de(fecha)), codigo_dia(fecha)), ())
+        if (plato_id, fecha) not in existentes
+    ]
+    DisponibilidadFecha.objects.bulk_create(nuevas, ignore_conflicts=True)
+    if nuevas:
+        invalidar_menu()
+    return len(nuevas)
+
+
+def retirar(casillas, desde=None):
+    """Quita las fechas futuras de las casillas ``(plato_id, dia)`` desmarcadas del patrón
+
+    Las fechas con ventas o reservas se conservan, y las semanas con plantilla
+    no se tocan. Devuelve cuántas se han borrado.
+    """
+    por_dia = {}
+    for plato_id, dia in casillas:
+        por_dia.setdefault(dia, []).append(plato_id)
+    if not por_dia:
+        return 0
+    desde = desde or timezone.localdate()
+    filtro = Q()
+    for dia, platos in por_dia.items():
+        filtro |= Q(plato_id__in=platos, fecha__iso_week_day=CODIGOS_DIA.index(dia) + 1)
+    candidatas = DisponibilidadFecha.objects.filter(filtro, fecha__gte=desde, vendidas=0, reservadas=0)
+
+    hasta = candidatas.aggregate(hasta=Max('fecha'))['hasta']
+    if hasta is None:
+        return 0
+    for lunes in plantillas_de_semanas(desde, hasta):
+        candidatas = candidatas.exclude(fecha__gte=lunes, fecha__lt=lunes + timedelta(days=7))
+    with invalidacion_agrupada():
+        borradas, _ = candidatas.delete()
+    return borradas
+
+
+# ==================== CAPACIDAD ====================
+# Cada fecha cuenta las raciones reservadas en carritos y las vendidas. Añadir
+# al carrito reserva con un UPDATE condicional (``reservadas + n <= capacidad``)
+# y el checkout convierte la reserva en venta. Las reservas de carritos sin
+# tocar durante ``CARRITO_RESERVA_MINUTOS`` caducan y vuelven al cupo
+# (``liberar_caducadas``, comando ``liberar_reservas``).
+
+class CapacidadAgotada(ValueError):
+    """No quedan raciones suficientes de un plato en su fecha de servicio"""
+
+    def __init__(self, plato, fecha, quedan=0):
+        self.plato, self.fecha, self.quedan = plato, fecha, quedan
+        detalle = f" (quedan {quedan})" if quedan else ""
+        super().__init__(f"No quedan raciones suficientes de {plato.nombre} para el {fecha:%d/%m/%Y}{detalle}")
+
+
+class NoALaVenta(ValueError):
+    """El plato no está publicado (``DisponibilidadFecha``) en esa fecha de servicio"""
+
+    def __init__(self, plato, fecha):
+        self.plato, self.fecha = plato, fecha
+        cuando = f"el {fecha:%d/%m/%Y}" if fecha else "sin fecha de servicio"
+        super().__init__(f"{plato.nombre} no está a la venta {cuando}.")
+
+
+def _hay_sitio(cantidad):
+    """La fecha no tiene límite o aún le caben ``cantidad`` raciones"""
+    return Q(capacidad__isnull=True) | Q(capacidad__gte=F('vendidas') + F('reservadas') + cantidad)
+
+
+def reservar(plato_id, fecha, cantidad):
+    """Aparta ``cantidad`` raciones de la fecha; ``False`` si no caben o no se vende
+
+    Si no caben, libera las reservas caducadas de esa fecha y lo intenta otra vez.
+    """
+    for intento in range(2):
+        actualizadas = DisponibilidadFecha.objects.filter(
+            _hay_sitio(cantidad), plato_id=plato_id, fecha=fecha
+        ).update(reservadas=F('reservadas') + cantidad)
+        if actualizadas:
+            return True
+        if intento == 0 and not liberar_caducadas(plato_id=plato_id, fecha=fecha):
+            break
+    return False
+
+
+def liberar(cantidades):
+    """Devuelve al cupo las reservas ``{(plato_id, fecha): cantidad}``"""
+    for (plato_id, fecha), cantidad in sorted(cantidades.items()):
+        if cantidad:
+            DisponibilidadFecha.objects.filter(plato_id=plato_id, fecha=fecha).update(
+                reservadas=Greatest(F('reservadas') - cantidad, 0)
+            )
+
+
+def liberar_caducadas(plato_id=None, fecha=None, ahora=None, limite=None):
+    """Libera las reservas de carrito caducadas (todas o las de una fecha)
+
+    Las líneas siguen en el carrito, sin reserva: en el checkout solo se
+    venden si aún caben. Devuelve cuántas líneas se han liberado.
+    """
+    caducadas = CarritoItem.objects.filter(reservada__gt=0, reserva_expira__lt=ahora or timezone.now())
+    if plato_id is not None:
+        caducadas = caducadas.filter(plato_id=plato_id, fecha_servicio=fecha)
+    with transaction.atomic():
+        # skip_locked: las líneas de un checkout en curso se quedan como están
+        lineas = list(caducadas.select_for_update(skip_locked=True).values_list(
+            'id', 'plato_id', 'fecha_servicio', 'reservada'
+        )[:limite])
+        if not lineas:
+            return 0
+        cantidades = {}
+        for _, plato, dia, reservada in lineas:
+            cantidades[(plato, dia)] = cantidades.get((plato, dia), 0) + reservada
+        CarritoItem.objects.filter(id__in=[linea[0] for linea in lineas]).update(reservada=0, reserva_expira=None)
+        liberar(cantidades)
+    return len(lineas)
+
+
+def _reservar_o_fallar(plato, fecha, cantidad):
+    if not reservar(plato.id, fecha, cantidad):
+        disponibilidad = DisponibilidadFecha.objects.filter(plato=plato, fecha=fecha).first()
+        if disponibilidad is None:
+            raise NoALaVenta(plato, fecha)
+        raise CapacidadAgotada(plato, fecha, disponibilidad.restantes)
+
+
+def anadir_al_carrito(usuario, plato, fecha, cantidad):
+    """Añade ``cantidad`` raciones de ``plato`` al carrito reservándolas en ``fecha``
+
+    ``CapacidadAgotada`` si no quedan y ``NoALaVenta`` si el plato no se
+    vende esa fecha.
+    """
+    if cantidad < 1:
+        raise ValueError("La cantidad debe ser al menos 1")
+    if fecha < timezone.localdate():
+        raise NoALaVenta(plato, fecha)
+
+    with transaction.atomic():
+        _reservar_o_fallar(plato, fecha, cantidad)
+        expira = timezone.now() + timedelta(minutes=settings.CARRITO_RESERVA_MINUTOS)
+        item, creado = CarritoItem.objects.get_or_create(
+            usuario=usuario, plato=plato, fecha_servicio=fecha,
+            defaults={'cantidad': cantidad, 'reservada': cantidad, 'reserva_expira': expira},
+        )
+        if not creado:
+            CarritoItem.objects.filter(pk=item.pk).update(
+                cantidad=F('cantidad') + cantidad, reservada=F('reservada') + cantidad, reserva_expira=expira
+            )
+    return item
+
+
+def cambiar_cantidad(item, cantidad):
+    """Deja la línea ``item`` del carrito en ``cantidad`` raciones ajustando su reserva
+
+    Las raciones de más se reservan (``CapacidadAgotada`` o ``NoALaVenta`` si
+    no se puede) y las de menos devuelven al cupo lo que tuvieran reservado.
+    """
+    if cantidad < 1:
+        raise ValueError("La cantidad debe ser al menos 1")
+    with transaction.atomic():
+        item = CarritoItem.objects.select_related('plato').select_for_update(of=('self',)).get(pk=item.pk)
+        diferencia = cantidad - item.cantidad
+        cambios = {'cantidad': cantidad}
+        if diferencia > 0:
+            _reservar_o_fallar(item.plato, item.fecha_servicio, diferencia)
+            cambios['reservada'] = item.reservada + diferencia
+            cambios['reserva_expira'] = timezone.now() + timedelta(minutes=settings.CARRITO_RESERVA_MINUTOS)
+        elif diferencia < 0 and item.reservada:
+            devueltas = min(-diferencia, item.reservada)
+            liberar({(item.plato_id, item.fecha_servicio): devueltas})
+            cambios['reservada'] = item.reservada - devueltas
+            if not cambios['reservada']:
+                cambios['reserva_expira'] = None
+        CarritoItem.objects.filter(pk=item.pk).update(**cambios)
+    item.refresh_from_db()
+    return item
+
+
+def vender(plato_id, fecha, cantidad, reservadas=0):
+    """Convierte en venta ``cantidad`` raciones, ``reservadas`` de ellas ya apartadas
+
+    Un único UPDATE condicional: la parte sin reserva solo se vende si cabe,
+    así que dos compras simultáneas nunca superan la capacidad. Devuelve
+    ``False`` si no cabe o si la fecha no está publicada: solo se vende lo
+    que tiene su ``DisponibilidadFecha``.
+    """
+    return bool(DisponibilidadFecha.objects.filter(
+        _hay_sitio(cantidad - reservadas), plato_id=plato_id, fecha=fecha,
+    ).update(vendidas=F('vendidas') + cantidad, reservadas=F('reservadas') - reservadas))
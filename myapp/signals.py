@@ -0,0 +1,110 @@
+"""
+Señales de la aplicación.
+
+Mantienen sincronizados los índices derivados de los modelos y publican los
+cambios del dashboard en vivo.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+
+from . import cohortes, eventos, ranking, servicio
+from .menu import invalidar_menu
+from .models import (
+    CarritoItem, Cliente, DisponibilidadFecha, Empresa, Inventario, PedidoHistorico, Plato, Produccion, Recibo,
+)
+from .reparto import DIRECCIONES
+from .search import desindexar_plato, indexar_plato
+
+
+@receiver(post_save, sender=Plato)
+def plato_guardado(sender, instance, raw=False, **kwargs):
+    if not raw:
+        indexar_plato(instance)
+    invalidar_menu()
+    ranking.invalidar_platos()
+
+
+@receiver(post_delete, sender=Plato)
+def plato_eliminado(sender, instance, **kwargs):
+    desindexar_plato(instance.pk)
+    invalidar_menu()
+    # Sus pedidos se borran en cascada
+    ranking.invalidar_ranking()
+    ranking.invalidar_platos()
+
+
+@receiver(post_save, sender=DisponibilidadFecha)
+@receiver(post_delete, sender=DisponibilidadFecha)
+def disponibilidad_modificada(sender, **kwargs):
+    invalidar_menu()
+
+
+@receiver(post_delete, sender=CarritoItem)
+def carrito_item_eliminado(sender, instance, **kwargs):
+    # Línea quitada del carrito (no vendida): su reserva vuelve al cupo
+    if instance.reservada:
+        servicio.liberar({(instance.plato_id, instance.fecha_servicio): instance.reservada})
+
+
+@receiver(post_save, sender=PedidoHistorico)
+def pedido_historico_guardado(sender, instance, raw=False, **kwargs):
+    # Un pedido de un mes cerrado cambia la retención ya cacheada de ese mes.
+    # Sin post_delete a propósito: los borrados masivos (archivo) siguen siendo rápidos
+    if not raw:
+        cohortes.invalidar_meses([instance.fecha_emision])
+
+
+# ==================== COORDENADAS DE REPARTO ====================
+
+@receiver(post_init, sender=Empresa)
+@receiver(post_init, sender=Cliente)
+def recordar_direccion(sender, instance, **kwargs):
+    # __dict__: no fuerza la carga de campos diferidos
+    instance._direccion_geocodificada = instance.__dict__.get(DIRECCIONES[sender])
+
+
+@receiver(pre_save, sender=Empresa)
+@receiver(pre_save, sender=Cliente)
+def descartar_coordenadas(sender, instance, raw=False, **kwargs):
+    """Si cambia la dirección, las coordenadas se vuelven a geocodificar"""
+    direccion = instance.__dict__.get(DIRECCIONES[sender])
+    if not raw and instance.pk and direccion != instance._direccion_geocodificada:
+        instance.latitud = instance.longitud = None
+
+
+# ==================== DASHBOARD EN VIVO ====================
+
+def _publicar_delta(instancia, anterior, nueva):
+    cambios = eventos.delta(anterior, nueva)
+    if cambios:
+        evento = {'modelo': instancia._meta.model_name, 'id': instancia.pk, 'cambios': cambios}
+        transaction.on_commit(lambda: eventos.publicar(evento))
+
+
+@receiver(post_init, sender=Recibo)
+@receiver(post_init, sender=Produccion)
+@receiver(post_init, sender=Inventario)
+def recordar_aportacion(sender, instance, **kwargs):
+    instance._aportacion_dashboard = eventos.aportacion(instance)
+
+
+@receiver(post_save, sender=Recibo)
+@receiver(post_save, sender=Produccion)
+@receiver(post_save, sender=Inventario)
+def publicar_guardado(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    anterior = None if created else instance._aportacion_dashboard
+    nueva = eventos.aportacion(instance)
+    if created or anterior is not None:
+        _publicar_delta(instance, anterior, nueva)
+    instance._aportacion_dashboard = nueva
+
+
+@receiver(post_delete, sender=Recibo)
+@receiver(post_delete, sender=Produccion)
+@receiver(post_delete, sender=Inventario)
+def publicar_eliminado(sender, instance, **kwargs):
+    if instance._aportacion_dashboard is not None:
+        _publicar_delta(instance, instance._aportacion_dashboard, None)
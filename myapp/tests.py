@@ -3,6 +3,7 @@ from django.contrib.auth.models import User
 from django.urls import reverse
 from django.core.exceptions import ValidationError
 from decimal import Decimal
+import json
 from rest_framework.test import APITestCase
 from rest_framework import status
 from .models import Cliente, Empresa, Plato, CarritoItem, Recibo, ReciboItem, DisponibilidadPlato
@@ -190,6 +191,458 @@ class CarritoItemModelTest(TestCase):
         self.assertEqual(item.usuario, self.user)
 
 
+class CheckoutTest(TestCase):
+    """Tests para la confirmación del carrito"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user('testuser', 'pass')
+        self.empresa = Empresa.objects.create(
+            codigo="EMP001",
+            nombre="Empresa Test",
+            cif="B12345678"
+        )
+        Cliente.objects.create(
+            Nombre_Completo="Test Cliente",
+            usuario=self.user,
+            empresa=self.empresa
+        )
+        self.plato = Plato.objects.create(
+            codigo="PLT001",
+            nombre="Test Plato",
+            precio=Decimal('10.00')
+        )
+        DisponibilidadPlato.objects.create(plato=self.plato, dia='MAR')
+        
+    def test_confirmar_carrito(self):
+        """Test que el carrito se convierte en recibo e histórico"""
+        from .checkout import confirmar_carrito
+        from .models import PedidoHistorico
+        from .servicio import NoALaVenta, publicar_menu
+        CarritoItem.objects.create(usuario=self.user, plato=self.plato, cantidad=3, dia_semana='MAR')
+        # Solo se vende lo publicado: sin fecha de servicio no se crea nada
+        with self.assertRaises(NoALaVenta):
+            confirmar_carrito(self.user)
+        self.assertFalse(Recibo.objects.exists())
+        
+        publicar_menu(semanas=1)
+        recibo = confirmar_carrito(self.user)
+        self.assertEqual(recibo.total, Decimal('30.00'))
+        self.assertEqual(recibo.empresa, self.empresa)
+        self.assertEqual(recibo.items.get().cantidad, 3)
+        self.assertEqual(PedidoHistorico.objects.get().dia_semana, 'MAR')
+        self.assertFalse(CarritoItem.objects.filter(usuario=self.user).exists())
+        
+    def test_no_vende_fechas_pasadas(self):
+        """Test que una línea cuyo día de servicio ya ha pasado no se cobra"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from .checkout import confirmar_carrito
+        from .models import DisponibilidadFecha
+        from .servicio import NoALaVenta
+        ayer = timezone.localdate() - timedelta(days=1)
+        DisponibilidadFecha.objects.create(plato=self.plato, fecha=ayer)
+        CarritoItem.objects.create(usuario=self.user, plato=self.plato, cantidad=1, fecha_servicio=ayer)
+        
+        with self.assertRaises(NoALaVenta) as contexto:
+            confirmar_carrito(self.user)
+        self.assertEqual(contexto.exception.fecha, ayer)
+        self.assertFalse(Recibo.objects.exists())
+        self.assertEqual(DisponibilidadFecha.objects.get(plato=self.plato, fecha=ayer).vendidas, 0)
+        
+    def test_confirmar_carrito_vacio(self):
+        """Test que un carrito vacío no genera recibo"""
+        from .checkout import confirmar_carrito
+        self.assertIsNone(confirmar_carrito(self.user))
+        self.assertFalse(Recibo.objects.exists())
+
+
+class RankingTest(TestCase):
+    """Tests del ranking materializado de platos más vendidos"""
+    
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.plato1 = Plato.objects.create(codigo="PLT001", nombre="Lentejas", precio=Decimal('8.00'))
+        self.plato2 = Plato.objects.create(codigo="PLT002", nombre="Paella", precio=Decimal('12.00'))
+        
+    def test_ventanas_e_incremento_en_checkout(self):
+        """Test que el checkout actualiza el ranking sin reconstruirlo"""
+        from datetime import date, timedelta
+        from unittest import mock
+        from .checkout import confirmar_carrito
+        from django.utils import timezone
+        from .servicio import publicar_menu
+        from . import ranking
+        
+        antiguo = Recibo.objects.create(
+            usuario=self.user, total=Decimal('40.00'), fecha_compra=timezone.now() - timedelta(days=10)
+        )
+        ReciboItem.objects.create(recibo=antiguo, plato=self.plato1, cantidad=5, precio_unitario=Decimal('8.00'))
+        fallido = Recibo.objects.create(usuario=self.user, total=Decimal('8.00'), estado_pago='fallido')
+        ReciboItem.objects.create(recibo=fallido, plato=self.plato1, cantidad=1, precio_unitario=Decimal('8.00'))
+        self.assertEqual(ranking.mas_vendidos('7d'), [])
+        self.assertEqual(ranking.mas_vendidos('30d')[0]['cantidad'], 5)
+        self.assertEqual(ranking.mas_vendidos('total')[0]['cantidad'], 5)
+        
+        DisponibilidadPlato.objects.create(plato=self.plato2, dia='LUN')
+        publicar_menu(semanas=1)
+        CarritoItem.objects.create(usuario=self.user, plato=self.plato2, cantidad=3, dia_semana='LUN')
+        with mock.patch.object(ranking, 'reconstruir') as reconstruir:
+            with self.captureOnCommitCallbacks(execute=True):
+                confirmar_carrito(self.user)
+            self.assertEqual(
+                ranking.mas_vendidos('7d'),
+                [{'plato_id': self.plato2.id, 'nombre': 'Paella', 'cantidad': 3}]
+            )
+            self.assertEqual(
+                [(fila['nombre'], fila['cantidad']) for fila in ranking.mas_vendidos('total')],
+                [('Lentejas', 5), ('Paella', 3)]
+            )
+            reconstruir.assert_not_called()
+            
+    def test_cubos_diarios_al_deslizar_la_ventana(self):
+        """Test que al cambiar de día solo se consultan los días nuevos"""
+        from datetime import timedelta
+        from unittest import mock
+        from django.utils import timezone
+        from . import ranking
+        
+        hoy = timezone.localdate()
+        antiguo = Recibo.objects.create(
+            usuario=self.user, total=Decimal('32.00'), fecha_compra=timezone.now() - timedelta(days=6)
+        )
+        ReciboItem.objects.create(recibo=antiguo, plato=self.plato1, cantidad=4, precio_unitario=Decimal('8.00'))
+        reciente = Recibo.objects.create(usuario=self.user, total=Decimal('24.00'))
+        ReciboItem.objects.create(recibo=reciente, plato=self.plato2, cantidad=2, precio_unitario=Decimal('12.00'))
+        
+        resumen = lambda ventana: [(fila['nombre'], fila['cantidad']) for fila in ranking.mas_vendidos(ventana)]
+        self.assertEqual(resumen('7d'), [('Lentejas', 4), ('Paella', 2)])
+        self.assertEqual(resumen('total'), [('Lentejas', 4), ('Paella', 2)])
+        
+        with mock.patch.object(ranking.timezone, 'localdate', return_value=hoy + timedelta(days=1)):
+            # El cubo del día nuevo y el avance del histórico: una consulta cada uno
+            with self.assertNumQueries(2):
+                self.assertEqual(resumen('7d'), [('Paella', 2)])
+                self.assertEqual(resumen('total'), [('Lentejas', 4), ('Paella', 2)])
+            
+    def test_ventas_concurrentes_no_se_pierden(self):
+        """Test que las ventas simultáneas suman todas y sin cerrojo se rehace el día"""
+        import threading
+        from unittest import mock
+        from django.core.cache import cache
+        from . import ranking
+        
+        self.assertEqual(ranking.mas_vendidos('7d'), [])
+        hilos = [
+            threading.Thread(target=ranking.registrar_venta, args=([(self.plato1.id, 1)],)) for _ in range(20)
+        ]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        self.assertEqual(ranking.mas_vendidos('7d')[0]['cantidad'], 20)
+        
+        # Con el cerrojo ocupado la venta no se suma: se descartan hoy y las ventanas
+        cache.add(ranking.CLAVE_CERROJO, 1, 5)
+        with mock.patch.object(ranking, 'ESPERA_CERROJO', 0):
+            ranking.registrar_venta([(self.plato1.id, 1)])
+        self.assertIsNone(cache.get(ranking._clave('7d')))
+        self.assertEqual(ranking.mas_vendidos('7d'), [])
+        
+    def test_api_mas_vendidos(self):
+        """Test del endpoint de más vendidos con ventana"""
+        from rest_framework.test import APIClient
+        recibo = Recibo.objects.create(usuario=self.user, total=Decimal('16.00'))
+        ReciboItem.objects.create(recibo=recibo, plato=self.plato1, cantidad=2, precio_unitario=Decimal('8.00'))
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        response = client.get('/api/platos/mas_vendidos/?ventana=7d')
+        self.assertEqual(response.json(), [{'plato__nombre': 'Lentejas', 'total_vendido': 2}])
+        response = client.get('/api/platos/mas_vendidos/?ventana=1y')
+        self.assertEqual(response.status_code, 400)
+
+
+class ArchivoHistoricoTest(TestCase):
+    """Tests del archivo de pedidos históricos"""
+    
+    def setUp(self):
+        from datetime import date, timedelta
+        from django.core.cache import cache
+        from .models import PedidoHistorico
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.plato = Plato.objects.create(codigo="PLT001", nombre="Lentejas", precio=Decimal('8.00'))
+        for dias, cantidad in [(800, 1), (500, 2), (10, 4)]:
+            pedido = PedidoHistorico.objects.create(
+                usuario=self.user, plato=self.plato, cantidad=cantidad, dia_semana='LUN'
+            )
+            PedidoHistorico.objects.filter(pk=pedido.pk).update(fecha_emision=date.today() - timedelta(days=dias))
+        
+    def test_archivar_por_lotes_y_consultar_ambas_tablas(self):
+        """Test que se archiva por lotes y las consultas unen ambas tablas"""
+        from datetime import date, timedelta
+        from django.db.models import Sum
+        from .models import PedidoHistorico, PedidoHistoricoArchivado
+        from . import archivo
+        
+        antes_de = archivo.horizonte(12)
+        self.assertEqual(archivo.archivar(PedidoHistorico, antes_de, lote=1, max_lotes=1), 1)
+        self.assertEqual(archivo.archivar(PedidoHistorico, antes_de, lote=1), 1)
+        self.assertEqual(archivo.archivar(PedidoHistorico, antes_de), 0)
+        self.assertEqual(PedidoHistorico.objects.count(), 1)
+        self.assertEqual(PedidoHistoricoArchivado.objects.count(), 2)
+        
+        self.assertEqual(archivo.contar(PedidoHistorico), 3)
+        self.assertEqual(len(archivo.querysets(PedidoHistorico, desde=date.today() - timedelta(days=30))), 1)
+        self.assertEqual(
+            archivo.agregar(PedidoHistorico, ['plato'], cantidad=Sum('cantidad')),
+            [{'plato': self.plato.id, 'cantidad': 7}]
+        )
+        self.assertEqual(archivo.contar(PedidoHistorico, desde=date.today() - timedelta(days=600)), 2)
+
+
+class FacturacionEmpresaTest(TestCase):
+    """Tests de la facturación semanal consolidada"""
+    
+    def setUp(self):
+        from .servicio import publicar_menu
+        self.empresa = Empresa.objects.create(
+            codigo="EMP001", nombre="Empresa B2B", cif="B12345678", facturacion_consolidada=True
+        )
+        self.plato = Plato.objects.create(codigo="PLT001", nombre="Lentejas", precio=Decimal('8.00'))
+        DisponibilidadPlato.objects.create(plato=self.plato, dia='LUN')
+        publicar_menu(semanas=1)
+        self.empleados = []
+        for i in range(2):
+            user = User.objects.create_user(username=f'empleado{i}', password='testpass123')
+            Cliente.objects.create(Nombre_Completo=f'Empleado {i}', usuario=user, empresa=self.empresa)
+            self.empleados.append(user)
+        
+    def test_checkout_b2b_sin_paycomet_y_factura_semanal(self):
+        """Test que los pedidos B2B se agrupan en una factura por empresa"""
+        from datetime import date
+        from .checkout import confirmar_carrito
+        from .facturacion import facturar_semana, lunes_de, marcar_pagadas
+        
+        for user in self.empleados:
+            CarritoItem.objects.create(usuario=user, plato=self.plato, cantidad=2, dia_semana='LUN')
+        self.client.login(username='empleado0', password='testpass123')
+        response = self.client.get(reverse('procesar_pago'))
+        self.assertRedirects(response, reverse('main'), fetch_redirect_response=False)
+        confirmar_carrito(self.empleados[1])
+        self.assertEqual(Recibo.objects.filter(metodo_pago=Recibo.METODO_FACTURA_SEMANAL).count(), 2)
+        # Se cobran con la factura: no son pagos pendientes
+        self.assertEqual(set(Recibo.objects.values_list('estado_pago', flat=True)), {'facturado'})
+        staff = User.objects.create_user(username='admin', password='testpass123', is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get('/api/dashboard/estadisticas/').json()['pedidos_pendientes'], 0)
+        
+        facturas = facturar_semana(lunes_de(date.today()))
+        self.assertEqual(len(facturas), 1)
+        factura = facturas[0]
+        self.assertEqual(factura.total, Decimal('32.00'))
+        self.assertEqual([(l.cantidad, l.precio_unitario) for l in factura.lineas.all()], [(4, Decimal('8.00'))])
+        self.assertEqual(factura.recibos.count(), 2)
+        self.assertEqual(facturar_semana(lunes_de(date.today())), [])
+        
+        # Un pedido tardío suma a la factura y a la línea existente
+        CarritoItem.objects.create(usuario=self.empleados[0], plato=self.plato, cantidad=1, dia_semana='LUN')
+        confirmar_carrito(self.empleados[0])
+        self.assertEqual(facturar_semana(lunes_de(date.today())), [factura])
+        factura.refresh_from_db()
+        self.assertEqual(factura.total, Decimal('40.00'))
+        self.assertEqual([(l.cantidad, l.precio_unitario) for l in factura.lineas.all()], [(5, Decimal('8.00'))])
+        
+        self.assertEqual(marcar_pagadas([factura]), 3)
+        self.assertFalse(Recibo.objects.filter(pagado=False).exists())
+        
+        # Tras pagarla, un pedido tardío va a una factura complementaria
+        CarritoItem.objects.create(usuario=self.empleados[1], plato=self.plato, cantidad=2, dia_semana='LUN')
+        confirmar_carrito(self.empleados[1])
+        complementaria, = facturar_semana(lunes_de(date.today()))
+        self.assertNotEqual(complementaria, factura)
+        self.assertEqual(complementaria.numero, f'{factura.numero}-C1')
+        self.assertEqual(complementaria.total, Decimal('16.00'))
+        self.assertEqual([l.cantidad for l in complementaria.lineas.all()], [2])
+        factura.refresh_from_db()
+        self.assertEqual((factura.total, factura.recibos.count()), (Decimal('40.00'), 3))
+        self.assertEqual([l.cantidad for l in factura.lineas.all()], [5])
+        self.assertEqual(marcar_pagadas([complementaria]), 1)
+
+
+class DocumentosTest(TestCase):
+    """Tests de la generación de PDF de recibos"""
+    
+    def setUp(self):
+        import tempfile
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        user = User.objects.create_user(username='cliente', password='testpass123')
+        plato = Plato.objects.create(codigo="PLT001", nombre="Paella", precio=Decimal('12.00'))
+        self.recibo = Recibo.objects.create(usuario=user, total=Decimal('24.00'))
+        ReciboItem.objects.create(recibo=self.recibo, plato=plato, cantidad=2, precio_unitario=Decimal('12.00'))
+        
+    def test_pdf_generado_una_vez_por_contenido(self):
+        """Test que el PDF se genera en el pool y se reutiliza si el recibo no cambia"""
+        from unittest import mock
+        from django.core.files.storage import default_storage
+        from . import documentos
+        
+        with self.settings(MEDIA_ROOT=self.media.name):
+            nombre, destino = documentos.documento('recibo', self.recibo.pk)
+            self.assertEqual(nombre, f'recibo-{self.recibo.pk}.pdf')
+            with default_storage.open(destino) as fichero:
+                self.assertTrue(fichero.read().startswith(b'%PDF'))
+            
+            with mock.patch.object(documentos, '_pool_procesos', side_effect=AssertionError):
+                self.assertEqual(documentos.documento('recibo', self.recibo.pk)[1], destino)
+            
+            Recibo.objects.filter(pk=self.recibo.pk).update(pagado=True)
+            self.assertNotEqual(documentos.documento('recibo', self.recibo.pk)[1], destino)
+
+    def test_lote_encolado_y_descarga_sin_esperar(self):
+        """Test que el lote lo ejecuta el comando y la descarga no espera al pool"""
+        from concurrent.futures import Future
+        from io import StringIO
+        from unittest import mock
+        from django.core.management import call_command
+        from . import documentos
+        from .models import LoteDocumentos
+
+        staff = User.objects.create_superuser(username='admin', password='testpass123')
+        self.client.force_login(staff)
+        with self.settings(MEDIA_ROOT=self.media.name):
+            response = self.client.post(reverse('admin:myapp_recibo_changelist'), {
+                'action': 'generar_pdfs', '_selected_action': [self.recibo.pk],
+            })
+            lote = LoteDocumentos.objects.get()
+            self.assertRedirects(response, reverse('admin:myapp_recibo_documentos', args=[lote.pk]))
+            self.assertEqual(lote.estado, 'pendiente')
+
+            call_command('generar_documentos', stdout=StringIO())
+            lote.refresh_from_db()
+            self.assertEqual((lote.estado, lote.hechos), ('terminada', 1))
+            response = self.client.get(reverse('admin:myapp_recibo_documentos', args=[lote.pk]) + '?descargar=1')
+            self.assertEqual(response.status_code, 200)
+
+            # PDF sin generar: se encarga al pool y se responde sin esperar el resultado
+            Recibo.objects.filter(pk=self.recibo.pk).update(pagado=True)
+            futuro = Future()
+            pool = mock.Mock(**{'submit.return_value': futuro})
+            with mock.patch.object(documentos, '_pool_procesos', return_value=pool):
+                url = reverse('admin:myapp_recibo_pdf', args=[self.recibo.pk])
+                self.assertEqual(self.client.get(url).status_code, 202)
+                self.assertEqual(self.client.get(url).status_code, 202)
+                self.assertEqual(pool.submit.call_count, 1)
+                futuro.set_result(b'%PDF-1.4 prueba')
+                response = self.client.get(url)
+            self.assertEqual(response['Content-Type'], 'application/pdf')
+
+
+class HojaProduccionTest(TestCase):
+    """Tests de la hoja de producción y reparto"""
+    
+    def setUp(self):
+        from datetime import date, timedelta
+        from .servicio import CODIGOS_DIA, publicar_menu
+        self.fecha = date.today() + timedelta(days=1)
+        if self.fecha.weekday() == 6:
+            self.fecha += timedelta(days=1)
+        self.dia = CODIGOS_DIA[self.fecha.weekday()]
+        self.empresa = Empresa.objects.create(codigo="EMP001", nombre="Oficinas", cif="B12345678", direccion="Calle 1")
+        self.plato = Plato.objects.create(codigo="PLT001", nombre="Lentejas", precio=Decimal('8.00'))
+        DisponibilidadPlato.objects.create(plato=self.plato, dia=self.dia)
+        publicar_menu(semanas=1)
+        self.usuarios = []
+        for i, empresa in enumerate([self.empresa, self.empresa, None]):
+            user = User.objects.create_user(username=f'cliente{i}', password='testpass123')
+            Cliente.objects.create(Nombre_Completo=f'Cliente {i}', usuario=user, empresa=empresa,
+                                   es_particular=empresa is None)
+            self.usuarios.append(user)
+            
+    def test_hoja_por_empresa_cacheada_y_planificada(self):
+        """Test que la hoja agrupa por empresa, se invalida en el checkout y planifica la producción"""
+        from .checkout import confirmar_carrito
+        from .hoja_produccion import a_csv, hoja, planificar
+        from .models import Produccion
+        
+        for i, user in enumerate(self.usuarios[:2]):
+            CarritoItem.objects.create(usuario=user, plato=self.plato, cantidad=i + 1, dia_semana=self.dia)
+            with self.captureOnCommitCallbacks(execute=True):
+                confirmar_carrito(user)
+        
+        datos = hoja(self.fecha)
+        self.assertEqual(datos['platos'][0]['total'], 3)
+        self.assertEqual([(e['nombre'], e['total']) for e in datos['empresas']], [('Oficinas', 3)])
+        
+        CarritoItem.objects.create(usuario=self.usuarios[2], plato=self.plato, cantidad=4, dia_semana=self.dia)
+        with self.captureOnCommitCallbacks(execute=True):
+            confirmar_carrito(self.usuarios[2])
+        datos = hoja(self.fecha)
+        self.assertEqual([(e['nombre'], e['total']) for e in datos['empresas']], [('Oficinas', 3), ('Particulares', 4)])
+        self.assertIn('PLT001,Lentejas,3,4,7', a_csv(datos).splitlines())
+        
+        self.assertEqual(planificar(self.fecha), (1, 0))
+        self.assertEqual(Produccion.objects.get(fecha_planificada=self.fecha).cantidad_planificada, 7)
+        self.assertEqual(planificar(self.fecha), (0, 0))
+
+
+class RepartoTest(TestCase):
+    """Tests de la planificación de rutas de reparto"""
+    
+    def test_dos_opt_deshace_cruces(self):
+        """Test que vecino más cercano + 2-opt recorre un círculo sin cruces"""
+        import numpy as np
+        from .reparto import dos_opt, longitud_ruta, matriz_distancias
+        
+        angulos = np.linspace(0, 2 * np.pi, 12, endpoint=False)
+        puntos = np.c_[40 + 0.05 * np.sin(angulos), -3.7 + 0.05 * np.cos(angulos)]
+        distancias = matriz_distancias(puntos)
+        optima = longitud_ruta(np.arange(12), distancias)
+        desordenada = np.array([0, 6, 1, 7, 2, 8, 3, 9, 4, 10, 5, 11])
+        self.assertGreater(longitud_ruta(desordenada, distancias), optima)
+        self.assertAlmostEqual(longitud_ruta(dos_opt(desordenada, distancias), distancias), optima)
+        
+    def test_rutas_del_dia_con_geocodificacion(self):
+        """Test que las paradas se geocodifican una vez y se reparten por capacidad"""
+        import os
+        import tempfile
+        from datetime import date, timedelta
+        from .servicio import CODIGOS_DIA
+        from .models import PedidoHistorico
+        from .reparto import planificar_rutas
+        
+        fecha = date.today() + timedelta(days=1)
+        if fecha.weekday() == 6:
+            fecha += timedelta(days=1)
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as dataset:
+            dataset.write('clave,latitud,longitud\n"Calle Mayor 1, Madrid",40.4155,-3.7074\n28040,40.4500,-3.7300\n')
+        self.addCleanup(os.remove, dataset.name)
+        
+        plato = Plato.objects.create(codigo="PLT001", nombre="Lentejas", precio=Decimal('8.00'))
+        empresa = Empresa.objects.create(codigo="EMP001", nombre="Oficinas", cif="B1", direccion="calle mayor 1 madrid")
+        destinos = [(empresa, ''), (None, 'Av. Complutense s/n, 28040 Madrid'), (None, 'Sin código')]
+        for i, (destino, direccion) in enumerate(destinos):
+            user = User.objects.create_user(username=f'cliente{i}', password='testpass123')
+            Cliente.objects.create(Nombre_Completo=f'Cliente {i}', usuario=user, empresa=destino,
+                                   es_particular=destino is None, direccion_particular=direccion)
+            PedidoHistorico.objects.create(usuario=user, plato=plato, cantidad=3,
+                                           dia_semana=CODIGOS_DIA[fecha.weekday()])
+        PedidoHistorico.objects.update(fecha_emision=fecha - timedelta(days=1))
+        
+        with self.settings(GEOCODIFICACION_DATASET=dataset.name, REPARTO_ORIGEN=(40.42, -3.70), REPARTO_CAPACIDAD=5):
+            plan = planificar_rutas(fecha)
+        self.assertEqual([[p['nombre'] for p in r['paradas']] for r in plan['rutas']], [['Oficinas'], ['Cliente 1']])
+        self.assertEqual([p['nombre'] for p in plan['sin_ubicacion']], ['Cliente 2'])
+        
+        empresa.refresh_from_db()
+        self.assertEqual((empresa.latitud, empresa.longitud), (40.4155, -3.7074))
+        empresa.direccion = 'Otra calle 3'
+        empresa.save()
+        self.assertIsNone(empresa.latitud)
+
+
 class ClienteCreacionFormTest(TestCase):
     """Tests para el formulario de creación de cliente"""
     
@@ -307,11 +760,10 @@ class ViewsTest(TestCase):
         # Debería redirigir
         self.assertEqual(response.status_code, 302)
         
-    def test_main_view_requires_login(self):
-        """Test que la vista main requiere login"""
+    def test_main_view_without_login(self):
+        """Test que la vista main se puede navegar sin login (carrito en cookie)"""
         response = self.client.get('/main/')
-        # Debería redirigir al login
-        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response.status_code, 200)
         
     def test_main_view_with_login(self):
         """Test vista main con usuario logueado"""
@@ -364,6 +816,725 @@ class APIViewsTest(APITestCase):
         self.assertTrue(any(plato['nombre'] == 'Test Plato API' for plato in data['results']))
 
 
+class MenuSemanalTest(APITestCase):
+    """Tests de la planificación del menú en bloque"""
+    
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', password='testpass123')
+        self.platos = [
+            Plato.objects.create(codigo=f"PLT00{i}", nombre=f"Plato {i}", precio=Decimal('9.00')) for i in range(3)
+        ]
+        DisponibilidadPlato.objects.create(plato=self.platos[0], dia='LUN')
+        DisponibilidadPlato.objects.create(plato=self.platos[0], dia='MAR')
+        
+    def test_diferencia_semanal_en_bloque(self):
+        """Test que la API aplica altas y bajas e invalida el menú una vez"""
+        from unittest import mock
+        from . import menu
+        
+        self.client.force_authenticate(user=self.admin)
+        url = reverse('menu_semanal')
+        cambios = {
+            'altas': [{'plato': p.id, 'dia': dia} for p in self.platos[1:] for dia in ('LUN', 'MIE')]
+                     + [{'plato': self.platos[0].id, 'dia': 'LUN'}],
+            'bajas': [{'plato': self.platos[0].id, 'dia': 'MAR'}],
+        }
+        # 7 del menú semanal y 5 para llevar el cambio a las fechas publicadas sin plantilla
+        with mock.patch.object(menu.cache, 'incr', wraps=menu.cache.incr) as incr, self.assertNumQueries(12):
+            response = self.client.patch(url, cambios, format='json')
+        self.assertEqual(response.json(), {'creadas': 4, 'eliminadas': 1})
+        self.assertEqual(incr.call_count, 1)
+        
+        response = self.client.get(url)
+        self.assertEqual([p['dias'] for p in response.json()['platos']], [['LUN'], ['LUN', 'MIE'], ['LUN', 'MIE']])
+        
+        response = self.client.patch(url, {'altas': [{'plato': self.platos[0].id, 'dia': 'DOM'}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_guardar_plantilla_desde_el_admin(self):
+        """Test que guardar plantilla exige permiso de cambio y un nombre no vacío"""
+        from django.contrib.auth.models import Permission
+        from .models import PlantillaMenu
+
+        url = reverse('admin:myapp_disponibilidadplato_semana')
+        lector = User.objects.create_user(username='lector', password='testpass123', is_staff=True)
+        lector.user_permissions.add(Permission.objects.get(codename='view_disponibilidadplato'))
+        self.client.force_login(lector)
+        self.assertEqual(self.client.post(url, {'nombre_plantilla': 'Invierno'}).status_code, 403)
+
+        self.client.force_login(self.admin)
+        self.client.post(url, {'nombre_plantilla': '   '})
+        self.assertFalse(PlantillaMenu.objects.exists())
+        # El nombre vacío tampoco vacía el menú
+        self.assertEqual(DisponibilidadPlato.objects.count(), 2)
+        self.client.post(url, {'nombre_plantilla': ' Invierno '})
+        self.assertEqual(PlantillaMenu.objects.get().nombre, 'Invierno')
+
+
+class PlantillasMenuTest(TestCase):
+    """Tests de plantillas y rotaciones de menú"""
+    
+    def test_rotacion_aplica_la_plantilla_de_cada_semana(self):
+        """Test que la rotación cambia solo las fechas de su semana y conserva las reservadas"""
+        from datetime import date, timedelta
+        from .models import DisponibilidadFecha, RotacionMenu, RotacionMenuPaso, SemanaMenu
+        from .planificacion import (aplicar_cambios_menu, aplicar_rotacion, casillas_actuales, comparar_plantilla,
+                                    guardar_plantilla)
+        from .servicio import publicar_menu
+        
+        lentejas = Plato.objects.create(codigo="PLT001", nombre="Lentejas", precio=Decimal('8.00'))
+        paella = Plato.objects.create(codigo="PLT002", nombre="Paella", precio=Decimal('9.00'))
+        DisponibilidadPlato.objects.create(plato=lentejas, dia='LUN')
+        semana_a = guardar_plantilla('Semana A')
+        DisponibilidadPlato.objects.all().delete()
+        DisponibilidadPlato.objects.create(plato=paella, dia='MAR')
+        DisponibilidadPlato.objects.create(plato=paella, dia='MIE')
+        semana_b = guardar_plantilla('Semana B')
+        
+        lunes = date.today() - timedelta(days=date.today().weekday())
+        publicar_menu(desde=lunes + timedelta(days=7), semanas=2)
+        tercera = lunes + timedelta(days=14)
+        DisponibilidadFecha.objects.filter(fecha=tercera + timedelta(days=2)).update(reservadas=1)
+        
+        def semana(inicio):
+            return set(DisponibilidadFecha.objects.filter(
+                fecha__gte=inicio, fecha__lt=inicio + timedelta(days=7)
+            ).values_list('plato_id', 'fecha'))
+        
+        self.assertEqual(comparar_plantilla(semana_a, tercera), {
+            'altas': {(lentejas.id, 'LUN')}, 'bajas': {(paella.id, 'MAR'), (paella.id, 'MIE')}, 'iguales': set(),
+        })
+        
+        rotacion = RotacionMenu.objects.create(nombre="Quincenal", fecha_inicio=lunes)
+        RotacionMenuPaso.objects.create(rotacion=rotacion, plantilla=semana_a, orden=1)
+        RotacionMenuPaso.objects.create(rotacion=rotacion, plantilla=semana_b, orden=2)
+        
+        # El miércoles reservado se queda; el menú semanal y la otra semana, igual
+        self.assertEqual(aplicar_rotacion(tercera + timedelta(days=1)), (semana_a, 1, 1))
+        self.assertEqual(semana(tercera), {(lentejas.id, tercera), (paella.id, tercera + timedelta(days=2))})
+        self.assertEqual(len(semana(lunes + timedelta(days=7))), 2)
+        self.assertEqual(casillas_actuales(), {(paella.id, 'MAR'), (paella.id, 'MIE')})
+        self.assertEqual(SemanaMenu.objects.get().plantilla, semana_a)
+        
+        # Las semanas nuevas se publican con la plantilla que les toca
+        cuarta = lunes + timedelta(days=21)
+        self.assertEqual(publicar_menu(desde=cuarta, semanas=2), 3)
+        self.assertEqual(semana(cuarta + timedelta(days=7)), {(lentejas.id, cuarta + timedelta(days=7))})
+        
+        # Los cambios del menú semanal no llegan a las semanas con plantilla
+        aplicar_cambios_menu(bajas=[(paella.id, 'MAR')])
+        self.assertEqual(len(semana(lunes + timedelta(days=7))), 2)
+        
+        self.assertEqual(aplicar_rotacion(lunes - timedelta(days=1)), (None, 0, 0))
+
+
+class FechasServicioTest(TestCase):
+    """Tests de la disponibilidad por fecha de servicio"""
+    
+    def setUp(self):
+        from datetime import date
+        from .servicio import proxima_fecha
+        self.plato = Plato.objects.create(codigo="PLT001", nombre="Lentejas", precio=Decimal('8.00'),
+                                          capacidad_diaria=3)
+        DisponibilidadPlato.objects.create(plato=self.plato, dia='JUE')
+        self.jueves = proxima_fecha('JUE', date.today())
+        self.usuarios = [User.objects.create_user(username=f'cliente{i}', password='testpass123') for i in range(2)]
+        
+    def test_publicacion_y_capacidad_en_checkout(self):
+        """Test que se publican fechas con capacidad y el checkout no la supera"""
+        from .checkout import confirmar_carrito
+        from .models import DisponibilidadFecha, PedidoHistorico
+        from .servicio import CapacidadAgotada, publicar_menu, retirar
+        
+        self.assertEqual(publicar_menu(semanas=2), 2)
+        self.assertEqual(publicar_menu(semanas=2), 0)
+        self.assertEqual(DisponibilidadFecha.objects.get(fecha=self.jueves).capacidad, 3)
+        
+        for usuario in self.usuarios:
+            CarritoItem.objects.create(usuario=usuario, plato=self.plato, cantidad=2, fecha_servicio=self.jueves)
+        self.assertEqual(CarritoItem.objects.first().dia_semana, 'JUE')
+        confirmar_carrito(self.usuarios[0])
+        with self.assertRaises(CapacidadAgotada):
+            confirmar_carrito(self.usuarios[1])
+        self.assertEqual(Recibo.objects.count(), 1)
+        self.assertEqual(CarritoItem.objects.filter(usuario=self.usuarios[1]).count(), 1)
+        self.assertEqual(PedidoHistorico.objects.get().fecha_servicio, self.jueves)
+        
+        # Las fechas ya vendidas se conservan al quitar el plato del menú
+        self.assertEqual(retirar([(self.plato.id, 'JUE')]), 1)
+        self.assertEqual(DisponibilidadFecha.objects.get().vendidas, 2)
+        
+    def test_reservas_al_anadir_al_carrito(self):
+        """Test que el carrito reserva raciones, las reservas caducan y el checkout las vende"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from .checkout import confirmar_carrito
+        from .models import DisponibilidadFecha
+        from .servicio import CapacidadAgotada, anadir_al_carrito, liberar_caducadas, publicar_menu
+        
+        publicar_menu(semanas=1)
+        primero, segundo = self.usuarios
+        anadir_al_carrito(primero, self.plato, self.jueves, 2)
+        with self.assertRaises(CapacidadAgotada):
+            anadir_al_carrito(segundo, self.plato, self.jueves, 2)
+        
+        # Al caducar, la reserva vuelve al cupo y otro cliente se la lleva
+        self.assertEqual(liberar_caducadas(ahora=timezone.now() + timedelta(hours=1)), 1)
+        anadir_al_carrito(segundo, self.plato, self.jueves, 2)
+        with self.assertRaises(CapacidadAgotada):
+            confirmar_carrito(primero)
+        confirmar_carrito(segundo)
+        
+        CarritoItem.objects.filter(usuario=primero).delete()
+        anadir_al_carrito(primero, self.plato, self.jueves, 1)
+        CarritoItem.objects.filter(usuario=primero).delete()
+        disponibilidad = DisponibilidadFecha.objects.get(fecha=self.jueves)
+        self.assertEqual((disponibilidad.reservadas, disponibilidad.vendidas), (0, 2))
+        
+    def test_api_del_carrito_reserva_y_no_mueve_reservas(self):
+        """Test que la API añade con reserva, ajusta la cantidad y no cambia plato ni fecha"""
+        from datetime import timedelta
+        from rest_framework.test import APIClient
+        from .models import DisponibilidadFecha
+        from .servicio import publicar_menu
+        
+        publicar_menu(semanas=1)
+        primero, segundo = self.usuarios
+        client = APIClient()
+        client.force_authenticate(user=primero)
+        response = client.post('/api/carrito/', {
+            'plato': self.plato.id, 'fecha_servicio': self.jueves.isoformat(), 'cantidad': 2, 'usuario': segundo.id,
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json()['reservada'], 2)
+        self.assertEqual(CarritoItem.objects.get().usuario, primero)
+        self.assertEqual(DisponibilidadFecha.objects.get(fecha=self.jueves).reservadas, 2)
+        
+        url = f"/api/carrito/{response.json()['id']}/"
+        self.assertEqual(client.patch(url, {'cantidad': 4}, format='json').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(client.patch(url, {'cantidad': 1}, format='json').json()['reservada'], 1)
+        self.assertEqual(DisponibilidadFecha.objects.get(fecha=self.jueves).reservadas, 1)
+        response = client.patch(url, {'fecha_servicio': (self.jueves + timedelta(days=7)).isoformat()}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+        # Fecha sin publicar
+        response = client.post('/api/carrito/', {
+            'plato': self.plato.id, 'fecha_servicio': (self.jueves + timedelta(days=1)).isoformat(),
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+    def test_carrito_solo_admite_fechas_publicadas(self):
+        """Test que solo se añade al carrito un plato a la venta en esa fecha"""
+        from datetime import timedelta
+        from .servicio import publicar_menu
+        
+        publicar_menu(semanas=1)
+        self.client.force_login(self.usuarios[0])
+        url = reverse('main')
+        for fecha in (self.jueves + timedelta(days=1), self.jueves):
+            self.client.post(url, {'plato_id': self.plato.id, 'cantidad': 1, 'fecha_servicio': fecha.isoformat()})
+        self.assertEqual(list(CarritoItem.objects.values_list('fecha_servicio', flat=True)), [self.jueves])
+
+
+class CaducidadCarritosTest(TestCase):
+    """Tests de la caducidad y compactación de carritos"""
+    
+    def test_caducar_archiva_y_libera_reservas(self):
+        """Test que las líneas abandonadas se archivan en lotes y sus reservas vuelven al cupo"""
+        from datetime import date, timedelta
+        from django.utils import timezone
+        from .carritos import caducar
+        from .models import CarritoItemArchivado, DisponibilidadFecha
+        from .servicio import anadir_al_carrito, proxima_fecha
+        
+        plato = Plato.objects.create(codigo="PLT001", nombre="Lentejas", precio=Decimal('8.00'))
+        jueves = proxima_fecha('JUE', date.today())
+        disponibilidad = DisponibilidadFecha.objects.create(plato=plato, fecha=jueves, capacidad=10)
+        usuarios = [User.objects.create_user(username=f'cliente{i}', password='testpass123') for i in range(3)]
+        
+        abandonada = anadir_al_carrito(usuarios[0], plato, jueves, 4)
+        CarritoItem.objects.filter(pk=abandonada.pk).update(fecha_agregado=timezone.now() - timedelta(days=30))
+        CarritoItem.objects.create(usuario=usuarios[1], plato=plato, fecha_servicio=date.today() - timedelta(days=1))
+        anadir_al_carrito(usuarios[2], plato, jueves, 1)
+        
+        self.assertEqual(caducar(archivar=True, lote=1), 2)
+        self.assertEqual(CarritoItemArchivado.objects.count(), 2)
+        self.assertEqual(list(CarritoItem.objects.values_list('usuario', flat=True)), [usuarios[2].id])
+        disponibilidad.refresh_from_db()
+        self.assertEqual(disponibilidad.reservadas, 1)
+        
+        # Sin fecha no hay línea: la restricción única no puede quedarse sin efecto
+        from django.db import IntegrityError, transaction
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            CarritoItem.objects.bulk_create([CarritoItem(usuario=usuarios[0], plato=plato, dia_semana='LUN')])
+        CarritoItem.objects.create(usuario=usuarios[0], plato=plato, dia_semana='JUE')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            CarritoItem.objects.create(usuario=usuarios[0], plato=plato, fecha_servicio=jueves)
+
+
+
+
+class RepetirPedidoTest(APITestCase):
+    """Tests de repetir el pedido de la semana anterior"""
+    
+    def test_repetir_semana_anterior(self):
+        """Test que se añaden los platos aún a la venta y se informa de los demás"""
+        from datetime import date, timedelta
+        from .models import DisponibilidadFecha, PedidoHistorico
+        from .servicio import proxima_fecha
+        
+        usuario = User.objects.create_user(username='cliente', password='testpass123')
+        lentejas = Plato.objects.create(codigo="PLT001", nombre="Lentejas", precio=Decimal('8.00'))
+        paella = Plato.objects.create(codigo="PLT002", nombre="Paella", precio=Decimal('9.00'))
+        jueves = proxima_fecha('JUE', date.today())
+        anterior = jueves - timedelta(weeks=1)
+        for plato in (lentejas, paella):
+            PedidoHistorico.objects.create(usuario=usuario, plato=plato, cantidad=2, fecha_servicio=anterior)
+        PedidoHistorico.objects.create(usuario=usuario, plato=lentejas, cantidad=1, fecha_servicio=anterior)
+        DisponibilidadFecha.objects.create(plato=lentejas, fecha=jueves)
+        
+        self.client.force_authenticate(user=usuario)
+        response = self.client.post('/api/carrito/repetir/')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([(l['nombre'], l['cantidad']) for l in response.data['anadidas']], [('Lentejas', 3)])
+        self.assertEqual([l['nombre'] for l in response.data['no_disponibles']], ['Paella'])
+        self.assertEqual(list(CarritoItem.objects.values_list('plato', 'fecha_servicio', 'cantidad')),
+                         [(lentejas.id, jueves, 3)])
+        
+        # Repetir otra vez no duplica las líneas
+        response = self.client.post('/api/carrito/repetir/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['en_carrito']), 1)
+        self.assertEqual(CarritoItem.objects.count(), 1)
+
+
+class RecomendacionesTest(APITestCase):
+    """Tests del modelo de recomendaciones por co-ocurrencia"""
+    
+    def test_recomienda_lo_que_se_pide_junto(self):
+        """Test que se recomienda primero lo que piden otros usuarios con lo mismo"""
+        import os
+        import tempfile
+        from datetime import date
+        import numpy as np
+        from . import recomendaciones
+        from .models import DisponibilidadFecha, PedidoHistorico
+        from .servicio import proxima_fecha
+        
+        platos = [Plato.objects.create(codigo=f"PLT{i}", nombre=nombre, precio=Decimal('8.00'))
+                  for i, nombre in enumerate(['Arroz', 'Bacalao', 'Croquetas', 'Durum'])]
+        arroz, bacalao, croquetas, durum = platos
+        usuarios = [User.objects.create_user(username=f'cliente{i}', password='testpass123') for i in range(4)]
+        compras = {0: [arroz, bacalao], 1: [arroz, bacalao], 2: [croquetas, durum], 3: [arroz]}
+        for i, pedidos in compras.items():
+            for plato in pedidos:
+                PedidoHistorico.objects.create(usuario=usuarios[i], plato=plato, dia_semana='LUN')
+        
+        with tempfile.TemporaryDirectory() as directorio:
+            ruta = os.path.join(directorio, 'recomendaciones.npz')
+            with self.settings(RECOMENDACIONES_MODELO=ruta):
+                # Sin modelo se conserva el orden
+                self.assertEqual(recomendaciones.ordenar(usuarios[3].id, platos, plato_id=lambda p: p.id), platos)
+                recomendaciones.guardar(recomendaciones.entrenar())
+                self.assertIsInstance(recomendaciones.modelo()['c_datos'], np.memmap)
+                
+                orden = recomendaciones.ordenar(usuarios[3].id, [durum, croquetas, bacalao, arroz],
+                                                plato_id=lambda p: p.id)
+                self.assertEqual(orden[:2], [bacalao, arroz])
+                # Usuario sin historial: por popularidad
+                self.assertEqual(recomendaciones.ordenar(None, [durum, arroz], plato_id=lambda p: p.id)[0], arroz)
+                
+                fecha = proxima_fecha('LUN', date.today())
+                for plato in platos:
+                    DisponibilidadFecha.objects.create(plato=plato, fecha=fecha)
+                self.client.force_authenticate(user=usuarios[2])
+                response = self.client.get('/api/menu/recomendado/', {'fecha': fecha.isoformat()})
+                self.assertEqual({p['nombre'] for p in response.data['platos'][:2]}, {'Croquetas', 'Durum'})
+
+
+class SegmentacionRFMTest(APITestCase):
+    """Tests de la segmentación RFM de clientes y empresas"""
+    
+    def test_rfm_incremental_y_activos(self):
+        """Test que la tabla resumen se actualiza solo con los recibos nuevos"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from . import rfm
+        from .models import SegmentoRFM
+        
+        # Ejecuciones pasado el margen de la marca: ven los recibos recién creados
+        despues = lambda: timezone.now() + rfm.MARGEN_MARCA
+        empresa = Empresa.objects.create(codigo="EMP001", nombre="Empresa Test", cif="B12345678")
+        ahora = timezone.now()
+        clientes = []
+        for i in range(5):
+            usuario = User.objects.create_user(username=f'cliente{i}', password='testpass123')
+            clientes.append(Cliente.objects.create(Nombre_Completo=f"Cliente {i}", usuario=usuario,
+                                                   empresa=empresa if i < 2 else None))
+            for dias in range(i + 1):
+                Recibo.objects.create(usuario=usuario, empresa=clientes[-1].empresa, total=Decimal('10.00'),
+                                      fecha_compra=ahora - timedelta(days=60 * (4 - i) + dias))
+        Recibo.objects.create(usuario=clientes[0].usuario, total=Decimal('99.00'), estado_pago='fallido')
+        
+        self.assertEqual(rfm.refrescar(ahora=despues()), (6, 6))
+        mejor = SegmentoRFM.objects.get(cliente=clientes[4])
+        self.assertEqual((mejor.r, mejor.f, mejor.m, mejor.segmento), (5, 5, 5, 'CAMPEONES'))
+        self.assertEqual(SegmentoRFM.objects.get(cliente=clientes[0]).segmento, 'PERDIDOS')
+        self.assertEqual(SegmentoRFM.objects.get(empresa=empresa).recibos, 3)
+        
+        # Sin recibos nuevos no se vuelve a agregar nada
+        self.assertEqual(rfm.refrescar(ahora=despues()), (0, 0))
+        Recibo.objects.create(usuario=clientes[0].usuario, empresa=empresa, total=Decimal('10.00'))
+        self.assertEqual(rfm.actualizar(ahora=despues()), 2)
+        self.assertEqual(SegmentoRFM.objects.get(cliente=clientes[0]).recibos, 2)
+        
+        self.client.force_authenticate(user=User.objects.create_user(username='staff', password='x', is_staff=True))
+        response = self.client.get('/api/clientes/activos/')
+        self.assertEqual({c['Nombre_Completo'] for c in response.data}, {'Cliente 0', 'Cliente 4'})
+        
+        # Leer no refresca la tabla; un recibo que pasa a fallido sí se recoge al refrescar
+        tardio = Recibo.objects.create(usuario=clientes[3].usuario, total=Decimal('10.00'))
+        with self.assertNumQueries(1):
+            self.assertNotIn(clientes[3], list(rfm.activos()))
+        self.assertEqual(rfm.actualizar(ahora=despues()), 1)
+        self.assertEqual(SegmentoRFM.objects.get(cliente=clientes[3]).recibos, 5)
+        tardio.estado_pago = 'fallido'
+        tardio.save()
+        self.assertEqual(rfm.actualizar(ahora=despues()), 1)
+        self.assertEqual(SegmentoRFM.objects.get(cliente=clientes[3]).recibos, 4)
+        self.assertEqual(rfm.actualizar(ahora=despues()), 0)
+        response = self.client.get('/api/rfm/', {'tipo': 'cliente', 'ordering': '-recibos'})
+        self.assertEqual(response.data['results'][0]['nombre'], 'Cliente 4')
+        response = self.client.get('/api/rfm/', {'tipo': 'empresa'})
+        self.assertEqual(response.data['count'], 1)
+        
+    def test_recibo_confirmado_tarde_no_se_pierde(self):
+        """Test que la marca deja margen para los recibos que se confirman después de leerla"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from . import rfm
+        from .models import SegmentoRFM
+        
+        ejecucion = timezone.now() + timedelta(hours=1)
+        clientes = []
+        for i, actualizado in enumerate([ejecucion - timedelta(hours=1), ejecucion]):
+            usuario = User.objects.create_user(username=f'cliente{i}', password='testpass123')
+            clientes.append(Cliente.objects.create(Nombre_Completo=f"Cliente {i}", usuario=usuario))
+            recibo = Recibo.objects.create(usuario=usuario, total=Decimal('10.00'))
+            Recibo.objects.filter(pk=recibo.pk).update(actualizado=actualizado)
+        # El recibo guardado justo al ejecutar queda para la próxima vez
+        self.assertEqual(rfm.actualizar(ahora=ejecucion), 1)
+        
+        # Marcado un minuto antes de la ejecución pero confirmado después de ella
+        tardio = Recibo.objects.create(usuario=clientes[0].usuario, total=Decimal('10.00'))
+        Recibo.objects.filter(pk=tardio.pk).update(actualizado=ejecucion - timedelta(minutes=1))
+        self.assertEqual(rfm.actualizar(ahora=ejecucion + timedelta(hours=1)), 2)
+        self.assertEqual(SegmentoRFM.objects.get(cliente=clientes[0]).recibos, 2)
+        self.assertEqual(SegmentoRFM.objects.get(cliente=clientes[1]).recibos, 1)
+
+
+class CohortesTest(APITestCase):
+    """Tests de la retención por cohortes de alta"""
+    
+    def test_matriz_de_retencion(self):
+        """Test que cada cohorte cuenta sus clientes activos N meses después del alta"""
+        from datetime import date, datetime
+        from django.core.cache import cache
+        from django.utils import timezone
+        from . import cohortes
+        from .models import PedidoHistorico
+        
+        plato = Plato.objects.create(codigo="PLT001", nombre="Lentejas", precio=Decimal('8.00'))
+        # (mes de alta, meses con pedidos)
+        altas = [((2026, 3), [(2026, 3), (2026, 6)]), ((2026, 3), [(2026, 4)]), ((2026, 3), []),
+                 ((2026, 5), [(2026, 5), (2026, 6)])]
+        for i, (alta, meses) in enumerate(altas):
+            usuario = User.objects.create_user(username=f'cliente{i}', password='testpass123')
+            cliente = Cliente.objects.create(Nombre_Completo=f"Cliente {i}", usuario=usuario)
+            Cliente.objects.filter(pk=cliente.pk).update(Creacion_cuenta=timezone.make_aware(datetime(*alta, 10)))
+            for mes in meses:
+                pedido = PedidoHistorico.objects.create(usuario=usuario, plato=plato, dia_semana='LUN')
+                PedidoHistorico.objects.filter(pk=pedido.pk).update(fecha_emision=date(*mes, 15))
+        
+        cache.clear()
+        filas = cohortes.calcular(hoy=date(2026, 6, 20))['cohortes']
+        self.assertEqual([(f['mes'], f['usuarios']) for f in filas], [('2026-03', 3), ('2026-05', 1)])
+        self.assertEqual(filas[0]['activos'], [1, 1, 0, 1])
+        self.assertEqual(filas[0]['retencion'], [0.3333, 0.3333, 0.0, 0.3333])
+        self.assertEqual(filas[1]['activos'], [1, 1])
+        
+        # Los meses cerrados quedan en la caché: el mes en curso se vuelve a consultar
+        self.assertIsNotNone(cache.get('cohortes:mes:2026-04'))
+        self.assertIsNone(cache.get('cohortes:mes:2026-06'))
+        # ... hasta que se borra un pedido de ese mes desde el admin
+        from django.db.models.deletion import Collector
+        self.assertTrue(Collector(using='default').can_fast_delete(PedidoHistorico.objects.all()))
+        admin = User.objects.create_superuser('admin', 'admin@test.com', 'adminpass')
+        self.client.force_login(admin)
+        pedido = PedidoHistorico.objects.get(fecha_emision=date(2026, 4, 15))
+        self.client.post('/admin/myapp/pedidohistorico/', {
+            'action': 'delete_selected', '_selected_action': [pedido.pk], 'post': 'yes',
+        })
+        self.assertFalse(PedidoHistorico.objects.filter(pk=pedido.pk).exists())
+        self.assertIsNone(cache.get('cohortes:mes:2026-04'))
+        self.assertEqual(cohortes.calcular(hoy=date(2026, 6, 20))['cohortes'][0]['activos'], [1, 0, 0, 1])
+        desde = cohortes.mes_desde_parametro('2026-05')
+        self.assertEqual(len(cohortes.calcular(desde=desde, hoy=date(2026, 6, 20))['cohortes']), 1)
+        
+        self.client.force_authenticate(user=User.objects.create_user(username='staff', password='x', is_staff=True))
+        response = self.client.get('/api/clientes/cohortes/', {'desde': 'marzo'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class CarritoAnonimoTest(TestCase):
+    """Tests del carrito en cookie firmada de los visitantes sin cuenta"""
+    
+    def test_carrito_en_cookie_se_fusiona_al_iniciar_sesion(self):
+        """Test que el visitante llena el carrito sin escribir en la BD y se fusiona en signin"""
+        from datetime import date
+        from .carrito_anonimo import NOMBRE_COOKIE
+        from .models import DisponibilidadFecha
+        from .servicio import proxima_fecha
+        
+        plato = Plato.objects.create(codigo="PLT001", nombre="Lentejas", precio=Decimal('8.00'))
+        otro = Plato.objects.create(codigo="PLT002", nombre="Paella", precio=Decimal('9.00'))
+        jueves = proxima_fecha('JUE', date.today())
+        DisponibilidadFecha.objects.create(plato=plato, fecha=jueves, capacidad=10)
+        usuario = User.objects.create_user(username='cliente', password='testpass123')
+        CarritoItem.objects.create(usuario=usuario, plato=plato, fecha_servicio=jueves, cantidad=1)
+        
+        client = Client()
+        for plato_id, cantidad in ((plato.id, 2), (plato.id, 1), (otro.id, 1)):
+            client.post(reverse('main'), {'plato_id': plato_id, 'cantidad': cantidad,
+                                          'fecha_servicio': jueves.isoformat()})
+        self.assertIn(NOMBRE_COOKIE, client.cookies)
+        self.assertEqual(CarritoItem.objects.count(), 1)
+        
+        # Una cookie manipulada se ignora
+        client.cookies[NOMBRE_COOKIE] = client.cookies[NOMBRE_COOKIE].value + 'x'
+        self.assertEqual(client.post(reverse('signin'), {'username': 'cliente', 'password': 'testpass123'}).status_code, 302)
+        self.assertEqual(CarritoItem.objects.get().cantidad, 1)
+        
+        client = Client()
+        client.post(reverse('main'), {'plato_id': plato.id, 'cantidad': 3, 'fecha_servicio': jueves.isoformat()})
+        client.post(reverse('signin'), {'username': 'cliente', 'password': 'testpass123'})
+        # Paella no se vende el jueves: no llegó a la cookie
+        self.assertEqual(list(CarritoItem.objects.values_list('plato', 'cantidad')), [(plato.id, 4)])
+        self.assertEqual(client.cookies[NOMBRE_COOKIE].value, '')
+
+class FastSerializersTest(APITestCase):
+    """Tests para la serialización rápida de listados"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='staffuser',
+            password='testpass123',
+            is_staff=True
+        )
+        self.empresa = Empresa.objects.create(
+            codigo="EMP001",
+            nombre="Empresa Test",
+            cif="B12345678"
+        )
+        self.plato = Plato.objects.create(
+            codigo="PLT001",
+            nombre="Plato Rápido",
+            precio=Decimal('12.50'),
+            grupo='CARNE',
+            estado='COMUN'
+        )
+        for empresa in (self.empresa, None):
+            recibo = Recibo.objects.create(usuario=self.user, empresa=empresa, total=Decimal('25.00'))
+            ReciboItem.objects.create(recibo=recibo, plato=self.plato, cantidad=2, precio_unitario=Decimal('12.50'))
+        self.client.force_authenticate(user=self.user)
+        
+    def test_platos_list_igual_que_serializer(self):
+        """Test que el listado rápido de platos coincide con PlatoSerializer"""
+        from .serializers import PlatoSerializer
+        response = self.client.get('/api/platos/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        esperado = [dict(PlatoSerializer(self.plato).data)]
+        self.assertEqual(response.json()['results'], esperado)
+        
+    def test_recibos_list_igual_que_serializer(self):
+        """Test que el listado rápido de recibos coincide con ReciboSerializer"""
+        import json
+        from .serializers import ReciboSerializer
+        response = self.client.get('/api/recibos/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        esperado = json.loads(json.dumps(
+            ReciboSerializer(Recibo.objects.order_by('id'), many=True).data
+        ))
+        resultados = sorted(response.json()['results'], key=lambda r: r['id'])
+        self.assertEqual(resultados, esperado)
+
+
+class BusquedaPlatosTest(APITestCase):
+    """Tests para la búsqueda de platos"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.lentejas = Plato.objects.create(
+            codigo="PLT001",
+            nombre="Lentejas estofadas",
+            precio=Decimal('8.50'),
+            ingredientes="Lentejas, chorizo, zanahoria",
+            alergenos="Sulfitos"
+        )
+        self.paella = Plato.objects.create(
+            codigo="PLT002",
+            nombre="Arroz con pollo",
+            precio=Decimal('9.50'),
+            ingredientes="Arroz, pollo, pimiento",
+            alergenos="Apio"
+        )
+        
+    def test_buscar_por_ingrediente(self):
+        """Test búsqueda por ingrediente"""
+        from .search import buscar_platos
+        self.assertEqual(list(buscar_platos('chorizo')), [self.lentejas])
+        
+    def test_buscar_tolera_errores(self):
+        """Test búsqueda con errores de escritura y sin tildes"""
+        from .search import buscar_platos
+        self.assertEqual(list(buscar_platos('lentejs')), [self.lentejas])
+        self.assertEqual(list(buscar_platos('ARROZ')), [self.paella])
+        
+    def test_indice_sincronizado(self):
+        """Test que el índice se actualiza al editar y borrar platos"""
+        from .search import buscar_platos
+        self.paella.nombre = "Paella mixta"
+        self.paella.save()
+        self.assertEqual(list(buscar_platos('paella')), [self.paella])
+        self.paella.delete()
+        self.assertEqual(list(buscar_platos('paella')), [])
+        
+    def test_admin_conserva_el_orden_de_relevancia(self):
+        """Test que el listado del admin muestra la búsqueda ordenada por relevancia"""
+        from .search import buscar_platos
+        Plato.objects.create(codigo="PLT003", nombre="Pollo asado", precio=Decimal('9.00'),
+                             ingredientes="Pollo, patata")
+        Plato.objects.create(codigo="PLT004", nombre="Crema de verduras", precio=Decimal('5.00'),
+                             ingredientes="Calabacín, puerro, pollo")
+        esperado = list(buscar_platos('pollo'))
+        self.assertNotEqual(esperado, sorted(esperado, key=lambda plato: -plato.pk))
+        
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@test.com', 'adminpass'))
+        response = self.client.get('/admin/myapp/plato/', {'q': 'pollo'})
+        self.assertEqual(list(response.context['cl'].result_list), esperado)
+        # Ordenar por una columna sigue funcionando
+        response = self.client.get('/admin/myapp/plato/', {'q': 'pollo', 'o': '2'})
+        self.assertEqual(list(response.context['cl'].result_list), sorted(esperado, key=lambda plato: plato.nombre))
+        
+    def test_api_search(self):
+        """Test parámetro search en la API de platos"""
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get('/api/platos/?search=pimiento')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([p['nombre'] for p in response.json()['results']], ['Arroz con pollo'])
+        
+    def test_vocabulario_solo_si_no_hay_resultados(self):
+        """Test que el vocabulario se consulta solo para corregir, cacheado, y se invalida al indexar"""
+        from django.core.cache import cache
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .search import CLAVE_VOCABULARIO, FTS_VOCAB_TABLE, buscar_platos
+        cache.clear()
+        
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(list(buscar_platos('chorizo')), [self.lentejas])
+        self.assertFalse(any(FTS_VOCAB_TABLE in c['sql'] for c in consultas.captured_queries))
+        
+        self.assertEqual(list(buscar_platos('lentejs')), [self.lentejas])
+        self.assertIsNotNone(cache.get(CLAVE_VOCABULARIO))
+        with CaptureQueriesContext(connection) as consultas:
+            buscar_platos('polo').count()
+        self.assertFalse(any(FTS_VOCAB_TABLE in c['sql'] for c in consultas.captured_queries))
+        
+        self.paella.save()
+        self.assertIsNone(cache.get(CLAVE_VOCABULARIO))
+        
+    def test_sin_limite_en_admin_y_api(self):
+        """Test que solo el menú acota los resultados de la búsqueda"""
+        from .search import buscar_platos
+        Plato.objects.create(codigo="PLT003", nombre="Arroz negro", precio=Decimal('11.00'))
+        self.assertEqual(buscar_platos('arroz', limite=1).count(), 1)
+        self.assertEqual(buscar_platos('arroz').count(), 2)
+
+
+class AlergenosTest(APITestCase):
+    """Tests para el filtrado por alérgenos"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.con_gluten = Plato.objects.create(
+            codigo="PLT001",
+            nombre="Macarrones",
+            precio=Decimal('8.00'),
+            alergenos="Contiene trigo y queso"
+        )
+        self.sin_gluten = Plato.objects.create(
+            codigo="PLT002",
+            nombre="Ensalada",
+            precio=Decimal('7.00'),
+            alergenos="Apio, mostaza"
+        )
+        DisponibilidadPlato.objects.create(plato=self.con_gluten, dia='MAR')
+        DisponibilidadPlato.objects.create(plato=self.sin_gluten, dia='MAR')
+        
+    def test_mascara_desde_texto(self):
+        """Test detección de alérgenos en texto libre"""
+        from .alergenos import codigos_de_mascara
+        self.assertEqual(codigos_de_mascara(self.con_gluten.alergenos_mascara), ['GLUTEN', 'LACTEOS'])
+        self.assertEqual(codigos_de_mascara(self.sin_gluten.alergenos_mascara), ['APIO', 'MOSTAZA'])
+
+    def test_palabras_completas_y_negaciones(self):
+        """Test que solo cuentan palabras completas (con plural) y no las menciones negadas"""
+        from .alergenos import codigos_de_mascara, mascara_desde_texto
+        self.assertEqual(codigos_de_mascara(mascara_desde_texto("Manipulado en cocina")), [])
+        self.assertEqual(codigos_de_mascara(mascara_desde_texto("Nueces y mejillones")), ['FRUTOS_CASCARA', 'MOLUSCOS'])
+        self.assertEqual(codigos_de_mascara(mascara_desde_texto("Sin gluten ni lactosa. Contiene huevos")), ['HUEVOS'])
+        self.assertEqual(codigos_de_mascara(mascara_desde_texto("Libre de frutos secos")), [])
+
+    def test_filtro_en_la_portada(self):
+        """Test que la portada muestra el filtro y acepta varias casillas"""
+        from datetime import date
+        from .servicio import proxima_fecha, publicar_menu
+        publicar_menu()
+        martes = proxima_fecha('MAR', date.today())
+        response = self.client.get(f'/main/?fecha={martes}&sin_alergenos=GLUTEN&sin_alergenos=APIO')
+        self.assertEqual(response.context['sin_alergenos'], ['GLUTEN', 'APIO'])
+        self.assertEqual(list(response.context['disponibles']), [])
+        self.assertContains(response, 'name="sin_alergenos" value="LACTEOS"')
+
+    def test_api_sin_alergenos(self):
+        """Test filtro sin_alergenos en la API de platos"""
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get('/api/platos/?sin_alergenos=gluten')
+        self.assertEqual([p['nombre'] for p in response.json()['results']], ['Ensalada'])
+        response = self.client.get('/api/platos/?sin_alergenos=GLUTENN')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+    def test_menu_filtrado_en_memoria(self):
+        """Test que el menú cacheado se filtra sin consultas adicionales"""
+        from .alergenos import BITS
+        from datetime import date
+        from .menu import filtrar_menu, menu_del_dia
+        from .servicio import proxima_fecha, publicar_menu
+        publicar_menu()
+        martes = proxima_fecha('MAR', date.today())
+        menu = menu_del_dia(martes)
+        with self.assertNumQueries(0):
+            menu = menu_del_dia(martes)
+            disponibles = filtrar_menu(menu, sin_alergenos=BITS['GLUTEN'])
+            self.assertEqual([d.plato.nombre for d in disponibles], ['Ensalada'])
+
+
 class SecurityTest(TestCase):
     """Tests de seguridad"""
     
@@ -385,6 +1556,229 @@ class SecurityTest(TestCase):
         self.assertNotEqual(settings.SECRET_KEY, '')
 
 
+class ConfiguracionTest(TestCase):
+    """Tests de la configuración por entorno"""
+    
+    def test_cache_local_en_tests(self):
+        """Test que los tests usan una caché local con prefijo"""
+        from django.conf import settings
+        self.assertEqual(settings.CACHES['default']['BACKEND'], 'django.core.cache.backends.locmem.LocMemCache')
+        self.assertTrue(settings.CACHES['default']['KEY_PREFIX'])
+        self.assertIn('sessions', settings.CACHES)
+        
+    def test_router_replica(self):
+        """Test que solo las lecturas marcadas van a la réplica configurada"""
+        from unittest import mock
+        from .db_routers import ReplicaRouter, lecturas_en_replica
+        router = ReplicaRouter()
+        with lecturas_en_replica():
+            self.assertIsNone(router.db_for_read(Plato))
+        with mock.patch('myapp.db_routers.replica_configurada', return_value=True):
+            self.assertIsNone(router.db_for_read(Plato))
+            with lecturas_en_replica():
+                self.assertEqual(router.db_for_read(Plato), 'replica')
+                self.assertEqual(router.db_for_write(Plato), 'default')
+        self.assertFalse(router.allow_migrate('replica', 'myapp'))
+
+
+class AsyncViewsTest(TestCase):
+    """Tests de las vistas asíncronas del despliegue ASGI"""
+    
+    def setUp(self):
+        from datetime import date, timedelta
+        from .models import Inventario, PedidoHistorico, Produccion
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        plato = Plato.objects.create(codigo="PLT001", nombre="Plato Async", precio=Decimal('10.00'))
+        produccion = Produccion.objects.create(
+            plato=plato, cantidad_planificada=10, fecha_planificada=date.today()
+        )
+        Inventario.objects.create(
+            plato=plato, produccion=produccion, cantidad_disponible=5,
+            fecha_produccion=date.today(), fecha_vencimiento=date.today() + timedelta(days=1)
+        )
+        PedidoHistorico.objects.create(usuario=self.user, plato=plato, cantidad=2, dia_semana='LUN')
+        Recibo.objects.create(usuario=self.user, total=Decimal('20.00'))
+        
+    async def test_misma_respuesta_que_vistas_sincronas(self):
+        """Test que las vistas asíncronas devuelven lo mismo que las de la API"""
+        from asgiref.sync import sync_to_async
+        from django.test import AsyncRequestFactory
+        from rest_framework.test import APIRequestFactory, force_authenticate
+        from . import api_views, async_views
+        
+        for nombre in ['production_dashboard_stats', 'inventory_alerts']:
+            request = AsyncRequestFactory().get('/')
+            request.auser = sync_to_async(lambda: self.user)
+            respuesta = await getattr(async_views, nombre)(request)
+            
+            request_api = APIRequestFactory().get('/')
+            force_authenticate(request_api, user=self.user)
+            esperada = await sync_to_async(getattr(api_views, nombre))(request_api)
+            
+            self.assertEqual(respuesta.status_code, 200)
+            self.assertEqual(json.loads(respuesta.content), esperada.data)
+            
+    async def test_requiere_autenticacion(self):
+        """Test que las vistas asíncronas rechazan usuarios anónimos"""
+        from asgiref.sync import sync_to_async
+        from django.contrib.auth.models import AnonymousUser
+        from django.test import AsyncRequestFactory
+        from . import async_views
+        
+        request = AsyncRequestFactory().get('/api/production/dashboard/stats/')
+        request.auser = sync_to_async(AnonymousUser)
+        respuesta = await async_views.production_dashboard_stats(request)
+        self.assertEqual(respuesta.status_code, 403)
+
+
+class PlanDashboardTest(TestCase):
+    """Tests del plan de consultas concurrentes de los dashboards"""
+    
+    def test_widgets_concurrentes_con_resultado_parcial(self):
+        """Test que un widget lento o con error no bloquea el resto"""
+        import time
+        from .dashboard import PlanDashboard
+        
+        def fallo():
+            raise RuntimeError('consulta rota')
+        
+        plan = PlanDashboard(timeout=0.5, concurrente=True)
+        plan.widget('rapido', lambda: 1, 0)
+        plan.widget('lento', lambda: time.sleep(2) or 2, 0)
+        plan.widget('roto', fallo, [])
+        
+        inicio = time.monotonic()
+        resultados = plan.ejecutar()
+        self.assertLess(time.monotonic() - inicio, 1.5)
+        self.assertEqual(resultados, {'rapido': 1, 'lento': 0, 'roto': []})
+        self.assertEqual(sorted(plan.parciales), ['lento', 'roto'])
+        
+    def test_timeout_interrumpe_la_consulta(self):
+        """Test que la base de datos corta la consulta y libera el hilo del pool"""
+        import threading
+        from django.db import connection, OperationalError
+        from .dashboard import PlanDashboard
+        
+        liberado = threading.Event()
+        errores = []
+        
+        def infinita():
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        'WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c) SELECT count(*) FROM c'
+                    )
+                    return cursor.fetchone()
+            except OperationalError as e:
+                errores.append(e)
+                raise
+            finally:
+                liberado.set()
+        
+        plan = PlanDashboard(timeout=0.3, concurrente=True)
+        plan.widget('infinita', infinita, 0)
+        self.assertEqual(plan.ejecutar(), {'infinita': 0})
+        self.assertTrue(liberado.wait(2))
+        self.assertEqual(len(errores), 1)
+        
+    def test_la_conexion_del_hilo_no_hereda_el_limite(self):
+        """Test que el hilo conserva su conexión y sin el límite del widget"""
+        import threading
+        import time
+        from unittest import mock
+        from django.db import connection, connections
+        from . import dashboard
+        
+        resultado = {}
+        
+        def widget():
+            with connections['default'].cursor() as cursor:
+                cursor.execute('SELECT 1')
+        
+        def hilo():
+            try:
+                dashboard._en_hilo(widget, time.monotonic() + 0.1)
+                conexion = connections['default']
+                resultado['conservada'] = conexion.connection is not None
+                time.sleep(0.2)
+                with conexion.cursor() as cursor:
+                    cursor.execute(
+                        'WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < 100000) '
+                        'SELECT count(*) FROM c'
+                    )
+                    resultado['filas'] = cursor.fetchone()[0]
+            except Exception as e:
+                resultado['error'] = e
+            finally:
+                connections.close_all()
+        
+        with mock.patch.dict(connection.settings_dict, {'CONN_MAX_AGE': 60}):
+            t = threading.Thread(target=hilo)
+            t.start()
+            t.join(5)
+        self.assertNotIn('error', resultado)
+        self.assertEqual(resultado, {'conservada': True, 'filas': 100000})
+        
+    def test_estadisticas_dashboard(self):
+        """Test que el dashboard de administración responde con todos los widgets"""
+        from rest_framework.test import APIClient
+        admin = User.objects.create_superuser('admin', 'admin@test.com', 'adminpass')
+        plato = Plato.objects.create(codigo="PLT001", nombre="Plato Dashboard", precio=Decimal('10.00'))
+        Recibo.objects.create(usuario=admin, total=Decimal('15.00'), pagado=True)
+        from .models import PedidoHistorico
+        PedidoHistorico.objects.create(usuario=admin, plato=plato, cantidad=3, dia_semana='LUN')
+        
+        client = APIClient()
+        client.force_authenticate(user=admin)
+        data = client.get('/api/dashboard/estadisticas/').json()
+        self.assertEqual(data['total_pedidos'], 1)
+        self.assertEqual(Decimal(data['total_ventas']), Decimal('15.00'))
+        self.assertEqual(data['pedidos_completados'], 1)
+        self.assertEqual(len(data['ventas_por_dia']), 7)
+        self.assertEqual(data['ventas_por_dia'][0]['ventas'], 15.0)
+        self.assertNotIn('parciales', data)
+
+
+class EventosDashboardTest(TestCase):
+    """Tests de los deltas del dashboard en vivo"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        
+    def test_deltas_de_recibo(self):
+        """Test que crear y pagar un recibo publica solo lo que cambia"""
+        from unittest import mock
+        with mock.patch('myapp.eventos.publicar') as publicar:
+            with self.captureOnCommitCallbacks(execute=True):
+                recibo = Recibo.objects.create(usuario=self.user, total=Decimal('12.50'))
+            with self.captureOnCommitCallbacks(execute=True):
+                recibo = Recibo.objects.get(pk=recibo.pk)
+                recibo.pagado = True
+                recibo.save()
+            with self.captureOnCommitCallbacks(execute=True):
+                recibo.save()
+        
+        eventos = [llamada.args[0] for llamada in publicar.call_args_list]
+        self.assertEqual(len(eventos), 2)
+        self.assertEqual(eventos[0]['cambios'], {'pedidos_hoy': 1, 'pedidos_semana': 1})
+        self.assertEqual(eventos[1]['cambios'], {'ingresos_hoy': 12.5, 'ingresos_semana': 12.5})
+        
+    async def test_bus_memoria_reparte_eventos(self):
+        """Test que cada suscriptor recibe los eventos publicados"""
+        import asyncio
+        from .eventos import BusMemoria
+        bus = BusMemoria()
+        suscriptores = [bus.escuchar(), bus.escuchar()]
+        pendientes = [asyncio.ensure_future(anext(s)) for s in suscriptores]
+        await asyncio.sleep(0)
+        await asyncio.to_thread(bus.publicar, {'cambios': {'pedidos_hoy': 1}})
+        recibidos = await asyncio.wait_for(asyncio.gather(*pendientes), timeout=1)
+        self.assertEqual(recibidos, [{'cambios': {'pedidos_hoy': 1}}] * 2)
+        for suscriptor in suscriptores:
+            await suscriptor.aclose()
+        self.assertFalse(bus._suscriptores)
+
+
 class IntegrationTest(TestCase):
     """Tests de integración"""
     
@@ -1,13 +1,21 @@
 import requests
 import json
 import hashlib
+from datetime import date
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.contrib.auth.models import User
 from django.contrib.auth import login, logout, authenticate
 from django.db import IntegrityError
+from . import carrito_anonimo, recomendaciones
 from .forms import ClienteForm
 from .models import Plato, DisponibilidadPlato, CarritoItem, Cliente,  Recibo, ReciboItem, Empresa, PedidoHistorico
+from .search import ids_platos
+from .checkout import confirmar_carrito
+from .menu import menu_del_dia, filtrar_menu
+from .servicio import (NOMBRES_DIA, CapacidadAgotada, NoALaVenta, anadir_al_carrito, codigo_dia,
+                       fecha_desde_parametros, fechas_servicio)
+from .alergenos import mascara_desde_parametro, codigos_de_mascara, CHOICES as ALERGENOS_CHOICES
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_POST
 from django.db import transaction
@@ -37,7 +45,9 @@ def register(request):
                 password=request.POST['password1'])
                 user.save()
                 login(request, user)
-                return redirect('create_cliente')
+                respuesta = redirect('create_cliente')
+                carrito_anonimo.fusionar(request, user, respuesta)
+                return respuesta
             except IntegrityError:
                 return render(request, 'singup.html', {
                 'form': UserCreationForm(),
@@ -141,7 +151,9 @@ def signin(request):
                     })
         else:
             login(request, user)
-            return redirect('main')
+            respuesta = redirect('main')
+            carrito_anonimo.fusionar(request, user, respuesta)
+            return respuesta
 
 #Asi se hacen todos        
 def create_cliente(request):
@@ -165,55 +177,81 @@ def create_cliente(request):
 
 
 #Continuamos la logica
-@login_required(login_url='signin')
 def main(request):
     # 1. Diccionario de días
     dias_semana = dict(DisponibilidadPlato.DIAS_SEMANA)
 
-    # 2. Día actual (por defecto LUN) y grupo (por defecto todos)
-    dia_actual = request.GET.get('dia', 'LUN')
+    # 2. Fecha de servicio (?fecha=AAAA-MM-DD; ?dia=LUN es el próximo lunes) y grupo (por defecto todos)
+    try:
+        fecha_actual = fecha_desde_parametros(request.GET.get('fecha'), request.GET.get('dia'))
+    except ValueError as e:
+        messages.error(request, str(e))
+        fecha_actual = fecha_desde_parametros()
+    dia_actual = codigo_dia(fecha_actual)
     grupo_actual = request.GET.get('grupo', '')
+    busqueda = request.GET.get('q', '').strip()
 
     # 3. POST → Agregar al carrito
     if request.method == 'POST':
         plato_id   = request.POST.get('plato_id')
         cantidad   = int(request.POST.get('cantidad', 1))
-        dia_semana = request.POST.get('dia_semana', dia_actual)
-
         plato = get_object_or_404(Plato, id=plato_id)
+        respuesta = redirect(f"{request.path}?fecha={fecha_actual.isoformat()}&grupo={grupo_actual}")
 
-        item, creado = CarritoItem.objects.get_or_create(
-            usuario=request.user,
-            plato=plato,
-            dia_semana=dia_semana,
-            defaults={'cantidad': cantidad}
-        )
-        if not creado:
-            item.cantidad = F('cantidad') + cantidad
-            item.save()
+        try:
+            fecha_servicio = fecha_desde_parametros(
+                request.POST.get('fecha_servicio'), request.POST.get('dia_semana'), defecto=fecha_actual
+            )
+            if request.user.is_authenticated:
+                # Reserva las raciones: no se puede añadir más de lo que queda
+                anadir_al_carrito(request.user, plato, fecha_servicio, cantidad)
+            else:
+                # Sin cuenta el carrito va en una cookie firmada, sin escribir en la BD
+                carrito_anonimo.anadir(request, respuesta, plato, fecha_servicio, cantidad)
+        except ValueError as e:
+            messages.error(request, str(e))
 
-        return redirect(f"{request.path}?dia={dia_actual}&grupo={grupo_actual}")
+        return respuesta
 
-    # 4. Obtener platos disponibles para el día (OPTIMIZADO)
-    disponibles = DisponibilidadPlato.objects.filter(
-        dia=dia_actual
-    ).select_related('plato')
+    # 4. Platos disponibles para el día: instantánea cacheada filtrada en memoria
+    try:
+        sin_alergenos = mascara_desde_parametro(','.join(request.GET.getlist('sin_alergenos')))
+    except ValueError as e:
+        messages.error(request, str(e))
+        sin_alergenos = 0
+
+    disponibles = filtrar_menu(
+        menu_del_dia(fecha_actual),
+        grupo=grupo_actual,
+        sin_alergenos=sin_alergenos,
+    )
 
-    if grupo_actual:
-        disponibles = disponibles.filter(plato__grupo=grupo_actual)
+    if busqueda:
+        posiciones = {plato_id: i for i, plato_id in enumerate(ids_platos(busqueda))}
+        disponibles = sorted(
+            (d for d in disponibles if d.plato_id in posiciones),
+            key=lambda d: posiciones[d.plato_id]
+        )
+    else:
+        # Lo que más encaja con lo que suele pedir el usuario, primero
+        disponibles = recomendaciones.ordenar(request.user.id, disponibles)
 
     # 5. Obtener carrito del usuario (OPTIMIZADO)
-    carrito_items = CarritoItem.objects.filter(
-        usuario=request.user
-    ).select_related('plato', 'usuario')
-    
-    # Usar agregación para calcular el total más eficientemente
-    from django.db.models import Sum, F
-    total_carrito = CarritoItem.objects.filter(
-        usuario=request.user
-    ).aggregate(
-        total=Sum(F('cantidad') * F('plato__precio'))
-    )['total'] or 0
+    if request.user.is_authenticated:
+        carrito_items = CarritoItem.objects.filter(
+            usuario=request.user
+        ).select_related('plato', 'usuario')
+
+        # Usar agregación para calcular el total más eficientemente
+        from django.db.models import Sum, F
+        total_carrito = CarritoItem.objects.filter(
+            usuario=request.user
+        ).aggregate(
+            total=Sum(F('cantidad') * F('plato__precio'))
+        )['total'] or 0
+    else:
+        carrito_items = carrito_anonimo.lineas_carrito(request)
+        total_carrito = sum(item.subtotal() for item in carrito_items)
 
     # 6. Grupos únicos ordenados (OPTIMIZADO con cache)
     from django.core.cache import cache
@@ -226,11 +264,16 @@ def main(request):
         'dias_semana': dias_semana,
         'dia_actual': dia_actual,
         'dia_actual_nombre': dias_semana.get(dia_actual, ''),
+        'fecha_actual': fecha_actual,
+        'fechas': [(fecha, NOMBRES_DIA[codigo_dia(fecha)]) for fecha in fechas_servicio()],
         'disponibles': disponibles,
         'carrito_items': carrito_items,
         'total_carrito': total_carrito,
         'grupo_actual': grupo_actual,
         'grupos': grupos,
+        'busqueda': busqueda,
+        'alergenos': ALERGENOS_CHOICES,
+        'sin_alergenos': codigos_de_mascara(sin_alergenos),
     })
 
 # ----------PAGO------------
@@ -331,51 +374,33 @@ def eliminar_carrito_item(request, item_id):
     return redirect('main')
 
 
+@require_POST
+def eliminar_carrito_anonimo(request, plato_id, fecha):
+    respuesta = redirect('main')
+    try:
+        carrito_anonimo.quitar(request, respuesta, plato_id, date.fromisoformat(fecha))
+    except ValueError:
+        pass
+    return respuesta
+
+
 # Prueba
 @login_required
-@transaction.atomic
 def procesar_pago(request):
-    usuario = request.user
-    carrito_items = CarritoItem.objects.filter(usuario=usuario)
+    try:
+        recibo = confirmar_carrito(request.user)
+    except (CapacidadAgotada, NoALaVenta) as e:
+        messages.error(request, str(e))
+        return redirect('main')
 
-    if not carrito_items.exists():
+    if recibo is None:
         messages.warning(request, "Tu carrito está vacío.")
         return redirect('main')
 
-    total = sum(item.plato.precio * item.cantidad for item in carrito_items)
-
-    try:
-        cliente = Cliente.objects.get(usuario=usuario)
-        empresa = cliente.empresa
-    except Cliente.DoesNotExist:
-        empresa = None
-
-    recibo = Recibo.objects.create(
-        usuario=usuario,
-        empresa=empresa,
-        total=total
-    )
-
-    for item in carrito_items:
-        ReciboItem.objects.create(
-            recibo=recibo,
-            plato=item.plato,
-            cantidad=item.cantidad,
-            precio_unitario=item.plato.precio
-        )
-
-    # Aquí creamos los registros en PedidoHistorico sin pasar fecha_emision
-    historico_items = [
-        PedidoHistorico(
-            usuario=item.usuario,
-            plato=item.plato,
-            cantidad=item.cantidad,
-            dia_semana=item.dia_semana
-        ) for item in carrito_items
-    ]
-    PedidoHistorico.objects.bulk_create(historico_items)
-
-    carrito_items.delete()
+    if recibo.metodo_pago == Recibo.METODO_FACTURA_SEMANAL:
+        # Cliente B2B: sin pago con Paycomet, entra en la factura semanal de su empresa
+        messages.success(request, "Pedido confirmado. Se incluirá en la factura semanal de tu empresa.")
+        return redirect('main')
 
     request.session['recibo_id'] = recibo.id
 
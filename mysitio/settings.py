@@ -12,7 +12,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
-from decouple import config
+import sys
+from decouple import Csv, config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -109,15 +110,174 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'mysitio.wsgi.application'
+ASGI_APPLICATION = 'mysitio.asgi.application'
+
+# Con USE_ASGI=True el contenedor arranca gunicorn con workers de uvicorn y las
+# URLs del menú y los dashboards apuntan a las vistas de myapp.async_views
+USE_ASGI = config('USE_ASGI', default=False, cast=bool)
+
+# Dashboards: consultas independientes ejecutadas en paralelo (myapp.dashboard)
+DASHBOARD_HILOS = config('DASHBOARD_HILOS', default=8, cast=int)
+DASHBOARD_TIMEOUT = config('DASHBOARD_TIMEOUT', default=5.0, cast=float)
+
+# Los tests usan siempre servicios locales (caché en memoria)
+TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
 
 # Database
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# SQLite por defecto; docker-compose pasa DB_ENGINE/DB_HOST/... para PostgreSQL.
+DB_ENGINE = config('DB_ENGINE', default='django.db.backends.sqlite3')
+
+if 'sqlite' in DB_ENGINE:
+    DATABASES = {
+        'default': {
+            'ENGINE': DB_ENGINE,
+            'NAME': BASE_DIR / config('DB_NAME', default='db.sqlite3'),
+        }
+    }
+
+    # Perfil de producción para despliegues pequeños de un solo nodo: WAL permite
+    # lecturas concurrentes con una escritura, busy_timeout hace esperar en vez de
+    # fallar con "database is locked" y BEGIN IMMEDIATE toma el bloqueo de
+    # escritura al empezar la transacción (evita interbloqueos al promocionarlo).
+    if config('SQLITE_PRODUCCION', default=False, cast=bool):
+        SQLITE_BUSY_TIMEOUT = config('SQLITE_BUSY_TIMEOUT', default=5000, cast=int)  # ms
+        DATABASES['default']['OPTIONS'] = {
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT};'
+                f"PRAGMA mmap_size={config('SQLITE_MMAP_SIZE', default=134217728, cast=int)};"
+                f"PRAGMA cache_size=-{config('SQLITE_CACHE_SIZE_KB', default=20000, cast=int)};"
+                'PRAGMA temp_store=MEMORY;'
+            ),
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': SQLITE_BUSY_TIMEOUT / 1000,
+        }
+else:
+    # Pool de conexiones de psycopg 3 (Django >= 5.1). Con pool, las conexiones
+    # no se mantienen por petición, así que CONN_MAX_AGE debe ser 0.
+    DB_POOL = config('DB_POOL', default=False, cast=bool)
+
+    def _base_de_datos(host, port):
+        return {
+            'ENGINE': DB_ENGINE,
+            'NAME': config('DB_NAME', default='familia_gastro'),
+            'USER': config('DB_USER', default='postgres'),
+            'PASSWORD': config('DB_PASSWORD', default=''),
+            'HOST': host,
+            'PORT': port,
+            'CONN_MAX_AGE': 0 if DB_POOL else config('DB_CONN_MAX_AGE', default=60, cast=int),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'connect_timeout': config('DB_CONNECT_TIMEOUT', default=5, cast=int),
+                **({'pool': {
+                    'min_size': config('DB_POOL_MIN_SIZE', default=2, cast=int),
+                    'max_size': config('DB_POOL_MAX_SIZE', default=10, cast=int),
+                    'timeout': config('DB_POOL_TIMEOUT', default=10, cast=int),
+                }} if DB_POOL else {}),
+            },
+        }
+
+    DATABASES = {
+        'default': _base_de_datos(
+            config('DB_HOST', default='localhost'),
+            config('DB_PORT', default='5432'),
+        ),
     }
+
+    # Réplica de solo lectura opcional para dashboards y analítica
+    DB_REPLICA_HOST = config('DB_REPLICA_HOST', default='')
+    if DB_REPLICA_HOST:
+        DATABASES['replica'] = {
+            **_base_de_datos(DB_REPLICA_HOST, config('DB_REPLICA_PORT', default='5432')),
+            'TEST': {'MIRROR': 'default'},
+        }
+
+DATABASE_ROUTERS = ['myapp.db_routers.ReplicaRouter']
+
+# Cache
+# Con Redis (docker-compose) todos los workers de gunicorn comparten la misma
+# caché; sin configurar, o en tests, se usa una caché local por proceso.
+CACHE_BACKEND = config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache')
+CACHE_LOCATION = config('CACHE_LOCATION', default='familia-gastro')
+if TESTING:
+    CACHE_BACKEND = 'django.core.cache.backends.locmem.LocMemCache'
+    CACHE_LOCATION = 'familia-gastro-tests'
+
+CACHE_KEY_PREFIX = config('CACHE_KEY_PREFIX', default='familia_gastro')
+CACHE_VERSION = config('CACHE_VERSION', default=1, cast=int)
+CACHE_COMPARTIDA = 'redis' in CACHE_BACKEND.lower() or 'memcached' in CACHE_BACKEND.lower()
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': CACHE_LOCATION,
+        'KEY_PREFIX': CACHE_KEY_PREFIX,
+        'VERSION': CACHE_VERSION,
+        'TIMEOUT': config('CACHE_TIMEOUT', default=300, cast=int),
+    },
+    'sessions': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': CACHE_LOCATION,
+        'KEY_PREFIX': f'{CACHE_KEY_PREFIX}:sesiones',
+        'TIMEOUT': None,
+    },
 }
 
+if 'redis' in CACHE_BACKEND.lower():
+    # Opciones del pool de conexiones de redis-py (uno por proceso)
+    for alias in CACHES.values():
+        alias['OPTIONS'] = {
+            'max_connections': config('CACHE_MAX_CONNECTIONS', default=50, cast=int),
+            'socket_connect_timeout': config('CACHE_CONNECT_TIMEOUT', default=2, cast=int),
+            'socket_timeout': config('CACHE_SOCKET_TIMEOUT', default=2, cast=int),
+            'health_check_interval': 30,
+            'retry_on_timeout': True,
+        }
+
+# Meses que PedidoHistorico y MovimientoInventario se quedan en las tablas
+# calientes antes de pasar al archivo (comando archivar_historico)
+ARCHIVO_MESES_RETENCION = config('ARCHIVO_MESES_RETENCION', default=12, cast=int)
+
+# Reparto (myapp.reparto): CSV local "clave,latitud,longitud" para geocodificar
+# direcciones, punto de salida de las rutas y límites de cada ruta
+GEOCODIFICACION_DATASET = config('GEOCODIFICACION_DATASET', default=str(BASE_DIR / 'data' / 'geocodificacion.csv'))
+REPARTO_ORIGEN = config('REPARTO_ORIGEN', default='40.4168,-3.7038', cast=Csv(float))
+REPARTO_CAPACIDAD = config('REPARTO_CAPACIDAD', default=200, cast=int)  # platos por vehículo
+REPARTO_MAX_PARADAS = config('REPARTO_MAX_PARADAS', default=25, cast=int)
+
+# Procesos que maquetan los PDF de recibos y facturas (myapp.documentos)
+DOCUMENTOS_PROCESOS = config('DOCUMENTOS_PROCESOS', default=4, cast=int)
+
+# Semanas de fechas de servicio que se publican por adelantado desde el menú
+# semanal (myapp.servicio, comando publicar_menu)
+MENU_SEMANAS_PUBLICADAS = config('MENU_SEMANAS_PUBLICADAS', default=4, cast=int)
+# Minutos que un carrito sin tocar mantiene reservadas sus raciones (comando liberar_reservas)
+CARRITO_RESERVA_MINUTOS = config('CARRITO_RESERVA_MINUTOS', default=30, cast=int)
+# Días que una línea de carrito sin confirmar se conserva (comando caducar_carritos)
+CARRITO_CADUCIDAD_DIAS = config('CARRITO_CADUCIDAD_DIAS', default=14, cast=int)
+
+# Recomendaciones (myapp.recomendaciones): días de histórico y fichero del
+# modelo que calcula cada noche el comando calcular_recomendaciones
+RECOMENDACIONES_DIAS = config('RECOMENDACIONES_DIAS', default=180, cast=int)
+RECOMENDACIONES_MODELO = config('RECOMENDACIONES_MODELO', default=str(BASE_DIR / 'data' / 'recomendaciones.npz'))
+
+# Bus de eventos del dashboard en vivo (myapp.eventos). Con varios workers o
+# procesos hace falta Redis; por defecto usa el de la caché si existe.
+EVENTOS_REDIS_URL = config(
+    'EVENTOS_REDIS_URL',
+    default=CACHE_LOCATION if 'redis' in CACHE_BACKEND.lower() and not TESTING else ''
+)
+
+# Sesiones: en la caché compartida si existe, así no se consulta la tabla
+# django_session en cada petición. 'cached_db' mantiene además una copia en BD.
+SESSION_ENGINE = config(
+    'SESSION_ENGINE',
+    default='django.contrib.sessions.backends.cache' if CACHE_COMPARTIDA and not TESTING
+    else 'django.contrib.sessions.backends.db'
+)
+SESSION_CACHE_ALIAS = 'sessions'
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
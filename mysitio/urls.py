@@ -21,9 +21,19 @@ from myapp import views
 from django.conf import settings
 from django.conf.urls.static import static
 from rest_framework.routers import DefaultRouter
-from myapp.api_views import (PlatoViewSet, ClienteViewSet, CarritoViewSet, ReciboViewSet, DashboardViewSet,
+from myapp.api_views import (PlatoViewSet, ClienteViewSet, CarritoViewSet, ReciboViewSet, DashboardViewSet, SegmentoRFMViewSet,
                             dashboard_estadisticas, dashboard_ventas_mensuales, production_dashboard_stats, 
-                            inventory_alerts, production_efficiency_chart, inventory_rotation_chart)
+                            inventory_alerts, production_efficiency_chart, inventory_rotation_chart,
+                            production_sheet, production_sheet_plan, delivery_routes, menu_semanal,
+                            menu_recomendado)
+
+vista_main = views.main
+if settings.USE_ASGI:
+    # Versiones asíncronas de las vistas de lectura más consultadas
+    from myapp import async_views
+    vista_main = async_views.main
+    production_dashboard_stats = async_views.production_dashboard_stats
+    inventory_alerts = async_views.inventory_alerts
 
 # Router para la API
 router = DefaultRouter()
@@ -32,13 +42,14 @@ router.register(r'clientes', ClienteViewSet)
 router.register(r'carrito', CarritoViewSet, basename='carrito')
 router.register(r'recibos', ReciboViewSet, basename='recibo')
 router.register(r'dashboard', DashboardViewSet, basename='dashboard')
+router.register(r'rfm', SegmentoRFMViewSet, basename='rfm')
 
 urlpatterns = [
     path(settings.ADMIN_URL, admin.site.urls),
     path('api/', include(router.urls)),
     path('api-auth/', include('rest_framework.urls')),
     
-    # Dashboard API endpoints
+    # Dashboard API endpoints (estadisticas/ queda tapada por DashboardViewSet.estadisticas del router)
     path('api/dashboard/estadisticas/', dashboard_estadisticas, name='dashboard_estadisticas'),
     path('api/dashboard/ventas_mensuales/', dashboard_ventas_mensuales, name='dashboard_ventas_mensuales'),
     
@@ -47,10 +58,15 @@ urlpatterns = [
     path('api/production/inventory/alerts/', inventory_alerts, name='inventory_alerts'),
     path('api/production/efficiency/chart/', production_efficiency_chart, name='production_efficiency_chart'),
     path('api/production/inventory/rotation/', inventory_rotation_chart, name='inventory_rotation_chart'),
+    path('api/production/sheet/', production_sheet, name='production_sheet'),
+    path('api/production/sheet/plan/', production_sheet_plan, name='production_sheet_plan'),
+    path('api/production/routes/', delivery_routes, name='delivery_routes'),
+    path('api/menu/semana/', menu_semanal, name='menu_semanal'),
+    path('api/menu/recomendado/', menu_recomendado, name='menu_recomendado'),
     
     path('', views.helloword, name='home'),
-    path('singup/', views.register),
-    path('main/', views.main, name='main'),  # ✅ Esta es la buena
+    path('singup/', views.register, name='registro'),
+    path('main/', vista_main, name='main'),  # ✅ Esta es la buena
     path('logout/', views.signout, name='logout'),
     path('signin/', views.signin, name='signin'),
     path('info/', views.create_cliente, name='create_cliente'),
@@ -64,8 +80,14 @@ urlpatterns = [
     path('admin_status/', views.admin_status_check, name='admin_status_check'),
     path('pago/', views.pago, name='pago'),
     path('eliminar-item/<int:item_id>/', views.eliminar_carrito_item, name='eliminar_item'),
+    path('eliminar-item-anonimo/<int:plato_id>/<str:fecha>/', views.eliminar_carrito_anonimo,
+         name='eliminar_item_anonimo'),
 ] 
 
+if settings.USE_ASGI:
+    # Conexiones SSE de larga duración: solo con workers asíncronos
+    urlpatterns.insert(0, path(f'{settings.ADMIN_URL}eventos/', async_views.eventos_dashboard, name='admin_eventos'))
+
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
     # Temporalmente deshabilitado para pruebas